@@ -12,5 +12,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ShengHang.settings')
+# ASGI 下使用曲库详情页/搜索接口的异步版本 (见 settings.ASYNC_VIEWS)
+os.environ.setdefault('SHENGHANG_ASYNC_VIEWS', '1')
+# ASGI 下流式响应会被整体读入内存，大列表接口改为一次性返回 (见 settings.STREAM_JSON_RESPONSES)
+os.environ.setdefault('SHENGHANG_STREAM_JSON', '0')
 
 application = get_asgi_application()
+
+# 预先建立数据库连接池中的连接 (settings.DATABASES 中的 POOL.MIN_SIZE)，
+# 避免进程启动后的第一批请求都去新建连接
+from app.mysqlPool.pool import warm_up_pools  # noqa: E402
+
+warm_up_pools()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,9 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.request_profiler_middleware',
+    'app.middleware.db_acquire_time_middleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'app.middleware.session_refresh_middleware',
+    'app.middleware.current_user_middleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -69,7 +74,20 @@ SESSION_COOKIE_SAMESITE = None  # 允许跨域携带
 SESSION_COOKIE_SECURE = False   # 开发环境 False，生产环境 HTTPS 改为 True
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_AGE = 86400  # 24小时
-SESSION_SAVE_EVERY_REQUEST = True  # 每次请求都更新 session
+# 会话存储: 保存在数据库 (django_session) 中，同时写入 CACHES['sessions'] 缓存，读会话时先读缓存，未命中才查询数据库
+# 退出登录、注销账号时在服务端同时删除缓存和数据库中的会话，已发出的 Cookie 随即失效
+# CACHES['sessions'] 必须是多进程共享的缓存: 本地内存缓存下其他 worker 在退出登录后仍可能读到缓存中的会话
+# 不要改为 signed_cookies: 会话内容只靠 SECRET_KEY 签名，得到密钥即可伪造任意用户 (包括管理员) 的会话，
+# 且退出登录无法使已发出的 Cookie 失效
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+# 不再每次请求都保存会话 (每个请求一条 UPDATE)，由 session_refresh_middleware 在剩余有效期不足时续期
+SESSION_SAVE_EVERY_REQUEST = False
+# 会话续期: 剩余有效期低于 SESSION_COOKIE_AGE * THRESHOLD 时重新保存会话并刷新 Cookie 过期时间
+SESSION_REFRESH = {
+    'ENABLED': True,
+    'THRESHOLD': 0.5,
+}
 
 ROOT_URLCONF = 'ShengHang.urls'
 
@@ -91,13 +109,30 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'ShengHang.wsgi.application'
 
+# 是否使用曲库详情页/搜索接口的异步版本 (并发执行查询)
+# asgi.py 中默认开启；WSGI 部署下异步视图没有并发收益，保持同步版本
+ASYNC_VIEWS = os.environ.get('SHENGHANG_ASYNC_VIEWS', '0') == '1'
+
+# 大列表接口是否流式输出 (见 app/views/jsonStream.py)
+# Django 4.2 在 ASGI 下会先把同步的流式响应全部读入内存再发送，没有收益，asgi.py 中默认关闭 (一次性编码返回)
+STREAM_JSON_RESPONSES = os.environ.get('SHENGHANG_STREAM_JSON', '1') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# 数据库在远程服务器上，使用带连接池的 MySQL 后端 (app/mysqlPool) 复用连接:
+#   请求结束时连接放回池中，CONN_MAX_AGE 需保持为 0
+# POOL:
+#   MAX_SIZE: 每个进程最多打开的连接数; TIMEOUT: 连接都被占用时最多等待的秒数
+#   MAX_AGE: 连接最长使用时间(秒)，应小于 MySQL 的 wait_timeout
+#   HEALTH_CHECK_INTERVAL: 连接空闲超过该秒数时取出前先 ping
+#   MIN_SIZE: 进程启动时预先建立的连接数
+# 关闭连接池 (ENABLED: False) 时可改用 Django 自带的长连接:
+#   'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'app.mysqlPool',
         'HOST': '124.70.86.207',
         'PORT': 3306,
         'USER': 'u23373273',
@@ -106,9 +141,140 @@ DATABASES = {
         'OPTIONS': {
             'charset': 'utf8mb4',
         },
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'ENABLED': True,
+            'MIN_SIZE': 2,
+            'MAX_SIZE': 10,
+            'MAX_AGE': 1800,
+            'HEALTH_CHECK_INTERVAL': 30,
+            'TIMEOUT': 10,
+        },
     }
 }
 
+# 在响应头 X-DB-Acquire-Time 中返回本次请求取数据库连接的耗时(毫秒)
+DB_ACQUIRE_TIME_HEADER = DEBUG
+
+# 接口耗时与 SQL 统计 (管理员接口 Administrator/get_request_profile/)
+# SERVER_TIMING: 在响应头 Server-Timing 中返回本次请求的总耗时、SQL 耗时和条数
+# N_PLUS_ONE_THRESHOLD: 同一请求中同一条 SQL (参数不同) 执行达到该次数时标记为 N+1 查询
+# SLOW_QUERIES: 每个接口展示的最慢 SQL 条数
+REQUEST_PROFILER = {
+    'ENABLED': True,
+    'SERVER_TIMING': DEBUG,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERIES': 5,
+}
+
+
+# 曲库检索索引
+# auto: MySQL 使用 SearchIndex 表的 ngram 全文索引，其他数据库使用本地索引文件
+SEARCH_INDEX_BACKEND = 'auto'   # auto / mysql / local
+SEARCH_INDEX_PATH = BASE_DIR / 'search_index.json'
+# 本地索引文件: 增删追加到 SEARCH_INDEX_PATH + '.log'，累计多少条后写回完整的索引文件
+SEARCH_INDEX_COMPACT_EVERY = 1000
+
+# 缓存
+# 默认使用本地内存缓存，多 worker 部署时可改为文件缓存以在进程间共享
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shenghang-default',
+    },
+    # 'default': {
+    #     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    #     'LOCATION': BASE_DIR / 'cache',
+    # },
+    # 会话缓存 (见 SESSION_ENGINE)，同一台服务器上的 worker 共享；多台服务器部署时改为 Redis 等共享缓存
+    # 条目超过 MAX_ENTRIES 时被淘汰的会话从数据库中重新读取
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# 详情页 (歌曲/专辑/歌手/歌单) 读穿透缓存
+# BACKEND: lru 为进程内 LRU 缓存; django 为使用上面 CACHES 中 ALIAS 对应的缓存
+# TIMEOUT: 缓存有效期(秒)
+# VERSION_TIMEOUT: 详情页版本号的缓存有效期(秒)，缓存命中时不查询数据库;
+#                  多进程部署下使用 lru 时也是其他进程读到修改后数据的最长时间 (使用共享缓存时立即生效)
+PROFILE_CACHE = {
+    'BACKEND': 'lru',
+    'ALIAS': 'default',
+    'MAX_ENTRIES': 1024,
+    'TIMEOUT': 300,
+    'VERSION_TIMEOUT': 5,
+}
+
+# 播放记录批量写入
+# ENABLED: 关闭后每次播放同步写入数据库
+# BATCH_SIZE: 每批写入的最大条数; FLUSH_INTERVAL: 最长写入间隔(秒)
+# MAX_PENDING: 缓冲区上限，写满时请求最多等待 1 秒，仍写不进则丢弃该次播放
+PLAY_EVENT_BUFFER = {
+    'ENABLED': True,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 50000,
+}
+
+# 点赞数写入缓冲 (歌单点赞、评论点赞)
+# ENABLED: 关闭后每次点赞同步更新点赞数
+# BATCH_SIZE / FLUSH_INTERVAL / MAX_PENDING: 含义同 PLAY_EVENT_BUFFER，同一对象的增量在写入时合并
+LIKE_COUNTER_BUFFER = {
+    'ENABLED': True,
+    'BATCH_SIZE': 1000,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 50000,
+}
+
+# 系统日志批量写入
+# BATCH_SIZE / FLUSH_INTERVAL / MAX_PENDING: 含义同 PLAY_EVENT_BUFFER
+# PUT_TIMEOUT: 缓冲区已满时等待的秒数 (背压)，超时后按 ON_FULL 处理:
+#   file 写入 FALLBACK_FILE / sync 同步写入数据库 / drop 丢弃
+# FALLBACK_FILE: 数据库不可用时日志追加写入的本地文件 (每行一条 JSON)，None 表示不写文件;
+#   用 python manage.py replay_system_logs 补写到数据库
+SYSTEM_LOG_BUFFER = {
+    'ENABLED': True,
+    'BATCH_SIZE': 500,
+    'FLUSH_INTERVAL': 1.0,
+    'MAX_PENDING': 10000,
+    'PUT_TIMEOUT': 0.1,
+    'ON_FULL': 'file',
+    'FALLBACK_FILE': BASE_DIR / 'systemlog_fallback.jsonl',
+}
+
+# 当前登录用户缓存 (request.current_user，见 app/views/currentUser.py)
+# BACKEND / ALIAS / MAX_ENTRIES: 含义同 PROFILE_CACHE
+# TIMEOUT: 缓存有效期(秒)，使用 lru 时也是其他 worker 读到封禁等状态变化的最长时间
+CURRENT_USER_CACHE = {
+    'BACKEND': 'lru',
+    'ALIAS': 'default',
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 60,
+}
+
+# 接口返回数据的 JSON 编码器 (json_cn 和流式响应，见 app/views/jsonEncoder.py)
+# BACKEND: auto 已安装 orjson (pip install orjson) 时使用 orjson，否则使用标准库;
+#          也可以指定 orjson / stdlib。两者输出相同，orjson 更快
+# 用 python manage.py benchmark_json_encoders 比较各编码器的速度
+JSON_ENCODER = {
+    'BACKEND': 'auto',
+}
+
+# 播放防刷时间窗口 (同一用户 60 秒内重复播放同一首歌不计数)
+# BACKEND: auto 在 CACHES 中 ALIAS 对应的缓存为多进程共享的缓存 (文件缓存、Redis 等) 时使用 django，
+#          为本地内存缓存时使用 local; local 为进程内窗口，只适用于单 worker 部署
+# MAX_ENTRIES: local 窗口的最大条目数
+PLAY_DEDUP_WINDOW = {
+    'BACKEND': 'auto',
+    'ALIAS': 'default',
+    'MAX_ENTRIES': 100000,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -150,3 +316,28 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# 日志
+# app 下各模块通过 logging.getLogger(__name__) 记录后台写入失败、缓存失效失败等异常，输出到控制台
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'app': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
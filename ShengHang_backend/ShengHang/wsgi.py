@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ShengHang.settings')
 
 application = get_wsgi_application()
+
+# 预先建立数据库连接池中的连接 (settings.DATABASES 中的 POOL.MIN_SIZE)，
+# 避免进程启动后的第一批请求都去新建连接
+from app.mysqlPool.pool import warm_up_pools  # noqa: E402
+
+warm_up_pools()
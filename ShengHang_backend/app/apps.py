@@ -5,12 +5,6 @@ class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
 
-    def ready(self):
-        # 避免在 migrate 时执行
-        import sys
-        if 'migrate' in sys.argv:
-            return
-
-        # 对于model.py中建表时无权限设置的default值，直接使用SQL语句进行设置
-        from .views.initialTable import initialize_tables
-        initialize_tables()
+    # 启动时不访问数据库。
+    # 建表后的修复 (默认值、外键名称、删除无用表) 由 python manage.py apply_schema_fixups 执行一次，
+    # 见 app/views/initialTable.py
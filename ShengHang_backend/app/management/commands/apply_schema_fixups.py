@@ -0,0 +1,53 @@
+# 执行建表后的一次性修复 (见 app/views/initialTable.py)
+# 每条修复只执行一次，执行记录保存在 SchemaFixup 表中，可以重复运行
+# 用法:
+#   python manage.py apply_schema_fixups            # 执行尚未执行的修复
+#   python manage.py apply_schema_fixups --list     # 查看每条修复是否已执行
+#   python manage.py apply_schema_fixups --fake     # 只记录不执行 (旧版本每次启动都会执行这些修复，已部署的数据库用这个)
+# 旧版本部署过的数据库第一次升级的完整步骤见 README (先 migrate app 0002 --fake，再 migrate --fake-initial)；
+# 删除 after_play_insert 触发器在迁移 0013 中执行，不受 --fake 影响
+#   python manage.py apply_schema_fixups --fake fk.album.singer_id   # 只标记指定的修复
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.views import initialTable
+
+
+class Command(BaseCommand):
+    help = "执行尚未执行过的建表修复 (MySQL 默认值、外键名称、删除无用表)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="只处理指定名称的修复，默认全部")
+        parser.add_argument("--list", action="store_true", help="列出所有修复及其执行时间")
+        parser.add_argument("--fake", action="store_true", help="只记录为已执行，不执行 SQL")
+
+    def handle(self, *args, **options):
+        known = [name for name, _ in initialTable.FIXUPS]
+        unknown = [name for name in options["names"] if name not in known]
+        if unknown:
+            raise CommandError(f"未知的修复: {', '.join(unknown)}")
+
+        if options["list"]:
+            done = initialTable.applied_fixups()
+            for name in known:
+                self.stdout.write(f"[{'X' if name in done else ' '}] {name}" + (f"  ({done[name]})" if name in done else ""))
+            return
+
+        if connection.vendor != "mysql" and not options["fake"]:
+            raise CommandError(f"这些修复是 MySQL 语句，不适用于 {connection.vendor}，可用 --fake 标记为已执行")
+
+        results = initialTable.apply_fixups(options["names"] or None, fake=options["fake"])
+        failures = []
+        for name, error in results:
+            if error is None:
+                self.stdout.write(f"[{'FAKED' if options['fake'] else 'OK'}] {name}")
+            else:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f"[失败] {name}: {error}"))
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} 条修复执行失败，修正后重新运行；若数据库中已经是修复后的状态，"
+                f"可用 --fake {' '.join(failures)} 标记为已执行"
+            )
+        self.stdout.write(self.style.SUCCESS(f"执行了 {len(results)} 条修复" if results else "没有需要执行的修复"))
@@ -0,0 +1,42 @@
+# 归档历史播放记录和系统日志 (冷热分离，见 app/views/archive.py)
+# 按整月归档: 超过保留月数的数据移到归档表，播放记录同时汇总到 PlayMonthlyStats
+# 用法 (可每天凌晨定时运行，中途中断后重新运行即可):
+#   python manage.py archive_history                       # 播放记录保留 6 个月，日志保留 3 个月
+#   python manage.py archive_history --play-months 12 --log-months 1
+#   python manage.py archive_history --dry-run             # 只统计待归档的条数
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app.views import archive
+
+
+class Command(BaseCommand):
+    help = "把旧的 PlayHistory / SystemLog 移到归档表，并按月汇总播放记录"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--play-months", type=int, default=6,
+                            help="PlayHistory 保留最近几个月 (含本月)，默认 6")
+        parser.add_argument("--log-months", type=int, default=3,
+                            help="SystemLog 保留最近几个月 (含本月)，默认 3")
+        parser.add_argument("--batch-size", type=int, default=5000, help="每批移动的条数，默认 5000")
+        parser.add_argument("--dry-run", action="store_true", help="只统计待归档的条数，不移动数据")
+
+    def handle(self, *args, **options):
+        if options["play_months"] < 1 or options["log_months"] < 1:
+            raise CommandError("保留月数至少为 1 (本月的数据不归档)")
+
+        tasks = [
+            ("PlayHistory", "play_time", options["play_months"] - 1, archive.archive_play_history),
+            ("SystemLog", "action_time", options["log_months"] - 1, archive.archive_system_logs),
+        ]
+        for table, time_column, months_ago, archive_func in tasks:
+            before = archive.month_start(months_ago)
+            if options["dry_run"]:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {time_column} < %s", [before])
+                    count = cursor.fetchone()[0]
+                self.stdout.write(f"{table}: {before} 之前待归档 {count} 条")
+                continue
+
+            moved = archive_func(before, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"{table}: 已归档 {before} 之前的 {moved} 条"))
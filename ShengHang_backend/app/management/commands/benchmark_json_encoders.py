@@ -0,0 +1,113 @@
+# JSON 编码器基准测试
+# 用接近实际接口返回数据的负载 (不访问数据库) 比较 app/views/jsonEncoder.py 中各编码器的编码速度，
+# 并检查各编码器的输出与标准库完全一致。用法:
+#   python manage.py benchmark_json_encoders
+#   python manage.py benchmark_json_encoders --rows 2000 --iterations 200
+import datetime
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.views import jsonEncoder
+
+
+def song_rows(count, rng):
+    "search_song / songlist_profile 的歌曲列表: 含 datetime、嵌套的歌手数组"
+    start = datetime.datetime(2020, 1, 1, 8, 0, 0)
+    return [{
+        "song_id": i,
+        "song_title": f"歌曲{i}",
+        "duration": rng.randint(120, 360),
+        "duration_formatted": "03:45",
+        "album_id": i // 10,
+        "album_title": f"专辑{i // 10}",
+        "singers": [{"singer_id": i % 97 + k, "singer_name": f"歌手{i % 97 + k}"} for k in range(rng.randint(1, 3))],
+        "add_time": start + datetime.timedelta(seconds=rng.randint(0, 10 ** 8), microseconds=rng.randint(0, 999999)),
+        "favorite_count": rng.randint(0, 10000),
+    } for i in range(count)]
+
+
+def comment_rows(count, rng):
+    "list_comment / get_my_comments 的评论列表: 长文本、datetime、可空字段"
+    start = datetime.datetime(2023, 1, 1)
+    return [{
+        "comment_id": i,
+        "user_id": rng.randint(1, 5000),
+        "username": f"用户{i % 500}",
+        "content": "这首歌真好听，" * rng.randint(1, 20),
+        "like_count": rng.randint(0, 500),
+        "comment_time": start + datetime.timedelta(seconds=rng.randint(0, 10 ** 7)),
+        "parent_id": None if i % 3 else i - 1,
+        "status": "正常",
+    } for i in range(count)]
+
+
+def stats_payload(count, rng):
+    "统计接口: SUM() 得到的 Decimal、date 键值、嵌套字典"
+    start = datetime.date(2024, 1, 1)
+    return {
+        "summary": {
+            "total_plays": Decimal(rng.randint(10 ** 5, 10 ** 7)),
+            "total_duration": Decimal(rng.randint(10 ** 7, 10 ** 9)),
+            "avg_duration": Decimal("213.47"),
+        },
+        "daily": [{
+            "date": start + datetime.timedelta(days=i),
+            "plays": rng.randint(0, 10 ** 5),
+            "duration": Decimal(rng.randint(0, 10 ** 7)),
+            "active_users": rng.randint(0, 5000),
+        } for i in range(count)],
+        "top_songs": song_rows(50, rng),
+    }
+
+
+PAYLOADS = {
+    "songs": song_rows,
+    "comments": comment_rows,
+    "stats": stats_payload,
+}
+
+
+class Command(BaseCommand):
+    help = "比较各 JSON 编码器在典型接口数据上的编码速度"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500, help="每个负载的行数，默认 500")
+        parser.add_argument("--iterations", type=int, default=100, help="每个编码器重复编码的次数，默认 100")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["iterations"] < 1:
+            raise CommandError("--rows 和 --iterations 至少为 1")
+        rng = random.Random(options["seed"])
+        encoders = jsonEncoder.ENCODERS
+        self.stdout.write(f"可用编码器: {', '.join(encoders)}；当前使用: {jsonEncoder.get_backend_name()}")
+        if "orjson" not in encoders:
+            self.stdout.write(self.style.WARNING("未安装 orjson (pip install orjson)，只测试标准库"))
+
+        for payload_name, build in PAYLOADS.items():
+            data = build(options["rows"], rng)
+            expected = encoders["stdlib"](data)
+            self.stdout.write(f"\n{payload_name} ({options['rows']} 行，{len(expected) / 1024:.1f} KB)")
+
+            baseline = None
+            for name, dumps in encoders.items():
+                output = dumps(data)
+                if output != expected:
+                    same = json.loads(output) == json.loads(expected)
+                    message = "解码后相同，字节不同" if same else "输出与标准库不一致"
+                    self.stdout.write(self.style.ERROR(f"  {name}: {message}"))
+                    continue
+
+                started = time.perf_counter()
+                for _ in range(options["iterations"]):
+                    dumps(data)
+                per_call = (time.perf_counter() - started) / options["iterations"]
+                baseline = baseline or per_call
+                self.stdout.write(
+                    f"  {name:<8} {per_call * 1000:8.3f} ms/次  {len(expected) / per_call / 2 ** 20:8.1f} MB/s"
+                    f"  x{baseline / per_call:.1f}"
+                )
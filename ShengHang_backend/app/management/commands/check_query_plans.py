@@ -0,0 +1,151 @@
+# 检查高频查询的执行计划
+# 对视图中最常执行的查询运行 EXPLAIN，出现全表扫描时命令失败 (退出码非 0)
+# 用法:
+#   python manage.py check_query_plans            # 只在没有可用索引的全表扫描时失败
+#   python manage.py check_query_plans --strict   # 任何全表扫描都失败
+# 注意: MySQL 在表中数据很少时即使有可用索引也可能选择全表扫描，因此默认只检查是否有可用索引
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+# (说明, 被检查的表, SQL, 参数)
+# SQL 与视图中的 WHERE / ORDER BY 保持一致，省略了与索引选择无关的 JOIN 和字段
+HOT_QUERIES = [
+    ("comment.get_comments_by_target 评论列表", "Comment",
+     "SELECT comment_id FROM Comment WHERE target_type = %s AND target_id = %s AND parent_id IS NULL "
+     "ORDER BY comment_time DESC",
+     ["song", 1]),
+    ("comment.get_comment_detail 评论的回复", "Comment",
+     "SELECT comment_id FROM Comment WHERE parent_id = %s ORDER BY comment_time ASC",
+     [1]),
+    ("comment.get_comment_tree 楼层列表 (按热度)", "Comment",
+     "SELECT comment_id FROM Comment WHERE target_type = %s AND target_id = %s AND parent_id IS NULL "
+     "ORDER BY like_count DESC, comment_id DESC LIMIT 20",
+     ["song", 1]),
+    ("comment.get_thread_replies 楼层内的回复", "Comment",
+     "SELECT comment_id FROM Comment WHERE root_id = %s ORDER BY comment_time ASC, comment_id ASC LIMIT 20",
+     [1]),
+    ("comment.list_comment 我的评论", "Comment",
+     "SELECT comment_id FROM Comment WHERE user_id = %s AND target_type = %s ORDER BY comment_time DESC",
+     [1, "song"]),
+    ("manager.admin_get_pending_comments 待审核评论", "Comment",
+     "SELECT comment_id FROM Comment WHERE status IN ('审核中', '举报中') ORDER BY comment_time DESC",
+     []),
+    ("manager.get_user_behavior_stats 评论数", "Comment",
+     "SELECT COUNT(*) FROM Comment WHERE comment_time BETWEEN %s AND %s",
+     ["2024-01-01", "2024-01-31"]),
+    ("favoriteAndSonglist.list_favorite 我的收藏", "Favorite",
+     "SELECT target_id FROM Favorite WHERE user_id = %s AND target_type = %s ORDER BY favorite_time DESC",
+     [1, "song"]),
+    ("favoriteAndSonglist.add_favorite 是否已收藏", "Favorite",
+     "SELECT favorite_id FROM Favorite WHERE user_id = %s AND target_type = %s AND target_id = %s",
+     [1, "song", 1]),
+    ("favoriteAndSonglist.get_platform_top_favorites 收藏排行", "FavoriteCount",
+     "SELECT target_id, fav_count FROM FavoriteCount WHERE target_type = %s AND fav_count > 0 "
+     "ORDER BY fav_count DESC LIMIT 10",
+     ["song"]),
+    ("manager.get_user_behavior_stats 收藏数", "Favorite",
+     "SELECT COUNT(*) FROM Favorite WHERE favorite_time BETWEEN %s AND %s",
+     ["2024-01-01", "2024-01-31"]),
+    ("favoriteAndSonglist.songlist_profile 歌单歌曲", "Songlist_Song",
+     "SELECT song_id FROM Songlist_Song WHERE songlist_id = %s ORDER BY add_time DESC LIMIT 101",
+     [1]),
+    ("playhistory.record_play 防刷检查", "PlayHistory",
+     "SELECT MAX(play_time), CURRENT_TIMESTAMP FROM PlayHistory WHERE user_id = %s AND song_id = %s",
+     [1, 1]),
+    ("playhistory.get_my_play_history 播放历史", "PlayHistory",
+     "SELECT play_id FROM PlayHistory WHERE user_id = %s ORDER BY play_time DESC LIMIT 50",
+     [1]),
+    ("playhistory.get_user_activity_trend 活跃趋势", "PlayHistory",
+     "SELECT COUNT(*) FROM PlayHistory WHERE user_id = %s AND play_time >= %s",
+     [1, "2024-01-01"]),
+    ("manager.get_user_behavior_stats 播放数", "PlayHistory",
+     "SELECT COUNT(*) FROM PlayHistory WHERE play_time BETWEEN %s AND %s",
+     ["2024-01-01", "2024-01-31"]),
+    ("playhistory.get_my_play_history 播放历史 (归档)", "PlayHistoryArchive",
+     "SELECT play_id FROM PlayHistoryArchive WHERE user_id = %s ORDER BY play_time DESC LIMIT 50",
+     [1]),
+    ("playhistory.get_user_top_charts 已归档播放汇总", "PlayMonthlyStats",
+     "SELECT song_id, SUM(play_count) FROM PlayMonthlyStats WHERE user_id = %s GROUP BY song_id",
+     [1]),
+    ("dailyStats.rebuild 已归档播放", "PlayHistoryArchive",
+     "SELECT COUNT(*) FROM PlayHistoryArchive WHERE play_time BETWEEN %s AND %s",
+     ["2024-01-01", "2024-01-31"]),
+    ("manager.get_system_logs 系统日志", "SystemLog",
+     "SELECT log_id FROM SystemLog WHERE (action_time < %s OR (action_time = %s AND log_id < %s)) "
+     "ORDER BY action_time DESC, log_id DESC LIMIT 21",
+     ["2024-01-31", "2024-01-31", 100]),
+    ("manager.get_system_logs 系统日志 (归档)", "SystemLogArchive",
+     "SELECT log_id FROM SystemLogArchive ORDER BY action_time DESC, log_id DESC LIMIT 21",
+     []),
+    ("archive.archive_play_history 待归档的播放记录", "PlayHistory",
+     "SELECT play_id FROM PlayHistory WHERE play_time < %s ORDER BY play_time, play_id LIMIT 5000",
+     ["2024-01-01"]),
+    ("profileVersion.get_profile_version 详情页版本", "EntityVersion",
+     "SELECT version, update_time FROM EntityVersion WHERE target_type = %s AND target_id = %s",
+     ["song", 1]),
+]
+
+
+def explain_mysql(cursor, table, sql, params):
+    """
+    返回 (是否全表扫描, 是否有可用索引, 执行计划说明)
+    type = ALL 表示全表扫描; 按时间排序取前 N 条时 type = index 且 key 非空也可接受
+    """
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [col[0] for col in cursor.description]
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        if plan.get("table") != table:
+            continue
+        full_scan = plan.get("type") == "ALL"
+        has_index = bool(plan.get("possible_keys")) or bool(plan.get("key"))
+        return full_scan, has_index, f"type={plan.get('type')} key={plan.get('key')} rows={plan.get('rows')}"
+    return False, True, "未涉及该表"
+
+
+def explain_sqlite(cursor, table, sql, params):
+    # SQLite: "SCAN 表名" 为全表扫描, "SEARCH 表名 USING INDEX" 为索引查找
+    # "SCAN 表名 USING INDEX" 为按索引顺序遍历 (用于 ORDER BY ... LIMIT)，不算全表扫描
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    details = [row[-1] for row in cursor.fetchall()]
+    full_scan = any(
+        detail.startswith(f"SCAN {table}") and "INDEX" not in detail
+        for detail in details
+    )
+    return full_scan, not full_scan, "; ".join(details)
+
+
+class Command(BaseCommand):
+    help = "对高频查询运行 EXPLAIN，出现全表扫描时失败"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--strict", action="store_true",
+            help="任何全表扫描都视为失败 (默认只在没有可用索引时失败)"
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == "mysql":
+            explain = explain_mysql
+        elif connection.vendor == "sqlite":
+            explain = explain_sqlite
+        else:
+            raise CommandError(f"不支持的数据库: {connection.vendor}")
+
+        failures = []
+        with connection.cursor() as cursor:
+            for name, table, sql, params in HOT_QUERIES:
+                full_scan, has_index, plan = explain(cursor, table, sql, params)
+                failed = full_scan and (options["strict"] or not has_index)
+                if failed:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(f"[全表扫描] {name}: {plan}"))
+                elif full_scan:
+                    self.stdout.write(self.style.WARNING(f"[全表扫描 (有可用索引)] {name}: {plan}"))
+                else:
+                    self.stdout.write(f"[OK] {name}: {plan}")
+
+        if failures:
+            raise CommandError(f"{len(failures)} 条高频查询存在全表扫描: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(HOT_QUERIES)} 条高频查询均使用索引"))
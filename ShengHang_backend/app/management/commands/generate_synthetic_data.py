@@ -0,0 +1,318 @@
+# 生成用于压测 / 基准测试的合成数据
+# 用户、歌手、专辑、歌曲、歌单、播放记录、评论、收藏按给定规模批量写入 (SQLite 和 MySQL 均可)，
+# 热门程度按长尾分布 (少数歌曲/专辑占大部分播放和收藏)，同一 --seed 生成的数据相同。
+# 写入后重新计算收藏排行、每日统计和检索索引 (评论楼层的 root_id / reply_count 在生成时直接算好)，使派生表与原始数据一致。
+# 用法:
+#   python manage.py generate_synthetic_data --scale small
+#   python manage.py generate_synthetic_data --scale medium --plays 2000000 --seed 7
+# 数据在已有数据之后追加 (编号从各表当前最大编号之后开始)，不会修改已有数据;
+# 生成的用户名以 bench_user_ 开头，密码均为 benchmark
+import datetime
+import itertools
+import random
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.views import commentThread
+from app.views.tools import hash_password
+
+
+# 各规模的默认数量
+SCALES = {
+    "small": {
+        "users": 200, "singers": 50, "albums": 200, "songs": 2000, "songlists": 300,
+        "plays": 20000, "comments": 5000, "favorites": 5000,
+    },
+    "medium": {
+        "users": 5000, "singers": 1000, "albums": 5000, "songs": 50000, "songlists": 10000,
+        "plays": 500000, "comments": 100000, "favorites": 100000,
+    },
+    "large": {
+        "users": 50000, "singers": 10000, "albums": 50000, "songs": 500000, "songlists": 100000,
+        "plays": 5000000, "comments": 1000000, "favorites": 1000000,
+    },
+}
+
+BENCH_PASSWORD = "benchmark"
+
+# 标题用字，组合出可被检索的中文标题
+TITLE_CHARS = "爱情晴天夜曲稻香七里香青花瓷告白气球简单双截棍星光海风城市旅行回忆雨季夏天少年梦想月亮彩虹时间故事"
+SINGER_CHARS = "周林王陈张李刘杨黄赵吴孙徐朱马胡郭何高罗杰伦俊宇子涵思琪雨欣嘉怡浩然"
+
+
+def fetch_max_id(cursor, table, pk):
+    cursor.execute(f"SELECT MAX({pk}) FROM {table}")
+    return cursor.fetchone()[0] or 0
+
+
+def insert_rows(cursor, table, columns, rows, batch_size):
+    "多行 INSERT 分批写入，返回写入的行数"
+    count = 0
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return count
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(batch))}",
+            [value for row in batch for value in row]
+        )
+        count += len(batch)
+
+
+class LongTail:
+    "按 Zipf 长尾分布从 [first_id, first_id + n) 中抽取编号，编号越小越热门"
+
+    def __init__(self, rng, first_id, n, skew=1.1):
+        self.rng = rng
+        self.ids = range(first_id, first_id + n)
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(n)))
+
+    def pick(self, k=1):
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+    def one(self):
+        return self.pick()[0]
+
+
+class Command(BaseCommand):
+    help = "生成用于压测和基准测试的合成数据 (追加到现有数据之后)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=list(SCALES), default="small", help="默认规模，默认 small")
+        for name in SCALES["small"]:
+            parser.add_argument(f"--{name}", type=int, help=f"{name} 数量，覆盖 --scale 的默认值")
+        parser.add_argument("--days", type=int, default=90, help="播放/评论/收藏时间分布在最近多少天内，默认 90")
+        parser.add_argument("--seed", type=int, default=20240101, help="随机种子，相同种子生成相同数据")
+        parser.add_argument("--batch-size", type=int, default=1000, help="每条 INSERT 写入的行数")
+        parser.add_argument("--skip-rebuild", action="store_true", help="不重新计算派生表 (收藏排行、每日统计、检索索引)")
+
+    def handle(self, *args, **options):
+        counts = dict(SCALES[options["scale"]])
+        for name in counts:
+            if options[name] is not None:
+                counts[name] = options[name]
+        required = ("users", "singers", "albums", "songs", "songlists")
+        if any(counts[name] < 1 for name in required):
+            raise CommandError(f"{' / '.join(required)} 至少为 1")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.now = datetime.datetime.now().replace(microsecond=0)
+        self.days = max(options["days"], 1)
+
+        started = time.monotonic()
+        with connection.cursor() as cursor:
+            self.base = {
+                "user": fetch_max_id(cursor, "User", "user_id"),
+                "singer": fetch_max_id(cursor, "Singer", "singer_id"),
+                "album": fetch_max_id(cursor, "Album", "album_id"),
+                "song": fetch_max_id(cursor, "Song", "song_id"),
+                "songlist": fetch_max_id(cursor, "Songlist", "songlist_id"),
+                "comment": fetch_max_id(cursor, "Comment", "comment_id"),
+            }
+            self.counts = counts
+
+            steps = [
+                ("users", self.generate_users),
+                ("singers", self.generate_singers),
+                ("albums", self.generate_albums),
+                ("songs", self.generate_songs),
+                ("songlists", self.generate_songlists),
+                ("plays", self.generate_plays),
+                ("comments", self.generate_comments),
+                ("favorites", self.generate_favorites),
+            ]
+            for name, step in steps:
+                step_started = time.monotonic()
+                with transaction.atomic():
+                    written = step(cursor)
+                self.stdout.write(f"{name}: {written} 行 ({time.monotonic() - step_started:.1f}s)")
+
+        if not options["skip_rebuild"]:
+            self.stdout.write("重新计算派生表...")
+            call_command("rebuild_favorite_counts", stdout=self.stdout)
+            # 用户注册时间分布在最近 4 * days 天内
+            call_command("rebuild_daily_stats", days=self.days * 4 + 1, stdout=self.stdout)
+            call_command("rebuild_search_index", batch_size=self.batch_size, stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"合成数据已生成 (scale={options['scale']}, seed={options['seed']})，"
+            f"共耗时 {time.monotonic() - started:.1f}s"
+        ))
+
+    # --------------------------
+    # 工具
+    # --------------------------
+    def ids(self, kind):
+        "本次生成的某类对象的编号范围"
+        first = self.base[kind] + 1
+        return range(first, first + self.counts[kind + "s"])
+
+    def long_tail(self, kind):
+        first = self.base[kind] + 1
+        return LongTail(self.rng, first, self.counts[kind + "s"])
+
+    def random_time(self, days=None):
+        seconds = self.rng.randrange((days or self.days) * 86400)
+        return (self.now - datetime.timedelta(seconds=seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+    def random_title(self, chars=TITLE_CHARS, low=2, high=6):
+        return "".join(self.rng.choice(chars) for _ in range(self.rng.randint(low, high)))
+
+    # --------------------------
+    # 各表
+    # --------------------------
+    def generate_users(self, cursor):
+        password = hash_password(BENCH_PASSWORD)
+        rows = (
+            (user_id, f"bench_user_{user_id}", password, self.rng.choice(["男", "女", "其他"]),
+             self.random_time(self.days * 4), "正常", "所有人可见")
+            for user_id in self.ids("user")
+        )
+        return insert_rows(cursor, "User",
+                           ["user_id", "user_name", "password", "gender", "register_time", "status", "visibility"],
+                           rows, self.batch_size)
+
+    def generate_singers(self, cursor):
+        rows = (
+            (singer_id, self.random_title(SINGER_CHARS, 2, 3) + f"{singer_id}",
+             self.rng.choice(["男", "女", "组合"]), self.rng.choice(["中国", "日本", "韩国", "美国"]))
+            for singer_id in self.ids("singer")
+        )
+        return insert_rows(cursor, "Singer", ["singer_id", "singer_name", "type", "country"], rows, self.batch_size)
+
+    def generate_albums(self, cursor):
+        singers = self.long_tail("singer")
+        rows = (
+            (album_id, self.random_title(), singers.one(),
+             (self.now - datetime.timedelta(days=self.rng.randrange(20 * 365))).strftime("%Y-%m-%d"),
+             "/images/default_album_cover.jpg")
+            for album_id in self.ids("album")
+        )
+        return insert_rows(cursor, "Album", ["album_id", "album_title", "singer_id", "release_date", "cover_url"],
+                           rows, self.batch_size)
+
+    def generate_songs(self, cursor):
+        # 歌曲均匀分到各专辑，歌手为专辑歌手，约 10% 的歌曲有合作歌手
+        cursor.execute(
+            "SELECT album_id, singer_id FROM Album WHERE album_id > %s ORDER BY album_id",
+            [self.base["album"]]
+        )
+        albums = cursor.fetchall()
+        singer_ids = self.ids("singer")
+
+        songs, song_singers = [], []
+        for index, song_id in enumerate(self.ids("song")):
+            album_id, singer_id = albums[index % len(albums)]
+            songs.append((song_id, self.random_title(), album_id, self.rng.randint(120, 360),
+                          f"/music/{song_id}.mp3", 0))
+            song_singers.append((song_id, singer_id))
+            if self.rng.random() < 0.1:
+                featured = self.rng.choice(singer_ids)
+                if featured != singer_id:
+                    song_singers.append((song_id, featured))
+
+        written = insert_rows(cursor, "Song",
+                              ["song_id", "song_title", "album_id", "duration", "file_url", "play_count"],
+                              songs, self.batch_size)
+        insert_rows(cursor, "Song_Singer", ["song_id", "singer_id"], song_singers, self.batch_size)
+        return written
+
+    def generate_songlists(self, cursor):
+        users = self.long_tail("user")
+        songs = self.long_tail("song")
+        songlists, entries = [], []
+        for songlist_id in self.ids("songlist"):
+            songlists.append((songlist_id, self.random_title(), users.one(), self.random_time(),
+                              "/images/default_songlist_cover.jpg", self.rng.randrange(100),
+                              self.rng.random() < 0.9))
+            for song_id in set(songs.pick(self.rng.randint(5, 50))):
+                entries.append((songlist_id, song_id, self.random_time()))
+
+        written = insert_rows(cursor, "Songlist",
+                              ["songlist_id", "songlist_title", "user_id", "create_time", "cover_url",
+                               "like_count", "is_public"],
+                              songlists, self.batch_size)
+        insert_rows(cursor, "Songlist_Song", ["songlist_id", "song_id", "add_time"], entries, self.batch_size)
+        return written
+
+    def generate_plays(self, cursor):
+        users = self.long_tail("user")
+        songs = self.long_tail("song")
+        play_counts = {}
+
+        def rows():
+            for _ in range(self.counts["plays"]):
+                song_id = songs.one()
+                play_counts[song_id] = play_counts.get(song_id, 0) + 1
+                yield users.one(), song_id, self.random_time(), self.rng.randint(10, 360)
+
+        written = insert_rows(cursor, "PlayHistory", ["user_id", "song_id", "play_time", "play_duration"],
+                              rows(), self.batch_size)
+
+        # 歌曲播放总次数与播放记录一致
+        items = sorted(play_counts.items())
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            cases = " ".join(["WHEN %s THEN %s"] * len(batch))
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"UPDATE Song SET play_count = play_count + CASE song_id {cases} END "
+                f"WHERE song_id IN ({placeholders})",
+                [value for row in batch for value in row] + [row[0] for row in batch]
+            )
+        return written
+
+    def generate_comments(self, cursor):
+        # 约 70% 为一级评论，其余回复本次生成的某条评论 (同一目标下)
+        users = self.long_tail("user")
+        targets = {kind: self.long_tail(kind) for kind in ("song", "album", "songlist")}
+        comments = []       # [comment_id, user_id, target_type, content, like_count, time, parent_id, root_id, reply_count, status, target_id]
+        first_id = self.base["comment"] + 1
+
+        for offset in range(self.counts["comments"]):
+            comment_id = first_id + offset
+            if comments and self.rng.random() < 0.3:
+                parent = comments[self.rng.randrange(len(comments))]
+                root_id = parent[7] or parent[0]
+                target_type, target_id = parent[2], parent[10]
+                parent_id = parent[0]
+                comments[root_id - first_id][8] += 1
+            else:
+                target_type = self.rng.choices(["song", "album", "songlist"], weights=[6, 2, 2])[0]
+                target_id = targets[target_type].one()
+                parent_id = root_id = None
+            comments.append([
+                comment_id, users.one(), target_type, self.random_title(low=4, high=20),
+                self.rng.randrange(50), self.random_time(), parent_id, root_id, 0,
+                commentThread.VISIBLE_STATUS, target_id,
+            ])
+
+        return insert_rows(cursor, "Comment",
+                           ["comment_id", "user_id", "target_type", "content", "like_count", "comment_time",
+                            "parent_id", "root_id", "reply_count", "status", "target_id"],
+                           comments, self.batch_size)
+
+    def generate_favorites(self, cursor):
+        users = self.long_tail("user")
+        targets = {kind: self.long_tail(kind) for kind in ("song", "album", "songlist")}
+        seen = set()
+        rows = []
+        # 热门对象容易重复抽到，最多尝试 3 倍次数
+        for _ in range(self.counts["favorites"] * 3):
+            if len(rows) >= self.counts["favorites"]:
+                break
+            target_type = self.rng.choices(["song", "album", "songlist"], weights=[7, 2, 1])[0]
+            key = (users.one(), target_type, targets[target_type].one())
+            if key in seen:
+                continue
+            seen.add(key)
+            rows.append(key + (self.random_time(),))
+
+        return insert_rows(cursor, "Favorite", ["user_id", "target_type", "target_id", "favorite_time"],
+                           rows, self.batch_size)
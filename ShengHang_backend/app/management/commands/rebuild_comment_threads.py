@@ -0,0 +1,16 @@
+# 从 parent_id 重新计算评论楼层 (root_id) 和楼层回复数 (reply_count)
+# 用法: python manage.py rebuild_comment_threads
+from django.core.management.base import BaseCommand
+
+from app.views import commentThread
+
+
+class Command(BaseCommand):
+    help = "从 parent_id 重新计算 Comment 的 root_id 和 reply_count"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="每条 UPDATE 语句更新的行数")
+
+    def handle(self, *args, **options):
+        roots, replies = commentThread.rebuild(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"已重新计算 {roots} 个楼层，{replies} 条回复"))
@@ -0,0 +1,36 @@
+# 从原始记录重新计算每日统计汇总
+# 用法:
+#   python manage.py rebuild_daily_stats              # 重新计算最近 7 天 (可每天定时运行，修正删除造成的偏差)
+#   python manage.py rebuild_daily_stats --days 30
+#   python manage.py rebuild_daily_stats --all        # 首次部署时回填全部历史数据
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from app.views import dailyStats
+
+
+class Command(BaseCommand):
+    help = "从 PlayHistory/Comment/Favorite/Songlist/User 表重新计算 DailyStats 和 UserDailyStats"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="重新计算最近多少天，默认 7")
+        parser.add_argument("--all", action="store_true", help="重新计算全部历史数据")
+        parser.add_argument("--batch-size", type=int, default=1000, help="每批写入的条数")
+
+    def handle(self, *args, **options):
+        end_date = dailyStats.db_today()
+        if options["all"]:
+            start_date = dailyStats.earliest_date() or end_date
+        else:
+            start_date = end_date - datetime.timedelta(days=options["days"] - 1)
+
+        # 按月分段计算，避免一次性读取过多数据
+        chunk_start = start_date
+        while chunk_start <= end_date:
+            chunk_end = min(chunk_start + datetime.timedelta(days=30), end_date)
+            daily_count, user_count = dailyStats.rebuild(chunk_start, chunk_end, batch_size=options["batch_size"])
+            self.stdout.write(f"{chunk_start} ~ {chunk_end}: 全站 {daily_count} 天, 用户 {user_count} 条")
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"每日统计已重新计算: {start_date} ~ {end_date}"))
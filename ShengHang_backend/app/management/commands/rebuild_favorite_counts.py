@@ -0,0 +1,23 @@
+# 从 Favorite 表重新统计收藏排行榜计数
+# 用法: python manage.py rebuild_favorite_counts [--type song album songlist]
+from django.core.management.base import BaseCommand
+
+from app.views import leaderboard
+
+
+class Command(BaseCommand):
+    help = "从 Favorite 表重新统计 FavoriteCount (平台收藏排行榜)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            nargs="+",
+            choices=list(leaderboard.TARGET_TYPES),
+            default=list(leaderboard.TARGET_TYPES),
+            help="要重新统计的对象类型，默认全部",
+        )
+
+    def handle(self, *args, **options):
+        for target_type in options["type"]:
+            count = leaderboard.rebuild(target_type)
+            self.stdout.write(self.style.SUCCESS(f"[{target_type}] 已统计 {count} 个对象"))
@@ -0,0 +1,27 @@
+# 全量重建曲库检索索引
+# 用法: python manage.py rebuild_search_index [--type song album singer songlist]
+from django.core.management.base import BaseCommand
+
+from app.views import searchIndex
+
+
+class Command(BaseCommand):
+    help = "从 Song/Album/Singer/Songlist 表全量重建检索索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--type",
+            nargs="+",
+            choices=list(searchIndex.TARGET_TABLES.keys()),
+            default=list(searchIndex.TARGET_TABLES.keys()),
+            help="要重建的对象类型，默认全部",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="每批写入的条数")
+
+    def handle(self, *args, **options):
+        backend = "MySQL FULLTEXT" if searchIndex.use_mysql_fulltext() else "本地索引文件"
+        self.stdout.write(f"检索索引存储: {backend}")
+
+        for target_type in options["type"]:
+            count = searchIndex.rebuild(target_type, batch_size=options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(f"[{target_type}] 已索引 {count} 条"))
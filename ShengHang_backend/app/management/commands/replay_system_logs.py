@@ -0,0 +1,21 @@
+# 把数据库不可用时写入本地文件的系统日志补写到数据库
+# 文件位置见 settings.SYSTEM_LOG_BUFFER['FALLBACK_FILE']
+# 用法: python manage.py replay_system_logs
+from django.core.management.base import BaseCommand
+
+from app.views import systemLog
+
+
+class Command(BaseCommand):
+    help = "把本地文件中的系统日志补写到 SystemLog 表"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="每批写入的条数")
+
+    def handle(self, *args, **options):
+        path = systemLog.fallback_path()
+        if not path:
+            self.stdout.write("未配置 SYSTEM_LOG_BUFFER['FALLBACK_FILE']")
+            return
+        count = systemLog.replay_fallback(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"已补写 {count} 条日志 ({path})"))
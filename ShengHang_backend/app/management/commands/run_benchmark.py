@@ -0,0 +1,242 @@
+# 接口基准测试
+# 用 Django 测试客户端依次请求关键接口 (不需要启动服务)，统计每个接口的
+# 耗时分位数 (p50/p95/p99)、SQL 条数和数据库耗时，结果保存为 JSON，便于在不同提交之间对比。
+# SQL 条数和数据库耗时取自 request_profiler_middleware 的 Server-Timing 响应头
+# (异步视图在线程池中执行的查询也会被统计)。
+# 先用 generate_synthetic_data 生成数据，再运行:
+#   python manage.py run_benchmark --requests 500 --output bench/after.json
+#   python manage.py run_benchmark --compare bench/before.json --max-regression 20
+# --compare 时打印与基准结果的差异，p95 变慢超过 --max-regression 百分比的接口会使命令失败
+import datetime
+import json
+import math
+import random
+import re
+import subprocess
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from app.views import requestProfiler
+from app.views.tools import ADMIN_USER_ID
+from .generate_synthetic_data import TITLE_CHARS
+
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def percentile(values, p):
+    "最近秩法求分位数，values 需已排序"
+    if not values:
+        return None
+    index = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+            cwd=settings.BASE_DIR
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "对关键接口运行基准测试，输出耗时分位数和 SQL 条数"
+
+    # 名称 -> 生成一次请求 (method, url, body, 登录用户) 的方法名
+    ENDPOINTS = {
+        "record_play": "request_record_play",
+        "search_song": "request_search_song",
+        "album_profile": "request_album_profile",
+        "songlist_profile": "request_songlist_profile",
+        "get_platform_top_favorites": "request_top_favorites",
+        "get_user_behavior_stats": "request_behavior_stats",
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="每个接口的请求次数，默认 200")
+        parser.add_argument("--warmup", type=int, default=10, help="每个接口正式计时前的预热请求数，默认 10")
+        parser.add_argument("--endpoints", nargs="+", choices=list(self.ENDPOINTS), default=list(self.ENDPOINTS),
+                            help="要测试的接口，默认全部")
+        parser.add_argument("--seed", type=int, default=1, help="随机种子，相同种子请求相同的对象")
+        parser.add_argument("--output", help="结果保存路径 (JSON)")
+        parser.add_argument("--compare", help="与之前保存的结果对比")
+        parser.add_argument("--max-regression", type=float,
+                            help="与 --compare 的结果相比 p95 变慢超过该百分比时命令失败")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.load_ids()
+
+        profiler_config = dict(requestProfiler.get_config(), ENABLED=True, SERVER_TIMING=True)
+        results = {}
+        with override_settings(REQUEST_PROFILER=profiler_config,
+                               ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ["testserver"]):
+            for name in options["endpoints"]:
+                results[name] = self.run_endpoint(name, options["requests"], options["warmup"])
+                self.print_result(name, results[name])
+
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "database": connection.vendor,
+                "async_views": getattr(settings, "ASYNC_VIEWS", False),
+                "requests": options["requests"],
+                "seed": options["seed"],
+                "data": self.data_size,
+            },
+            "endpoints": results,
+        }
+
+        if options["output"]:
+            path = Path(options["output"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"结果已保存到 {path}"))
+
+        if options["compare"]:
+            self.compare(report, options["compare"], options["max_regression"])
+
+    # --------------------------
+    # 测试数据
+    # --------------------------
+    def load_ids(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT song_id FROM Song")
+            self.song_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT album_id FROM Album")
+            self.album_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT songlist_id FROM Songlist WHERE is_public = 1")
+            self.songlist_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT user_id FROM User WHERE status = '正常'")
+            self.user_ids = [row[0] for row in cursor.fetchall()]
+
+        if not (self.song_ids and self.album_ids and self.songlist_ids and self.user_ids):
+            raise CommandError("数据库中没有歌曲/专辑/公开歌单/用户，请先运行 generate_synthetic_data")
+        self.data_size = {
+            "songs": len(self.song_ids),
+            "albums": len(self.album_ids),
+            "public_songlists": len(self.songlist_ids),
+            "users": len(self.user_ids),
+        }
+
+    def request_record_play(self):
+        body = {"song_id": self.rng.choice(self.song_ids), "play_duration": self.rng.randint(10, 300)}
+        return "POST", "/playHistory/record_play/", body, self.rng.choice(self.user_ids)
+
+    def request_search_song(self):
+        keyword = "".join(self.rng.choice(TITLE_CHARS) for _ in range(self.rng.randint(1, 2)))
+        return "POST", "/song/search_song/", {"song_title": keyword}, self.rng.choice(self.user_ids)
+
+    def request_album_profile(self):
+        return "GET", f"/album/profile/{self.rng.choice(self.album_ids)}/", None, self.rng.choice(self.user_ids)
+
+    def request_songlist_profile(self):
+        return "GET", f"/songlist/profile/{self.rng.choice(self.songlist_ids)}/", None, self.rng.choice(self.user_ids)
+
+    def request_top_favorites(self):
+        body = {"target_type": self.rng.choice(["song", "album", "songlist"]), "limit": 10}
+        return "POST", "/favorite/get_platform_top_favorites/", body, self.rng.choice(self.user_ids)
+
+    def request_behavior_stats(self):
+        end = datetime.date.today() - datetime.timedelta(days=self.rng.randrange(60))
+        start = end - datetime.timedelta(days=self.rng.choice([7, 30]))
+        return "POST", "/Administrator/user/get_user_behavior_stats/", \
+            {"start_date": str(start), "end_date": str(end)}, ADMIN_USER_ID
+
+    # --------------------------
+    # 运行
+    # --------------------------
+    def login(self, client, user_id):
+        session = client.session
+        session["user_id"] = user_id
+        session.save()
+        client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+    def run_endpoint(self, name, requests, warmup):
+        make_request = getattr(self, self.ENDPOINTS[name])
+        clients = {}
+        latencies, queries, db_times = [], [], []
+        statuses = {}
+
+        for index in range(warmup + requests):
+            method, url, body, user_id = make_request()
+            client = clients.get(user_id)
+            if client is None:
+                client = clients[user_id] = Client()
+                self.login(client, user_id)
+
+            started = time.perf_counter()
+            if method == "GET":
+                response = client.get(url)
+            else:
+                response = client.post(url, json.dumps(body), content_type="application/json")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if index < warmup:
+                continue
+
+            latencies.append(elapsed_ms)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            match = _SERVER_TIMING_DB.search(response.get("Server-Timing", ""))
+            if match:
+                db_times.append(float(match.group(1)))
+                queries.append(int(match.group(2)))
+
+        latencies.sort()
+        queries.sort()
+        return {
+            "requests": requests,
+            "status": statuses,
+            "errors": sum(count for status, count in statuses.items() if int(status) >= 400),
+            "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "p50_ms": round(percentile(latencies, 50), 3) if latencies else None,
+            "p95_ms": round(percentile(latencies, 95), 3) if latencies else None,
+            "p99_ms": round(percentile(latencies, 99), 3) if latencies else None,
+            "max_ms": round(latencies[-1], 3) if latencies else None,
+            "queries_p50": percentile(queries, 50),
+            "queries_max": queries[-1] if queries else None,
+            "db_ms_mean": round(sum(db_times) / len(db_times), 3) if db_times else None,
+        }
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f"{name:<28} p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+            f"queries={result['queries_p50']} (max {result['queries_max']}) db={result['db_ms_mean']}ms "
+            f"status={result['status']}"
+        )
+
+    # --------------------------
+    # 对比
+    # --------------------------
+    def compare(self, report, baseline_path, max_regression):
+        try:
+            baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"无法读取对比结果 {baseline_path}: {e}")
+
+        self.stdout.write(f"\n与 {baseline_path} (commit {baseline['meta'].get('commit')}) 对比:")
+        regressions = []
+        for name, result in report["endpoints"].items():
+            before = baseline["endpoints"].get(name)
+            if not before or not before.get("p95_ms") or result["p95_ms"] is None:
+                self.stdout.write(f"{name:<28} 无对比数据")
+                continue
+            change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            line = (f"{name:<28} p95 {before['p95_ms']} -> {result['p95_ms']}ms ({change:+.1f}%), "
+                    f"queries {before.get('queries_p50')} -> {result['queries_p50']}")
+            if max_regression is not None and change > max_regression:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} 个接口 p95 变慢超过 {max_regression}%: {', '.join(regressions)}")
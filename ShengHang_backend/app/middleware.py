@@ -0,0 +1,219 @@
+# 中间件
+import contextvars
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .mysqlPool import pool as mysql_pool
+from .views import requestProfiler
+from .views import currentUser
+from .views.tools import json_cn
+
+
+# ================================
+# 流式响应
+# ================================
+# 流式响应 (app/views/jsonStream.py) 的内容和其中的查询在中间件返回之后、服务器发送响应体时才生成。
+# 复制请求的上下文 (SQL 统计、取连接耗时记录在 ContextVar 中)，每一块内容都在该上下文中生成，
+# 全部输出 (或客户端断开) 后再调用 on_finish 完成统计
+def finish_after_streaming(response, on_finish):
+    context = contextvars.copy_context()
+    content = response.streaming_content
+
+    def stream():
+        try:
+            while True:
+                try:
+                    chunk = context.run(next, content)
+                except StopIteration:
+                    return
+                yield chunk
+        finally:
+            on_finish()
+
+    response.streaming_content = stream()
+
+
+# ================================
+# 统计每个请求从连接池取数据库连接的耗时
+# ================================
+# 耗时计入 get_pool_stats 的分位数统计 (管理员接口 Administrator/get_db_pool_stats/)，
+# settings.DB_ACQUIRE_TIME_HEADER 为 True 时同时写入响应头 X-DB-Acquire-Time (毫秒)
+# 流式响应在响应体输出完毕后计入统计，响应头已经发出，不写 X-DB-Acquire-Time
+# 同时支持 WSGI 和 ASGI，ASGI 下不会为中间件额外切换线程
+@sync_and_async_middleware
+def db_acquire_time_middleware(get_response):
+
+    def report(response, token):
+        if response.streaming:
+            # 先复制上下文 (其中仍有本请求的统计) 再结束当前上下文中的统计
+            finish_after_streaming(response, lambda: mysql_pool.record_request(request_stats))
+            request_stats = mysql_pool.detach_request(token)
+            return response
+        count, ms = mysql_pool.finish_request(token)
+        if count and getattr(settings, "DB_ACQUIRE_TIME_HEADER", False):
+            response["X-DB-Acquire-Time"] = f"{ms:.3f}"
+        return response
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = mysql_pool.start_request()
+            try:
+                response = await get_response(request)
+            except BaseException:
+                mysql_pool.finish_request(token)
+                raise
+            return report(response, token)
+    else:
+        def middleware(request):
+            token = mysql_pool.start_request()
+            try:
+                response = get_response(request)
+            except BaseException:
+                mysql_pool.finish_request(token)
+                raise
+            return report(response, token)
+
+    return middleware
+
+
+# ================================
+# 按路由统计接口耗时和 SQL
+# ================================
+# 统计结果见 app/views/requestProfiler.py 和管理员接口 Administrator/get_request_profile/，
+# settings.REQUEST_PROFILER['SERVER_TIMING'] 为 True 时同时写入响应头 Server-Timing
+# (浏览器开发者工具的 Timing 面板可直接显示)
+# 流式响应在响应体输出完毕后记录 (耗时包括发送响应体的时间)，不写 Server-Timing
+@sync_and_async_middleware
+def request_profiler_middleware(get_response):
+    config = requestProfiler.get_config()
+    if not config["ENABLED"]:
+        return get_response
+
+    def record(request, response, request_record, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        requestProfiler.profiler.record(
+            requestProfiler.route_name(request), response.status_code, elapsed_ms, request_record,
+            config["N_PLUS_ONE_THRESHOLD"]
+        )
+        return elapsed_ms
+
+    def report(request, response, request_record, started):
+        if response.streaming:
+            finish_after_streaming(response, lambda: record(request, response, request_record, started))
+            return response
+        elapsed_ms = record(request, response, request_record, started)
+        if config["SERVER_TIMING"]:
+            response["Server-Timing"] = requestProfiler.server_timing(elapsed_ms, request_record)
+        return response
+
+    # report 在 finish_request 之前调用，流式响应复制的上下文中仍带有本请求的 SQL 记录
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            request_record, token = requestProfiler.start_request()
+            try:
+                response = await get_response(request)
+                return report(request, response, request_record, started)
+            finally:
+                requestProfiler.finish_request(token)
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            request_record, token = requestProfiler.start_request()
+            try:
+                response = get_response(request)
+                return report(request, response, request_record, started)
+            finally:
+                requestProfiler.finish_request(token)
+
+    return middleware
+
+
+# ================================
+# 会话按需续期 (滑动过期)
+# ================================
+# 原来 SESSION_SAVE_EVERY_REQUEST = True，每个请求都重新保存一次会话 (数据库会话为一条 UPDATE)。
+# 现在只有会话剩余有效期低于 SESSION_REFRESH['THRESHOLD'] (占 SESSION_COOKIE_AGE 的比例) 时才重新保存，
+# SessionMiddleware 保存会话时会同时刷新 Cookie 的过期时间。上次续期的时间记录在会话的 REFRESHED_AT_KEY 中
+# 持续使用的会话会一直续期 (与原来每次请求都保存相同)，因此会话必须保存在服务端 (见 settings.SESSION_ENGINE)，
+# 退出登录、注销账号时删除服务端的会话，被盗用的 Cookie 随之失效
+# 需放在 SessionMiddleware 之后 (响应阶段先于 SessionMiddleware 执行)
+REFRESHED_AT_KEY = "_refreshed_at"
+
+
+@sync_and_async_middleware
+def session_refresh_middleware(get_response):
+    config = getattr(settings, "SESSION_REFRESH", {})
+    if not config.get("ENABLED", True):
+        return get_response
+    refresh_after = settings.SESSION_COOKIE_AGE * (1 - config.get("THRESHOLD", 0.5))
+
+    def refresh(request):
+        session = request.session
+        # 只处理本次请求读取过的会话 (已加载，不会再查询)，未读取会话的接口不受影响
+        if not session.accessed or "user_id" not in session:
+            return
+        now = int(time.time())
+        if session.modified or now - session.get(REFRESHED_AT_KEY, 0) >= refresh_after:
+            session[REFRESHED_AT_KEY] = now
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            refresh(request)
+            return response
+    else:
+        def middleware(request):
+            response = get_response(request)
+            refresh(request)
+            return response
+
+    return middleware
+
+
+# ================================
+# 解析当前登录用户
+# ================================
+# 见 app/views/currentUser.py，结果放在 request.current_user 中 (未登录为 None)
+# 已注销的用户清除会话后按未登录处理；封禁的用户清除会话并直接返回 403，不进入视图
+# 需放在 SessionMiddleware 之后
+@sync_and_async_middleware
+def current_user_middleware(get_response):
+
+    def resolve(request):
+        "返回 None 表示继续处理请求，否则为直接返回的响应"
+        request.current_user = None
+        # 没有会话 Cookie 的请求不读取会话
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return None
+        user_id = request.session.get("user_id")
+        if not user_id:
+            return None
+
+        user = currentUser.load_user(user_id)
+        if user is None or user.is_banned:
+            request.session.flush()
+            if user is not None:
+                return json_cn({"error": "用户封禁中"}, 403)
+            return None
+        request.current_user = user
+        return None
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            # 读取会话和用户缓存未命中时会查询数据库
+            response = await sync_to_async(resolve)(request)
+            if response is None:
+                response = await get_response(request)
+            return response
+    else:
+        def middleware(request):
+            response = resolve(request)
+            if response is None:
+                response = get_response(request)
+            return response
+
+    return middleware
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.26 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+def add_fulltext_index(apps, schema_editor):
+    # MySQL 使用 ngram 分词的全文索引 (默认 ngram_token_size=2，即二元组)
+    # 其他数据库 (如本地测试用的 SQLite) 使用磁盘上的本地倒排索引，不需要建全文索引
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        "ALTER TABLE SearchIndex ADD FULLTEXT INDEX SearchIndex_keywords_ft (keywords) WITH PARSER ngram"
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute("ALTER TABLE SearchIndex DROP INDEX SearchIndex_keywords_ft")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_rename_singer_id_album_singer_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndex',
+            fields=[
+                ('index_id', models.AutoField(primary_key=True, serialize=False, verbose_name='索引编号')),
+                ('target_type', models.CharField(choices=[('song', 'song'), ('album', 'album'), ('singer', 'singer'), ('songlist', 'songlist')], max_length=10, verbose_name='检索对象类型')),
+                ('target_id', models.IntegerField(verbose_name='检索对象ID')),
+                ('keywords', models.CharField(max_length=512, verbose_name='检索关键词(标题+拼音首字母)')),
+            ],
+            options={
+                'db_table': 'SearchIndex',
+                'unique_together': {('target_type', 'target_id')},
+            },
+        ),
+        migrations.RunPython(add_fulltext_index, drop_fulltext_index),
+    ]
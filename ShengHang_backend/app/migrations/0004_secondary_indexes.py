@@ -0,0 +1,61 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_searchindex'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['target_type', 'target_id', 'comment_time'], name='Comment_target_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['parent_id', 'comment_time'], name='Comment_parent_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['user', 'target_type', 'comment_time'], name='Comment_user_type_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['status', 'comment_time'], name='Comment_status_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['comment_time'], name='Comment_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'target_type', 'favorite_time'], name='Favorite_user_type_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['target_type', 'target_id'], name='Favorite_target_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['favorite_time'], name='Favorite_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playhistory',
+            index=models.Index(fields=['user', 'play_time'], name='PlayHistory_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playhistory',
+            index=models.Index(fields=['user', 'song', 'play_time'], name='PlayHistory_user_song_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playhistory',
+            index=models.Index(fields=['play_time'], name='PlayHistory_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='systemlog',
+            index=models.Index(fields=['action_time'], name='SystemLog_time_idx'),
+        ),
+    ]
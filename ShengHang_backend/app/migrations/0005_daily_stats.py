@@ -0,0 +1,47 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_secondary_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('stat_date', models.DateField(primary_key=True, serialize=False, verbose_name='统计日期')),
+                ('play_count', models.IntegerField(default=0, verbose_name='播放次数')),
+                ('play_duration', models.BigIntegerField(default=0, verbose_name='播放总时长（秒）')),
+                ('comment_count', models.IntegerField(default=0, verbose_name='评论数')),
+                ('favorite_count', models.IntegerField(default=0, verbose_name='收藏数')),
+                ('songlist_count', models.IntegerField(default=0, verbose_name='新建歌单数')),
+                ('new_user_count', models.IntegerField(default=0, verbose_name='新增用户数')),
+            ],
+            options={
+                'db_table': 'DailyStats',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stat_date', models.DateField(verbose_name='统计日期')),
+                ('play_count', models.IntegerField(default=0, verbose_name='播放次数')),
+                ('play_duration', models.BigIntegerField(default=0, verbose_name='播放总时长（秒）')),
+                ('comment_count', models.IntegerField(default=0, verbose_name='评论数')),
+                ('favorite_count', models.IntegerField(default=0, verbose_name='收藏数')),
+                ('songlist_count', models.IntegerField(default=0, verbose_name='新建歌单数')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.user', verbose_name='用户')),
+            ],
+            options={
+                'db_table': 'UserDailyStats',
+                'indexes': [models.Index(fields=['stat_date'], name='UserDailyStats_date_idx')],
+                'unique_together': {('user', 'stat_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.26 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+def backfill_favorite_counts(apps, schema_editor):
+    # 用已有的收藏记录初始化排行榜计数
+    schema_editor.execute("""
+        INSERT INTO FavoriteCount (target_type, target_id, fav_count)
+        SELECT target_type, target_id, COUNT(*)
+        FROM Favorite
+        GROUP BY target_type, target_id
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavoriteCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(choices=[('song', 'song'), ('album', 'album'), ('songlist', 'songlist')], max_length=10, verbose_name='收藏对象类型')),
+                ('target_id', models.IntegerField(verbose_name='收藏对象ID')),
+                ('fav_count', models.IntegerField(default=0, verbose_name='被收藏次数')),
+            ],
+            options={
+                'db_table': 'FavoriteCount',
+                'indexes': [models.Index(fields=['target_type', '-fav_count'], name='FavoriteCount_rank_idx')],
+                'unique_together': {('target_type', 'target_id')},
+            },
+        ),
+        migrations.RunPython(backfill_favorite_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 4.2.26 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+def backfill_comment_threads(apps, schema_editor):
+    # 按已有的 parent_id 计算 root_id 和楼层回复数 (与 commentThread.rebuild 相同)
+    with schema_editor.connection.cursor() as cursor:
+        # 第一层：直接回复一级评论的
+        cursor.execute("""
+            UPDATE Comment SET root_id = parent_id
+            WHERE parent_id IN (SELECT comment_id FROM (
+                SELECT comment_id FROM Comment WHERE parent_id IS NULL
+            ) AS r)
+        """)
+
+        # 之后每一层继承父评论的 root_id，直到没有新的行被更新
+        while True:
+            cursor.execute("""
+                SELECT c.comment_id, p.root_id
+                FROM Comment c
+                         JOIN Comment p ON c.parent_id = p.comment_id
+                WHERE c.root_id IS NULL
+                  AND p.root_id IS NOT NULL
+            """)
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                "UPDATE Comment SET root_id = %s WHERE comment_id = %s",
+                [(root_id, comment_id) for comment_id, root_id in rows]
+            )
+
+        # 楼层回复数只统计状态为 '正常' 的回复
+        cursor.execute("""
+            UPDATE Comment SET reply_count = COALESCE((
+                SELECT r.replies FROM (
+                    SELECT root_id, COUNT(*) AS replies
+                    FROM Comment
+                    WHERE root_id IS NOT NULL
+                      AND status = '正常'
+                    GROUP BY root_id
+                ) AS r
+                WHERE r.root_id = Comment.comment_id
+            ), 0)
+        """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_favoritecount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.IntegerField(default=0, verbose_name='楼层回复数'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='root_id',
+            field=models.IntegerField(blank=True, null=True, verbose_name='所在楼层的一级评论ID'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['root_id', 'comment_time'], name='Comment_root_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['target_type', 'target_id', 'like_count'], name='Comment_target_hot_idx'),
+        ),
+        migrations.RunPython(backfill_comment_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.26 on 2026-10-18 15:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_comment_threads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LikeRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(choices=[('songlist', 'songlist'), ('comment', 'comment')], max_length=10, verbose_name='点赞对象类型')),
+                ('target_id', models.IntegerField(verbose_name='点赞对象ID')),
+                ('like_time', models.DateTimeField(auto_now_add=True, verbose_name='点赞时间')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.user', verbose_name='点赞用户')),
+            ],
+            options={
+                'verbose_name': '点赞记录',
+                'verbose_name_plural': '点赞记录',
+                'db_table': 'LikeRecord',
+                'indexes': [models.Index(fields=['target_type', 'target_id'], name='LikeRecord_target_idx')],
+                'unique_together': {('user', 'target_type', 'target_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_likerecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemaFixup',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='修复名称')),
+                ('applied_time', models.DateTimeField(auto_now_add=True, verbose_name='执行时间')),
+            ],
+            options={
+                'verbose_name': '建表修复记录',
+                'verbose_name_plural': '建表修复记录',
+                'db_table': 'SchemaFixup',
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.26 on 2026-10-18 12:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_schema_fixup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayHistoryArchive',
+            fields=[
+                ('play_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='播放记录编号')),
+                ('play_time', models.DateTimeField(verbose_name='播放时间')),
+                ('play_duration', models.IntegerField(verbose_name='实际播放时长（秒）')),
+            ],
+            options={
+                'verbose_name': '播放记录归档',
+                'verbose_name_plural': '播放记录归档',
+                'db_table': 'PlayHistoryArchive',
+            },
+        ),
+        migrations.CreateModel(
+            name='PlayMonthlyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='月份 (当月 1 日)')),
+                ('play_count', models.IntegerField(default=0, verbose_name='播放次数')),
+                ('play_duration', models.BigIntegerField(default=0, verbose_name='播放总时长（秒）')),
+            ],
+            options={
+                'verbose_name': '已归档播放月度汇总',
+                'verbose_name_plural': '已归档播放月度汇总',
+                'db_table': 'PlayMonthlyStats',
+            },
+        ),
+        migrations.CreateModel(
+            name='SystemLogArchive',
+            fields=[
+                ('log_id', models.IntegerField(primary_key=True, serialize=False, verbose_name='日志编号')),
+                ('action', models.CharField(max_length=255, verbose_name='操作内容')),
+                ('target_table', models.CharField(blank=True, max_length=64, null=True, verbose_name='被操作数据表名')),
+                ('target_id', models.IntegerField(blank=True, null=True, verbose_name='被操作记录ID')),
+                ('action_time', models.DateTimeField(verbose_name='操作时间')),
+                ('result', models.CharField(choices=[('success', 'success'), ('fail', 'fail')], max_length=10, verbose_name='操作结果状态')),
+            ],
+            options={
+                'verbose_name': '系统日志归档',
+                'verbose_name_plural': '系统日志归档',
+                'db_table': 'SystemLogArchive',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='systemlog',
+            name='SystemLog_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='systemlog',
+            index=models.Index(fields=['action_time', 'log_id'], name='SystemLog_time_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='playhistoryarchive',
+            name='song',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.song', verbose_name='播放歌曲'),
+        ),
+        migrations.AddField(
+            model_name='playhistoryarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.user', verbose_name='播放用户'),
+        ),
+        migrations.AddField(
+            model_name='playmonthlystats',
+            name='song',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.song', verbose_name='歌曲'),
+        ),
+        migrations.AddField(
+            model_name='playmonthlystats',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.user', verbose_name='用户'),
+        ),
+        migrations.AddIndex(
+            model_name='systemlogarchive',
+            index=models.Index(fields=['action_time', 'log_id'], name='SystemLogArc_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playhistoryarchive',
+            index=models.Index(fields=['user', 'play_time'], name='PlayArchive_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playhistoryarchive',
+            index=models.Index(fields=['play_time'], name='PlayArchive_time_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='playmonthlystats',
+            unique_together={('user', 'song', 'month')},
+        ),
+    ]
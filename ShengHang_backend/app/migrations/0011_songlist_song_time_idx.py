@@ -0,0 +1,17 @@
+# Generated by Django 4.2.26 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_history_archive'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='songlistsong',
+            index=models.Index(fields=['songlist', 'add_time'], name='SonglistSong_list_time_idx'),
+        ),
+    ]
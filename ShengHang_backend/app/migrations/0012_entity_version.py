@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_songlist_song_time_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntityVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target_type', models.CharField(choices=[('song', 'song'), ('album', 'album'), ('singer', 'singer'), ('songlist', 'songlist')], max_length=10, verbose_name='详情页类型')),
+                ('target_id', models.IntegerField(verbose_name='对象ID (0 表示整类)')),
+                ('version', models.BigIntegerField(default=0, verbose_name='版本号')),
+                ('update_time', models.DateTimeField(verbose_name='最后修改时间')),
+            ],
+            options={
+                'verbose_name': '详情页版本',
+                'verbose_name_plural': '详情页版本',
+                'db_table': 'EntityVersion',
+                'unique_together': {('target_type', 'target_id')},
+            },
+        ),
+    ]
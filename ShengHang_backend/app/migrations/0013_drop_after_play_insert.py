@@ -0,0 +1,22 @@
+# Generated by Django 4.2.26 on 2026-10-18 16:40
+
+from django.db import migrations
+
+
+def drop_after_play_insert(apps, schema_editor):
+    # 原 after_play_insert 触发器在每条播放记录插入后执行 play_count + 1，热门歌曲的行锁竞争严重。
+    # 现在由 playhistory.write_play_events 批量写入时按歌曲汇总后一次更新，
+    # 必须删除该触发器，否则播放次数会被重复累加 (触发器只在 MySQL 中创建过)
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute("DROP TRIGGER IF EXISTS after_play_insert")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_entity_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_after_play_insert, migrations.RunPython.noop),
+    ]
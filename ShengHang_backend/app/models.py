@@ -141,6 +141,8 @@ class Comment(models.Model):
     like_count      = models.IntegerField(default=0,                                      verbose_name='点赞数')
     comment_time    = models.DateTimeField(auto_now_add=True,                           verbose_name='评论时间')
     parent_id       = models.IntegerField(null=True, blank=True,                        verbose_name='父评论ID')
+    root_id         = models.IntegerField(null=True, blank=True,                        verbose_name='所在楼层的一级评论ID')
+    reply_count     = models.IntegerField(default=0,                                    verbose_name='楼层回复数')
     status          = models.CharField(max_length=3, choices=STATUS_CHOICES,            verbose_name='评论状态')
     target_id       = models.IntegerField(verbose_name='评论目标ID')
 
@@ -148,6 +150,15 @@ class Comment(models.Model):
         db_table = 'Comment'
         verbose_name = '评论'
         verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['target_type', 'target_id', 'comment_time'], name='Comment_target_time_idx'),  # 歌曲/专辑/歌单的评论列表
+            models.Index(fields=['parent_id', 'comment_time'], name='Comment_parent_time_idx'),                 # 评论的回复
+            models.Index(fields=['root_id', 'comment_time'], name='Comment_root_time_idx'),                     # 楼层内的回复
+            models.Index(fields=['target_type', 'target_id', 'like_count'], name='Comment_target_hot_idx'),     # 评论列表按热度排序
+            models.Index(fields=['user', 'target_type', 'comment_time'], name='Comment_user_type_time_idx'),    # 我的评论
+            models.Index(fields=['status', 'comment_time'], name='Comment_status_time_idx'),                    # 待审核评论
+            models.Index(fields=['comment_time'], name='Comment_time_idx'),                                     # 管理员按时间段统计
+        ]
 
     def __str__(self):
         return self.comment_id
@@ -169,6 +180,11 @@ class Favorite(models.Model):
 
     class Meta:
         db_table = 'Favorite'
+        indexes = [
+            models.Index(fields=['user', 'target_type', 'favorite_time'], name='Favorite_user_type_time_idx'),  # 我的收藏
+            models.Index(fields=['target_type', 'target_id'], name='Favorite_target_idx'),                      # 收藏排行/是否已收藏
+            models.Index(fields=['favorite_time'], name='Favorite_time_idx'),                                   # 管理员按时间段统计
+        ]
 
     def __str__(self):
         return self.favorite_id
@@ -184,6 +200,11 @@ class PlayHistory(models.Model):
 
     class Meta:
         db_table = 'PlayHistory'
+        indexes = [
+            models.Index(fields=['user', 'play_time'], name='PlayHistory_user_time_idx'),                  # 播放历史/听歌报告/活跃趋势
+            models.Index(fields=['user', 'song', 'play_time'], name='PlayHistory_user_song_time_idx'),     # 防刷检查
+            models.Index(fields=['play_time'], name='PlayHistory_time_idx'),                               # 管理员按时间段统计
+        ]
 
     def __str__(self):
         return self.play_id
@@ -226,6 +247,9 @@ class SonglistSong(models.Model):
     class Meta:
         db_table = 'Songlist_Song'
         unique_together = (('songlist', 'song'),)     #primary_key
+        indexes = [
+            models.Index(fields=['songlist', 'add_time'], name='SonglistSong_list_time_idx'),   # 歌单歌曲按添加时间分页
+        ]
 
     def __str__(self):
         return self.songlist + ' ' + self.song
@@ -259,6 +283,84 @@ class SystemLog(models.Model):
     result       = models.CharField(max_length=10, choices=RESULT_CHOICES,  verbose_name='操作结果状态')
     class Meta:
         db_table = 'SystemLog'
+        indexes = [
+            models.Index(fields=['action_time', 'log_id'], name='SystemLog_time_id_idx'),    # 系统日志按时间倒序 (游标分页)
+        ]
+
+
+
+# 归档表 (见 app/views/archive.py)
+# 超过保留期的播放记录/系统日志由 python manage.py archive_history 从原表移到归档表，原表只保留最近的数据
+class PlayHistoryArchive(models.Model):
+    play_id         = models.IntegerField(primary_key=True,                 verbose_name='播放记录编号')
+    user            = models.ForeignKey('User', on_delete=models.CASCADE,   verbose_name='播放用户')
+    song            = models.ForeignKey('Song', on_delete=models.CASCADE,   verbose_name='播放歌曲')
+    play_time       = models.DateTimeField(                                 verbose_name='播放时间')
+    play_duration   = models.IntegerField(                                  verbose_name='实际播放时长（秒）')
+
+    class Meta:
+        db_table = 'PlayHistoryArchive'
+        verbose_name = '播放记录归档'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['user', 'play_time'], name='PlayArchive_user_time_idx'),      # 播放历史/按时间段统计
+            models.Index(fields=['play_time'], name='PlayArchive_time_idx'),                   # 重新计算每日统计
+        ]
+
+
+# 已归档播放记录按 (用户, 歌曲, 月份) 的汇总，用于不限时间的排行 (不需要扫描归档表)
+class PlayMonthlyStats(models.Model):
+    user            = models.ForeignKey('User', on_delete=models.CASCADE,   verbose_name='用户')
+    song            = models.ForeignKey('Song', on_delete=models.CASCADE,   verbose_name='歌曲')
+    month           = models.DateField(                                     verbose_name='月份 (当月 1 日)')
+    play_count      = models.IntegerField(default=0,                        verbose_name='播放次数')
+    play_duration   = models.BigIntegerField(default=0,                     verbose_name='播放总时长（秒）')
+
+    class Meta:
+        db_table = 'PlayMonthlyStats'
+        verbose_name = '已归档播放月度汇总'
+        verbose_name_plural = verbose_name
+        unique_together = ('user', 'song', 'month')
+
+
+class SystemLogArchive(models.Model):
+    RESULT_CHOICES = SystemLog.RESULT_CHOICES
+
+    log_id       = models.IntegerField(primary_key=True,                        verbose_name='日志编号')
+    action       = models.CharField(max_length=255,                             verbose_name='操作内容')
+    target_table = models.CharField(max_length=64, null=True, blank=True,       verbose_name='被操作数据表名')
+    target_id    = models.IntegerField(null=True, blank=True,                   verbose_name='被操作记录ID')
+    action_time  = models.DateTimeField(                                        verbose_name='操作时间')
+    result       = models.CharField(max_length=10, choices=RESULT_CHOICES,      verbose_name='操作结果状态')
+
+    class Meta:
+        db_table = 'SystemLogArchive'
+        verbose_name = '系统日志归档'
+        verbose_name_plural = verbose_name
+        indexes = [
+            models.Index(fields=['action_time', 'log_id'], name='SystemLogArc_time_id_idx'),   # 按时间倒序 (游标分页)
+        ]
+
+
+class SearchIndex(models.Model):
+    TARGET_TYPE_CHOICES = [
+        ('song', 'song'),
+        ('album', 'album'),
+        ('singer', 'singer'),
+        ('songlist', 'songlist'),
+    ]
+
+    index_id    = models.AutoField(primary_key=True,                             verbose_name='索引编号')
+    target_type = models.CharField(max_length=10, choices=TARGET_TYPE_CHOICES,   verbose_name='检索对象类型')
+    target_id   = models.IntegerField(                                           verbose_name='检索对象ID')
+    keywords    = models.CharField(max_length=512,                               verbose_name='检索关键词(标题+拼音首字母)')
+
+    class Meta:
+        db_table = 'SearchIndex'
+        unique_together = (('target_type', 'target_id'),)
+
+    def __str__(self):
+        return self.keywords
 
 
 #删表sql指令
@@ -284,4 +386,109 @@ class SystemLog(models.Model):
 #DROP TABLE auth_user_user_permissions; 
 #DROP TABLE auth_user;
 #DROP TABLE auth_permission;
-#DROP TABLE django_content_type; 
\ No newline at end of file
+#DROP TABLE django_content_type; 
+
+
+class DailyStats(models.Model):
+    stat_date       = models.DateField(primary_key=True,    verbose_name='统计日期')
+    play_count      = models.IntegerField(default=0,        verbose_name='播放次数')
+    play_duration   = models.BigIntegerField(default=0,     verbose_name='播放总时长（秒）')
+    comment_count   = models.IntegerField(default=0,        verbose_name='评论数')
+    favorite_count  = models.IntegerField(default=0,        verbose_name='收藏数')
+    songlist_count  = models.IntegerField(default=0,        verbose_name='新建歌单数')
+    new_user_count  = models.IntegerField(default=0,        verbose_name='新增用户数')
+
+    class Meta:
+        db_table = 'DailyStats'
+
+
+
+class UserDailyStats(models.Model):
+    user            = models.ForeignKey('User', on_delete=models.CASCADE,   verbose_name='用户')
+    stat_date       = models.DateField(                                     verbose_name='统计日期')
+    play_count      = models.IntegerField(default=0,                        verbose_name='播放次数')
+    play_duration   = models.BigIntegerField(default=0,                     verbose_name='播放总时长（秒）')
+    comment_count   = models.IntegerField(default=0,                        verbose_name='评论数')
+    favorite_count  = models.IntegerField(default=0,                        verbose_name='收藏数')
+    songlist_count  = models.IntegerField(default=0,                        verbose_name='新建歌单数')
+
+    class Meta:
+        db_table = 'UserDailyStats'
+        unique_together = (('user', 'stat_date'),)
+        indexes = [
+            models.Index(fields=['stat_date'], name='UserDailyStats_date_idx'),     # 管理员按时间段统计活跃用户
+        ]
+
+
+
+class FavoriteCount(models.Model):
+    TARGET_TYPE_CHOICES = [
+        ('song', 'song'),
+        ('album', 'album'),
+        ('songlist', 'songlist'),
+    ]
+
+    target_type     = models.CharField(max_length=10, choices=TARGET_TYPE_CHOICES,  verbose_name='收藏对象类型')
+    target_id       = models.IntegerField(                                          verbose_name='收藏对象ID')
+    fav_count       = models.IntegerField(default=0,                                verbose_name='被收藏次数')
+
+    class Meta:
+        db_table = 'FavoriteCount'
+        unique_together = (('target_type', 'target_id'),)
+        indexes = [
+            models.Index(fields=['target_type', '-fav_count'], name='FavoriteCount_rank_idx'),   # 收藏排行榜
+        ]
+
+
+
+class LikeRecord(models.Model):
+    TARGET_TYPE_CHOICES = [
+        ('songlist', 'songlist'),
+        ('comment', 'comment'),
+    ]
+
+    user            = models.ForeignKey('User', on_delete=models.CASCADE,               verbose_name='点赞用户')
+    target_type     = models.CharField(max_length=10, choices=TARGET_TYPE_CHOICES,     verbose_name='点赞对象类型')
+    target_id       = models.IntegerField(verbose_name='点赞对象ID')
+    like_time       = models.DateTimeField(auto_now_add=True,                           verbose_name='点赞时间')
+
+    class Meta:
+        db_table = 'LikeRecord'
+        verbose_name = '点赞记录'
+        verbose_name_plural = verbose_name
+        unique_together = ('user', 'target_type', 'target_id')     # 重复点赞由唯一索引拒绝
+        indexes = [
+            models.Index(fields=['target_type', 'target_id'], name='LikeRecord_target_idx'),   # 删除对象时清理点赞记录
+        ]
+
+
+
+class SchemaFixup(models.Model):
+    name            = models.CharField(max_length=100, primary_key=True,    verbose_name='修复名称')
+    applied_time    = models.DateTimeField(auto_now_add=True,               verbose_name='执行时间')
+
+    class Meta:
+        db_table = 'SchemaFixup'
+        verbose_name = '建表修复记录'     # 见 app/views/initialTable.py
+        verbose_name_plural = verbose_name
+
+
+
+class EntityVersion(models.Model):
+    TARGET_TYPE_CHOICES = [
+        ('song', 'song'),
+        ('album', 'album'),
+        ('singer', 'singer'),
+        ('songlist', 'songlist'),
+    ]
+
+    target_type     = models.CharField(max_length=10, choices=TARGET_TYPE_CHOICES,     verbose_name='详情页类型')
+    target_id       = models.IntegerField(                                              verbose_name='对象ID (0 表示整类)')
+    version         = models.BigIntegerField(default=0,                                 verbose_name='版本号')
+    update_time     = models.DateTimeField(                                             verbose_name='最后修改时间')
+
+    class Meta:
+        db_table = 'EntityVersion'
+        verbose_name = '详情页版本'     # 见 app/views/profileVersion.py
+        verbose_name_plural = verbose_name
+        unique_together = ('target_type', 'target_id')
@@ -0,0 +1,2 @@
+# MySQL 连接池数据库后端
+# 在 settings.DATABASES 中使用 'ENGINE': 'app.mysqlPool'，并通过 'POOL' 配置连接池
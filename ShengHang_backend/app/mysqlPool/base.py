@@ -0,0 +1,52 @@
+# 带连接池的 MySQL 后端
+# 与 django.db.backends.mysql 相同，只是：
+#   - 建立连接改为从连接池取出 (get_new_connection)
+#   - 关闭连接改为放回连接池 (_close)；连接出错、事务未结束或 autocommit 被修改时才真正关闭
+#   - 复用的连接不重复执行连接初始化语句 (init_connection_state)
+# POOL.ENABLED 为 False 时行为与原生 MySQL 后端完全一致
+from django.db.backends.mysql import base as mysql_base
+
+from .pool import get_pool
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = get_pool(self.alias, self.settings_dict)
+
+    def _open_connection(self, conn_params):
+        return super().get_new_connection(conn_params)
+
+    def get_new_connection(self, conn_params):
+        if self.pool is None:
+            return self._open_connection(conn_params)
+        return self.pool.acquire(lambda: self._open_connection(conn_params))
+
+    def init_connection_state(self):
+        if getattr(self.connection, "pool_initialized", False):
+            return
+        super().init_connection_state()
+        if self.pool is not None:
+            self.connection.pool_initialized = True
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            return super()._close()
+
+        # 事务中途关闭、autocommit 未恢复、出错后连接不可用 时不能复用
+        reusable = (
+            not self.in_atomic_block
+            and self.autocommit == self.settings_dict["AUTOCOMMIT"]
+            and (not self.errors_occurred or self.is_usable())
+        )
+        self.pool.release(self.connection, discard=not reusable)
+
+    def warm_up_pool(self, count):
+        "预先建立 count 个空闲连接"
+        if self.pool is None:
+            return
+        conn_params = self.get_connection_params()
+        for _ in range(count):
+            if not self.pool.add_idle(lambda: self._open_connection(conn_params)):
+                break
@@ -0,0 +1,318 @@
+# 数据库连接池
+# 数据库在远程服务器上，每次新建连接都要经过 TCP 握手和 MySQL 认证。
+# 连接池在进程内保留已建立的连接，请求结束时 Django 关闭连接实际上是把连接放回池中，
+# 下一个请求 (可以在其他线程中) 直接取出复用：
+#   - MAX_SIZE: 每个进程最多同时打开的连接数，连接都被占用时等待最多 TIMEOUT 秒
+#   - MAX_AGE: 连接建立超过 MAX_AGE 秒后不再复用，关闭后重新建立
+#   - HEALTH_CHECK_INTERVAL: 连接空闲超过该秒数时，取出前先 ping 一次，失效则丢弃
+#   - MIN_SIZE: 进程启动时预先建立的连接数 (见 wsgi.py / asgi.py 中的 warm_up_pools)
+#
+# 每次取连接的耗时会累加到当前请求上 (见 app.middleware.db_acquire_time_middleware)，
+# get_pool_stats 返回连接池状态和按请求统计的取连接耗时分布，用于按高峰负载调整 MAX_SIZE
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_CONFIG = {
+    'ENABLED': True,
+    'MIN_SIZE': 0,
+    'MAX_SIZE': 10,
+    'MAX_AGE': 1800,
+    'HEALTH_CHECK_INTERVAL': 30,
+    'TIMEOUT': 10,
+}
+
+
+class PoolTimeout(Exception):
+    "等待空闲连接超时"
+
+
+class ConnectionPool:
+
+    def __init__(self, name, max_size=10, max_age=1800, health_check_interval=30, timeout=10):
+        self.name = name
+        self.max_size = max_size
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+
+        self.cond = threading.Condition()
+        self.idle = deque()     # (连接, 建立时间, 最后使用时间)，后进先出，常用的连接保持活跃
+        self.created_at = {}    # id(连接) -> 建立时间 (包括被占用的连接)
+        self.opening = 0        # 正在建立的连接数
+
+        # 统计
+        self.acquired = 0
+        self.created = 0
+        self.recycled = 0
+        self.health_check_failures = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @property
+    def size(self):
+        return len(self.created_at) + self.opening
+
+    # --------------------------
+    # 取出连接
+    # --------------------------
+    def acquire(self, connect):
+        """
+        取出一个可用连接，没有空闲连接且未达到 MAX_SIZE 时调用 connect() 新建
+        返回连接，取连接的耗时计入当前请求
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        try:
+            while True:
+                conn, need_check = self._take(deadline)
+                if conn is None:
+                    conn = self._open(connect)
+                    break
+                if not need_check or self._ping(conn):
+                    break
+        finally:
+            self._record_wait(time.monotonic() - start)
+        return conn
+
+    def _take(self, deadline):
+        "返回 (空闲连接, 是否需要健康检查)；可以新建连接时返回 (None, False)"
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                while self.idle:
+                    conn, created_at, last_used = self.idle.pop()
+                    if now - created_at >= self.max_age:
+                        self._discard(conn, locked=True)
+                        self.recycled += 1
+                        continue
+                    self.acquired += 1
+                    return conn, now - last_used >= self.health_check_interval
+
+                if self.size < self.max_size:
+                    self.opening += 1
+                    self.acquired += 1
+                    return None, False
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"[{self.name}] 等待数据库连接超时 ({self.timeout} 秒)，连接池已满 ({self.max_size})")
+                self.cond.wait(remaining)
+
+    def _open(self, connect):
+        try:
+            conn = connect()
+        except Exception:
+            with self.cond:
+                self.opening -= 1
+                self.cond.notify()
+            raise
+        with self.cond:
+            self.opening -= 1
+            self.created_at[id(conn)] = time.monotonic()
+            self.created += 1
+        return conn
+
+    def _ping(self, conn):
+        try:
+            conn.ping()
+            return True
+        except Exception:
+            with self.cond:
+                self.health_check_failures += 1
+            self._discard(conn)
+            return False
+
+    # --------------------------
+    # 归还连接
+    # --------------------------
+    def release(self, conn, discard=False):
+        "归还连接；discard 为 True (如连接出错、事务未结束) 时直接关闭"
+        with self.cond:
+            created_at = self.created_at.get(id(conn))
+            if created_at is None:
+                # 不是本连接池建立的连接
+                discard = True
+            elif time.monotonic() - created_at >= self.max_age:
+                self.recycled += 1
+                discard = True
+            if not discard:
+                self.idle.append((conn, created_at, time.monotonic()))
+                self.cond.notify()
+                return
+        self._discard(conn)
+
+    def _discard(self, conn, locked=False):
+        if locked:
+            self.created_at.pop(id(conn), None)
+            self.cond.notify()
+        else:
+            with self.cond:
+                self.created_at.pop(id(conn), None)
+                self.cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def add_idle(self, connect):
+        "新建一个空闲连接放入池中 (预热)，已达到 MAX_SIZE 时返回 False"
+        with self.cond:
+            if self.size >= self.max_size:
+                return False
+            self.opening += 1
+        conn = self._open(connect)
+        self.release(conn)
+        return True
+
+    def close_all(self):
+        with self.cond:
+            idle, self.idle = list(self.idle), deque()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    # --------------------------
+    # 统计
+    # --------------------------
+    def _record_wait(self, seconds):
+        with self.cond:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+        request_stats = _request_acquire.get()
+        if request_stats is not None:
+            request_stats[0] += 1
+            request_stats[1] += seconds
+
+    def stats(self):
+        with self.cond:
+            return {
+                "max_size": self.max_size,
+                "size": self.size,
+                "idle": len(self.idle),
+                "in_use": self.size - len(self.idle),
+                "acquired": self.acquired,
+                "created": self.created,
+                "recycled": self.recycled,
+                "health_check_failures": self.health_check_failures,
+                "timeouts": self.timeouts,
+                "acquire_ms_avg": round(self.wait_total * 1000 / self.acquired, 3) if self.acquired else None,
+                "acquire_ms_max": round(self.wait_max * 1000, 3),
+            }
+
+
+# ================================
+# 每个数据库别名一个连接池 (进程内共享)
+# ================================
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool_config(settings_dict):
+    "返回合并默认值后的 POOL 配置，未开启连接池时返回 None"
+    config = dict(DEFAULT_POOL_CONFIG, **settings_dict.get("POOL", {}))
+    return config if config["ENABLED"] else None
+
+
+def get_pool(alias, settings_dict):
+    config = get_pool_config(settings_dict)
+    if config is None:
+        return None
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = ConnectionPool(
+                alias,
+                max_size=config["MAX_SIZE"],
+                max_age=config["MAX_AGE"],
+                health_check_interval=config["HEALTH_CHECK_INTERVAL"],
+                timeout=config["TIMEOUT"],
+            )
+        return pool
+
+
+def warm_up_pools():
+    "为所有使用连接池的数据库预先建立 MIN_SIZE 个连接，失败不影响启动"
+    for alias, settings_dict in settings.DATABASES.items():
+        if settings_dict.get("ENGINE") != "app.mysqlPool":
+            continue
+        config = get_pool_config(settings_dict)
+        if config is None or not config["MIN_SIZE"]:
+            continue
+        try:
+            connections[alias].warm_up_pool(config["MIN_SIZE"])
+        except Exception:
+            logger.exception("[%s] 连接池预热失败", alias)
+
+
+# ================================
+# 按请求统计取连接耗时
+# ================================
+# [取连接次数, 耗时(秒)]，由中间件在请求开始时设置
+_request_acquire = contextvars.ContextVar("db_request_acquire", default=None)
+
+# 最近若干个请求的取连接耗时 (毫秒)，用于计算分位数
+REQUEST_SAMPLES = 1000
+_request_samples = deque(maxlen=REQUEST_SAMPLES)
+_request_samples_lock = threading.Lock()
+
+
+def start_request():
+    return _request_acquire.set([0, 0.0])
+
+
+def finish_request(token):
+    "结束当前请求的统计，返回 (取连接次数, 耗时毫秒)"
+    return record_request(detach_request(token))
+
+
+def detach_request(token):
+    """
+    结束当前上下文中的统计但暂不计入分位数，返回本请求的统计 [取连接次数, 耗时(秒)]
+    用于流式响应: 响应体生成时仍会累加到返回的对象中，全部输出后再调用 record_request
+    """
+    request_stats = _request_acquire.get() or [0, 0.0]
+    _request_acquire.reset(token)
+    return request_stats
+
+
+def record_request(request_stats):
+    "把一个请求的取连接耗时计入分位数统计，返回 (取连接次数, 耗时毫秒)"
+    count, seconds = request_stats
+    ms = seconds * 1000
+    if count:
+        with _request_samples_lock:
+            _request_samples.append(ms)
+    return count, ms
+
+
+def _percentile(values, p):
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return round(values[index], 3)
+
+
+def get_pool_stats():
+    with _request_samples_lock:
+        samples = sorted(_request_samples)
+    with _pools_lock:
+        pools = dict(_pools)
+    return {
+        "pools": {alias: pool.stats() for alias, pool in pools.items()},
+        "request_acquire_ms": {
+            "samples": len(samples),
+            "p50": _percentile(samples, 50) if samples else None,
+            "p95": _percentile(samples, 95) if samples else None,
+            "p99": _percentile(samples, 99) if samples else None,
+            "max": round(samples[-1], 3) if samples else None,
+        },
+    }
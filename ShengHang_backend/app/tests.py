@@ -1,3 +1,1319 @@
-from django.test import TestCase
+import datetime
+import decimal
+import io
+import json
+import os
+import tempfile
+import time
+import uuid
+from importlib import import_module
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .mysqlPool.pool import ConnectionPool, PoolTimeout
+from .models import (Album, Comment, DailyStats, Favorite, FavoriteCount, LikeRecord, PlayHistory,
+                     PlayHistoryArchive, PlayMonthlyStats, Singer, Song, Songlist, SonglistSong, SongSinger, SystemLog,
+                     SystemLogArchive, User, UserDailyStats)
+from .views import (archive, commentThread, currentUser, jsonEncoder, leaderboard, likeCounter, playhistory,
+                    requestProfiler, searchIndex)
+from .views.batchWriter import BatchWriter
+from .views.cache import get_profile_cache, invalidate_profile, invalidate_profiles
+from .views.comment import delete_comment_tree
+from .views.dailyStats import add_stats, add_user_stat, db_today, subtract_user
+from .views.dedupWindow import DedupWindow, DjangoDedupStore, LocalDedupStore, create_dedup_window
+from .views.jsonStream import JSONArray, batched, fetch_batches, json_stream
+from .views.searchIndex import LocalSearchIndex
+from .views.profileVersion import get_profile_version
+from .views.tools import decode_cursor, encode_cursor, hash_password, json_cn, keyset_filter, paginate_rows
+
+
+# ================================
+# 游标分页
+# ================================
+class KeysetCursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        cursor = encode_cursor("song_title:ASC", ["爱在西元前", 12])
+        self.assertEqual(decode_cursor(cursor, "song_title:ASC"), ["爱在西元前", 12])
+
+    def test_no_cursor(self):
+        self.assertIsNone(decode_cursor(None, "song_title:ASC"))
+        self.assertIsNone(decode_cursor("", "song_title:ASC"))
+
+    def test_other_order_rejected(self):
+        # 换了排序方式后不能继续使用旧游标
+        cursor = encode_cursor("song_title:ASC", ["a", 1])
+        with self.assertRaises(ValueError):
+            decode_cursor(cursor, "song_title:DESC")
+
+    def test_invalid_cursor_rejected(self):
+        for cursor in ("not-base64!", encode_cursor("k", [1]), "eyJvIjogImsifQ=="):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor, "k")
+
+    def test_keyset_filter(self):
+        sql, params = keyset_filter("s.play_count", "s.song_id", "DESC", [100, 7])
+        self.assertEqual(sql, "(s.play_count < %s OR (s.play_count = %s AND s.song_id < %s))")
+        self.assertEqual(params, [100, 100, 7])
+
+        sql, _ = keyset_filter("s.song_title", "s.song_id", "ASC", ["a", 7])
+        self.assertEqual(sql, "(s.song_title > %s OR (s.song_title = %s AND s.song_id > %s))")
+
+    def test_paginate_rows(self):
+        rows = [("a", 1), ("b", 2), ("c", 3)]
+        page, next_cursor = paginate_rows(rows, 2, "k", lambda row: [row[0], row[1]])
+        self.assertEqual(page, rows[:2])
+        self.assertEqual(decode_cursor(next_cursor, "k"), ["b", 2])
+
+        page, next_cursor = paginate_rows(rows, 3, "k", lambda row: [row[0], row[1]])
+        self.assertEqual(page, rows)
+        self.assertIsNone(next_cursor)
+
+
+# ================================
+# 播放防刷时间窗口
+# ================================
+class DedupWindowTests(SimpleTestCase):
+
+    def make_window(self, max_entries=100, trusted=True):
+        store = LocalDedupStore(60, max_entries)
+        if trusted:
+            # 跳过进程启动后的 window 秒
+            store.started_at -= 60
+        return DedupWindow(store, 60)
+
+    def test_untrusted_miss_falls_back_to_database(self):
+        window = self.make_window(trusted=False)
+        self.assertEqual(window.last_play(1, 2, lambda: "db"), "db")
+        self.assertEqual(window.stats()["misses"], 1)
+
+    def test_trusted_miss_skips_database(self):
+        window = self.make_window()
+        self.assertIsNone(window.last_play(1, 2, lambda: self.fail("不应查询数据库")))
+
+    def test_keys_normalized_to_int(self):
+        window = self.make_window()
+        window.record("5", "7", "t1")
+        self.assertEqual(window.last_play(5, 7, lambda: None), "t1")
+
+    def test_expired_entry_ignored(self):
+        window = self.make_window()
+        window.record(1, 2, "t1")
+        stored_at, played_at = window.store.entries[(1, 2)]
+        window.store.entries[(1, 2)] = (stored_at - 61, played_at)
+        self.assertIsNone(window.last_play(1, 2, lambda: "db"))
+
+    def test_eviction_makes_window_untrusted(self):
+        window = self.make_window(max_entries=1)
+        window.record(1, 1, "t1")
+        window.record(1, 2, "t2")
+        self.assertNotIn((1, 1), window.store.entries)
+        # 被淘汰的条目可能仍在 window 秒内，未命中时必须查询数据库
+        self.assertEqual(window.last_play(1, 1, lambda: "db"), "db")
+
+    def test_auto_backend_follows_cache(self):
+        # 本地内存缓存下各 worker 互不可见，使用进程内窗口; 共享缓存时使用 Django 缓存
+        self.assertIsInstance(create_dedup_window().store, LocalDedupStore)
+        shared = {"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                              "LOCATION": tempfile.gettempdir()}}
+        with override_settings(CACHES=shared):
+            self.assertIsInstance(create_dedup_window().store, DjangoDedupStore)
+        with override_settings(CACHES=shared, PLAY_DEDUP_WINDOW={"BACKEND": "local"}):
+            self.assertIsInstance(create_dedup_window().store, LocalDedupStore)
+
+
+# ================================
+# 后台批量写入
+# ================================
+class BatchWriterTests(SimpleTestCase):
+
+    def make_writer(self, flush_func, items, max_pending=100):
+        self.dropped = []
+        writer = BatchWriter("test-writer", flush_func, batch_size=100,
+                             max_pending=max_pending, drop_func=self.dropped.extend)
+        # 直接放入缓冲区，不启动后台线程，由测试调用 flush
+        writer.items.extend(items)
+        return writer
+
+    def test_flush_writes_batch(self):
+        written = []
+        writer = self.make_writer(written.append, [0, 1, 2])
+        self.assertEqual(writer.flush(), 3)
+        self.assertEqual(written, [[0, 1, 2]])
+        self.assertEqual(writer.pending_count(), 0)
+
+    def test_bad_item_dropped_after_one_by_one_fallback(self):
+        written = []
+
+        def flush(batch):
+            if "bad" in batch:
+                raise ValueError("bad item")
+            written.extend(batch)
+
+        writer = self.make_writer(flush, [1, "bad", 2])
+        with self.assertLogs("app.views.batchWriter", "WARNING"):
+            self.assertEqual(writer.flush(), 2)
+        self.assertEqual(written, [1, 2])
+        self.assertEqual(self.dropped, ["bad"])
+        self.assertEqual(writer.pending_count(), 0)
+
+    def test_requeued_when_database_unavailable(self):
+        available = False
+        written = []
+
+        def flush(batch):
+            if not available:
+                raise ConnectionError("database unavailable")
+            written.extend(batch)
+
+        writer = self.make_writer(flush, [1, 2])
+        with self.assertLogs("app.views.batchWriter", "WARNING"):
+            self.assertEqual(writer.flush(), 0)
+        self.assertEqual(writer.pending_count(), 2)
+        self.assertEqual(self.dropped, [])
+
+        available = True
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(written, [1, 2])
+
+    def test_requeue_overflow_dropped(self):
+        def flush(batch):
+            # 写入失败期间又放入了新数据，缓冲区只剩一个空位
+            if writer.pending_count() == 0:
+                writer.items.append("new")
+            raise ConnectionError("database unavailable")
+
+        writer = self.make_writer(flush, [1, 2], max_pending=2)
+        with self.assertLogs("app.views.batchWriter", "WARNING"):
+            writer.flush()
+        self.assertEqual(writer.items, [1, "new"])
+        self.assertEqual(self.dropped, [2])
+
+
+# ================================
+# 数据库测试数据
+# ================================
+def create_song(user_name="tester"):
+    user = User.objects.create(user_name=user_name, password="x")
+    singer = Singer.objects.create(singer_name="周杰伦", type="男")
+    album = Album.objects.create(album_title="Jay", singer=singer)
+    song = Song.objects.create(song_title="爱在西元前", album=album, duration=230, file_url="/a.mp3")
+    return user, song
+
+
+def login(client, user):
+    "把 user_id 写入测试客户端的会话 (与 user.login 相同)"
+    currentUser.invalidate_user(user.user_id)
+    session = client.session
+    session["user_id"] = user.user_id
+    session.save()
+    client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+
+
+def post_json(client, url, data):
+    return client.post(url, json.dumps(data), content_type="application/json")
+
+
+# ================================
+# 搜索接口的游标分页
+# ================================
+class SearchPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user, song = create_song()
+        # 播放次数有重复，翻页时必须按 (play_count, song_id) 定位
+        for i, play_count in enumerate([5, 3, 5, 1, 5, 3]):
+            Song.objects.create(song_title=f"歌曲{i}", album=song.album, duration=200,
+                                file_url="/b.mp3", play_count=play_count)
+        login(self.client, self.user)
+
+    def fetch_all(self, order, direction):
+        ids, cursor, pages = [], None, 0
+        while True:
+            data = {"order": order, "direction": direction, "page_size": 2}
+            if cursor:
+                data["cursor"] = cursor
+            result = post_json(self.client, "/song/search_song/", data).json()
+            ids.extend(song["song_id"] for song in result["songs"])
+            self.assertLessEqual(len(result["songs"]), 2)
+            cursor = result["next_cursor"]
+            pages += 1
+            if not cursor:
+                return ids, pages
+
+    def test_pages_cover_all_results_once(self):
+        expected = list(Song.objects.order_by("-play_count", "-song_id").values_list("song_id", flat=True))
+        ids, pages = self.fetch_all("play_count", "desc")
+        self.assertEqual(ids, expected)
+        self.assertEqual(pages, 4)
+
+        expected = list(Song.objects.order_by("play_count", "song_id").values_list("song_id", flat=True))
+        self.assertEqual(self.fetch_all("play_count", "asc")[0], expected)
+
+    def test_cursor_from_other_order_rejected(self):
+        result = post_json(self.client, "/song/search_song/", {"order": "play_count", "page_size": 2}).json()
+        response = post_json(self.client, "/song/search_song/",
+                             {"order": "duration", "cursor": result["next_cursor"]})
+        self.assertEqual(response.status_code, 400)
+
+
+# ================================
+# 本地检索索引
+# ================================
+def temp_index_path(test):
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return os.path.join(directory.name, "search_index.json")
+
+
+class LocalSearchIndexTests(SimpleTestCase):
+
+    def setUp(self):
+        self.path = temp_index_path(self)
+
+    def test_search_by_bigram_and_pinyin(self):
+        index = LocalSearchIndex(self.path)
+        index.upsert_many("song", [(1, "爱在西元前"), (2, "晴天")])
+        self.assertEqual(index.search("song", "西元"), [1])
+        self.assertEqual(index.search("song", "azxyq"), [1])
+        self.assertEqual(index.search("song", "在元"), [])
+
+    def test_writes_append_to_log(self):
+        index = LocalSearchIndex(self.path, compact_every=100)
+        index.upsert_many("song", [(1, "爱在西元前")], replace=True)
+        self.assertEqual(os.path.getsize(index.log_path), 0)
+        snapshot_mtime = os.path.getmtime(self.path)
+
+        index.upsert_many("song", [(2, "晴天")])
+        index.remove_many("song", [1])
+        with open(index.log_path, encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+        # 增删只追加日志，不重写快照
+        self.assertEqual(os.path.getmtime(self.path), snapshot_mtime)
+
+        # 其他进程: 读取快照后重放日志
+        other = LocalSearchIndex(self.path)
+        self.assertEqual(other.search("song", "晴天"), [2])
+        self.assertEqual(other.search("song", "西元"), [])
+
+    def test_replays_only_new_lines(self):
+        writer = LocalSearchIndex(self.path, compact_every=100)
+        reader = LocalSearchIndex(self.path)
+        writer.upsert_many("song", [(1, "爱在西元前")])
+        self.assertEqual(reader.search("song", "西元"), [1])
+        writer.upsert_many("song", [(1, "稻香")])
+        self.assertEqual(reader.search("song", "西元"), [])
+        self.assertEqual(reader.search("song", "稻香"), [1])
+        self.assertEqual(reader.log_entries, 2)
+
+    def test_compaction(self):
+        writer = LocalSearchIndex(self.path, compact_every=3)
+        reader = LocalSearchIndex(self.path)
+        for target_id, title in [(1, "爱在西元前"), (2, "晴天"), (3, "七里香")]:
+            writer.upsert_many("song", [(target_id, title)])
+        self.assertEqual(reader.search("song", "里香"), [3])
+
+        writer.upsert_many("song", [(4, "稻香")])
+        # 第 3 条后写回快照并清空日志，日志中只剩第 4 条
+        self.assertEqual(writer.log_entries, 1)
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(sorted(json.load(f)["song"]["docs"]), ["1", "2", "3"])
+        # 日志被清空后重新加载快照
+        self.assertEqual(reader.search("song", "稻香"), [4])
+        self.assertEqual(reader.search("song", "晴天"), [2])
+
+    def test_partial_line_ignored(self):
+        index = LocalSearchIndex(self.path)
+        index.upsert_many("song", [(1, "晴天")])
+        with open(index.log_path, "a", encoding="utf-8") as f:
+            f.write('{"op": "remove", "type": "song"')
+        self.assertEqual(LocalSearchIndex(self.path).search("song", "晴天"), [1])
+
+
+# ================================
+# 注销账号
+# ================================
+class DeleteAccountTests(TestCase):
+
+    def setUp(self):
+        self.index = LocalSearchIndex(temp_index_path(self))
+        patcher = mock.patch.object(searchIndex, "_local_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_songlists_removed_from_search_index(self):
+        user = User.objects.create(user_name="leaving", password=hash_password("pw"))
+        songlist = Songlist.objects.create(songlist_title="夏日歌单", user=user)
+        searchIndex.index_entity("songlist", songlist.songlist_id, songlist.songlist_title)
+        self.assertEqual(self.index.search("songlist", "夏日"), [songlist.songlist_id])
+
+        login(self.client, user)
+        response = post_json(self.client, "/user/delete_account/", {"password": "pw"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(User.objects.filter(user_id=user.user_id).exists())
+        self.assertEqual(self.index.search("songlist", "夏日"), [])
+        # 测试数据库由迁移建表，没有 MySQL 表上的 ON DELETE CASCADE (见 initialTable)，手动删除歌单
+        Songlist.objects.filter(songlist_id=songlist.songlist_id).delete()
+
+
+# ================================
+# 删除评论及其回复
+# ================================
+class DeleteCommentTreeTests(TestCase):
+
+    def setUp(self):
+        self.user, self.song = create_song()
+
+    def comment(self, parent=None, status="正常"):
+        return Comment.objects.create(
+            user=self.user, target_type="song", target_id=self.song.song_id, content="hi", status=status,
+            parent_id=parent and parent.comment_id,
+            root_id=parent and (parent.root_id or parent.comment_id),
+        )
+
+    def test_delete_reply_subtree(self):
+        root = self.comment()
+        reply = self.comment(root)
+        nested = self.comment(reply)
+        hidden = self.comment(nested, status="审核中")
+        sibling = self.comment(root)
+        Comment.objects.filter(comment_id=root.comment_id).update(reply_count=3)
+        LikeRecord.objects.create(user=self.user, target_type="comment", target_id=nested.comment_id)
+
+        self.assertEqual(delete_comment_tree(reply.comment_id), 3)
+
+        remaining = set(Comment.objects.values_list("comment_id", flat=True))
+        self.assertEqual(remaining, {root.comment_id, sibling.comment_id})
+        self.assertNotIn(hidden.comment_id, remaining)
+        # 只扣除可见的回复 (审核中的回复不计入楼层回复数)
+        self.assertEqual(Comment.objects.get(comment_id=root.comment_id).reply_count, 1)
+        self.assertFalse(LikeRecord.objects.filter(target_type="comment").exists())
+
+    def test_delete_thread_root(self):
+        root = self.comment()
+        reply = self.comment(root)
+        self.comment(reply)
+        other = self.comment()
+
+        self.assertEqual(delete_comment_tree(root.comment_id), 3)
+        self.assertEqual(list(Comment.objects.values_list("comment_id", flat=True)), [other.comment_id])
+
+    def test_missing_comment(self):
+        self.assertEqual(delete_comment_tree(12345), 0)
+
+
+# ================================
+# 详情页 ETag / 304
+# ================================
+class ProfileConditionalRequestTests(TestCase):
+
+    def setUp(self):
+        self.user, self.song = create_song()
+        self.url = f"/song/profile/{self.song.song_id}/"
+        # 测试之间数据库回滚后主键会重复，清掉进程内的缓存
+        get_profile_cache().invalidate_kind("song")
+        login(self.client, self.user)
+
+    def get(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(self.url, **headers)
+
+    def test_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('"song-'))
+        # 从未修改过的对象没有 Last-Modified
+        self.assertNotIn("Last-Modified", response)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+
+    def test_not_modified(self):
+        etag = self.get()["ETag"]
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+    def test_cache_hit_skips_database(self):
+        etag = self.get()["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(etag).status_code, 304)
+            self.assertEqual(self.get().status_code, 200)
+        tables = " ".join(query["sql"] for query in queries)
+        self.assertNotIn("EntityVersion", tables)
+        self.assertNotIn("Song", tables)
+
+    def invalidate(self, *obj_ids):
+        # 缓存的版本号在事务提交后删除
+        with self.captureOnCommitCallbacks(execute=True):
+            if obj_ids:
+                invalidate_profile("song", *obj_ids)
+            else:
+                invalidate_profiles("song")
+
+    def test_invalidate_changes_etag(self):
+        etag = self.get()["ETag"]
+        self.invalidate(self.song.song_id)
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        version = get_profile_version("song", self.song.song_id)
+        self.assertEqual(version.version, 1)
+        self.assertIn("Last-Modified", response)
+
+        etag = response["ETag"]
+        self.invalidate()
+        self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_other_song_not_affected(self):
+        etag = self.get()["ETag"]
+        self.invalidate(self.song.song_id + 1)
+        self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_pending_likes_change_etag(self):
+        # 响应中合并了尚未写入的点赞数时 ETag 带上增量的版本，增量变化后旧 ETag 不再匹配
+        etag = self.get()["ETag"]
+        with mock.patch.object(likeCounter, "_pending", {}):
+            likeCounter._add_pending({("comment", 12345): 1})
+            response = self.get(etag)
+            self.assertEqual(response.status_code, 200)
+            pending_etag = response["ETag"]
+            self.assertNotEqual(pending_etag, etag)
+            self.assertEqual(self.get(pending_etag).status_code, 304)
+
+            likeCounter._add_pending({("comment", 12345): 1})
+            self.assertEqual(self.get(pending_etag).status_code, 200)
+
+            # 增量写入数据库后 (这里直接扣除) 恢复为只由版本号决定的 ETag
+            likeCounter._add_pending({("comment", 12345): 2}, sign=-1)
+            self.assertEqual(self.get(etag).status_code, 304)
+
+    def test_missing_song(self):
+        self.url = "/song/profile/999999/"
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_login_required(self):
+        self.client.cookies.clear()
+        self.assertEqual(self.get('"anything"').status_code, 403)
+
+
+# ================================
+# 播放记录批量写入
+# ================================
+class PlayEventWriteTests(TestCase):
+
+    def setUp(self):
+        self.user, self.song = create_song()
+        self.other = Song.objects.create(song_title="晴天", album=self.song.album, duration=269, file_url="/b.mp3")
+
+    def test_batch_updates_play_count_and_daily_stats(self):
+        playhistory.write_play_events([
+            (self.user.user_id, self.song.song_id, 30),
+            (self.user.user_id, self.song.song_id, 10),
+            (self.user.user_id, self.other.song_id, 5),
+        ])
+        self.assertEqual(PlayHistory.objects.filter(user=self.user).count(), 3)
+        # 同一首歌的多次播放由 CASE 表达式一次累加
+        self.song.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.song.play_count, 2)
+        self.assertEqual(self.other.play_count, 1)
+
+        stats = UserDailyStats.objects.get(user=self.user)
+        self.assertEqual((stats.play_count, stats.play_duration), (3, 45))
+        # 每批使用同一个播放时间，统计日期与记录的日期一致
+        play_dates = {p.play_time.date() for p in PlayHistory.objects.filter(user=self.user)}
+        self.assertEqual(play_dates, {stats.stat_date})
+
+    def test_record_play(self):
+        store = LocalDedupStore(60)
+        self.client.cookies.clear()
+        login(self.client, self.user)
+        url = "/playHistory/record_play/"
+        with mock.patch.object(playhistory, "play_writer", None), \
+             mock.patch.object(playhistory, "_known_song_ids", set()), \
+             mock.patch.object(playhistory, "play_dedup", DedupWindow(store, 60)):
+            self.assertEqual(post_json(self.client, url, {"song_id": 999999}).status_code, 404)
+
+            response = post_json(self.client, url, {"song_id": self.song.song_id, "play_duration": 30})
+            self.assertEqual(response.json()["message"], "播放记录已更新")
+
+            # 60 秒内重复播放不计数，歌曲是否存在不再查询数据库
+            with CaptureQueriesContext(connection) as queries:
+                response = post_json(self.client, url, {"song_id": self.song.song_id})
+            self.assertEqual(response.json()["message"], "播放记录过频，忽略本次计数")
+            self.assertFalse([q for q in queries if "FROM Song" in q["sql"]])
+
+            # 窗口不可信时 (如进程刚启动) 查询数据库中的播放时间
+            store.entries.clear()
+            response = post_json(self.client, url, {"song_id": self.song.song_id})
+            self.assertEqual(response.json()["message"], "播放记录过频，忽略本次计数")
+
+        self.song.refresh_from_db()
+        self.assertEqual(self.song.play_count, 1)
+
+
+# ================================
+# 每日统计汇总
+# ================================
+class DailyStatsTests(TestCase):
+
+    # 早于今天的一天，检查删除时按记录创建的日期扣除
+    PAST = datetime.datetime(2024, 1, 2, 8, 0, tzinfo=datetime.timezone.utc)
+
+    def setUp(self):
+        self.user, self.song = create_song()
+        login(self.client, self.user)
+
+    def user_stats(self, stat_date):
+        return UserDailyStats.objects.get(user=self.user, stat_date=stat_date)
+
+    def add_past(self, counter):
+        add_stats({(self.user.user_id, self.PAST.date()): {counter: 1}})
+
+    def test_add_user_stat_uses_database_date(self):
+        add_user_stat(self.user.user_id, "comment_count")
+        add_user_stat(self.user.user_id, "comment_count")
+        today = db_today()
+        self.assertEqual(self.user_stats(today).comment_count, 2)
+        self.assertEqual(DailyStats.objects.get(stat_date=today).comment_count, 2)
+
+    def test_delete_comment_subtracts_on_comment_date(self):
+        comment = Comment.objects.create(user=self.user, target_type="song", target_id=self.song.song_id,
+                                         content="hi", status="正常")
+        Comment.objects.filter(comment_id=comment.comment_id).update(comment_time=self.PAST)
+        self.add_past("comment_count")
+
+        delete_comment_tree(comment.comment_id)
+        self.assertEqual(self.user_stats(self.PAST.date()).comment_count, 0)
+        self.assertEqual(DailyStats.objects.get(stat_date=self.PAST.date()).comment_count, 0)
+
+    def test_delete_favorite(self):
+        favorite = Favorite.objects.create(user=self.user, target_type="song", target_id=self.song.song_id)
+        Favorite.objects.filter(favorite_id=favorite.favorite_id).update(favorite_time=self.PAST)
+        self.add_past("favorite_count")
+
+        response = post_json(self.client, "/favorite/delete_favorite/", {"type": "song", "id": self.song.song_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user_stats(self.PAST.date()).favorite_count, 0)
+
+    def test_delete_songlist(self):
+        songlist = Songlist.objects.create(songlist_title="夏日歌单", user=self.user)
+        Songlist.objects.filter(songlist_id=songlist.songlist_id).update(create_time=self.PAST)
+        self.add_past("songlist_count")
+
+        with mock.patch.object(searchIndex, "_local_index", LocalSearchIndex(temp_index_path(self))):
+            response = self.client.post(f"/songlist/delete_songlist/{songlist.songlist_id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user_stats(self.PAST.date()).songlist_count, 0)
+
+    def test_subtract_user(self):
+        User.objects.filter(user_id=self.user.user_id).update(register_time=self.PAST)
+        PlayHistory.objects.create(user=self.user, song=self.song, play_duration=30)
+        PlayHistory.objects.filter(user=self.user).update(play_time=self.PAST)
+        add_stats({(self.user.user_id, self.PAST.date()): {"play_count": 1, "play_duration": 30},
+                   (None, self.PAST.date()): {"new_user_count": 1}})
+
+        subtract_user(self.user.user_id)
+        stats = DailyStats.objects.get(stat_date=self.PAST.date())
+        self.assertEqual((stats.play_count, stats.play_duration, stats.new_user_count), (0, 0, 0))
+
+
+# ================================
+# 收藏排行榜计数
+# ================================
+class FavoriteCountTests(TestCase):
+
+    def setUp(self):
+        self.user, self.song = create_song()
+        self.other = Song.objects.create(song_title="晴天", album=self.song.album, duration=269, file_url="/b.mp3")
+        login(self.client, self.user)
+
+    def count(self, song):
+        row = FavoriteCount.objects.filter(target_type="song", target_id=song.song_id).first()
+        return row and row.fav_count
+
+    def favorite(self, user, song):
+        Favorite.objects.create(user=user, target_type="song", target_id=song.song_id)
+        leaderboard.change_favorite_counts({("song", song.song_id): 1})
+
+    def test_change_counts_upserts(self):
+        leaderboard.change_favorite_counts({("song", self.song.song_id): 2, ("song", self.other.song_id): 0})
+        leaderboard.change_favorite_counts({("song", self.song.song_id): -1})
+        self.assertEqual(self.count(self.song), 1)
+        # 变化量为 0 的不写入
+        self.assertIsNone(self.count(self.other))
+
+    def test_delete_favorite_decrements(self):
+        self.favorite(self.user, self.song)
+        response = post_json(self.client, "/favorite/delete_favorite/", {"type": "song", "id": self.song.song_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.count(self.song), 0)
+
+    def test_remove_user_favorites(self):
+        fan = User.objects.create(user_name="fan", password="x")
+        self.favorite(self.user, self.song)
+        self.favorite(fan, self.song)
+        self.favorite(fan, self.other)
+        leaderboard.remove_user_favorites(fan.user_id)
+        self.assertEqual((self.count(self.song), self.count(self.other)), (1, 0))
+
+    def test_rebuild_matches_favorites(self):
+        fan = User.objects.create(user_name="fan", password="x")
+        Favorite.objects.create(user=self.user, target_type="song", target_id=self.song.song_id)
+        Favorite.objects.create(user=fan, target_type="song", target_id=self.song.song_id)
+        leaderboard.change_favorite_counts({("song", self.other.song_id): 5})
+
+        self.assertEqual(leaderboard.rebuild("song"), 1)
+        self.assertEqual(self.count(self.song), 2)
+        self.assertIsNone(self.count(self.other))
+
+    def test_ranking_reads_counts(self):
+        fan = User.objects.create(user_name="fan", password="x")
+        self.favorite(self.user, self.other)
+        self.favorite(fan, self.other)
+        self.favorite(fan, self.song)
+        response = post_json(self.client, "/favorite/get_platform_top_favorites/", {"target_type": "song"})
+        ranking = response.json()["ranking"]
+        self.assertEqual([(row["target_id"], row["fav_count"]) for row in ranking],
+                         [(self.other.song_id, 2), (self.song.song_id, 1)])
+
+
+# ================================
+# 评论楼层
+# ================================
+class CommentThreadTests(TestCase):
+
+    def setUp(self):
+        self.user, self.song = create_song()
+
+    def comment(self, parent=None, status="正常"):
+        # 只写 parent_id，root_id / reply_count 由被测代码计算
+        return Comment.objects.create(
+            user=self.user, target_type="song", target_id=self.song.song_id, content="hi", status=status,
+            parent_id=parent and parent.comment_id,
+        )
+
+    def make_thread(self):
+        root = self.comment()
+        reply = self.comment(root)
+        nested = self.comment(reply)
+        hidden = self.comment(nested, status="审核中")
+        return root, reply, nested, hidden
+
+    def assert_thread(self, root, *replies, reply_count):
+        root.refresh_from_db()
+        self.assertIsNone(root.root_id)
+        self.assertEqual(root.reply_count, reply_count)
+        for reply in replies:
+            reply.refresh_from_db()
+            self.assertEqual(reply.root_id, root.comment_id)
+
+    def test_rebuild(self):
+        root, *replies = self.make_thread()
+        self.assertEqual(commentThread.rebuild(batch_size=1), (1, 3))
+        # 审核中的回复属于楼层，但不计入回复数
+        self.assert_thread(root, *replies, reply_count=2)
+
+    def test_migration_backfill(self):
+        root, *replies = self.make_thread()
+        migration = import_module("app.migrations.0007_comment_threads")
+        migration.backfill_comment_threads(None, mock.Mock(connection=connection))
+        self.assert_thread(root, *replies, reply_count=2)
+
+    def test_status_change_updates_reply_count(self):
+        root, reply, nested, hidden = self.make_thread()
+        commentThread.rebuild()
+
+        commentThread.set_comment_status(hidden.comment_id, "正常")
+        self.assert_thread(root, reply_count=3)
+        commentThread.set_comment_status(reply.comment_id, "举报中")
+        self.assert_thread(root, reply_count=2)
+        # 状态不变时计数不变
+        commentThread.set_comment_status(reply.comment_id, "举报中")
+        self.assert_thread(root, reply_count=2)
+
+
+# ================================
+# 点赞计数
+# ================================
+class LikeCounterTests(TestCase):
+
+    def setUp(self):
+        self.user, self.song = create_song()
+        self.songlist = Songlist.objects.create(songlist_title="夏日歌单", user=self.user)
+        self.comment = Comment.objects.create(user=self.user, target_type="songlist",
+                                              target_id=self.songlist.songlist_id, content="hi", status="正常")
+        # 每个测试使用独立的待写入增量
+        patcher = mock.patch.object(likeCounter, "_pending", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def like_counts(self):
+        self.songlist.refresh_from_db()
+        self.comment.refresh_from_db()
+        return self.songlist.like_count, self.comment.like_count
+
+    def test_write_merges_deltas(self):
+        songlist_id, comment_id = self.songlist.songlist_id, self.comment.comment_id
+        items = [("songlist", songlist_id, 1), ("comment", comment_id, 1), ("songlist", songlist_id, 1)]
+        likeCounter._add_pending(likeCounter._sum_deltas(items))
+        self.assertEqual(likeCounter.pending_likes("songlist", songlist_id), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            likeCounter.write_like_deltas(items)
+        # 每种对象一条 UPDATE
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(self.like_counts(), (2, 1))
+        # 写入后从待写入增量中扣除
+        self.assertEqual(likeCounter.pending_likes("songlist", songlist_id), 0)
+        self.assertEqual(likeCounter._pending, {})
+
+    def test_pending_merged_into_reads(self):
+        likeCounter._add_pending({("songlist", self.songlist.songlist_id): 3,
+                                  ("comment", self.comment.comment_id): 1})
+        rows = [{"songlist_id": self.songlist.songlist_id, "like_count": 2}]
+        likeCounter.merge_pending_likes("songlist", rows, "songlist_id")
+        self.assertEqual(rows[0]["like_count"], 5)
+
+        # 缓存中的详情页对象不被修改
+        profile = {"like_count": 1, "comments": [{"comment_id": self.comment.comment_id, "like_count": 0}]}
+        merged, pending = likeCounter.merge_profile_likes(profile, self.songlist.songlist_id)
+        self.assertEqual((merged["like_count"], merged["comments"][0]["like_count"]), (4, 1))
+        self.assertEqual(pending, likeCounter.pending_generation())
+        self.assertTrue(pending)
+        self.assertEqual((profile["like_count"], profile["comments"][0]["like_count"]), (1, 0))
+
+    def test_dropped_deltas_leave_pending(self):
+        items = [("songlist", self.songlist.songlist_id, 1)]
+        likeCounter._add_pending(likeCounter._sum_deltas(items))
+        likeCounter._drop_like_deltas(items)
+        self.assertEqual(likeCounter._pending, {})
+
+    def test_add_like_once_per_user(self):
+        with mock.patch.object(likeCounter, "like_writer", None):
+            self.assertTrue(likeCounter.add_like(self.user.user_id, "songlist", self.songlist.songlist_id))
+            self.assertFalse(likeCounter.add_like(self.user.user_id, "songlist", self.songlist.songlist_id))
+        self.assertEqual(self.like_counts(), (1, 0))
+        self.assertEqual(LikeRecord.objects.filter(target_type="songlist").count(), 1)
+
+
+# ================================
+# 数据库连接池
+# ================================
+class FakeConnection:
+
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.closed = False
+
+    def ping(self):
+        if not self.alive:
+            raise OSError("gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def make_pool(self, **kwargs):
+        kwargs.setdefault("timeout", 0.01)
+        return ConnectionPool("test", **kwargs)
+
+    def test_released_connection_reused(self):
+        pool = self.make_pool(max_size=2)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        self.assertIs(pool.acquire(lambda: self.fail("不应新建连接")), conn)
+        self.assertEqual(pool.stats()["created"], 1)
+
+    def test_full_pool_times_out(self):
+        pool = self.make_pool(max_size=1)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        self.assertEqual(pool.stats()["timeouts"], 1)
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+
+        def connect():
+            raise OSError("refused")
+
+        with self.assertRaises(OSError):
+            pool.acquire(connect)
+        self.assertEqual(pool.size, 0)
+        self.assertIsInstance(pool.acquire(FakeConnection), FakeConnection)
+
+    def test_old_connection_recycled(self):
+        pool = self.make_pool(max_age=60)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn)
+        # 空闲期间超过 MAX_AGE，取出时关闭并新建
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 61):
+            fresh = pool.acquire(FakeConnection)
+        self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["recycled"], 1)
+
+        # 使用期间超过 MAX_AGE，归还时直接关闭
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 122):
+            pool.release(fresh)
+        self.assertTrue(fresh.closed)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+    def test_stale_connection_checked(self):
+        pool = self.make_pool(health_check_interval=0)
+        conn = pool.acquire(lambda: FakeConnection(alive=False))
+        pool.release(conn)
+        fresh = pool.acquire(FakeConnection)
+        self.assertIsNot(fresh, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()["health_check_failures"], 1)
+
+    def test_discard_and_foreign_connection(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.acquire(FakeConnection)
+        pool.release(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.size, 0)
+
+        foreign = FakeConnection()
+        pool.release(foreign)
+        self.assertTrue(foreign.closed)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+
+# ================================
+# 接口耗时与 SQL 统计
+# ================================
+class RequestProfilerTests(TestCase):
+
+    def record(self, *statements):
+        record = requestProfiler.RequestRecord()
+        for sql, seconds in statements:
+            record.add(sql, seconds)
+        return record
+
+    def test_fingerprint(self):
+        fp = requestProfiler.fingerprint
+        self.assertEqual(fp("SELECT * FROM Song WHERE song_id IN (%s, %s, %s) LIMIT 10"),
+                         "SELECT * FROM Song WHERE song_id IN (...) LIMIT ?")
+        self.assertEqual(fp("INSERT INTO T (a, b)\n  VALUES (%s, %s), (%s, %s)"),
+                         "INSERT INTO T (a, b) VALUES (%s, %s), ...")
+        self.assertEqual(fp("SELECT 1 FROM Song WHERE song_id = 3"), fp("SELECT 1 FROM Song WHERE song_id = 42"))
+
+    def test_route_stats(self):
+        stats = requestProfiler.RouteStats()
+        query = "SELECT * FROM Singer WHERE singer_id = %s"
+        stats.add(200, 3, self.record(*[(query, 0.001)] * 5), threshold=5)
+        stats.add(500, 40, self.record((query, 0.002)), threshold=5)
+
+        snapshot = stats.snapshot(slow_queries=5)
+        self.assertEqual((snapshot["count"], snapshot["errors"]), (2, 1))
+        self.assertEqual(snapshot["histogram"]["<=5ms"], 1)
+        self.assertEqual(snapshot["histogram"]["<=50ms"], 1)
+        self.assertEqual((snapshot["p50_ms"], snapshot["p99_ms"]), (5, 50))
+        self.assertEqual((snapshot["avg_queries"], snapshot["max_queries"]), (3, 5))
+        # 只有第一个请求中同一指纹执行了 5 次
+        self.assertEqual(snapshot["n_plus_one_requests"], 1)
+        self.assertEqual(snapshot["n_plus_one"][0]["count"], 6)
+        self.assertEqual(snapshot["slowest_queries"][0]["max_ms"], 2.0)
+
+    def test_middleware_records_route(self):
+        user, song = create_song()
+        login(self.client, user)
+        profiler = requestProfiler.RequestProfiler()
+        with mock.patch.object(requestProfiler, "profiler", profiler):
+            self.client.get(f"/song/profile/{song.song_id}/")
+            self.client.get(f"/song/profile/{song.song_id}/")
+        routes = profiler.snapshot()["routes"]
+        stats = routes["GET /song/profile/<int:song_id>/"]
+        self.assertEqual((stats["count"], stats["errors"]), (2, 0))
+        self.assertGreater(stats["max_queries"], 0)
+        self.assertTrue(stats["slowest_queries"])
+
+        profiler.reset()
+        self.assertEqual(profiler.snapshot()["routes"], {})
+
+
+# ================================
+# 合成数据与基准测试命令
+# ================================
+class BenchmarkCommandTests(TestCase):
+
+    COUNTS = {"users": 4, "singers": 2, "albums": 3, "songs": 8, "songlists": 3,
+              "plays": 40, "comments": 15, "favorites": 10}
+
+    def setUp(self):
+        self.index = LocalSearchIndex(temp_index_path(self))
+        patcher = mock.patch.object(searchIndex, "_local_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self, **options):
+        call_command("generate_synthetic_data", days=3, seed=7, batch_size=7, stdout=io.StringIO(),
+                     **dict(self.COUNTS, **options))
+
+    def test_generated_data_consistent(self):
+        self.generate()
+        self.assertEqual(Song.objects.count(), self.COUNTS["songs"])
+        self.assertEqual(PlayHistory.objects.count(), self.COUNTS["plays"])
+        self.assertEqual(Comment.objects.count(), self.COUNTS["comments"])
+
+        # 派生数据与原始记录一致
+        self.assertEqual(sum(Song.objects.values_list("play_count", flat=True)), self.COUNTS["plays"])
+        self.assertEqual(sum(FavoriteCount.objects.values_list("fav_count", flat=True)), Favorite.objects.count())
+        self.assertEqual(sum(DailyStats.objects.values_list("play_count", flat=True)), self.COUNTS["plays"])
+        self.assertEqual(sum(DailyStats.objects.values_list("new_user_count", flat=True)), self.COUNTS["users"])
+        threads = list(Comment.objects.order_by("comment_id").values_list("root_id", "reply_count"))
+        commentThread.rebuild()
+        self.assertEqual(list(Comment.objects.order_by("comment_id").values_list("root_id", "reply_count")), threads)
+        song = Song.objects.first()
+        self.assertIn(song.song_id, self.index.search("song", song.song_title))
+
+    def test_same_seed_same_titles(self):
+        self.generate()
+        titles = list(Song.objects.order_by("song_id").values_list("song_title", flat=True))
+        # 追加生成时编号接在已有数据之后
+        self.generate(skip_rebuild=True)
+        more = list(Song.objects.order_by("song_id").values_list("song_title", flat=True))[len(titles):]
+        self.assertEqual(more, titles)
+
+    def test_required_counts(self):
+        with self.assertRaises(CommandError):
+            self.generate(songs=0)
+
+    def test_run_benchmark(self):
+        self.generate()
+        output = os.path.join(tempfile.mkdtemp(), "bench.json")
+        self.addCleanup(os.remove, output)
+        options = {"requests": 3, "warmup": 1, "endpoints": ["search_song", "album_profile"], "stdout": io.StringIO()}
+        call_command("run_benchmark", output=output, **options)
+
+        with open(output, encoding="utf-8") as f:
+            report = json.load(f)
+        for name in options["endpoints"]:
+            result = report["endpoints"][name]
+            self.assertEqual((result["requests"], result["errors"]), (3, 0))
+            self.assertIsNotNone(result["p95_ms"])
+            self.assertGreater(result["queries_max"], 0)
+
+        # 与 p95 极小的基准结果对比时判定为变慢
+        for result in report["endpoints"].values():
+            result["p95_ms"] = 0.001
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        with self.assertRaises(CommandError):
+            call_command("run_benchmark", compare=output, max_regression=50, **options)
+
+
+# ================================
+# 建表修复与迁移
+# ================================
+class SchemaMigrationTests(SimpleTestCase):
+
+    def test_trigger_dropped_by_migration(self):
+        # 触发器必须由迁移删除，apply_schema_fixups --fake 不能把它标记为已执行
+        from .views.initialTable import FIXUPS
+        self.assertFalse([name for name, _ in FIXUPS if name.startswith("trigger.")])
+
+        migration = import_module("app.migrations.0013_drop_after_play_insert")
+        for vendor, expected in (("mysql", ["DROP TRIGGER IF EXISTS after_play_insert"]), ("sqlite", [])):
+            schema_editor = mock.Mock()
+            schema_editor.connection.vendor = vendor
+            migration.drop_after_play_insert(None, schema_editor)
+            self.assertEqual([c.args[0] for c in schema_editor.execute.call_args_list], expected)
+
+
+# ================================
+# 历史数据归档
+# ================================
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        self.user, self.song = create_song()
+
+    def play(self, day, duration=30):
+        play = PlayHistory.objects.create(user=self.user, song=self.song, play_duration=duration)
+        play_time = datetime.datetime.combine(day, datetime.time(12), tzinfo=datetime.timezone.utc)
+        PlayHistory.objects.filter(play_id=play.play_id).update(play_time=play_time)
+
+    def monthly(self):
+        return {(row.month, row.play_count, row.play_duration)
+                for row in PlayMonthlyStats.objects.filter(user=self.user, song=self.song)}
+
+    def user_song_plays(self, start_dt=None):
+        sql, params = archive.user_song_plays_sql(self.user.user_id, start_dt)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT song_id, plays FROM {sql} AS t", params)
+            return dict(cursor.fetchall())
+
+    def test_month_start(self):
+        today = datetime.date(2024, 3, 15)
+        self.assertEqual(archive.month_start(0, today), datetime.date(2024, 3, 1))
+        self.assertEqual(archive.month_start(3, today), datetime.date(2023, 12, 1))
+
+    def test_archive_rolls_up_by_month(self):
+        self.play(datetime.date(2024, 1, 5), 10)
+        self.play(datetime.date(2024, 1, 31), 20)
+        self.play(datetime.date(2024, 2, 10), 40)
+        self.play(datetime.date(2024, 3, 2), 80)
+
+        # 每批 2 条，同一个月的记录跨批次累加
+        self.assertEqual(archive.archive_play_history("2024-03-01", batch_size=2), 3)
+        self.assertEqual(PlayHistory.objects.count(), 1)
+        self.assertEqual(PlayHistoryArchive.objects.count(), 3)
+        expected = {(datetime.date(2024, 1, 1), 2, 30), (datetime.date(2024, 2, 1), 1, 40)}
+        self.assertEqual(self.monthly(), expected)
+
+        # 重新运行不会重复汇总
+        self.assertEqual(archive.archive_play_history("2024-03-01"), 0)
+        self.assertEqual(self.monthly(), expected)
+
+        # 排行读取原表 + 月度汇总 / 归档表，结果与归档前相同
+        self.assertEqual(self.user_song_plays(), {self.song.song_id: 4})
+        self.assertEqual(self.user_song_plays("2024-01-20 00:00:00"), {self.song.song_id: 3})
+
+    def test_archive_system_logs(self):
+        for _ in range(3):
+            SystemLog.objects.create(action="test", result="success")
+        SystemLog.objects.update(action_time=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+        SystemLog.objects.create(action="recent", result="success")
+
+        self.assertEqual(archive.archive_system_logs("2024-02-01", batch_size=2), 3)
+        self.assertEqual(list(SystemLog.objects.values_list("action", flat=True)), ["recent"])
+        self.assertEqual(SystemLogArchive.objects.count(), 3)
+
+
+# ================================
+# 歌单详情与歌单内排序
+# ================================
+class SonglistSongsTests(TestCase):
+
+    def setUp(self):
+        get_profile_cache().invalidate_kind("songlist")
+        self.user, song = create_song()
+        album = song.album
+        guest = Singer.objects.create(singer_name="费玉清", type="男")
+        self.songs = [song] + [
+            Song.objects.create(song_title=title, album=album, duration=duration, file_url="/x.mp3")
+            for title, duration in (("晴天", 269), ("千里之外", 255))
+        ]
+        for s in self.songs:
+            SongSinger.objects.create(song=s, singer=album.singer)
+        # 合唱歌曲有两位歌手，不能因此出现两次
+        SongSinger.objects.create(song=self.songs[2], singer=guest)
+
+        self.songlist = Songlist.objects.create(songlist_title="周杰伦精选", user=self.user)
+        for s in self.songs:
+            SonglistSong.objects.create(songlist=self.songlist, song=s)
+        login(self.client, self.user)
+
+    def test_profile_one_row_per_song(self):
+        data = self.client.get(f"/songlist/profile/{self.songlist.songlist_id}/").json()
+        self.assertEqual(sorted(song["song_id"] for song in data["songs"]), sorted(s.song_id for s in self.songs))
+        self.assertEqual(data["song_count"], 3)
+        self.assertEqual(data["total_duration"], 230 + 269 + 255)
+        duet = next(song for song in data["songs"] if song["song_id"] == self.songs[2].song_id)
+        self.assertEqual([singer["singer_name"] for singer in duet["singers"]], ["周杰伦", "费玉清"])
+        self.assertIsNone(data["next_cursor"])
+
+    def test_sort_pages_by_cursor(self):
+        url = f"/songlist/sort_songlist/{self.songlist.songlist_id}/"
+        first = self.client.get(url, {"sort": "duration", "page_size": 2}).json()
+        self.assertEqual((first["total"], first["total_duration"]), (3, 230 + 269 + 255))
+        self.assertEqual(len(first["songs"]), 2)
+        self.assertIsNotNone(first["next_cursor"])
+
+        rest = self.client.get(url, {"sort": "duration", "page_size": 2, "cursor": first["next_cursor"]}).json()
+        self.assertIsNone(rest["next_cursor"])
+        durations = [song["duration"] for song in first["songs"] + rest["songs"]]
+        self.assertEqual(sorted(durations), [230, 255, 269])
+        self.assertIn(durations, ([230, 255, 269], [269, 255, 230]))
+
+        # 游标不能用于其他排序方式
+        response = self.client.get(url, {"sort": "play_count", "cursor": first["next_cursor"]})
+        self.assertEqual(response.status_code, 400)
+
+    def test_private_songlist(self):
+        Songlist.objects.filter(songlist_id=self.songlist.songlist_id).update(is_public=False)
+        get_profile_cache().invalidate_kind("songlist")
+        login(self.client, User.objects.create(user_name="other", password="x"))
+        self.assertEqual(self.client.get(f"/songlist/profile/{self.songlist.songlist_id}/").status_code, 403)
+        self.assertEqual(self.client.get(f"/songlist/sort_songlist/{self.songlist.songlist_id}/").status_code, 403)
+
+
+# ================================
+# 会话存储
+# ================================
+SESSION_CACHES = dict(settings.CACHES, sessions={
+    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+    "LOCATION": os.path.join(tempfile.gettempdir(), "shenghang-test-sessions"),
+})
+
+
+@override_settings(CACHES=SESSION_CACHES)
+class SessionStoreTests(TestCase):
+
+    def setUp(self):
+        from django.core.cache import caches
+        self.session_cache = caches["sessions"]
+        self.session_cache.clear()
+        self.user = User.objects.create(user_name="listener", password=hash_password("pw"))
+        currentUser.invalidate_user(self.user.user_id)
+        response = post_json(self.client, "/user/login/", {"username": "listener", "password": "pw"})
+        self.assertEqual(response.status_code, 200)
+        self.session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def test_session_read_from_cache(self):
+        # 登录后会话已写入缓存，之后的请求不再查询 django_session
+        self.client.get("/user/logout/")
+        with CaptureQueriesContext(connection) as queries:
+            # 已登录时 GET 返回 400 (POST required)，未登录为 403
+            self.assertEqual(self.client.get("/user/logout/").status_code, 400)
+        self.assertFalse([q for q in queries.captured_queries if "django_session" in q["sql"]])
+
+    def test_logout_invalidates_session(self):
+        cache_key = "django.contrib.sessions.cached_db" + self.session_key
+        self.assertIsNotNone(self.session_cache.get(cache_key))
+        self.assertEqual(post_json(self.client, "/user/logout/", {}).status_code, 200)
+        self.assertIsNone(self.session_cache.get(cache_key))
+        # 旧 Cookie 不再有效
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = self.session_key
+        self.assertEqual(self.client.get("/user/logout/").status_code, 403)
+
+
+# ================================
+# 评论接口的登录检查
+# ================================
+class CommentLoginTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create(user_id=currentUser.ADMIN_USER_ID, user_name="admin", password="x")
+        self.user, self.song = create_song()
+        self.comment = Comment.objects.create(
+            user=self.user, target_type="song", target_id=self.song.song_id, content="hi", status="正常")
+
+    def test_login_required(self):
+        data = {"comment_id": self.comment.comment_id, "action": "report",
+                "target_type": "song", "target_id": self.song.song_id, "content": "hi"}
+        for url in ("/comment/publish_comment/", "/comment/delete_comment/", "/comment/action_comment/"):
+            self.assertEqual(post_json(self.client, url, data).status_code, 403)
+        self.assertEqual(Comment.objects.get(comment_id=self.comment.comment_id).status, "正常")
+
+    def test_delete_own_comment(self):
+        login(self.client, self.user)
+        response = post_json(self.client, "/comment/delete_comment/", {"comment_id": self.comment.comment_id})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_delete_error_logged(self):
+        login(self.client, self.user)
+        with mock.patch("app.views.comment.delete_comment_tree", side_effect=RuntimeError("boom")), \
+                self.assertLogs("app.views.comment", "ERROR"):
+            response = post_json(self.client, "/comment/delete_comment/", {"comment_id": self.comment.comment_id})
+        self.assertEqual(response.status_code, 500)
+
+    def test_audit_error_logged(self):
+        login(self.client, self.admin)
+        with mock.patch("app.views.manager.set_comment_status", side_effect=RuntimeError("boom")), \
+                self.assertLogs("app.views.manager", "ERROR"):
+            response = post_json(self.client, "/Administrator/comment/admin_audit_comment/",
+                                 {"comment_id": self.comment.comment_id, "result": "pass"})
+        self.assertEqual(response.status_code, 500)
+
+
+# ================================
+# 流式 JSON 响应
+# ================================
+class JSONStreamTests(TestCase):
+
+    ROWS = [{"song_id": i, "title": f"歌曲{i}", "time": datetime.datetime(2026, 10, 1, 8, 0, 0, 123456)}
+            for i in range(7)]
+
+    def stream_body(self, response):
+        if response.streaming:
+            return b"".join(response.streaming_content)
+        return response.content
+
+    def test_same_output_as_json_cn(self):
+        expected = json_cn({"user": {"id": 1, "name": "听众"}, "items": self.ROWS, "count": 7, "empty": []}).content
+        for streaming in (True, False):
+            with self.subTest(streaming=streaming), override_settings(STREAM_JSON_RESPONSES=streaming):
+                items = JSONArray(batched(self.ROWS, 3))
+                response = json_stream({
+                    "user": {"id": 1, "name": "听众"},
+                    "items": items,
+                    # 写在数组之后的统计值在输出到该位置时才计算
+                    "count": lambda: items.count,
+                    "empty": JSONArray(iter([[], []])),
+                })
+                self.assertEqual(response.streaming, streaming)
+                self.assertEqual(response["Content-Type"], "application/json")
+                self.assertEqual(self.stream_body(response), expected)
+
+    def test_fetch_batches(self):
+        user, song = create_song()
+        other = Song.objects.create(song_title="七里香", album=song.album, duration=200, file_url="/b.mp3")
+        sql = "SELECT song_id, song_title FROM Song ORDER BY song_id"
+        self.assertEqual([len(batch) for batch in fetch_batches(sql, [], batch_size=1)], [1, 1])
+
+        songs = JSONArray([{"id": row[0], "title": row[1]} for row in batch]
+                          for batch in fetch_batches(sql, [], batch_size=1))
+        self.assertEqual(json.loads(self.stream_body(json_stream({"songs": songs}))), {"songs": [
+            {"id": song.song_id, "title": "爱在西元前"},
+            {"id": other.song_id, "title": "七里香"},
+        ]})
+
+
+# ================================
+# JSON 编码器
+# ================================
+class JSONEncoderTests(SimpleTestCase):
+
+    DATA = {
+        "title": "晴天",
+        "time": datetime.datetime(2026, 10, 1, 8, 0, 0, 123456),
+        "utc": datetime.datetime(2026, 10, 1, 8, 0, 0, tzinfo=datetime.timezone.utc),
+        "day": datetime.date(2026, 10, 1),
+        "clock": datetime.time(8, 30, 15, 500000),
+        "total": decimal.Decimal("12.50"),
+        "uuid": uuid.UUID(int=1),
+        "list": [1, 2.5, None, True],
+        1: "非字符串键",
+    }
+    EXPECTED = (
+        '{"title":"晴天","time":"2026-10-01T08:00:00.123","utc":"2026-10-01T08:00:00Z","day":"2026-10-01",'
+        '"clock":"08:30:15.500","total":"12.50","uuid":"00000000-0000-0000-0000-000000000001",'
+        '"list":[1,2.5,null,true],"1":"非字符串键"}'
+    ).encode("utf-8")
+
+    def test_backends_match_django_encoder(self):
+        for name, encode in jsonEncoder.ENCODERS.items():
+            with self.subTest(backend=name):
+                self.assertEqual(encode(self.DATA), self.EXPECTED)
+
+    @skipIf(jsonEncoder.orjson is None, "orjson 未安装")
+    def test_orjson_falls_back_to_stdlib(self):
+        # 超过 64 位的整数 orjson 无法编码
+        data = {"big": 2 ** 70}
+        self.assertEqual(jsonEncoder.ENCODERS["orjson"](data), jsonEncoder.stdlib_dumps(data))
+
+    def test_backend_setting(self):
+        auto = "orjson" if jsonEncoder.orjson is not None else "stdlib"
+        for backend, expected in (("auto", auto), ("stdlib", "stdlib")):
+            with self.subTest(backend=backend), override_settings(JSON_ENCODER={"BACKEND": backend}):
+                self.assertEqual(jsonEncoder.get_backend_name(), expected)
+
+        with override_settings(JSON_ENCODER={"BACKEND": "simdjson"}), \
+                self.assertLogs("app.views.jsonEncoder", "WARNING"):
+            self.assertEqual(jsonEncoder.get_backend_name(), "stdlib")
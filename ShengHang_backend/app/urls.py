@@ -7,12 +7,18 @@ from app.views import comment as comment
 from app.views import playhistory as ph
 from app.views import manager as manager
 
+from django.conf import settings
 from django.http import HttpResponse
 
 def home(request):
     return HttpResponse("ShengHang backend is running successfully.")
 
 
+# 曲库的详情页和搜索接口在 ASGI 部署时使用异步版本 (settings.ASYNC_VIEWS)
+def catalogue_view(sync_view, async_view):
+    return async_view if settings.ASYNC_VIEWS else sync_view
+
+
 
 urlpatterns = [
     path("", home),
@@ -35,23 +41,23 @@ urlpatterns = [
     path("user/update_visibility/", user.update_visibility),
 
     # 歌手与音乐管理模块
-    path("singer/search_singer/", music.search_singer),
-    path("singer/profile/<int:singer_id>/", music.singer_profile),
-    path("album/search_album/", music.search_album),
-    path("album/profile/<int:album_id>/", music.album_profile),
-    path("song/search_song/", music.search_song),
-    path("song/profile/<int:song_id>/", music.song_profile),
+    path("singer/search_singer/", catalogue_view(music.search_singer, music.search_singer_async)),
+    path("singer/profile/<int:singer_id>/", catalogue_view(music.singer_profile, music.singer_profile_async)),
+    path("album/search_album/", catalogue_view(music.search_album, music.search_album_async)),
+    path("album/profile/<int:album_id>/", catalogue_view(music.album_profile, music.album_profile_async)),
+    path("song/search_song/", catalogue_view(music.search_song, music.search_song_async)),
+    path("song/profile/<int:song_id>/", catalogue_view(music.song_profile, music.song_profile_async)),
 
     # 收藏与歌单模块
     path("songlist/list_songlists/", favorite.list_songlists),
     path("songlist/create_songlist/", favorite.create_songlist),
     path("songlist/edit_songlist/<int:songlist_id>/", favorite.edit_songlist),
-    path("songlist/profile/<int:songlist_id>/", favorite.songlist_profile),
+    path("songlist/profile/<int:songlist_id>/", catalogue_view(favorite.songlist_profile, favorite.songlist_profile_async)),
     path("songlist/delete_songlist/<int:songlist_id>/", favorite.delete_songlist),
     path("songlist/<int:songlist_id>/add_song/", favorite.songlist_add_song),
     path("songlist/<int:songlist_id>/delete_song/<int:song_id>/", favorite.songlist_delete_song),
     path("songlist/sort_songlist/<int:songlist_id>/", favorite.sort_songlist),
-    path("songlist/search_songlist/", favorite.search_songlist),
+    path("songlist/search_songlist/", catalogue_view(favorite.search_songlist, favorite.search_songlist_async)),
     path("songlist/like_songlist/<int:songlist_id>/", favorite.like_songlist),
     path("favorite/list_favorite/", favorite.list_favorite),
     path("favorite/add_favorite/", favorite.add_favorite),
@@ -66,6 +72,8 @@ urlpatterns = [
     path("comment/action_comment/", comment.action_comment),
     path("comment/get_comments_by_target/", comment.get_comments_by_target),
     path("comment/get_comment_detail/", comment.get_comment_detail),
+    path("comment/get_comment_tree/", comment.get_comment_tree),
+    path("comment/get_thread_replies/", comment.get_thread_replies),
     path("comment/get_my_comments/", comment.get_my_comments),
     path("comment/get_comment_stats/", comment.get_comment_stats),
     path("comment/report_comment/", comment.report_comment),
@@ -90,8 +98,11 @@ urlpatterns = [
     path("Administrator/song/admin_delete_song/", manager.admin_delete_song),
     path("Administrator/song/admin_update_song/", manager.admin_update_song),
     path("Administrator/get_system_logs/", manager.get_system_logs),
+    path("Administrator/get_request_profile/", manager.get_request_profile),
     path("Administrator/user/get_specific_user_stats/", manager.get_specific_user_stats),
     path("Administrator/user/get_user_behavior_stats/", manager.get_user_behavior_stats),
     path("Administrator/comment/admin_get_pending_comments/", manager.admin_get_pending_comments),
     path("Administrator/comment/admin_audit_comment/", manager.admin_audit_comment),
+    path("Administrator/get_play_dedup_stats/", manager.get_play_dedup_stats),
+    path("Administrator/get_db_pool_stats/", manager.get_db_pool_stats),
 ]
@@ -8,4 +8,4 @@ from . import playhistory
 from . import tools
 
 # Re-export commonly used utilities
-from .tools import json_cn, hash_password, require_admin, get_user_id, dictfetchall, format_time
+from .tools import json_cn, hash_password, require_admin, get_user_id, dictfetchall, format_time, fetch_song_singers
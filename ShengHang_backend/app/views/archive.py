@@ -0,0 +1,149 @@
+# 历史数据归档模块 (冷热分离)
+# PlayHistory 和 SystemLog 只增不减，按时间段统计和分页查询会越来越慢。
+# 这里把超过保留期的数据按批移到归档表，原表只保留最近几个月的数据:
+#   - PlayHistory -> PlayHistoryArchive，同时按 (用户, 歌曲, 月份) 汇总到 PlayMonthlyStats
+#   - SystemLog   -> SystemLogArchive
+# 由 python manage.py archive_history 定期执行 (如每天凌晨)
+#
+# 读取播放记录的接口需要同时考虑两部分数据:
+#   - 最近的播放记录、按时间段统计: 原表 + 归档表 (都有 (user_id, play_time) 索引)
+#   - 不限时间的排行: 原表 + PlayMonthlyStats，不扫描归档表
+# 每日统计 (DailyStats / UserDailyStats) 重新计算时也会读取归档表
+#
+# 没有使用 MySQL 分区表: 分区表不支持外键，且分区键必须包含在主键中
+import datetime
+
+from django.db import connection, transaction
+
+from .tools import upsert_counter_sql
+from .dailyStats import db_today
+
+
+PLAY_COLUMNS = ["play_id", "user_id", "song_id", "play_time", "play_duration"]
+LOG_COLUMNS = ["log_id", "action", "target_table", "target_id", "action_time", "result"]
+
+
+def month_start(months_ago, today=None):
+    "months_ago 个月前的当月 1 日，如 months_ago=0 为本月 1 日"
+    today = today or db_today()
+    month_index = today.year * 12 + today.month - 1 - months_ago
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _month_of(value):
+    # MySQL 返回 datetime，SQLite 返回字符串
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value[:10])
+    return datetime.date(value.year, value.month, 1)
+
+
+# ================================
+# 移动到归档表
+# ================================
+def _move_batch(cursor, table, archive_table, pk, columns, time_column, before, batch_size):
+    "把一批 time_column < before 的数据从原表移到归档表，返回移动的行"
+    cursor.execute(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE {time_column} < %s ORDER BY {time_column}, {pk} LIMIT %s",
+        [before, batch_size]
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return rows
+
+    row_sql = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    cursor.execute(
+        f"INSERT INTO {archive_table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(rows))}",
+        [value for row in rows for value in row]
+    )
+    cursor.execute(
+        f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(rows))})",
+        [row[0] for row in rows]
+    )
+    return rows
+
+
+def archive_play_history(before, batch_size=5000):
+    """
+    把 play_time < before 的播放记录移到 PlayHistoryArchive 并汇总到 PlayMonthlyStats
+    每批一个事务，中途中断不会丢失或重复数据，重新运行即可。返回移动的条数
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                rows = _move_batch(cursor, "PlayHistory", "PlayHistoryArchive", "play_id", PLAY_COLUMNS,
+                                   "play_time", before, batch_size)
+                if not rows:
+                    return total
+
+                monthly = {}
+                for _, user_id, song_id, play_time, play_duration in rows:
+                    key = (user_id, song_id, _month_of(play_time))
+                    counts = monthly.setdefault(key, [0, 0])
+                    counts[0] += 1
+                    counts[1] += play_duration or 0
+                # 按主键顺序写入，与其他批量写入的加锁顺序一致
+                monthly_rows = sorted(monthly.items())
+                cursor.execute(
+                    upsert_counter_sql("PlayMonthlyStats", ["user_id", "song_id", "month"],
+                                       ["play_count", "play_duration"], len(monthly_rows)),
+                    [value for key, counts in monthly_rows for value in key + tuple(counts)]
+                )
+        total += len(rows)
+
+
+def archive_system_logs(before, batch_size=5000):
+    "把 action_time < before 的系统日志移到 SystemLogArchive，返回移动的条数"
+    total = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                rows = _move_batch(cursor, "SystemLog", "SystemLogArchive", "log_id", LOG_COLUMNS,
+                                   "action_time", before, batch_size)
+        if not rows:
+            return total
+        total += len(rows)
+
+
+# ================================
+# 查询 (原表 + 归档)
+# ================================
+def _time_filter(start_dt, end_dt):
+    sql, params = "", []
+    if start_dt:
+        sql += " AND play_time >= %s"
+        params.append(start_dt)
+    if end_dt:
+        sql += " AND play_time <= %s"
+        params.append(end_dt)
+    return sql, params
+
+
+def user_song_plays_sql(user_id, start_dt=None, end_dt=None):
+    """
+    某个用户每首歌的播放次数 (原表 + 已归档)，返回 (子查询 SQL, 参数)，子查询的列为 song_id, plays
+    不限时间时已归档部分读取 PlayMonthlyStats，限定时间时读取 PlayHistoryArchive
+    """
+    time_sql, time_params = _time_filter(start_dt, end_dt)
+    hot = f"SELECT song_id, COUNT(*) AS plays FROM PlayHistory WHERE user_id = %s{time_sql} GROUP BY song_id"
+    if start_dt or end_dt:
+        cold = f"SELECT song_id, COUNT(*) AS plays FROM PlayHistoryArchive WHERE user_id = %s{time_sql} GROUP BY song_id"
+        cold_params = [user_id] + time_params
+    else:
+        cold = "SELECT song_id, SUM(play_count) AS plays FROM PlayMonthlyStats WHERE user_id = %s GROUP BY song_id"
+        cold_params = [user_id]
+    sql = f"(SELECT song_id, SUM(plays) AS plays FROM ({hot} UNION ALL {cold}) AS up GROUP BY song_id)"
+    return sql, [user_id] + time_params + cold_params
+
+
+def user_plays_sql(user_id, start_dt=None, end_dt=None):
+    """
+    某个用户在时间段内的每条播放记录 (原表 + 归档表)，返回 (子查询 SQL, 参数)
+    子查询的列为 song_id, play_time, play_duration
+    """
+    time_sql, time_params = _time_filter(start_dt, end_dt)
+    parts = [
+        f"SELECT song_id, play_time, play_duration FROM {table} WHERE user_id = %s{time_sql}"
+        for table in ("PlayHistory", "PlayHistoryArchive")
+    ]
+    return f"({' UNION ALL '.join(parts)})", ([user_id] + time_params) * 2
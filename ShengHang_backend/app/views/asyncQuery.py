@@ -0,0 +1,47 @@
+# 异步视图工具
+# Django 4.2 的数据库操作只能同步执行。异步视图把相互独立的查询分别放到线程池中并发执行，
+# 每个线程使用自己的数据库连接 (从连接池取出，见 app/mysqlPool)，
+# 一个请求的耗时接近最慢的那条查询，而不是所有查询之和；等待数据库时事件循环可以处理其他请求
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+
+
+def run_queries(queries):
+    """
+    依次执行查询
+    :param queries: [(sql, params), ...]
+    :return: 每条查询的 fetchall() 结果列表
+    """
+    results = []
+    with connection.cursor() as cursor:
+        for sql, params in queries:
+            cursor.execute(sql, params)
+            results.append(cursor.fetchall())
+    return results
+
+
+def _run_in_thread(func, *args):
+    try:
+        return func(*args)
+    finally:
+        # 线程池中的线程不经过请求流程，用完后归还连接 (CONN_MAX_AGE 为 0 时放回连接池)
+        close_old_connections()
+
+
+async def arun(func, *args):
+    "在线程池中执行阻塞的数据库操作，不阻塞事件循环"
+    return await sync_to_async(_run_in_thread, thread_sensitive=False)(func, *args)
+
+
+async def arun_queries(queries):
+    "并发执行相互独立的查询，返回值与 run_queries 相同"
+    results = await asyncio.gather(*(arun(run_queries, [query]) for query in queries))
+    return [rows for (rows,) in results]
+
+
+def async_csrf_exempt(view):
+    # Django 4.2 的 csrf_exempt 不支持异步视图，直接设置中间件检查的属性
+    view.csrf_exempt = True
+    return view
@@ -0,0 +1,168 @@
+# 后台批量写入模块
+# 高频写操作 (如播放记录) 先放入进程内缓冲区，由后台线程定期批量写入数据库，
+# 避免每个请求单独 INSERT / UPDATE 造成的行锁竞争
+#   - 缓冲区达到 batch_size 或距上次写入超过 interval 秒时写入一次
+#   - 缓冲区达到 max_pending 时，put 最多阻塞 put_timeout 秒等待写入 (背压)
+#   - 进程退出时 (atexit) 写入缓冲区中剩余的数据，仍写不进的数据交给 drop_func
+import atexit
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+
+    def __init__(self, name, flush_func, batch_size=500, interval=1.0,
+                 max_pending=50000, put_timeout=1.0, drop_func=None):
+        """
+        :param name: 名称，用于线程名和日志
+        :param flush_func: 写入函数，参数为一批数据的列表 (长度不超过 batch_size)
+        :param drop_func: 可选，已放入缓冲区但最终被丢弃的数据列表会传给该函数
+        """
+        self.name = name
+        self.flush_func = flush_func
+        self.drop_func = drop_func
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+
+        self.items = []
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()     # 保证同一时刻只有一个线程在写入
+        self.thread = None
+        self.stopped = False
+
+    # --------------------------
+    # 写入缓冲区
+    # --------------------------
+    def put(self, item):
+        "放入一条数据，缓冲区已满且等待超时时返回 False (数据被丢弃)"
+        with self.cond:
+            self._ensure_started()
+            deadline = time.monotonic() + self.put_timeout
+            while len(self.items) >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning("[%s] 缓冲区已满，丢弃数据", self.name)
+                    return False
+                self.cond.notify_all()
+                self.cond.wait(remaining)
+
+            self.items.append(item)
+            if len(self.items) >= self.batch_size:
+                self.cond.notify_all()
+            return True
+
+    def pending_count(self):
+        with self.cond:
+            return len(self.items)
+
+    # --------------------------
+    # 写入数据库
+    # --------------------------
+    def flush(self):
+        "把当前缓冲区中的数据全部写入数据库，返回写入条数"
+        with self.flush_lock:
+            with self.cond:
+                items, self.items = self.items, []
+                self.cond.notify_all()    # 唤醒因缓冲区已满而阻塞的 put
+
+            if not items:
+                return 0
+
+            written = 0
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                try:
+                    self.flush_func(batch)
+                    written += len(batch)
+                except Exception:
+                    logger.exception("[%s] 批量写入失败，改为逐条写入", self.name)
+                    count = self._flush_one_by_one(batch)
+                    if count == 0:
+                        # 逐条也全部失败，多半是数据库不可用，放回缓冲区等待下次写入
+                        self._requeue(items[start:])
+                        break
+                    written += count
+            return written
+
+    def _flush_one_by_one(self, batch):
+        "整批写入失败时逐条写入，丢弃单独写入仍失败的数据 (如引用的歌曲已被删除)"
+        if len(batch) == 1:
+            return 0
+        written, failed, errors = 0, [], []
+        for item in batch:
+            try:
+                self.flush_func([item])
+                written += 1
+            except Exception as e:
+                failed.append(item)
+                errors.append(e)
+        if written and failed:
+            logger.error("[%s] 丢弃 %d 条无法写入的数据: %s", self.name, len(failed), errors[0])
+            self._dropped(failed)
+        return written
+
+    def _requeue(self, items):
+        "写入失败的数据放回缓冲区头部，超出 max_pending 的部分丢弃"
+        with self.cond:
+            room = max(self.max_pending - len(self.items), 0)
+            if room < len(items):
+                logger.warning("[%s] 缓冲区已满，丢弃 %d 条数据", self.name, len(items) - room)
+            self.items[:0] = items[:room]
+        self._dropped(items[room:])
+
+    def _dropped(self, items):
+        if items and self.drop_func is not None:
+            try:
+                self.drop_func(items)
+            except Exception:
+                logger.exception("[%s] drop_func 执行失败", self.name)
+
+    # --------------------------
+    # 后台线程
+    # --------------------------
+    def _ensure_started(self):
+        # 调用方已持有 self.cond
+        if self.thread is not None or self.stopped:
+            return
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if not self.stopped and len(self.items) < self.batch_size:
+                    self.cond.wait(self.interval)
+                stopped = self.stopped
+
+            # 后台线程不经过请求流程，需要自己关闭失效的数据库连接
+            close_old_connections()
+            self.flush()
+
+            if stopped:
+                return
+
+    def stop(self):
+        "停止后台线程并写入剩余数据"
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+            thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=30)
+        self.flush()
+
+        # 数据库不可用时 flush 会把数据放回缓冲区，进程退出后这些数据就丢失了
+        with self.cond:
+            items, self.items = self.items, []
+        if items:
+            logger.error("[%s] 退出时仍有 %d 条数据未能写入", self.name, len(items))
+            self._dropped(items)
@@ -0,0 +1,274 @@
+# 详情页缓存模块
+# 歌曲/专辑/歌手/歌单详情页的数据只会被管理员操作、评论和歌单操作修改，
+# 因此在视图前加一层读穿透缓存，写操作后数据库中的详情页版本号加一 (见 profileVersion.py)，缓存 key 随之变化
+# 版本号本身也缓存 VERSION_TIMEOUT 秒，缓存命中 (包括返回 304) 时不访问数据库
+#   - lru: 进程内 LRU + TTL (默认)
+#   - django: 使用 Django 缓存框架 (settings.CACHES，可配置本地内存或文件缓存)
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .asyncQuery import arun
+from .profileVersion import bump_versions, bump_kind_versions, get_profile_version
+
+
+logger = logging.getLogger(__name__)
+
+
+# 永不过期 (用于缓存代数)
+NO_EXPIRY = float("inf")
+
+
+# ================================
+# 缓存后端
+# ================================
+class LRUCache:
+    "进程内 LRU 缓存，超过 timeout 秒的条目视为过期"
+
+    def __init__(self, max_entries=1024, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()    # key -> (过期时间, value)
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            expire_at, value = item
+            if expire_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DjangoCache:
+    "Django 缓存框架的适配器，接口与 LRUCache 保持一致"
+
+    def __init__(self, alias="default", timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, timeout=None):
+        if timeout == NO_EXPIRY:
+            timeout = None  # Django 中 None 表示永不过期
+        elif timeout is None:
+            timeout = self.timeout
+        self.backend.set(key, value, timeout)
+
+    def delete_many(self, keys):
+        self.backend.delete_many(list(keys))
+
+    def clear(self):
+        self.backend.clear()
+
+
+# 只在当前进程内有效的 Django 缓存后端，多 worker 部署时各进程互不可见
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_shared_cache(alias="default"):
+    "CACHES 中 alias 对应的缓存是否在多个进程间共享 (文件缓存、数据库缓存、Redis、Memcached 等)"
+    config = settings.CACHES.get(alias)
+    return config is not None and config.get("BACKEND") not in PROCESS_LOCAL_CACHES
+
+
+def create_backend(config):
+    "根据配置创建缓存后端"
+    if config.get("BACKEND", "lru") == "django":
+        return DjangoCache(config.get("ALIAS", "default"), config.get("TIMEOUT", 300))
+    return LRUCache(config.get("MAX_ENTRIES", 1024), config.get("TIMEOUT", 300))
+
+
+# ================================
+# 详情页缓存
+# ================================
+class ProfileCache:
+    """
+    key 格式: profile:{kind}:{generation}:{id}[:{version}]
+    kind 为 song / album / singer / songlist
+    generation 为该类详情页的代数，整类失效时换一个新代数，旧 key 自然过期
+    version 为数据库中的详情页版本 (见 profileVersion.py)，版本变化后其他进程中的旧缓存不会再被读到
+    版本号本身缓存在 profile:{kind}:{generation}:{id}:version 中，有效期 version_timeout 秒
+    """
+
+    KINDS = ("song", "album", "singer", "songlist")
+
+    def __init__(self, backend, version_timeout=5):
+        self.backend = backend
+        self.version_timeout = version_timeout
+
+    def _generation_key(self, kind):
+        return f"profile:{kind}:generation"
+
+    def _generation(self, kind):
+        generation = self.backend.get(self._generation_key(kind))
+        if generation is None:
+            # 代数丢失 (如被淘汰) 时生成新值，而不是从 0 开始，避免读到旧代数的脏数据
+            generation = self._new_generation(kind)
+        return generation
+
+    def _new_generation(self, kind):
+        generation = time.time_ns()
+        self.backend.set(self._generation_key(kind), generation, timeout=NO_EXPIRY)
+        return generation
+
+    def key(self, kind, obj_id, version=None):
+        key = f"profile:{kind}:{self._generation(kind)}:{obj_id}"
+        return key if version is None else f"{key}:{version}"
+
+    def _version_key(self, kind, obj_id):
+        return f"profile:{kind}:{self._generation(kind)}:{obj_id}:version"
+
+    def get_version(self, kind, obj_id, loader):
+        """
+        读取缓存的详情页版本，未命中时调用 loader() 查询数据库
+        loader 返回 None 表示对象不存在，不缓存
+        """
+        key = self._version_key(kind, obj_id)
+        version = self.backend.get(key)
+        if version is None:
+            version = loader()
+            if version is not None:
+                self.backend.set(key, version, timeout=self.version_timeout)
+        return version
+
+    async def aget_version(self, kind, obj_id, loader):
+        "get_version 的异步版本，loader 为返回协程的函数"
+        key = self._version_key(kind, obj_id)
+        version = self.backend.get(key)
+        if version is None:
+            version = await loader()
+            if version is not None:
+                self.backend.set(key, version, timeout=self.version_timeout)
+        return version
+
+    def forget_versions(self, kind, *obj_ids):
+        "删除缓存的版本号，下次读取时重新查询数据库"
+        self.backend.delete_many([self._version_key(kind, obj_id) for obj_id in obj_ids])
+
+    def get_or_build(self, kind, obj_id, builder, version=None):
+        """
+        读取缓存，未命中时调用 builder() 查询数据库并写入缓存
+        builder 返回 None 表示对象不存在，不缓存
+        """
+        key = self.key(kind, obj_id, version)
+        value = self.backend.get(key)
+        if value is None:
+            value = builder()
+            if value is not None:
+                self.backend.set(key, value)
+        return value
+
+    async def aget_or_build(self, kind, obj_id, builder, version=None):
+        """
+        get_or_build 的异步版本，builder 为返回协程的函数
+        缓存本身 (进程内 LRU / 本地内存缓存) 不涉及 IO，直接在事件循环中读写
+        """
+        key = self.key(kind, obj_id, version)
+        value = self.backend.get(key)
+        if value is None:
+            value = await builder()
+            if value is not None:
+                self.backend.set(key, value)
+        return value
+
+    def invalidate_kind(self, *kinds):
+        "使本进程中某几类详情页缓存全部失效 (详情页版本号无法更新时使用)"
+        for kind in kinds:
+            self._new_generation(kind)
+
+
+_profile_cache = None
+_profile_cache_lock = threading.Lock()
+
+def get_profile_cache():
+    global _profile_cache
+    if _profile_cache is None:
+        with _profile_cache_lock:
+            if _profile_cache is None:
+                config = getattr(settings, "PROFILE_CACHE", {})
+                _profile_cache = ProfileCache(create_backend(config), config.get("VERSION_TIMEOUT", 5))
+    return _profile_cache
+
+
+# 详情页视图读取版本号
+def load_profile_version(kind, obj_id):
+    "读取详情页版本 (优先读缓存)，对象不存在时返回 None"
+    return get_profile_cache().get_version(kind, obj_id, lambda: get_profile_version(kind, obj_id))
+
+async def aload_profile_version(kind, obj_id):
+    return await get_profile_cache().aget_version(kind, obj_id, lambda: arun(get_profile_version, kind, obj_id))
+
+
+# 写操作使用的失效函数
+# 详情页缓存的 key 带有数据库中的版本号，版本号加一后读到新版本号的进程都不会再读到旧条目 (旧条目由 LRU / TIMEOUT 淘汰)，
+# 因此只需删除缓存的版本号 (事务提交后删除，避免其他请求在提交前又缓存了旧版本号)。
+# 使用进程内 LRU 时只能删除本进程的版本号，其他 worker 最多 VERSION_TIMEOUT 秒后读到新版本；
+# 使用共享的 Django 缓存时所有 worker 立即生效
+# 版本号更新失败时为该类详情页换一个新代数，至少本进程不再返回旧数据
+def invalidate_profile(kind, *obj_ids):
+    try:
+        bump_versions(kind, *obj_ids)
+    except Exception:
+        logger.exception("详情页版本更新失败")
+        _invalidate_kind_locally(kind)
+        return
+    obj_ids = [obj_id for obj_id in obj_ids if obj_id is not None]
+    transaction.on_commit(lambda: _forget_versions(kind, obj_ids))
+
+def invalidate_profiles(*kinds):
+    kinds = kinds or ProfileCache.KINDS
+    try:
+        bump_kind_versions(*kinds)
+    except Exception:
+        logger.exception("详情页版本更新失败")
+    # 整类版本变化，换一个新代数 (同时丢弃该类缓存的全部版本号)
+    transaction.on_commit(lambda: _invalidate_kind_locally(*kinds))
+
+def _forget_versions(kind, obj_ids):
+    try:
+        get_profile_cache().forget_versions(kind, *obj_ids)
+    except Exception:
+        logger.exception("详情页缓存失效失败")
+
+def _invalidate_kind_locally(*kinds):
+    try:
+        get_profile_cache().invalidate_kind(*kinds)
+    except Exception:
+        # 缓存失效失败不应影响主业务流程，条目会在 TIMEOUT 后过期
+        logger.exception("详情页缓存失效失败")
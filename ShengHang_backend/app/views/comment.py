@@ -1,8 +1,18 @@
 # 评论模块
 import json
-from django.db import connection
+import logging
+
+from django.db import connection, transaction
 from django.views.decorators.csrf import csrf_exempt
 from .tools import *
+from .cache import invalidate_profile
+from .dailyStats import add_user_stat, subtract_stats
+from .likeCounter import add_like, target_exists, merge_pending_likes, delete_like_records
+from .commentThread import VISIBLE_STATUS, get_thread_info, change_reply_count, set_comment_status
+from .jsonStream import JSONArray, fetch_batches, json_stream
+
+
+logger = logging.getLogger(__name__)
 
 
 # ================================
@@ -13,7 +23,9 @@ def publish_comment(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
 
     # 必填参数
@@ -30,16 +42,29 @@ def publish_comment(request):
     if target_type not in ['song', 'album', 'songlist']:
         return json_cn({"error": "无效的评论目标类型"}, 400)
 
+    # 回复记录所在楼层：父评论是一级评论时楼层就是父评论，否则继承父评论的楼层
+    root_id = None
+    if parent_id:
+        parent = get_thread_info(parent_id)
+        if parent is None:
+            return json_cn({"error": "回复的评论不存在"}, 404)
+        root_id = parent[0] or int(parent_id)
+
     # 简单的敏感词过滤逻辑可以在这里加...
+    # 审核中的回复不计入楼层回复数，审核通过时再计入
     status = '审核中'
 
     sql = """
-          INSERT INTO Comment (user_id, target_type, target_id, content, parent_id, status, like_count, comment_time)
-          VALUES (%s, %s, %s, %s, %s, %s, 0, NOW()) \
+          INSERT INTO Comment (user_id, target_type, target_id, content, parent_id, root_id, status, like_count,
+                               reply_count, comment_time)
+          VALUES (%s, %s, %s, %s, %s, %s, %s, 0, 0, NOW()) \
           """
 
     with connection.cursor() as cursor:
-        cursor.execute(sql, [current_user_id, target_type, target_id, content, parent_id, status])
+        cursor.execute(sql, [current_user_id, target_type, target_id, content, parent_id, root_id, status])
+
+    invalidate_profile(target_type, target_id)
+    add_user_stat(current_user_id, "comment_count")
 
     return json_cn({"message": "评论发布成功，正在进行安全审核"})
 
@@ -53,7 +78,9 @@ def delete_comment(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
     comment_id = data.get("comment_id")
 
@@ -94,38 +121,75 @@ def delete_comment(request):
     if not can_delete:
         return json_cn({"error": "无权删除此评论"}, 403)
 
-    # 执行删除
-    # 级联删除
-    def recursive_delete_comment(cursor, cid):
-        """
-        递归删除评论及其所有子评论
-        """
-        # 第一步：查找当前评论的所有子评论（回复）
-        sql_find_children = "SELECT comment_id FROM Comment WHERE parent_id = %s"
-        cursor.execute(sql_find_children, [cid])
-        children = cursor.fetchall()
-
-        # 第二步：对每一个子评论，递归调用删除
-        for child in children:
-            child_id = child[0]
-            recursive_delete_comment(cursor, child_id)
-
-        # 第三步：子孙都删完了，删除自己
-        sql_delete_self = "DELETE FROM Comment WHERE comment_id = %s"
-        cursor.execute(sql_delete_self, [cid])
-
     try:
-        with connection.cursor() as cursor:
-            # 调用递归函数
-            recursive_delete_comment(cursor, comment_id)
+        with transaction.atomic():
+            deleted = delete_comment_tree(comment_id)
+
+        invalidate_profile(target_type, target_id)
 
-        return json_cn({"message": "评论及其回复已成功删除"})
+        return json_cn({"message": "评论及其回复已成功删除", "deleted_count": deleted})
 
-    except Exception as e:
-        print(f"Delete Error: {e}")
+    except Exception:
+        logger.exception("删除评论失败: %s", comment_id)
         return json_cn({"error": "删除失败，数据库错误"}, 500)
 
 
+# 每条 DELETE ... IN (...) 语句最多包含的评论ID数
+COMMENT_BATCH_SIZE = 1000
+# MySQL 递归 CTE 默认最多递归 1000 层 (cte_max_recursion_depth)，回复链可能更深
+COMMENT_MAX_DEPTH = 100000
+
+
+def delete_comment_tree(comment_id):
+    """
+    删除评论及其所有子孙回复，返回删除的条数，需要在事务中调用
+    - 一级评论：整个楼层的回复都带有 root_id，直接按 root_id 查出
+    - 楼层中的回复：用一条递归 CTE 查出子树 (走 parent_id 索引)
+    再分批 DELETE，语句数只与回复总数 / COMMENT_BATCH_SIZE 有关，与回复链深度无关
+    """
+    info = get_thread_info(comment_id)
+    if info is None:
+        return 0
+    root_id = info[0]
+
+    with connection.cursor() as cursor:
+        if root_id is None:
+            cursor.execute(
+                "SELECT comment_id, status, user_id, comment_time FROM Comment WHERE comment_id = %s OR root_id = %s",
+                [comment_id, comment_id]
+            )
+        else:
+            # UNION 去重，防止脏数据中 parent_id 成环导致无限递归
+            # 递归深度上限用 SET_VAR 提示只对这一条语句生效 (连接会放回连接池，不能修改会话变量)；
+            # 其他数据库把提示当作普通注释
+            cursor.execute(f"""
+                WITH RECURSIVE tree (comment_id, status, user_id, comment_time) AS (
+                    SELECT comment_id, status, user_id, comment_time FROM Comment WHERE comment_id = %s
+                    UNION
+                    SELECT c.comment_id, c.status, c.user_id, c.comment_time
+                    FROM Comment c JOIN tree t ON c.parent_id = t.comment_id
+                )
+                SELECT /*+ SET_VAR(cte_max_recursion_depth = {COMMENT_MAX_DEPTH}) */
+                    comment_id, status, user_id, comment_time FROM tree
+            """, [comment_id])
+        rows = cursor.fetchall()
+        ids = [row[0] for row in rows]
+
+        deleted = 0
+        for start in range(0, len(ids), COMMENT_BATCH_SIZE):
+            batch = ids[start:start + COMMENT_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(f"DELETE FROM Comment WHERE comment_id IN ({placeholders})", batch)
+            deleted += cursor.rowcount
+            delete_like_records("comment", batch)
+
+    # 删除的是楼层中的回复时，从楼层回复数中扣除其中可见的部分
+    change_reply_count(root_id, -sum(1 for row in rows if row[1] == VISIBLE_STATUS))
+    # 每日统计按评论发表的日期扣除
+    subtract_stats("comment_count", [(row[2], row[3]) for row in rows])
+    return deleted
+
+
 # ================================
 # 3. 对评论进行点赞 / 举报 
 # ================================
@@ -134,7 +198,9 @@ def action_comment(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
 
     comment_id = data.get("comment_id")
@@ -144,17 +210,20 @@ def action_comment(request):
         return json_cn({"error": "参数缺失"}, 400)
 
     if action == 'like':
-        # 只能直接增加计数
-        sql = "UPDATE Comment SET like_count = like_count + 1 WHERE comment_id = %s"
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [comment_id])
+        # 每个用户只能点赞一次，点赞数由后台批量写入 (详情页缓存也在写入后失效)
+        if not target_exists("comment", comment_id):
+            return json_cn({"error": "评论不存在"}, 404)
+
+        result = add_like(current_user_id, "comment", comment_id)
+        if result is False:
+            return json_cn({"error": "已经点过赞了"}, 400)
+        if result is None:
+            return json_cn({"error": "服务器繁忙，请稍后再试"}, 503)
         return json_cn({"message": "点赞成功"})
 
     elif action == 'report':
-        # 举报：将状态改为 '举报中'
-        sql = "UPDATE Comment SET status = '举报中' WHERE comment_id = %s"
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [comment_id])
+        # 举报：将状态改为 '举报中' (不再计入楼层回复数)
+        set_comment_status(comment_id, '举报中')
         return json_cn({"message": "举报成功，等待管理员审核"})
 
     else:
@@ -183,6 +252,7 @@ def get_comments_by_target(request):
           SELECT c.comment_id, \
                  c.content, \
                  c.like_count, \
+                 c.reply_count, \
                  c.comment_time, \
                  c.user_id,
                  u.user_name, \
@@ -203,6 +273,7 @@ def get_comments_by_target(request):
     with connection.cursor() as cursor:
         cursor.execute(sql, [target_type, target_id])
         comments = dictfetchall(cursor)
+    merge_pending_likes("comment", comments, "comment_id")
 
     return json_cn({"comments": comments, "count": len(comments)})
 
@@ -256,6 +327,7 @@ def get_comment_detail(request):
                       """
         cursor.execute(sql_replies, [comment_id])
         replies = dictfetchall(cursor)
+    merge_pending_likes("comment", main_rows + replies, "comment_id")
 
     return json_cn({
         "comment": main_comment,
@@ -271,9 +343,9 @@ def get_my_comments(request):
         return json_cn({"error": "GET required"}, 400)
 
     # 登录验证需要 session，GET请求也能读 session
-    current_user_id = request.session.get("user_id")
-    if not current_user_id:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 401)
+    current_user_id = request.current_user.user_id
 
     sql = """
           SELECT comment_id, target_type, target_id, content, like_count, comment_time, status
@@ -282,11 +354,13 @@ def get_my_comments(request):
           ORDER BY comment_time DESC \
           """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [current_user_id])
-        comments = dictfetchall(cursor)
+    columns = ["comment_id", "target_type", "target_id", "content", "like_count", "comment_time", "status"]
+
+    def build_comments(rows):
+        return merge_pending_likes("comment", [dict(zip(columns, row)) for row in rows], "comment_id")
 
-    return json_cn({"my_comments": comments})
+    # 流式输出，评论很多时不必一次读出全部
+    return json_stream({"my_comments": JSONArray(map(build_comments, fetch_batches(sql, [current_user_id])))})
 
 
 # ================================
@@ -345,13 +419,13 @@ def list_comment(request):
     # --------------------------
     # 1. 必须登录
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录再查看评论"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
-    # 2. 获取歌曲的评论
+    # 2. 歌曲、专辑、歌单评论的查询
     # --------------------------
     sql_song = """
         SELECT 
@@ -366,15 +440,6 @@ def list_comment(request):
         ORDER BY c.comment_time DESC
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_song, [uid])
-        songs = cursor.fetchall()
-
-    song_count = len(songs)
-
-    # --------------------------
-    # 3. 获取专辑的评论
-    # --------------------------
     sql_album = """
         SELECT 
             a.album_id,
@@ -388,15 +453,6 @@ def list_comment(request):
         ORDER BY c.comment_time DESC
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_album, [uid])
-        albums = cursor.fetchall()
-
-    album_count = len(albums)
-
-    # --------------------------
-    # 4. 获取歌单的评论
-    # --------------------------
     sql_songlist = """
         SELECT 
             sl.songlist_id,
@@ -410,63 +466,38 @@ def list_comment(request):
         ORDER BY c.comment_time DESC
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_songlist, [uid])
-        songlists = cursor.fetchall()
-
-    songlist_count = len(songlists)
-
     # --------------------------
-    # 5. 格式化返回数据
+    # 3. 格式化每批数据 (三类评论格式相同，只有对象编号的字段名不同)
     # --------------------------
-
-    # ---------- 歌曲评论 ----------
-    song_comments = []
-    for song_id, comment_id, content, like_count, comment_time in songs:
-        song_comments.append({
-            "song_id": song_id,
-            "comment_id": comment_id,
-            "content": content,
-            "like_count": like_count,
-            "comment_time": comment_time.strftime("%Y-%m-%d %H:%M") if comment_time else None
-        })
-
-    # ---------- 专辑评论 ----------
-    album_comments = []
-    for album_id, comment_id, content, like_count, comment_time in albums:
-        album_comments.append({
-            "album_id": album_id,
-            "comment_id": comment_id,
-            "content": content,
-            "like_count": like_count,
-            "comment_time": comment_time.strftime("%Y-%m-%d %H:%M") if comment_time else None
-        })
-
-    # ---------- 歌单评论 ----------
-    songlist_comments = []
-    for songlist_id, comment_id, content, like_count, comment_time in songlists:
-        songlist_comments.append({
-            "songlist_id": songlist_id,
-            "comment_id": comment_id,
-            "content": content,
-            "like_count": like_count,
-            "comment_time": comment_time.strftime("%Y-%m-%d %H:%M") if comment_time else None
-        })
-
-    # ---------- 返回 ----------
-    return json_cn({
+    def comments_array(sql, id_key):
+        def build(rows):
+            return [{
+                id_key: target_id,
+                "comment_id": comment_id,
+                "content": content,
+                "like_count": like_count,
+                "comment_time": comment_time.strftime("%Y-%m-%d %H:%M") if comment_time else None
+            } for target_id, comment_id, content, like_count, comment_time in rows]
+        return JSONArray(map(build, fetch_batches(sql, [uid])))
+
+    song_comments = comments_array(sql_song, "song_id")
+    album_comments = comments_array(sql_album, "album_id")
+    songlist_comments = comments_array(sql_songlist, "songlist_id")
+
+    # ---------- 返回 (流式输出，条数在列表之后输出) ----------
+    return json_stream({
         "user_id": uid,
         "songs": {
-            "count": song_count,
-            "comments": song_comments
+            "comments": song_comments,
+            "count": lambda: song_comments.count
         },
         "albums": {
-            "count": album_count,
-            "comments": album_comments
+            "comments": album_comments,
+            "count": lambda: album_comments.count
         },
         "songlists": {
-            "count": songlist_count,
-            "comments": songlist_comments
+            "comments": songlist_comments,
+            "count": lambda: songlist_comments.count
         }
     })
 
@@ -476,10 +507,10 @@ def list_comment(request):
 @csrf_exempt
 def report_comment(request):
 
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录再查看评论"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # 1. 获取参数
     data = json.loads(request.body)
@@ -491,12 +522,197 @@ def report_comment(request):
 
     # 2. 执行举报
     # 逻辑：不管它之前是什么状态，只要有人举报，就改为 '举报中'，等待管理员处理
-    sql = "UPDATE Comment SET status = '举报中' WHERE comment_id = %s"
-
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [comment_id])
+    set_comment_status(comment_id, '举报中')
 
     # 虽然 SystemLog 主要记管理员操作，但这里也可以借用一下
     # add_system_log(f"用户举报评论: {reason}", "Comment", comment_id, "success")
 
-    return json_cn({"message": "举报成功，我们将尽快处理"})
\ No newline at end of file
+    return json_cn({"message": "举报成功，我们将尽快处理"})
+
+# ================================
+# 10. 评论楼层列表 (一级评论 + 每个楼层的前几条回复)
+# ================================
+# 固定两次查询：一页一级评论 + 这些楼层的前 reply_limit 条回复 (按时间正序)
+# 一级评论支持按热度(hot)或时间(time)排序，均使用游标分页
+# 楼层中剩余的回复通过 get_thread_replies 继续加载
+DEFAULT_REPLY_LIMIT = 3
+MAX_REPLY_LIMIT = 20
+
+
+def _thread_cursor(root_id, reply):
+    "楼层内回复的游标：按 (comment_time, comment_id) 正序"
+    return encode_cursor(f"thread:{root_id}", [reply["comment_time"], reply["comment_id"]])
+
+
+def get_comment_tree(request):
+    if request.method != "GET":
+        return json_cn({"error": "GET required"}, 400)
+
+    target_type = request.GET.get("target_type")
+    target_id = request.GET.get("target_id")
+    sort_by = request.GET.get("sort_by", "time")  # 'time' or 'hot'
+
+    if not target_type or not target_id:
+        return json_cn({"error": "参数缺失"}, 400)
+
+    try:
+        reply_limit = int(request.GET.get("reply_limit", DEFAULT_REPLY_LIMIT))
+    except ValueError:
+        reply_limit = DEFAULT_REPLY_LIMIT
+    reply_limit = max(0, min(reply_limit, MAX_REPLY_LIMIT))
+
+    if sort_by == 'hot':
+        sort_expr = "c.like_count"
+    else:
+        sort_by = 'time'
+        sort_expr = "c.comment_time"
+
+    page_size = get_page_size(request.GET)
+    order_key = f"{sort_by}:DESC"
+    try:
+        cursor_values = decode_cursor(request.GET.get("cursor"), order_key)
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
+
+    filters = ["c.target_type = %s", "c.target_id = %s", "c.parent_id IS NULL", "c.status = %s"]
+    params = [target_type, target_id, VISIBLE_STATUS]
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter(sort_expr, "c.comment_id", "DESC", cursor_values)
+        filters.append(keyset_sql)
+        params.extend(keyset_params)
+
+    # 1. 一页一级评论
+    sql = f"""
+          SELECT c.comment_id,
+                 c.content,
+                 c.like_count,
+                 c.reply_count,
+                 c.comment_time,
+                 c.user_id,
+                 u.user_name,
+                 u.profile,
+                 {sort_expr} AS sort_key
+          FROM Comment c
+                   JOIN User u ON c.user_id = u.user_id
+          WHERE {" AND ".join(filters)}
+          ORDER BY sort_key DESC, c.comment_id DESC
+          LIMIT %s
+          """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [page_size + 1])
+        rows = dictfetchall(cursor)
+
+    comments, next_cursor = paginate_rows(rows, page_size, order_key,
+                                          lambda row: [row["sort_key"], row["comment_id"]])
+    merge_pending_likes("comment", comments, "comment_id")
+
+    # 2. 这些楼层的前 reply_limit 条回复
+    replies_by_root = {}
+    root_ids = [c["comment_id"] for c in comments if c["reply_count"] > 0]
+    if root_ids and reply_limit:
+        placeholders = ", ".join(["%s"] * len(root_ids))
+        sql_replies = f"""
+              SELECT *
+              FROM (SELECT c.comment_id,
+                           c.root_id,
+                           c.parent_id,
+                           c.content,
+                           c.like_count,
+                           c.comment_time,
+                           c.user_id,
+                           u.user_name,
+                           pu.user_name AS reply_to_user_name,
+                           ROW_NUMBER() OVER (PARTITION BY c.root_id ORDER BY c.comment_time, c.comment_id) AS rn
+                    FROM Comment c
+                             JOIN User u ON c.user_id = u.user_id
+                             LEFT JOIN Comment p ON c.parent_id = p.comment_id
+                             LEFT JOIN User pu ON p.user_id = pu.user_id
+                    WHERE c.root_id IN ({placeholders})
+                      AND c.status = %s) t
+              WHERE rn <= %s
+              ORDER BY root_id, rn
+              """
+        with connection.cursor() as cursor:
+            cursor.execute(sql_replies, root_ids + [VISIBLE_STATUS, reply_limit])
+            for reply in dictfetchall(cursor):
+                reply.pop("rn")
+                replies_by_root.setdefault(reply["root_id"], []).append(reply)
+            merge_pending_likes("comment", [r for rs in replies_by_root.values() for r in rs], "comment_id")
+
+    for comment in comments:
+        comment.pop("sort_key")
+        replies = replies_by_root.get(comment["comment_id"], [])
+        comment["replies"] = replies
+        comment["replies_cursor"] = (
+            _thread_cursor(comment["comment_id"], replies[-1])
+            if replies and comment["reply_count"] > len(replies) else None
+        )
+
+    return json_cn({
+        "comments": comments,
+        "count": len(comments),
+        "next_cursor": next_cursor
+    })
+
+
+# ================================
+# 11. 加载楼层中的更多回复
+# ================================
+# 楼层内所有层级的回复按时间正序平铺，reply_to_user_name 为被回复的用户
+def get_thread_replies(request):
+    if request.method != "GET":
+        return json_cn({"error": "GET required"}, 400)
+
+    try:
+        root_id = int(request.GET.get("root_id"))
+    except (TypeError, ValueError):
+        return json_cn({"error": "未检测到评论ID"}, 400)
+
+    page_size = get_page_size(request.GET)
+    try:
+        cursor_values = decode_cursor(request.GET.get("cursor"), f"thread:{root_id}")
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
+
+    filters = ["c.root_id = %s", "c.status = %s"]
+    params = [root_id, VISIBLE_STATUS]
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter("c.comment_time", "c.comment_id", "ASC", cursor_values)
+        filters.append(keyset_sql)
+        params.extend(keyset_params)
+
+    sql = f"""
+          SELECT c.comment_id,
+                 c.root_id,
+                 c.parent_id,
+                 c.content,
+                 c.like_count,
+                 c.comment_time,
+                 c.user_id,
+                 u.user_name,
+                 pu.user_name AS reply_to_user_name
+          FROM Comment c
+                   JOIN User u ON c.user_id = u.user_id
+                   LEFT JOIN Comment p ON c.parent_id = p.comment_id
+                   LEFT JOIN User pu ON p.user_id = pu.user_id
+          WHERE {" AND ".join(filters)}
+          ORDER BY c.comment_time ASC, c.comment_id ASC
+          LIMIT %s
+          """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [page_size + 1])
+        rows = dictfetchall(cursor)
+    merge_pending_likes("comment", rows, "comment_id")
+
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = _thread_cursor(root_id, rows[-1])
+    else:
+        next_cursor = None
+
+    return json_cn({
+        "root_id": root_id,
+        "replies": rows,
+        "count": len(rows),
+        "next_cursor": next_cursor
+    })
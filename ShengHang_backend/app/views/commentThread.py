@@ -0,0 +1,122 @@
+# 评论楼层模块
+# 回复按 "楼层" 组织：每条回复记录所在楼层的一级评论 root_id (一级评论的 root_id 为 NULL)，
+# 一级评论的 reply_count 记录楼层内状态为 '正常' 的回复数 (任意深度)
+#   - 加载整个楼层只需 WHERE root_id = ?，不需要递归
+#   - 楼层回复数直接读 reply_count，不需要 COUNT
+#
+# 评论变为 / 不再是 '正常' 状态 (审核通过、举报、删除) 时调用 change_reply_count 更新楼层计数；
+# 注销账号等级联删除不会回退计数，可运行
+#   python manage.py rebuild_comment_threads
+# 重新计算 root_id 和 reply_count
+from django.db import connection, transaction
+
+
+VISIBLE_STATUS = '正常'
+
+
+def get_thread_info(comment_id):
+    "返回 (root_id, status, target_type, target_id)，root_id 为 NULL 表示一级评论；评论不存在返回 None"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT root_id, status, target_type, target_id FROM Comment WHERE comment_id = %s",
+            [comment_id]
+        )
+        return cursor.fetchone()
+
+
+def change_reply_count(root_id, delta):
+    "增减楼层的回复数，root_id 为 None (一级评论本身) 时不做任何事"
+    if root_id is None or not delta:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE Comment SET reply_count = reply_count + %s WHERE comment_id = %s",
+            [delta, root_id]
+        )
+
+
+def set_comment_status(comment_id, status):
+    """
+    修改评论状态，并按可见性的变化更新楼层回复数
+    返回 (root_id, 原状态, target_type, target_id)，评论不存在返回 None
+    """
+    with transaction.atomic():
+        info = get_thread_info(comment_id)
+        if info is None:
+            return None
+        root_id, old_status = info[0], info[1]
+
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE Comment SET status = %s WHERE comment_id = %s", [status, comment_id])
+
+        delta = (status == VISIBLE_STATUS) - (old_status == VISIBLE_STATUS)
+        change_reply_count(root_id, delta)
+    return info
+
+
+# ================================
+# 从 parent_id 重新计算
+# ================================
+def rebuild(batch_size=1000):
+    """
+    按 parent_id 逐层重新计算 root_id，再重新统计一级评论的 reply_count
+    返回 (一级评论数, 回复数)
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE Comment SET root_id = NULL, reply_count = 0")
+
+            # 第一层：直接回复一级评论的
+            cursor.execute("SELECT COUNT(*) FROM Comment WHERE parent_id IS NULL")
+            roots = cursor.fetchone()[0]
+            cursor.execute("""
+                UPDATE Comment SET root_id = parent_id
+                WHERE parent_id IN (SELECT comment_id FROM (
+                    SELECT comment_id FROM Comment WHERE parent_id IS NULL
+                ) AS r)
+            """)
+
+            # 之后每一层继承父评论的 root_id，直到没有新的行被更新
+            # (父评论已被删除的孤立回复保持 root_id 为 NULL，不会出现在任何楼层中)
+            replies = cursor.rowcount
+            while True:
+                cursor.execute("""
+                    SELECT c.comment_id, p.root_id
+                    FROM Comment c
+                             JOIN Comment p ON c.parent_id = p.comment_id
+                    WHERE c.root_id IS NULL
+                      AND p.root_id IS NOT NULL
+                """)
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    cases = " ".join(["WHEN %s THEN %s"] * len(batch))
+                    placeholders = ", ".join(["%s"] * len(batch))
+                    cursor.execute(
+                        f"UPDATE Comment SET root_id = CASE comment_id {cases} END "
+                        f"WHERE comment_id IN ({placeholders})",
+                        [value for row in batch for value in row] + [row[0] for row in batch]
+                    )
+                replies += len(rows)
+
+            cursor.execute("""
+                SELECT root_id, COUNT(*)
+                FROM Comment
+                WHERE root_id IS NOT NULL
+                  AND status = %s
+                GROUP BY root_id
+            """, [VISIBLE_STATUS])
+            counts = cursor.fetchall()
+            for start in range(0, len(counts), batch_size):
+                batch = counts[start:start + batch_size]
+                cases = " ".join(["WHEN %s THEN %s"] * len(batch))
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(
+                    f"UPDATE Comment SET reply_count = CASE comment_id {cases} END "
+                    f"WHERE comment_id IN ({placeholders})",
+                    [value for row in batch for value in row] + [row[0] for row in batch]
+                )
+
+    return roots, replies
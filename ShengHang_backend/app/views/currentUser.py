@@ -0,0 +1,110 @@
+# 当前登录用户
+# current_user_middleware 在每个请求开始时解析一次当前用户 (编号、用户名、状态、角色、可见性)，
+# 放在 request.current_user 中 (未登录为 None)，视图不再各自读取会话和查询 User 表
+#   - 用户信息缓存 TIMEOUT 秒，封禁、修改可见性、注销账号时调用 invalidate_user 主动失效
+#   - 已封禁或已注销的用户在进入视图之前清除会话，封禁的用户返回 403
+#   - 使用进程内 lru 缓存时只能失效本进程的条目，其他 worker 最多 TIMEOUT 秒后读到新状态；
+#     需要立即生效时把 BACKEND 改为 django 并把 CACHES 中 ALIAS 对应的缓存配置为多进程共享的缓存
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .cache import create_backend
+
+
+logger = logging.getLogger(__name__)
+
+
+ADMIN_USER_ID = 1  # 可以改成实际管理员 id
+
+BANNED_STATUS = "封禁中"
+
+ROLE_ADMIN = "admin"
+ROLE_USER = "user"
+
+
+class CurrentUser:
+    "当前登录用户，只包含权限判断需要的字段"
+
+    __slots__ = ("user_id", "user_name", "status", "visibility")
+
+    def __init__(self, user_id, user_name, status, visibility):
+        self.user_id = user_id
+        self.user_name = user_name
+        self.status = status
+        self.visibility = visibility
+
+    @property
+    def role(self):
+        return ROLE_ADMIN if self.user_id == ADMIN_USER_ID else ROLE_USER
+
+    @property
+    def is_admin(self):
+        return self.role == ROLE_ADMIN
+
+    @property
+    def is_banned(self):
+        return self.status == BANNED_STATUS
+
+
+# ================================
+# 缓存
+# ================================
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+def get_user_cache():
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                config = dict({"MAX_ENTRIES": 10000, "TIMEOUT": 60}, **getattr(settings, "CURRENT_USER_CACHE", {}))
+                _user_cache = create_backend(config)
+    return _user_cache
+
+
+def _cache_key(user_id):
+    return f"current_user:{user_id}"
+
+
+def load_user(user_id):
+    "读取用户信息 (优先读缓存)，用户不存在时返回 None"
+    cache = get_user_cache()
+    row = cache.get(_cache_key(user_id))
+    if row is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT user_id, user_name, status, visibility FROM User WHERE user_id = %s", [user_id])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        row = tuple(row)
+        cache.set(_cache_key(user_id), row)
+    return CurrentUser(*row)
+
+
+def invalidate_user(*user_ids):
+    "用户状态、可见性等被修改或用户被删除后调用"
+    try:
+        get_user_cache().delete_many([_cache_key(user_id) for user_id in user_ids if user_id is not None])
+    except Exception:
+        # 失效失败不影响主业务流程，条目会在 TIMEOUT 后过期
+        logger.exception("用户缓存失效失败")
+
+
+# ================================
+# 视图中使用
+# ================================
+def get_current_user(request):
+    "当前登录用户，未登录时返回 None (没有经过 current_user_middleware 的请求在这里解析)"
+    if not hasattr(request, "current_user"):
+        user_id = request.session.get("user_id")
+        request.current_user = load_user(user_id) if user_id else None
+    return request.current_user
+
+
+def current_user_id(request):
+    "当前登录用户的编号，未登录时返回 None"
+    user = get_current_user(request)
+    return user.user_id if user else None
@@ -0,0 +1,217 @@
+# 每日统计汇总模块
+# 管理员统计、听歌报告、活跃趋势等接口原本直接对 PlayHistory/Comment/Favorite 原始记录
+# 按天 GROUP BY，数据越多越慢。这里维护两张按天汇总的表，统计接口只需读取 O(天数) 行：
+#   - DailyStats:     每天的全站 播放次数/播放时长/评论/收藏/新建歌单/新增用户
+#   - UserDailyStats: 每个用户每天的 播放次数/播放时长/评论/收藏/新建歌单
+#
+# 写入播放、评论、收藏、歌单、注册时由对应视图调用 add_* 增量更新；
+# 删除评论、取消收藏、删除歌单、注销账号时调用 subtract_* 按原记录所在的日期扣除。
+# 日期一律使用数据库的时钟 (与记录中的 NOW() / CURRENT_TIMESTAMP 相同)，见 db_today。
+# 其他级联删除 (如删除歌曲) 不会回退计数，可定期运行
+#   python manage.py rebuild_daily_stats --days 7
+# 从原始记录重新计算最近几天的汇总 (首次部署时使用 --all 回填历史数据)
+import datetime
+import logging
+
+from django.db import connection, transaction
+
+from .tools import upsert_counter_sql
+
+
+logger = logging.getLogger(__name__)
+
+
+# 两张表共有的计数字段
+USER_COUNTERS = ("play_count", "play_duration", "comment_count", "favorite_count", "songlist_count")
+DAILY_COUNTERS = USER_COUNTERS + ("new_user_count",)
+
+
+def add_stats(rows):
+    """
+    增量更新汇总表
+    :param rows: {(user_id, stat_date): {"play_count": 1, ...}}
+                 user_id 为 None 时只更新全站汇总 (如新增用户)
+    """
+    if not rows:
+        return
+
+    daily = {}
+    user_rows = []
+    for (user_id, stat_date), deltas in rows.items():
+        total = daily.setdefault(stat_date, dict.fromkeys(DAILY_COUNTERS, 0))
+        for counter, delta in deltas.items():
+            total[counter] += delta
+        if user_id is not None:
+            user_rows.append([user_id, stat_date] + [deltas.get(c, 0) for c in USER_COUNTERS])
+
+    daily_rows = [[stat_date] + [total[c] for c in DAILY_COUNTERS] for stat_date, total in sorted(daily.items())]
+
+    # 按主键顺序写入，多个 worker 并发更新时加锁顺序一致
+    user_rows.sort(key=lambda row: (row[0], row[1]))
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                upsert_counter_sql("DailyStats", ["stat_date"], DAILY_COUNTERS, len(daily_rows)),
+                [value for row in daily_rows for value in row]
+            )
+            if user_rows:
+                cursor.execute(
+                    upsert_counter_sql("UserDailyStats", ["user_id", "stat_date"], USER_COUNTERS, len(user_rows)),
+                    [value for row in user_rows for value in row]
+                )
+
+
+def db_today():
+    "数据库时钟的当前日期，统计接口的 \"今天\" 与记录的日期使用同一个时钟"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT CURRENT_DATE")
+        return _to_date(cursor.fetchone()[0])
+
+
+def add_user_stat(user_id, counter, delta=1):
+    "单个计数增量更新 (评论、收藏、建歌单、注册)，计入数据库的当天，失败不影响主业务流程"
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # 统计日期直接写 CURRENT_DATE，不需要先查询数据库的日期
+                cursor.execute(
+                    upsert_counter_sql("DailyStats", ["stat_date"], DAILY_COUNTERS, 1,
+                                       ["CURRENT_DATE"] + ["%s"] * len(DAILY_COUNTERS)),
+                    [delta if c == counter else 0 for c in DAILY_COUNTERS]
+                )
+                if user_id is not None:
+                    cursor.execute(
+                        upsert_counter_sql("UserDailyStats", ["user_id", "stat_date"], USER_COUNTERS, 1,
+                                           ["%s", "CURRENT_DATE"] + ["%s"] * len(USER_COUNTERS)),
+                        [user_id] + [delta if c == counter else 0 for c in USER_COUNTERS]
+                    )
+    except Exception:
+        logger.exception("每日统计更新失败")
+
+
+def subtract_stats(counter, records):
+    """
+    删除原始记录时从汇总中扣除，计入记录创建的那一天 (与 rebuild 的结果一致)，失败不影响主业务流程
+    :param records: [(user_id, 记录时间), ...]
+    """
+    rows = {}
+    for user_id, created_at in records:
+        row = rows.setdefault((user_id, _to_date(created_at)), {counter: 0})
+        row[counter] -= 1
+    try:
+        add_stats(rows)
+    except Exception:
+        logger.exception("每日统计更新失败")
+
+
+def subtract_user(user_id):
+    """
+    注销账号前调用：从全站汇总中扣除该用户的所有记录 (用户汇总随账号级联删除)
+    """
+    rows = {}
+    try:
+        with connection.cursor() as cursor:
+            for counter, table, time_column, aggregate in SOURCES:
+                cursor.execute(f"""
+                    SELECT DATE({time_column}), {aggregate}
+                    FROM {table}
+                    WHERE user_id = %s
+                    GROUP BY DATE({time_column})
+                """, [user_id])
+                for stat_date, value in cursor.fetchall():
+                    row = rows.setdefault((None, _to_date(stat_date)), {})
+                    row[counter] = row.get(counter, 0) - int(value or 0)
+        add_stats(rows)
+    except Exception:
+        logger.exception("每日统计更新失败")
+
+
+# ================================
+# 从原始记录重新计算
+# ================================
+# (计数字段, 原始表, 时间字段, 聚合表达式)
+SOURCES = [
+    ("play_count",     "PlayHistory", "play_time",     "COUNT(*)"),
+    ("play_duration",  "PlayHistory", "play_time",     "COALESCE(SUM(play_duration), 0)"),
+    # 已归档的播放记录 (见 archive.py)，同一计数的多个来源累加
+    ("play_count",     "PlayHistoryArchive", "play_time", "COUNT(*)"),
+    ("play_duration",  "PlayHistoryArchive", "play_time", "COALESCE(SUM(play_duration), 0)"),
+    ("comment_count",  "Comment",     "comment_time",  "COUNT(*)"),
+    ("favorite_count", "Favorite",    "favorite_time", "COUNT(*)"),
+    ("songlist_count", "Songlist",    "create_time",   "COUNT(*)"),
+    ("new_user_count", "User",        "register_time", "COUNT(*)"),
+]
+
+
+def _to_date(value):
+    # MySQL 返回 date / datetime，SQLite 返回字符串
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def rebuild(start_date, end_date, batch_size=1000):
+    """
+    用原始记录重新计算 [start_date, end_date] 内的汇总数据 (闭区间)
+    返回写入的 (全站汇总行数, 用户汇总行数)
+    """
+    start_dt = f"{start_date} 00:00:00"
+    end_dt = f"{end_date} 23:59:59.999999"
+
+    daily = {}
+    per_user = {}
+    with connection.cursor() as cursor:
+        for counter, table, time_column, aggregate in SOURCES:
+            user_column = "user_id" if counter in USER_COUNTERS else "NULL"
+            cursor.execute(f"""
+                SELECT {user_column}, DATE({time_column}), {aggregate}
+                FROM {table}
+                WHERE {time_column} BETWEEN %s AND %s
+                GROUP BY {user_column}, DATE({time_column})
+            """, [start_dt, end_dt])
+
+            for user_id, stat_date, value in cursor.fetchall():
+                stat_date = _to_date(stat_date)
+                value = int(value or 0)
+                total = daily.setdefault(stat_date, dict.fromkeys(DAILY_COUNTERS, 0))
+                total[counter] += value
+                if user_id is not None:
+                    row = per_user.setdefault((user_id, stat_date), dict.fromkeys(USER_COUNTERS, 0))
+                    row[counter] += value
+
+    daily_rows = [[d] + [total[c] for c in DAILY_COUNTERS] for d, total in sorted(daily.items())]
+    user_rows = [[u, d] + [row[c] for c in USER_COUNTERS] for (u, d), row in sorted(per_user.items())]
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM DailyStats WHERE stat_date BETWEEN %s AND %s", [start_date, end_date])
+            cursor.execute("DELETE FROM UserDailyStats WHERE stat_date BETWEEN %s AND %s", [start_date, end_date])
+
+            for table, columns, rows in [
+                ("DailyStats", ["stat_date"] + list(DAILY_COUNTERS), daily_rows),
+                ("UserDailyStats", ["user_id", "stat_date"] + list(USER_COUNTERS), user_rows),
+            ]:
+                for start in range(0, len(rows), batch_size):
+                    batch = rows[start:start + batch_size]
+                    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(batch))
+                    cursor.execute(
+                        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders}",
+                        [value for row in batch for value in row]
+                    )
+
+    return len(daily_rows), len(user_rows)
+
+
+def earliest_date():
+    "原始记录中最早的日期，用于 --all 回填"
+    dates = []
+    with connection.cursor() as cursor:
+        for _, table, time_column, _ in SOURCES:
+            cursor.execute(f"SELECT MIN({time_column}) FROM {table}")
+            value = cursor.fetchone()[0]
+            if value:
+                dates.append(_to_date(value))
+    return min(dates) if dates else None
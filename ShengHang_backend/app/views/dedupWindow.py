@@ -0,0 +1,154 @@
+# 播放防刷时间窗口
+# 记录每个 (user_id, song_id) 最近一次有效播放的时间，保留 window 秒，
+# record_play 的 "60 秒内是否播放过" 检查直接查窗口，不再每次查询 PlayHistory
+#   - local: 进程内有界字典 (单 worker 部署)
+#   - django: 使用 Django 缓存框架 (多 worker 部署时配置为共享缓存)
+#   - auto (默认): ALIAS 对应的缓存在进程间共享时使用 django，否则使用 local
+#
+# 窗口未命中时，只有在 "窗口可信" 的情况下才能直接判定为没有播放过：
+#   - 窗口建立已超过 window 秒 (进程重启/缓存清空后的前 window 秒内不可信)
+#   - 最近 window 秒内没有因容量不足淘汰过未过期的条目
+# 否则回退查询数据库
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache import is_shared_cache
+
+
+class LocalDedupStore:
+    "进程内有界字典，按写入顺序淘汰"
+
+    def __init__(self, window, max_entries=100000):
+        self.window = window
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()    # key -> (写入时间戳, 播放时间)
+        self.started_at = time.time()
+        self.evicted_at = None          # 最近一次淘汰未过期条目的时间
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+        if item is None or item[0] < time.time() - self.window:
+            return None
+        return item[1]
+
+    def set(self, key, played_at):
+        with self.lock:
+            now = time.time()
+            self.entries.pop(key, None)
+            self.entries[key] = (now, played_at)
+
+            # 先清理过期条目 (按写入顺序，最旧的在前)
+            while self.entries:
+                oldest_key, (stored_at, _) = next(iter(self.entries.items()))
+                if stored_at >= now - self.window:
+                    break
+                del self.entries[oldest_key]
+
+            # 仍超出容量时淘汰最旧的条目，此后 window 秒内的未命中不可信
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evicted_at = time.time()
+
+    def trusted(self, now):
+        if now - self.started_at < self.window:
+            return False
+        return self.evicted_at is None or now - self.evicted_at >= self.window
+
+
+class DjangoDedupStore:
+    "基于 Django 缓存的窗口，多个 worker 共享"
+
+    def __init__(self, window, alias="default"):
+        self.window = window
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def _key(self, key):
+        user_id, song_id = key
+        return f"play_dedup:{user_id}:{song_id}"
+
+    def get(self, key):
+        return self.backend.get(self._key(key))
+
+    def set(self, key, played_at):
+        self.backend.set(self._key(key), played_at, self.window)
+
+    def trusted(self, now):
+        # 缓存被清空或重启后起始时间会重新写入
+        started_at = self.backend.get("play_dedup:started_at")
+        if started_at is None:
+            self.backend.add("play_dedup:started_at", now, None)
+            return False
+        return now - started_at >= self.window
+
+
+def _key(user_id, song_id):
+    # 统一为整数，客户端传入 "5" 和 5 时落在同一个 key 上，不能借此绕过防刷
+    return int(user_id), int(song_id)
+
+
+class DedupWindow:
+
+    def __init__(self, store, window=60):
+        self.store = store
+        self.window = window
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def last_play(self, user_id, song_id, db_lookup):
+        """
+        返回最近一次播放的时间，窗口内没有记录时返回 None
+        :param db_lookup: 窗口不可信时调用，查询数据库中最近一次播放的时间
+        """
+        now = time.time()
+        played_at = self.store.get(_key(user_id, song_id))
+        if played_at is not None or self.store.trusted(now):
+            self._count(hit=True)
+            return played_at
+
+        self._count(hit=False)
+        return db_lookup()
+
+    def record(self, user_id, song_id, played_at):
+        self.store.set(_key(user_id, song_id), played_at)
+
+    def _count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+            }
+
+
+def create_dedup_window(window=60):
+    config = getattr(settings, "PLAY_DEDUP_WINDOW", {})
+    backend = config.get("BACKEND", "auto")
+    alias = config.get("ALIAS", "default")
+    if backend == "auto":
+        # 进程内窗口在多 worker 部署下各自独立，同一用户的请求落到不同 worker 时防刷失效
+        backend = "django" if is_shared_cache(alias) else "local"
+
+    if backend == "django":
+        store = DjangoDedupStore(window, alias)
+    else:
+        store = LocalDedupStore(window, config.get("MAX_ENTRIES", 100000))
+    return DedupWindow(store, window)
@@ -1,9 +1,19 @@
 # 收藏与歌单模块
 
-from django.db import connection
+from django.db import connection, transaction
 from django.views.decorators.csrf import csrf_exempt
 import json
 from .tools import *
+from . import searchIndex
+from .searchIndex import search_filter
+from .cache import get_profile_cache, invalidate_profile, load_profile_version, aload_profile_version
+from .profileVersion import not_modified, add_validators
+from .dailyStats import add_user_stat, subtract_stats
+from .leaderboard import change_favorite_counts
+from .asyncQuery import run_queries, arun, arun_queries, async_csrf_exempt
+from .jsonStream import JSONArray, fetch_batches, json_stream
+from .likeCounter import (add_like, target_exists, merge_pending_likes, merge_profile_likes, pending_generation,
+                          delete_like_records)
 
 
 # ================================
@@ -14,10 +24,10 @@ def list_songlists(request):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录后再查看歌单"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
     # 2. 解析筛选参数
@@ -69,6 +79,7 @@ def list_songlists(request):
             "like_count": likes,
             "is_public": bool(public)
         })
+    merge_pending_likes("songlist", songlists, "songlist_id")
 
     return json_cn({
         "user_id": uid,
@@ -84,10 +95,10 @@ def create_songlist(request):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录后再创建歌单"}, 403)
     
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -136,6 +147,10 @@ def create_songlist(request):
 
     with connection.cursor() as cursor:
         cursor.execute(sql, [uid, songlist_title, description, is_public, cover_url])
+        new_songlist_id = cursor.lastrowid
+
+    searchIndex.index_entity("songlist", new_songlist_id, songlist_title)
+    add_user_stat(uid, "songlist_count")
 
     return json_cn({
         "message": f"成功创建歌单：{songlist_title}"
@@ -150,10 +165,10 @@ def edit_songlist(request, songlist_id):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录后再编辑歌单"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
     # 2. 查询歌单是否存在 + 权限检查
@@ -226,6 +241,9 @@ def edit_songlist(request, songlist_id):
             songlist_title, description, is_public, cover_url, songlist_id
         ])
 
+    searchIndex.index_entity("songlist", songlist_id, songlist_title)
+    invalidate_profile("songlist", songlist_id)
+
     return json_cn({
         "message": f"歌单修改成功：{songlist_title}",
         "songlist_id": songlist_id
@@ -235,59 +253,98 @@ def edit_songlist(request, songlist_id):
 # ================================
 # 4. 歌单详情
 # ================================
-@csrf_exempt
-def songlist_profile(request, songlist_id):
-    # --------------------------
-    # 1. 检查登录状态
-    # --------------------------
-    if "user_id" not in request.session:
-        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+# 歌单详情中直接返回的歌曲数，其余歌曲通过 sort_songlist 的 next_cursor 分页获取
+SONGLIST_PAGE_SIZE = MAX_PAGE_SIZE
+
+# 歌单歌曲的排序方式 (白名单，避免 SQL 注入)，均为倒序，相同时按 song_id 倒序
+SONGLIST_SORT_EXPRS = {
+    "add_time": "ss.add_time",
+    "duration": "s.duration",
+    "play_count": "s.play_count",
+}
+
+# 歌单的歌曲数和总时长，在数据库中计算
+SQL_SONGLIST_TOTALS = """
+    SELECT COUNT(*), IFNULL(SUM(s.duration), 0)
+    FROM Songlist_Song ss
+    JOIN Song s ON ss.song_id = s.song_id
+    JOIN Album a ON s.album_id = a.album_id
+    WHERE ss.songlist_id = %s
+"""
+
+
+def songlist_songs_query(songlist_id, sort, page_size, cursor_values=None):
+    """
+    歌单中一页歌曲的查询，每首歌一行 (歌手单独查询，不与 Song_Singer 连接)，多取一条用于判断是否有下一页
+    :return: (sql, params)，结果列为 song_id, song_title, duration, album_title, add_time, sort_key
+    """
+    sort_expr = SONGLIST_SORT_EXPRS[sort]
+    filters = ["ss.songlist_id = %s"]
+    params = [songlist_id]
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter(sort_expr, "s.song_id", "DESC", cursor_values)
+        filters.append(keyset_sql)
+        params.extend(keyset_params)
+
+    sql = f"""
+        SELECT 
+            s.song_id,
+            s.song_title,
+            s.duration,
+            a.album_title AS album_title,
+            ss.add_time,
+            {sort_expr} AS sort_key
+        FROM Songlist_Song ss
+        JOIN Song s ON ss.song_id = s.song_id
+        JOIN Album a ON s.album_id = a.album_id
+        WHERE {" AND ".join(filters)}
+        ORDER BY sort_key DESC, s.song_id DESC
+        LIMIT %s
+    """
+    return sql, params + [page_size + 1]
 
-    uid = request.session["user_id"]
 
-    # --------------------------
-    # 2. 查询歌单信息
-    # --------------------------
+def songlist_order_key(songlist_id, sort):
+    return f"songlist:{songlist_id}:{sort}"
+
+
+def build_songlist_songs(songlist_id, sort, page_size, song_rows, song_singers):
+    "生成一页歌曲列表，返回 (songs, next_cursor)"
+    song_rows, next_cursor = paginate_rows(song_rows, page_size, songlist_order_key(songlist_id, sort),
+                                           lambda row: [row[5], row[0]])
+    songs = []
+    for (sid, stitle, dur, album_title, add_time, _) in song_rows:
+        songs.append({
+            "song_id": sid,
+            "song_title": stitle,
+            "duration": dur,
+            "duration_formatted": format_time(dur),
+            "album_title": album_title,
+            "singers": song_singers.get(sid, []),
+            "add_time": add_time.strftime("%Y-%m-%d %H:%M") if add_time else None
+        })
+    return songs, next_cursor
+
+
+def songlist_profile_queries(songlist_id):
+    "歌单详情需要的查询，相互独立，异步视图中并发执行"
     sql_list = """
         SELECT user_id, songlist_title, description, create_time, cover_url,
                like_count, is_public
         FROM Songlist
         WHERE songlist_id = %s
     """
-    with connection.cursor() as cursor:
-        cursor.execute(sql_list, [songlist_id])
-        row = cursor.fetchone()
 
-    if not row:
-        return json_cn({"error": "歌单不存在"}, 404)
+    # 第一页歌曲 (按添加时间倒序)
+    sql_songs, song_params = songlist_songs_query(songlist_id, "add_time", SONGLIST_PAGE_SIZE)
 
-    owner_id, title, desc, ctime, cover, likes, is_public = row
-
-    # --------------------------
-    # 3. 私密歌单权限判断
-    # --------------------------
-    is_owner = (uid == owner_id)
-    if not is_owner and is_public == 0:
-        return json_cn({"error": "这是一个私密歌单，你无权查看"}, 403)
-
-    # --------------------------
-    # 4. 查询歌单中的歌曲列表
-    # --------------------------
-    sql_songs = """
-        SELECT 
-            s.song_id,
-            s.song_title,
-            s.duration,
-            a.album_title AS album_title,
-            sg.singer_id,
-            sg.singer_name
-        FROM Songlist_Song ss
-        JOIN Song s ON ss.song_id = s.song_id
-        JOIN Album a ON s.album_id = a.album_id
-        JOIN Song_Singer ss2 ON s.song_id = ss2.song_id
-        JOIN Singer sg ON ss2.singer_id = sg.singer_id
-        WHERE ss.songlist_id = %s
-        ORDER BY ss.add_time DESC
+    # 第一页歌曲的歌手 (以歌曲查询为子查询，不依赖歌曲查询的结果)
+    sql_singers = f"""
+        SELECT p.song_id, si.singer_id, si.singer_name
+        FROM ({sql_songs}) p
+        JOIN Song_Singer ss2 ON ss2.song_id = p.song_id
+        JOIN Singer si ON si.singer_id = ss2.singer_id
+        ORDER BY p.song_id, si.singer_id
     """
 
     sql_comment = """
@@ -298,37 +355,42 @@ def songlist_profile(request, songlist_id):
         WHERE target_id = %s AND target_type = 'songlist'
         ORDER BY comment_time DESC
     """
+    return [
+        (sql_list, [songlist_id]),
+        (sql_songs, song_params),
+        (SQL_SONGLIST_TOTALS, [songlist_id]),
+        (sql_singers, song_params),
+        (sql_comment, [songlist_id]),
+    ]
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_songs, [songlist_id])
-        song_rows = cursor.fetchall()
 
-        cursor.execute(sql_comment, [songlist_id])
-        comment_rows = cursor.fetchall()
+def build_songlist_profile(songlist_id, results):
+    "由查询结果生成歌单详情数据，歌单不存在时返回 None"
+    list_rows, song_rows, total_rows, singer_rows, comment_rows = results
 
     # --------------------------
-    # 5. 计算总时长
+    # 1. 歌单信息
     # --------------------------
-    total_duration = sum([row[2] for row in song_rows])
+    if not list_rows:
+        return None
+
+    owner_id, title, desc, ctime, cover, likes, is_public = list_rows[0]
 
     # --------------------------
-    # 6. 生成歌曲列表
+    # 2. 歌曲数和总时长 (SQL 中计算，不受分页影响)
     # --------------------------
-    songs = []
-    for (sid, stitle, dur, album_title, singer_id, singer_name) in song_rows:
-        songs.append({
-            "song_id": sid,
-            "song_title": stitle,
-            "duration": dur,
-            "duration_formatted": format_time(dur),
-            "album_title": album_title,
-            "singer_id": singer_id,
-            "singer_name": singer_name
-        })
+    song_count, total_duration = total_rows[0]
+    total_duration = int(total_duration)
+
+    # --------------------------
+    # 3. 生成第一页歌曲列表
+    # --------------------------
+    songs, next_cursor = build_songlist_songs(songlist_id, "add_time", SONGLIST_PAGE_SIZE,
+                                              song_rows, group_song_singers(singer_rows))
 
 
     # --------------------------
-    # 7. 生成歌单评论列表
+    # 4. 生成歌单评论列表
     # --------------------------
     comments = []
     for user_id, user_name, comment_id, content, like_count, comment_time in comment_rows:
@@ -342,9 +404,9 @@ def songlist_profile(request, songlist_id):
         })
 
     # --------------------------
-    # 8. 返回歌单详情
+    # 5. 返回歌单详情
     # --------------------------
-    return json_cn({
+    return {
         "songlist_id": songlist_id,
         "songlist_title": title,
         "description": desc,
@@ -352,15 +414,67 @@ def songlist_profile(request, songlist_id):
         "cover_url": cover,
         "like_count": likes,
         "is_public": bool(is_public),
-        "is_owner": is_owner,
         "owner_id": owner_id,
-        "song_count": len(songs),
+        "song_count": song_count,
         "total_duration": total_duration,
         "total_duration_formatted": format_time(total_duration),
         "songs": songs,
+        "next_cursor": next_cursor,
         "comment_count": len(comments),
         "comments": comments
-    })
+    }
+
+
+def load_songlist_profile(songlist_id):
+    "查询歌单详情数据，不存在时返回 None"
+    return build_songlist_profile(songlist_id, run_queries(songlist_profile_queries(songlist_id)))
+
+
+async def aload_songlist_profile(songlist_id):
+    return build_songlist_profile(songlist_id, await arun_queries(songlist_profile_queries(songlist_id)))
+
+
+@csrf_exempt
+def songlist_profile(request, songlist_id):
+    # --------------------------
+    # 1. 检查登录状态
+    # --------------------------
+    if not request.current_user:
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    # --------------------------
+    # 2. 私密歌单权限判断 (创建者和是否公开随版本号一起查询)
+    # --------------------------
+    version = load_profile_version("songlist", songlist_id)
+    if version is None:
+        return json_cn({"error": "歌单不存在"}, 404)
+
+    uid = request.current_user.user_id
+    is_owner = (uid == version.fields["user_id"])
+    if not is_owner and not version.fields["is_public"]:
+        return json_cn({"error": "这是一个私密歌单，你无权查看"}, 403)
+
+    # --------------------------
+    # 3. 客户端缓存仍是最新时返回 304 (创建者和其他用户看到的 is_owner 不同，使用不同的 ETag)
+    # --------------------------
+    variant = ".owner" if is_owner else ""
+    response = not_modified(request, version, variant + pending_generation())
+    if response:
+        return response
+
+    # --------------------------
+    # 4. 读取详情 (优先读缓存)
+    # --------------------------
+    profile = get_profile_cache().get_or_build(
+        "songlist", songlist_id, lambda: load_songlist_profile(songlist_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "歌单不存在"}, 404)
+
+    # 缓存中的数据与用户无关，is_owner 和尚未写入的点赞数在返回前单独加入 (ETag 中也加上对应的后缀)
+    profile, pending = merge_profile_likes(profile, songlist_id)
+    return add_validators(json_cn(dict(profile, is_owner=is_owner)), version, variant + pending)
+
 
 
 
@@ -373,16 +487,16 @@ def delete_songlist(request, songlist_id):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录后再进行删除操作"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
     # 2. 查询歌单是否存在 + 权限检查
     # --------------------------
     sql_select = """
-        SELECT user_id, songlist_title
+        SELECT user_id, songlist_title, create_time
         FROM Songlist
         WHERE songlist_id = %s
     """
@@ -394,7 +508,7 @@ def delete_songlist(request, songlist_id):
     if not row:
         return json_cn({"error": "删除失败：该歌单不存在"}, 404)
 
-    owner_id, title = row
+    owner_id, title, create_time = row
 
     if owner_id != uid:
         return json_cn({"error": "无权限删除：你不是该歌单的创建者"}, 403)
@@ -410,8 +524,17 @@ def delete_songlist(request, songlist_id):
         WHERE songlist_id = %s
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_delete, [songlist_id])
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql_delete, [songlist_id])
+            deleted = cursor.rowcount
+        delete_like_records("songlist", [songlist_id])
+        if deleted:
+            # 每日统计按歌单创建的日期扣除
+            subtract_stats("songlist_count", [(owner_id, create_time)])
+
+    searchIndex.remove_entities("songlist", [songlist_id])
+    invalidate_profile("songlist", songlist_id)
 
     return json_cn({
         "message": f"成功删除歌单：{title}",
@@ -428,10 +551,10 @@ def songlist_add_song(request, songlist_id):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录后再添加歌曲到歌单"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
     # 2. 查询歌单是否存在 + 权限检查
@@ -511,6 +634,8 @@ def songlist_add_song(request, songlist_id):
     with connection.cursor() as cursor:
         cursor.execute(sql_insert, [songlist_id, song_id])
 
+    invalidate_profile("songlist", songlist_id)
+
     return json_cn({
         "message": f"成功添加歌曲：{song_title}",
         "songlist_id": songlist_id,
@@ -527,10 +652,10 @@ def songlist_delete_song(request, songlist_id, song_id):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录后再进行移除操作"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
     # 2. 查询歌单是否存在 + 权限检查
@@ -590,6 +715,8 @@ def songlist_delete_song(request, songlist_id, song_id):
     with connection.cursor() as cursor:
         cursor.execute(sql_delete, [songlist_id, song_id])
 
+    invalidate_profile("songlist", songlist_id)
+
     return json_cn({
         "message": f"已成功从歌单移除：{song_title}",
         "songlist_id": songlist_id,
@@ -606,10 +733,10 @@ def sort_songlist(request, songlist_id):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录后再进行排序操作"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
     # 2. 查询歌单信息（获取权限）
@@ -633,72 +760,49 @@ def sort_songlist(request, songlist_id):
         return json_cn({"error": "无权查看私密歌单"}, 403)
 
     # --------------------------
-    # 3. 获取排序方式（默认按添加时间）
+    # 3. 获取排序方式（默认按添加时间）和分页参数
     # --------------------------
     sort = request.GET.get("sort", "add_time")  # add_time / duration / play_count
-
-    # 白名单，安全避免 SQL 注入
-    sort_map = {
-        "add_time": "ss.add_time DESC",
-        "duration": "s.duration DESC",
-        "play_count": "s.play_count DESC",
-    }
-
-    if sort not in sort_map:
+    if sort not in SONGLIST_SORT_EXPRS:
         sort = "add_time"
 
-    order_sql = sort_map[sort]
+    page_size = get_page_size(request.GET, default=SONGLIST_PAGE_SIZE)
+    try:
+        cursor_values = decode_cursor(request.GET.get("cursor"), songlist_order_key(songlist_id, sort))
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
 
     # --------------------------
-    # 4. 查询排序后的歌曲列表
+    # 4. 查询一页排序后的歌曲、歌曲总数和总时长
     # --------------------------
-    sql_songs = f"""
-        SELECT 
-            s.song_id,
-            s.song_title,
-            s.duration,
-            a.album_title AS album_title,
-            sg.singer_id,
-            sg.singer_name,
-            ss.add_time
-        FROM Songlist_Song ss
-        JOIN Song s ON ss.song_id = s.song_id
-        JOIN Album a ON s.album_id = a.album_id
-        JOIN Song_Singer ss2 ON s.song_id = ss2.song_id
-        JOIN Singer sg ON ss2.singer_id = sg.singer_id
-        WHERE ss.songlist_id = %s
-        ORDER BY {order_sql}
-    """
+    sql_songs, song_params = songlist_songs_query(songlist_id, sort, page_size, cursor_values)
 
     with connection.cursor() as cursor:
-        cursor.execute(sql_songs, [songlist_id])
+        cursor.execute(sql_songs, song_params)
         rows = cursor.fetchall()
+        cursor.execute(SQL_SONGLIST_TOTALS, [songlist_id])
+        song_count, total_duration = cursor.fetchone()
 
     # --------------------------
-    # 5. 格式化返回数据
+    # 5. 格式化返回数据 (批量查询这一页歌曲的歌手)
     # --------------------------
-    songs = []
-    for sid, name, duration, album, singer_id, singer_name, add_time in rows:
-        songs.append({
-            "song_id": sid,
-            "song_title": name,
-            "duration": duration,
-            "duration_formatted": format_time(duration),
-            "album_title": album,
-            "singer_id": singer_id,
-            "singer_name": singer_name,
-            "add_time": add_time.strftime("%Y-%m-%d %H:%M") if add_time else None
-        })
+    song_singers = fetch_song_singers([row[0] for row in rows[:page_size]])
+    songs, next_cursor = build_songlist_songs(songlist_id, sort, page_size, rows, song_singers)
 
     # --------------------------
     # 6. 返回结果
     # --------------------------
+    total_duration = int(total_duration)
     return json_cn({
         "songlist_id": songlist_id,
         "songlist_title": title,
         "sort_by": sort,
         "songs": songs,
-        "total": len(songs)
+        "total": song_count,
+        "total_duration": total_duration,
+        "total_duration_formatted": format_time(total_duration),
+        "page_size": page_size,
+        "next_cursor": next_cursor
     })
 
 
@@ -711,7 +815,7 @@ def search_songlist(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    user_id = request.session.get("user_id")
+    user_id = current_user_id(request)
     if not user_id:
         return json_cn({"error": "请先登录"}, 403)
 
@@ -734,8 +838,9 @@ def search_songlist(request):
     params = []
 
     if songlist_title:
-        filters.append("sl.songlist_title LIKE %s")
-        params.append(f"%{songlist_title}%")
+        title_sql, title_params = search_filter("songlist", "sl.songlist_id", "sl.songlist_title", songlist_title)
+        filters.append(title_sql)
+        params.extend(title_params)
     if user_name:
         filters.append("u.user_name LIKE %s")
         params.append(f"%{user_name}%")
@@ -750,7 +855,7 @@ def search_songlist(request):
     join = ""
 
     if orderType == "songs_count":  
-        order = f"sls.songs_count {orderDir}"    # 默认按名字排序
+        sort_expr = "COALESCE(sls.songs_count, 0)"
         join = """LEFT JOIN (
                     SELECT songlist_id, COUNT(*) AS songs_count
                     FROM songlist_song
@@ -758,19 +863,36 @@ def search_songlist(request):
                 ) sls ON sls.songlist_id = sl.songlist_id
                 """
     elif orderType == "user_name":
-        order = f"u.user_name {orderDir}"
+        sort_expr = "u.user_name"
     elif orderType == "like_count":
-        order = f"sl.like_count {orderDir}"
+        sort_expr = "sl.like_count"
     else:
-        order = f"sl.songlist_title {orderDir}"
+        orderType = "songlist_title"    # 默认按名字排序
+        sort_expr = "sl.songlist_title"
 
 
     # --------------------------
-    # 4. 查询歌单信息
+    # 4. 分页参数 (游标分页)
+    # --------------------------
+    page_size = get_page_size(data)
+    order_key = f"{orderType}:{orderDir}"
+    try:
+        cursor_values = decode_cursor(data.get("cursor"), order_key)
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
+
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter(sort_expr, "sl.songlist_id", orderDir, cursor_values)
+        filters.append(keyset_sql)
+        params.extend(keyset_params)
+
+
+    # --------------------------
+    # 5. 查询歌单信息
     # --------------------------
     sql_songlist = f"""
-        SELECT sl.songlist_id, sl.songlist_title, sl.cover_url, u.user_id, u.user_name, sl.like_count
-        {', COALESCE(sls.songs_count, 0) AS songs_count' if orderType == 'songs_count' else ''}
+        SELECT sl.songlist_id, sl.songlist_title, sl.cover_url, u.user_id, u.user_name, sl.like_count,
+               {sort_expr} AS sort_key
         FROM Songlist sl
         JOIN User u ON u.user_id = sl.user_id
         {join}
@@ -779,36 +901,39 @@ def search_songlist(request):
     if filters:
         sql_songlist += " WHERE " + " AND ".join(filters)
 
-    sql_songlist += f" ORDER BY {order}"
+    sql_songlist += f" ORDER BY sort_key {orderDir}, sl.songlist_id {orderDir} LIMIT %s"
 
 
     with connection.cursor() as cursor:
-        cursor.execute(sql_songlist, params)
+        cursor.execute(sql_songlist, params + [page_size + 1])
         rows = cursor.fetchall()
 
-        if not rows:
-            return json_cn({"message": "未找到符合歌单", "songlists": []})
-            
-        # --------------------------
-        # 5. 返回搜索结果
-        # --------------------------
-        songlists = []
-        for row in rows:
-            songlist_id, songlist_title, cover_url, user_id, user_name, like_count = row[:6]
-            songs_count = row[6] if orderType == "songs_count" else None
-            songlists.append({
-                "songlist_id": songlist_id,
-                "songlist_title": songlist_title,
-                "cover_url": cover_url,
-                "user_id": user_id,
-                "user_name": user_name,
-                "like_count": like_count,
-                "songs_count": songs_count
-            })
+    if not rows:
+        return json_cn({"message": "未找到符合歌单", "songlists": [], "next_cursor": None})
+
+    rows, next_cursor = paginate_rows(rows, page_size, order_key, lambda row: [row[6], row[0]])
+
+    # --------------------------
+    # 6. 返回搜索结果
+    # --------------------------
+    songlists = []
+    for songlist_id, songlist_title, cover_url, user_id, user_name, like_count, sort_key in rows:
+        songlists.append({
+            "songlist_id": songlist_id,
+            "songlist_title": songlist_title,
+            "cover_url": cover_url,
+            "user_id": user_id,
+            "user_name": user_name,
+            "like_count": like_count,
+            "songs_count": sort_key if orderType == "songs_count" else None
+        })
+    merge_pending_likes("songlist", songlists, "songlist_id")
 
     return json_cn({
         "total": len(songlists),
-        "songlists": songlists
+        "songlists": songlists,
+        "page_size": page_size,
+        "next_cursor": next_cursor
     })
 
 
@@ -818,15 +943,25 @@ def search_songlist(request):
 # ================================
 @csrf_exempt
 def like_songlist(request, songlist_id):
-        
-    sql = """
-        UPDATE Songlist
-        SET like_count = like_count + 1
-        WHERE Songlist_id = %s;
-    """
+    # --------------------------
+    # 1. 检查登录状态 (每个用户只能点赞一次)
+    # --------------------------
+    if not request.current_user:
+        return json_cn({"error": "请先登录后再点赞"}, 403)
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [songlist_id])
+    uid = request.current_user.user_id
+
+    if not target_exists("songlist", songlist_id):
+        return json_cn({"error": "歌单不存在"}, 404)
+
+    # --------------------------
+    # 2. 记录点赞，点赞数由后台批量写入 (详情页缓存也在写入后失效)
+    # --------------------------
+    result = add_like(uid, "songlist", songlist_id)
+    if result is False:
+        return json_cn({"error": "已经点过赞了"}, 400)
+    if result is None:
+        return json_cn({"error": "服务器繁忙，请稍后再试"}, 503)
 
     return json_cn({
         "message": "点赞成功",
@@ -843,13 +978,13 @@ def list_favorite(request):
     # --------------------------
     # 1. 必须登录
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录再查看收藏"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     # --------------------------
-    # 2. 获取收藏的歌曲
+    # 2. 收藏的歌曲、专辑、歌单的查询
     # --------------------------
     sql_song = """
         SELECT 
@@ -863,17 +998,6 @@ def list_favorite(request):
         ORDER BY f.favorite_time DESC
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_song, [uid])
-        songs = cursor.fetchall()
-
-    song_count = len(songs)
-    song_total_duration = sum([s[2] for s in songs]) if songs else 0
-
-
-    # --------------------------
-    # 3. 获取收藏的专辑
-    # --------------------------
     sql_album = """
         SELECT 
             al.album_id,
@@ -886,15 +1010,6 @@ def list_favorite(request):
         ORDER BY f.favorite_time DESC
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_album, [uid])
-        albums = cursor.fetchall()
-
-    album_count = len(albums)
-
-    # --------------------------
-    # 4. 获取收藏的歌单
-    # --------------------------
     sql_songlist = """
         SELECT 
             sl.songlist_id,
@@ -906,68 +1021,64 @@ def list_favorite(request):
         ORDER BY f.favorite_time DESC
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_songlist, [uid])
-        songlists = cursor.fetchall()
-
-    songlist_count = len(songlists)
-
     # --------------------------
-    # 5. 格式化返回数据
+    # 3. 格式化每批数据
     # --------------------------
+    song_total_duration = 0
 
     # ---------- 收藏歌曲 ----------
-    favorite_songs = []
-    for sid, title, duration, ctime in songs:
-        favorite_songs.append({
+    def build_songs(rows):
+        nonlocal song_total_duration
+        song_total_duration += sum(duration or 0 for _, _, duration, _ in rows)
+        return [{
             "song_id": sid,
             "song_title": title,
             "duration": duration,
             "duration_formatted": format_time(duration),
             "favorite_time": ctime.strftime("%Y-%m-%d %H:%M") if ctime else None
-        })
+        } for sid, title, duration, ctime in rows]
 
     # ---------- 收藏专辑 ----------
-    favorite_albums = []
-    for aid, title, date, ctime in albums:
-        favorite_albums.append({
+    def build_albums(rows):
+        return [{
             "album_id": aid,
             "album_title": title,
-            "release_date": str(date) if date else None,
+            "release_date": date,
             "favorite_time": ctime.strftime("%Y-%m-%d %H:%M") if ctime else None
-        })
+        } for aid, title, date, ctime in rows]
 
     # ---------- 收藏歌单 ----------
-    favorite_songlists = []
-    for lid, title, ctime in songlists:
-        favorite_songlists.append({
+    def build_songlists(rows):
+        return [{
             "songlist_id": lid,
             "songlist_title": title,
             "favorite_time": ctime.strftime("%Y-%m-%d %H:%M") if ctime else None
-        })
+        } for lid, title, ctime in rows]
 
-    # ---------- 返回 ----------
-    return json_cn({
+    favorite_songs = JSONArray(map(build_songs, fetch_batches(sql_song, [uid])))
+    favorite_albums = JSONArray(map(build_albums, fetch_batches(sql_album, [uid])))
+    favorite_songlists = JSONArray(map(build_songlists, fetch_batches(sql_songlist, [uid])))
+
+    # ---------- 返回 (流式输出，条数和总时长在列表之后输出) ----------
+    return json_stream({
         "user_id": uid,
         "songs": {
-            "count": song_count,
-            "total_duration": song_total_duration,
-            "total_duration_formatted": format_time(song_total_duration),
-            "items": favorite_songs
+            "items": favorite_songs,
+            "count": lambda: favorite_songs.count,
+            "total_duration": lambda: song_total_duration,
+            "total_duration_formatted": lambda: format_time(song_total_duration)
         },
         "albums": {
-            "count": album_count,
-            "items": favorite_albums
+            "items": favorite_albums,
+            "count": lambda: favorite_albums.count
         },
         "songlists": {
-            "count": songlist_count,
-            "items": favorite_songlists
+            "items": favorite_songlists,
+            "count": lambda: favorite_songlists.count
         }
     })
 
 
-
-
 # ================================
 # 12. 进行收藏操作
 # ================================
@@ -976,10 +1087,10 @@ def add_favorite(request):
     # --------------------------
     # 1. 必须登录
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录再进行收藏"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -998,6 +1109,11 @@ def add_favorite(request):
     if target_type not in ["song", "album", "songlist"]:
         return json_cn({"error": "非法的收藏类型"}, 400)
 
+    try:
+        target_id = int(target_id)
+    except (TypeError, ValueError):
+        return json_cn({"error": "非法的收藏对象ID"}, 400)
+
     # --------------------------
     # 3. 检查是否已收藏
     # --------------------------
@@ -1022,8 +1138,13 @@ def add_favorite(request):
         VALUES(%s, %s, %s)
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_insert, [uid, target_type, target_id])
+    # 收藏记录和排行榜计数在同一事务中写入
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql_insert, [uid, target_type, target_id])
+        change_favorite_counts({(target_type, target_id): 1})
+
+    add_user_stat(uid, "favorite_count")
 
     # --------------------------
     # 5. 返回成功
@@ -1044,10 +1165,10 @@ def delete_favorite(request):
     # --------------------------
     # 1. 检验登录
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录再进行操作"}, 403)
 
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -1066,11 +1187,16 @@ def delete_favorite(request):
     if target_type not in ["song", "album", "songlist"]:
         return json_cn({"error": "非法的收藏类型"}, 400)
 
+    try:
+        target_id = int(target_id)
+    except (TypeError, ValueError):
+        return json_cn({"error": "非法的收藏对象ID"}, 400)
+
     # --------------------------
     # 3. 检查是否已收藏
     # --------------------------
     sql_check = f"""
-        SELECT 1
+        SELECT favorite_time
         FROM Favorite
         WHERE user_id = %s AND target_type = %s AND target_id = %s
     """
@@ -1090,8 +1216,14 @@ def delete_favorite(request):
         WHERE user_id = %s AND target_type = %s AND target_id = %s
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_delete, [uid, target_type, target_id])
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql_delete, [uid, target_type, target_id])
+            deleted = cursor.rowcount
+        change_favorite_counts({(target_type, target_id): -deleted})
+        if deleted:
+            # 每日统计按收藏的日期扣除
+            subtract_stats("favorite_count", [(uid, exists[0])])
 
     # --------------------------
     # 5. 返回成功
@@ -1114,10 +1246,10 @@ def get_my_favorite_songs_stats(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
 
-    current_user_id = request.session["user_id"]
+    current_user_id = request.current_user.user_id
 
     # 1. 计算收藏歌曲总时长
     sql_duration = """
@@ -1165,7 +1297,7 @@ def get_platform_top_favorites(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
 
     try:
@@ -1177,34 +1309,32 @@ def get_platform_top_favorites(request):
     target_type = data.get("target_type", "song")
     limit = data.get("limit", 10)  # 默认取前10
 
+    # 从排行榜计数表 FavoriteCount 按 (target_type, fav_count) 索引顺序读取前 N 名
     if target_type == 'song':
         sql = """
-            SELECT f.target_id, COUNT(*) as fav_count, s.song_title as name
-            FROM Favorite f
-            JOIN Song s ON f.target_id = s.song_id
-            WHERE f.target_type = 'song'
-            GROUP BY f.target_id, s.song_title
-            ORDER BY fav_count DESC
+            SELECT fc.target_id, fc.fav_count, s.song_title as name
+            FROM FavoriteCount fc
+            JOIN Song s ON fc.target_id = s.song_id
+            WHERE fc.target_type = 'song' AND fc.fav_count > 0
+            ORDER BY fc.fav_count DESC
             LIMIT %s
         """
     elif target_type == 'album':
         sql = """
-            SELECT f.target_id, COUNT(*) as fav_count, a.album_title as name
-            FROM Favorite f
-            JOIN Album a ON f.target_id = a.album_id
-            WHERE f.target_type = 'album'
-            GROUP BY f.target_id, a.album_title
-            ORDER BY fav_count DESC
+            SELECT fc.target_id, fc.fav_count, a.album_title as name
+            FROM FavoriteCount fc
+            JOIN Album a ON fc.target_id = a.album_id
+            WHERE fc.target_type = 'album' AND fc.fav_count > 0
+            ORDER BY fc.fav_count DESC
             LIMIT %s
         """
     elif target_type == 'songlist':
         sql = """
-            SELECT f.target_id, COUNT(*) as fav_count, sl.songlist_title as name
-            FROM Favorite f
-            JOIN Songlist sl ON f.target_id = sl.songlist_id
-            WHERE f.target_type = 'songlist'
-            GROUP BY f.target_id, sl.songlist_title
-            ORDER BY fav_count DESC
+            SELECT fc.target_id, fc.fav_count, sl.songlist_title as name
+            FROM FavoriteCount fc
+            JOIN Songlist sl ON fc.target_id = sl.songlist_id
+            WHERE fc.target_type = 'songlist' AND fc.fav_count > 0
+            ORDER BY fc.fav_count DESC
             LIMIT %s
         """
     else:
@@ -1216,3 +1346,41 @@ def get_platform_top_favorites(request):
 
     return json_cn({"ranking": result, "type": target_type})
 
+
+
+
+# ================================
+# 16. 异步版本 (ASGI 部署时使用，见 urls.py)
+# ================================
+@async_csrf_exempt
+async def search_songlist_async(request):
+    return await arun(search_songlist, request)
+
+
+@async_csrf_exempt
+async def songlist_profile_async(request, songlist_id):
+    uid = current_user_id(request)
+    if not uid:
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    version = await aload_profile_version("songlist", songlist_id)
+    if version is None:
+        return json_cn({"error": "歌单不存在"}, 404)
+
+    is_owner = (uid == version.fields["user_id"])
+    if not is_owner and not version.fields["is_public"]:
+        return json_cn({"error": "这是一个私密歌单，你无权查看"}, 403)
+
+    variant = ".owner" if is_owner else ""
+    response = not_modified(request, version, variant + pending_generation())
+    if response:
+        return response
+
+    profile = await get_profile_cache().aget_or_build(
+        "songlist", songlist_id, lambda: aload_songlist_profile(songlist_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "歌单不存在"}, 404)
+
+    profile, pending = merge_profile_likes(profile, songlist_id)
+    return add_validators(json_cn(dict(profile, is_owner=is_owner)), version, variant + pending)
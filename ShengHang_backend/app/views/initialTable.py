@@ -1,401 +1,420 @@
+# 建表后的一次性修复 (MySQL)
+# 修复数据库中 Django 无法设置的默认值。
+# 修复数据库中自动生成的奇怪外键和级联删除属性(每次新建数据库要重新改这些奇奇怪怪外键名)
+# 删除django生成了无用表
+# (已废弃的 after_play_insert 触发器由迁移 0013 删除，所有数据库都必须执行，不能用 --fake 跳过)
+#
+# 原来在 AppConfig.ready 中每次启动都全部执行一遍 (约 50 条 ALTER TABLE，每个 worker 启动都要等几秒)，
+# 现在每条修复有固定的名称，执行成功后记录在 SchemaFixup 表中，只执行一次:
+#   python manage.py migrate
+#   python manage.py apply_schema_fixups
+# (旧版本部署过的数据库第一次升级时的步骤见 README)
+# 新增修复时在 FIXUPS 末尾追加，不要修改已有修复的名称
 from django.db import connection
 
-def initialize_tables():
-    """
-    用于修复数据库中 Django 无法设置的默认值。
-    修复数据库中自动生成的奇怪外键和级联删除属性(每次新建数据库要重新改这些奇奇怪怪外键名)
-    删除django生成了无用表
-    定义了触发器
-    此函数会：
-    """
 
-    sql_fixes = [
-        # user表
-        # 修复 gender
-        """
+# (名称, SQL 列表)
+FIXUPS = [
+    # user表
+    # 修复 gender
+    ("user.gender", ["""
         ALTER TABLE user
         MODIFY gender ENUM('男','女','其他')
         NOT NULL DEFAULT '其他'
-        """,
+    """]),
 
-        # 修复 register_time
-        """
+    # 修复 register_time
+    ("user.register_time", ["""
         ALTER TABLE user
         MODIFY register_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
-        # 修复 status
-        """
+    # 修复 status
+    ("user.status", ["""
         ALTER TABLE user
         MODIFY status ENUM('正常','封禁中')
         NOT NULL DEFAULT '正常'
-        """,
+    """]),
 
-        # 修复 visibility
-        """
+    # 修复 visibility
+    ("user.visibility", ["""
         ALTER TABLE user
         MODIFY visibility ENUM('私密','仅关注者可见','所有人可见')
         NOT NULL DEFAULT '所有人可见'
-        """,
+    """]),
 
 
-        # singer表
-        # 修复type
-        """
+    # singer表
+    # 修复type
+    ("singer.type", ["""
         ALTER TABLE singer
         MODIFY type ENUM('男','女','组合')
         NOT NULL
-        """,
+    """]),
 
 
-        # album表
-        # 修复发行日期
-        """
+    # album表
+    # 修复发行日期
+    ("album.release_date", ["""
         ALTER TABLE album
         MODIFY release_date DATE
         NOT NULL DEFAULT '1970-01-01'
-        """,
+    """]),
 
-        # 修复专辑封面路径
-        """
+    # 修复专辑封面路径
+    ("album.cover_url", ["""
         ALTER TABLE album
         MODIFY cover_url VARCHAR(255)
         NOT NULL DEFAULT '/images/default_album_cover.jpg'
-        """,
+    """]),
 
 
-        # song表
-        # 修复歌曲总播放次数
-        """
+    # song表
+    # 修复歌曲总播放次数
+    ("song.play_count", ["""
         ALTER TABLE song
         MODIFY play_count INT
         NOT NULL DEFAULT 0
-        """,
+    """]),
 
-        # songlist表
-        # 修复创建时间
-        """
+    # songlist表
+    # 修复创建时间
+    ("songlist.create_time", ["""
         ALTER TABLE songlist
         MODIFY create_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
-        # 修复封面路径
-        """
+    # 修复封面路径
+    ("songlist.cover_url", ["""
         ALTER TABLE songlist
         MODIFY cover_url VARCHAR(255)
         NOT NULL DEFAULT '/images/default_songlist_cover.jpg'
-        """,
+    """]),
 
-        # 修复点赞数
-        """
+    # 修复点赞数
+    ("songlist.like_count", ["""
         ALTER TABLE songlist
         MODIFY like_count INT
         NOT NULL DEFAULT 0
-        """,
+    """]),
 
-        # 修复公开性
-        """
+    # 修复公开性
+    ("songlist.is_public", ["""
         ALTER TABLE songlist
         MODIFY is_public TINYINT
         NOT NULL DEFAULT true
-        """,
+    """]),
 
 
-        # comment表
-        # 修复评论目标类型
-        """
-        ALTER TABLE comment.py
-        MODIFY target_type ENUM('song','album','songlist') 
-        """,
+    # comment表
+    # 修复评论目标类型
+    ("comment.target_type", ["""
+        ALTER TABLE comment
+        MODIFY target_type ENUM('song','album','songlist')
+    """]),
 
-        # 修复点赞数
-        """
-        ALTER TABLE comment.py
+    # 修复点赞数
+    ("comment.like_count", ["""
+        ALTER TABLE comment
         MODIFY like_count INT
         NOT NULL DEFAULT 0
-        """,
+    """]),
 
-        # 修复评论时间
-        """
-        ALTER TABLE comment.py
+    # 修复评论时间
+    ("comment.comment_time", ["""
+        ALTER TABLE comment
         MODIFY comment_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
-        # 修复评论状态
-        """
-        ALTER TABLE comment.py
+    # 修复评论状态
+    ("comment.status", ["""
+        ALTER TABLE comment
         MODIFY status ENUM('审核中','举报中','正常')
         NOT NULL
-        """,
+    """]),
 
 
-        # favorite表
-        # 修复收藏目标类型
-        """
+    # favorite表
+    # 修复收藏目标类型
+    ("favorite.target_type", ["""
         ALTER TABLE favorite
-        MODIFY target_type ENUM('song','album','songlist') 
-        """,
+        MODIFY target_type ENUM('song','album','songlist')
+    """]),
 
-        # 修复收藏时间
-        """
+    # 修复收藏时间
+    ("favorite.favorite_time", ["""
         ALTER TABLE favorite
         MODIFY favorite_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
 
-        # playhistory表
-        # 修复播放时间
-        """
+    # playhistory表
+    # 修复播放时间
+    ("playhistory.play_time", ["""
         ALTER TABLE playhistory
         MODIFY play_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
-        # 修复实际播放时长
-        """
+    # 修复实际播放时长
+    ("playhistory.play_duration", ["""
         ALTER TABLE playhistory
         MODIFY play_duration INT
         NOT NULL DEFAULT 0
-        """,
+    """]),
 
 
-        # userfollow表
-        # 修复关注时间
-        """
+    # userfollow表
+    # 修复关注时间
+    ("userfollow.follow_time", ["""
         ALTER TABLE userfollow
         MODIFY follow_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
 
-        # singerfollow表
-        # 修复关注时间
-        """
+    # singerfollow表
+    # 修复关注时间
+    ("singerfollow.follow_time", ["""
         ALTER TABLE singerfollow
         MODIFY follow_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
 
-        # songlist_song表
-        # 修复添加时间
-        """
+    # songlist_song表
+    # 修复添加时间
+    ("songlist_song.add_time", ["""
         ALTER TABLE songlist_song
         MODIFY add_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
 
-        # systemlog表
-        # 修复操作时间
-        """
+    # systemlog表
+    # 修复操作时间
+    ("systemlog.action_time", ["""
         ALTER TABLE systemlog
         MODIFY action_time DATETIME(6)
         NOT NULL DEFAULT CURRENT_TIMESTAMP(6)
-        """,
+    """]),
 
-        # 修改操作结果状态
-        """
+    # 修改操作结果状态
+    ("systemlog.result", ["""
         ALTER TABLE systemlog
         MODIFY result ENUM('success','fail')
         NOT NULL
-        """,
+    """]),
 
-        # 修改对应外键名称和属性
-        # album表
+    # 修改对应外键名称和属性
+    # album表
+    ("fk.album.singer_id", [
+        "ALTER TABLE album DROP FOREIGN KEY Album_singer_id_40707949_fk_Singer_singer_id",
         """
-        ALTER TABLE album
-        DROP FOREIGN KEY Album_singer_id_40707949_fk_Singer_singer_id;
-
         ALTER TABLE album
         ADD CONSTRAINT Album_singer_id_fk FOREIGN KEY (singer_id) REFERENCES singer(singer_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # song表
-        # 修改表中错误的外键名字
+    # song表
+    # 修改表中错误的外键名字
+    ("fk.song.album_id", [
+        "ALTER TABLE song DROP FOREIGN KEY Song_album_id_12171706_fk_Album_album_id",
         """
-        ALTER TABLE song
-        DROP FOREIGN KEY Song_album_id_12171706_fk_Album_album_id;
-
         ALTER TABLE song
         ADD CONSTRAINT Song_album_id_fk FOREIGN KEY (album_id) REFERENCES album(album_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # songlist表
+    # songlist表
+    ("fk.songlist.user_id", [
+        "ALTER TABLE songlist DROP FOREIGN KEY Songlist_user_id_8a517e4f_fk_User_user_id",
         """
-        ALTER TABLE songlist
-        DROP FOREIGN KEY Songlist_user_id_8a517e4f_fk_User_user_id;
-
         ALTER TABLE songlist
         ADD CONSTRAINT Songlist_user_id_fk FOREIGN KEY (user_id) REFERENCES user(user_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # comment表
+    # comment表
+    ("fk.comment.user_id", [
+        "ALTER TABLE comment DROP FOREIGN KEY Comment_user_id_1cbe86a2_fk_User_user_id",
         """
-        ALTER TABLE comment
-        DROP FOREIGN KEY Comment_user_id_1cbe86a2_fk_User_user_id;
-
         ALTER TABLE comment
         ADD CONSTRAINT Comment_user_id_fk FOREIGN KEY (user_id) REFERENCES user(user_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # favorite表
+    # favorite表
+    ("fk.favorite.user_id", [
+        "ALTER TABLE favorite DROP FOREIGN KEY Favorite_user_id_5febe7a0_fk_User_user_id",
         """
-        ALTER TABLE favorite
-        DROP FOREIGN KEY Favorite_user_id_5febe7a0_fk_User_user_id;
-
         ALTER TABLE favorite
         ADD CONSTRAINT Favorite_user_id_fk FOREIGN KEY (user_id) REFERENCES user(user_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # playhistory表
+    # playhistory表
+    ("fk.playhistory.song_id", [
+        "ALTER TABLE playhistory DROP FOREIGN KEY PlayHistory_song_id_8d9897de_fk_Song_song_id",
         """
-        ALTER TABLE playhistory
-        DROP FOREIGN KEY PlayHistory_song_id_8d9897de_fk_Song_song_id;
-
         ALTER TABLE playhistory
         ADD CONSTRAINT PlayHistory_song_id_fk FOREIGN KEY (song_id) REFERENCES song(song_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
+    ("fk.playhistory.user_id", [
+        "ALTER TABLE playhistory DROP FOREIGN KEY PlayHistory_user_id_763a0bf1_fk_User_user_id",
         """
-        ALTER TABLE playhistory
-        DROP FOREIGN KEY PlayHistory_user_id_763a0bf1_fk_User_user_id;
-
         ALTER TABLE playhistory
         ADD CONSTRAINT PlayHistory_user_id_fk FOREIGN KEY (user_id) REFERENCES user(user_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # userfollow表
+    # userfollow表
+    ("fk.userfollow.followed_id", [
+        "ALTER TABLE userfollow DROP FOREIGN KEY UserFollow_followed_id_55f582a4_fk_User_user_id",
         """
-        ALTER TABLE userfollow
-        DROP FOREIGN KEY UserFollow_followed_id_55f582a4_fk_User_user_id;
-
         ALTER TABLE userfollow
         ADD CONSTRAINT UserFollow_followed_id_fk FOREIGN KEY (followed_id) REFERENCES user(user_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
+    ("fk.userfollow.follower_id", [
+        "ALTER TABLE userfollow DROP FOREIGN KEY UserFollow_follower_id_37f00a2f_fk_User_user_id",
         """
-        ALTER TABLE userfollow
-        DROP FOREIGN KEY UserFollow_follower_id_37f00a2f_fk_User_user_id;
-
         ALTER TABLE userfollow
         ADD CONSTRAINT UserFollow_follower_id_fk FOREIGN KEY (follower_id) REFERENCES user(user_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # singerfollow表
+    # singerfollow表
+    ("fk.singerfollow.singer_id", [
+        "ALTER TABLE singerfollow DROP FOREIGN KEY SingerFollow_singer_id_9c1efdb2_fk_Singer_singer_id",
         """
-        ALTER TABLE singerfollow
-        DROP FOREIGN KEY SingerFollow_singer_id_9c1efdb2_fk_Singer_singer_id;
-
         ALTER TABLE singerfollow
         ADD CONSTRAINT SingerFollow_singer_id_fk FOREIGN KEY (singer_id) REFERENCES singer(singer_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
+    ("fk.singerfollow.user_id", [
+        "ALTER TABLE singerfollow DROP FOREIGN KEY SingerFollow_user_id_d929e3e8_fk_User_user_id",
         """
-        ALTER TABLE singerfollow
-        DROP FOREIGN KEY SingerFollow_user_id_d929e3e8_fk_User_user_id;
-
         ALTER TABLE singerfollow
         ADD CONSTRAINT SingerFollow_user_id_fk FOREIGN KEY (user_id) REFERENCES user(user_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # songlist_song表
+    # songlist_song表
+    ("fk.songlist_song.song_id", [
+        "ALTER TABLE songlist_song DROP FOREIGN KEY Songlist_Song_song_id_77173337_fk_Song_song_id",
         """
-        ALTER TABLE songlist_song
-        DROP FOREIGN KEY Songlist_Song_song_id_77173337_fk_Song_song_id;
-
         ALTER TABLE songlist_song
         ADD CONSTRAINT Songlist_Song_song_id_fk FOREIGN KEY (song_id) REFERENCES song(song_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
+    ("fk.songlist_song.songlist_id", [
+        "ALTER TABLE songlist_song DROP FOREIGN KEY Songlist_Song_songlist_id_8cd98c3a_fk_Songlist_songlist_id",
         """
-        ALTER TABLE songlist_song
-        DROP FOREIGN KEY Songlist_Song_songlist_id_8cd98c3a_fk_Songlist_songlist_id;
-
         ALTER TABLE songlist_song
         ADD CONSTRAINT Songlist_Song_songlist_id_fk FOREIGN KEY (songlist_id) REFERENCES songlist(songlist_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
-        # song_singer表
+    # song_singer表
+    ("fk.song_singer.singer_id", [
+        "ALTER TABLE song_singer DROP FOREIGN KEY Song_Singer_singer_id_c7096906_fk_Singer_singer_id",
         """
-        ALTER TABLE song_singer
-        DROP FOREIGN KEY Song_Singer_singer_id_c7096906_fk_Singer_singer_id;
-
         ALTER TABLE song_singer
         ADD CONSTRAINT Song_Singer_singer_id_fk FOREIGN KEY (singer_id) REFERENCES singer(singer_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
 
+    ("fk.song_singer.song_id", [
+        "ALTER TABLE song_singer DROP FOREIGN KEY Song_Singer_song_id_c14193ef_fk_Song_song_id",
         """
-        ALTER TABLE song_singer
-        DROP FOREIGN KEY Song_Singer_song_id_c14193ef_fk_Song_song_id;
-
         ALTER TABLE song_singer
         ADD CONSTRAINT Song_Singer_song_id_fk FOREIGN KEY (song_id) REFERENCES song(song_id)
-        ON DELETE CASCADE;
+        ON DELETE CASCADE
         """,
+    ]),
+
+    # 触发器
+    # 递归删除子评论的 delete_comment_reply 触发器已不再使用，
+    # 评论及其回复由 comment.delete_comment_tree 批量删除
+
+    # 自动更新触发器 after_play_insert 已废弃，改为在迁移 0013_drop_after_play_insert 中删除:
+    # 旧版本数据库用 apply_schema_fixups --fake 标记修复时不会跳过它，否则播放次数会被重复累加
+
+
+    # 删除无用表
+    # django_migrations 不再删除: 迁移记录被删除后 migrate 无法判断哪些迁移已执行
+    ("drop.django_admin_log", ["DROP TABLE IF EXISTS django_admin_log"]),
+    ("drop.auth_group_permissions", ["DROP TABLE IF EXISTS auth_group_permissions"]),
+    ("drop.auth_user_groups", ["DROP TABLE IF EXISTS auth_user_groups"]),
+    ("drop.auth_group", ["DROP TABLE IF EXISTS auth_group"]),
+    ("drop.auth_user_user_permissions", ["DROP TABLE IF EXISTS auth_user_user_permissions"]),
+    ("drop.auth_user", ["DROP TABLE IF EXISTS auth_user"]),
+    ("drop.auth_permission", ["DROP TABLE IF EXISTS auth_permission"]),
+    ("drop.django_content_type", ["DROP TABLE IF EXISTS django_content_type"]),
+]
 
-        # 触发器
-        # 递归删除子评论触发器
-        # 当评论被删除前，自动删除 parent_id 为该评论ID 的所有子评论
-        # 数据库会因此再次触发本触发器，从而实现递归删除
-        #"""
-        #CREATE TRIGGER delete_comment_reply 
-        #BEFORE DELETE ON Comment
-        #FOR EACH ROW
-        #BEGIN
-        #    DELETE FROM Comment WHERE parent_id = OLD.comment_id;
-        #END;
-        #""",
-
-        # 自动更新触发器
-        """
-        CREATE TRIGGER after_play_insert
-        AFTER INSERT ON PlayHistory
-        FOR EACH ROW
-        BEGIN
-            UPDATE Song 
-            SET play_count = play_count + 1 
-            WHERE song_id = NEW.song_id;
-        END;
-        """,
 
+# ================================
+# 执行记录
+# ================================
+def applied_fixups():
+    "已执行的修复 {名称: 执行时间}"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name, applied_time FROM SchemaFixup")
+        return dict(cursor.fetchall())
 
-        # 删除无用表
-        """DROP TABLE django_migrations""",
-        """DROP TABLE django_admin_log""",
-        """DROP TABLE auth_group_permissions""",
-        """DROP TABLE auth_user_groups""",
-        """DROP TABLE auth_group""",
-        """DROP TABLE auth_user_user_permissions""", 
-        """DROP TABLE auth_user""",
-        """DROP TABLE auth_permission""",
-        """DROP TABLE django_content_type""",
-    ]
 
+def record_fixup(name):
     with connection.cursor() as cursor:
-        for sql in sql_fixes:
+        cursor.execute("INSERT INTO SchemaFixup (name, applied_time) VALUES (%s, CURRENT_TIMESTAMP)", [name])
+
+
+def apply_fixups(names=None, fake=False):
+    """
+    执行尚未执行过的修复 (names 为 None 时为全部)，每条修复执行成功后立即记录
+    fake=True 时只记录、不执行 (用于旧版本启动时已经执行过这些修复的数据库)
+    返回 [(名称, 错误信息或 None)]，已执行过的修复不在其中
+    ALTER TABLE 在 MySQL 中会隐式提交，无法放在事务中回滚:
+    一条修复中途失败时不记录，修正后重新运行即可 (已成功的语句会再报一次 "已存在" 的错误，可用 --fake 跳过)
+    """
+    done = applied_fixups()
+    results = []
+    for name, statements in FIXUPS:
+        if name in done or (names is not None and name not in names):
+            continue
+        error = None
+        if not fake:
             try:
-                cursor.execute(sql)
+                with connection.cursor() as cursor:
+                    for sql in statements:
+                        cursor.execute(sql)
             except Exception as e:
-                # 如果已修复或云数据库不允许重复修改，则忽略错误
-                print(f"[InitialTable] Warning: {e}")
-
-    print("[InitialTable] 建表初始化成功.")
+                error = str(e)
+        if error is None:
+            record_fixup(name)
+        results.append((name, error))
+    return results
@@ -0,0 +1,68 @@
+# JSON 编码
+# 所有接口都经过 json_cn (以及流式响应 jsonStream) 编码返回数据，这里根据 settings.JSON_ENCODER 选择编码器:
+#   - orjson: C 实现，速度是标准库的数倍 (需要 pip install orjson)
+#   - stdlib: 标准库 json + DjangoJSONEncoder (原来 JsonResponse 的行为)
+#   - auto: 已安装 orjson 时使用 orjson，否则使用 stdlib (默认)
+# 两种编码器的输出语义一致 (与 DjangoJSONEncoder 相同):
+#   - datetime 为 ISO 8601，微秒截断到毫秒，UTC 时区写为 Z; date / time 为 ISO 8601
+#   - Decimal (如 SUM() 的结果)、UUID 为字符串; 中文不转义
+# 两者都输出紧凑格式 (分隔符后没有空格)
+# orjson 无法编码的数据 (如超过 64 位的整数) 自动改用标准库编码
+import logging
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+logger = logging.getLogger(__name__)
+
+
+_django_encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def stdlib_dumps(data):
+    return _django_encoder.encode(data).encode("utf-8")
+
+
+if orjson is not None:
+    # datetime / date / time 交给 DjangoJSONEncoder.default 处理，格式 (毫秒、Z) 与标准库完全一致
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def orjson_dumps(data):
+        try:
+            return orjson.dumps(data, default=_django_encoder.default, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return stdlib_dumps(data)
+else:
+    orjson_dumps = None
+
+
+# 名称 -> 编码函数 (data -> UTF-8 bytes)，不可用的编码器不在其中
+ENCODERS = {"stdlib": stdlib_dumps}
+if orjson_dumps is not None:
+    ENCODERS["orjson"] = orjson_dumps
+
+
+def get_backend_name():
+    backend = getattr(settings, "JSON_ENCODER", {}).get("BACKEND", "auto")
+    if backend == "auto":
+        return "orjson" if "orjson" in ENCODERS else "stdlib"
+    if backend not in ENCODERS:
+        logger.warning("JSON 编码器 %s 不可用，改用标准库 json", backend)
+        return "stdlib"
+    return backend
+
+
+_dumps = None
+
+def dumps(data):
+    "按配置的编码器编码，返回 UTF-8 bytes"
+    global _dumps
+    if _dumps is None:
+        _dumps = ENCODERS[get_backend_name()]
+    return _dumps(data)
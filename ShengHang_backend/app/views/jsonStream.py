@@ -0,0 +1,116 @@
+# 流式 JSON 响应
+# 个人收藏、个人评论、粉丝列表等接口的数据量随用户的历史增长，原来先 fetchall 取出全部数据，
+# 生成完整的字典列表后一次性序列化成 JsonResponse。现在逐批读取、逐批编码输出 (StreamingHttpResponse):
+#   - 每个请求占用的内存只与批大小有关，与数据条数无关
+#   - 第一批数据读出后就开始发送，不必等待整个查询结束
+# MySQL (mysqlclient) 的默认游标会把整个结果集读到客户端，这里改用服务器端游标 (SSCursor)；
+# SQLite 的游标本身就是逐行读取
+# 注意:
+#   - 服务器端游标读完之前同一连接不能执行其他查询，因此多个列表依次查询、依次输出
+#   - 响应开始发送后无法再修改状态码，参数检查、权限检查必须在返回响应之前完成
+#   - 依赖数组内容的统计值 (如条数) 写成函数放在数组之后，输出到该位置时才计算
+#   - 查询在中间件返回之后执行，SQL 和取连接耗时的统计由中间件在响应体输出完毕后记录 (见 app/middleware.py)
+#   - 只在 WSGI 下流式输出: ASGI 下 Django 会先把整个响应体读入内存，因此 settings.STREAM_JSON_RESPONSES
+#     为 False (asgi.py 中的默认值) 时在视图中一次性编码，返回普通的 HttpResponse
+from django.conf import settings
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .jsonEncoder import dumps
+
+
+# 每批读取的行数
+STREAM_BATCH_SIZE = 500
+
+
+def fetch_batches(sql, params, batch_size=STREAM_BATCH_SIZE):
+    "执行查询并逐批返回结果 (每批为行的列表)，用于 JSONArray"
+    if connection.vendor == "mysql":
+        from MySQLdb.cursors import SSCursor
+
+        connection.ensure_connection()
+        with connection.wrap_database_errors:
+            raw_cursor = connection.connection.cursor(SSCursor)
+        # 经过 Django 的游标包装，SQL 统计 (requestProfiler) 等 execute_wrapper 仍然生效
+        cursor = CursorWrapper(raw_cursor, connection)
+    else:
+        cursor = connection.cursor()
+
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        # 未读完时 SSCursor.close 会读取并丢弃剩余的行，之后连接才能执行其他查询
+        cursor.close()
+
+
+def batched(items, batch_size=STREAM_BATCH_SIZE):
+    "把已在内存中的列表分批，用于 JSONArray"
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+class JSONArray:
+    """
+    逐批生成的 JSON 数组
+    batches: 可迭代的批，每批是要输出的数据列表；输出完成后 count 为元素个数
+    """
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.count = 0
+
+
+# 每输出一批数据后把已编码的内容发送出去
+_FLUSH = None
+
+
+def _encode(value):
+    if isinstance(value, JSONArray):
+        yield b"["
+        for batch in value.batches:
+            if not batch:
+                continue
+            chunk = b",".join(dumps(item) for item in batch)
+            yield chunk if value.count == 0 else b"," + chunk
+            value.count += len(batch)
+            yield _FLUSH
+        yield b"]"
+    elif isinstance(value, dict):
+        yield b"{"
+        for index, (key, item) in enumerate(value.items()):
+            yield (b"" if index == 0 else b",") + dumps(str(key)) + b":"
+            yield from _encode(item)
+        yield b"}"
+    elif callable(value):
+        yield from _encode(value())
+    else:
+        yield dumps(value)
+
+
+def _chunks(data):
+    pieces = []
+    for piece in _encode(data):
+        if piece is _FLUSH:
+            if pieces:
+                yield b"".join(pieces)
+                pieces = []
+        else:
+            pieces.append(piece)
+    if pieces:
+        yield b"".join(pieces)
+
+
+def json_stream(data, status=200):
+    """
+    流式输出 JSON (编码器与 json_cn 相同，见 jsonEncoder.py)
+    data 中的 JSONArray 逐批输出，函数在输出到该位置时调用
+    """
+    if not getattr(settings, "STREAM_JSON_RESPONSES", True):
+        return HttpResponse(b"".join(_chunks(data)), status=status, content_type="application/json")
+    return StreamingHttpResponse(_chunks(data), status=status, content_type="application/json")
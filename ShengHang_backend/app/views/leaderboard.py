@@ -0,0 +1,55 @@
+# 收藏排行榜模块
+# 平台收藏排行榜原本每次请求都对整张 Favorite 表 GROUP BY，这里用 FavoriteCount 表
+# 维护每个 (target_type, target_id) 的被收藏次数，并在 (target_type, fav_count) 上建索引，
+# 读取前 N 名只需按索引顺序取 N 行
+#   - add_favorite / delete_favorite / 注销账号 时在同一事务中增减计数
+#   - 出现偏差时运行 python manage.py rebuild_favorite_counts 从 Favorite 表重新统计
+from django.db import connection, transaction
+
+from .tools import upsert_counter_sql
+
+
+TARGET_TYPES = ("song", "album", "songlist")
+
+
+def change_favorite_counts(deltas):
+    """
+    增减被收藏次数，需要在写 Favorite 表的同一事务中调用
+    :param deltas: {(target_type, target_id): 变化量}
+    """
+    rows = sorted((key, delta) for key, delta in deltas.items() if delta)
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            upsert_counter_sql("FavoriteCount", ["target_type", "target_id"], ["fav_count"], len(rows)),
+            [value for (target_type, target_id), delta in rows for value in (target_type, target_id, delta)]
+        )
+
+
+def remove_user_favorites(user_id):
+    "注销账号前调用：扣除该用户所有收藏对应的计数 (收藏记录随后被级联删除)"
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT target_type, target_id, COUNT(*)
+            FROM Favorite
+            WHERE user_id = %s
+            GROUP BY target_type, target_id
+        """, [user_id])
+        rows = cursor.fetchall()
+    change_favorite_counts({(target_type, int(target_id)): -count for target_type, target_id, count in rows})
+
+
+def rebuild(target_type):
+    "从 Favorite 表重新统计某类对象的被收藏次数，返回统计的对象数"
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM FavoriteCount WHERE target_type = %s", [target_type])
+            cursor.execute("""
+                INSERT INTO FavoriteCount (target_type, target_id, fav_count)
+                SELECT target_type, target_id, COUNT(*)
+                FROM Favorite
+                WHERE target_type = %s
+                GROUP BY target_type, target_id
+            """, [target_type])
+            return cursor.rowcount
@@ -0,0 +1,239 @@
+# 点赞计数模块
+# 歌单点赞、评论点赞原本每次点击都执行 UPDATE ... SET like_count = like_count + 1，
+# 热门歌单/评论的那一行会成为行锁热点。这里：
+#   - 每个用户对每个对象的点赞记录在 LikeRecord 表中 (唯一索引)，重复点赞直接被唯一索引拒绝
+#   - 点赞数的增量先累加在进程内，由后台线程定期合并，每种对象一条 UPDATE 批量写入
+#   - 读取点赞数时用 merge_pending_likes 把尚未写入的增量加上
+# 缓冲区中的增量只对本进程可见，多 worker 部署时其他 worker 最多晚 FLUSH_INTERVAL 秒看到
+# 详情页合并了这部分增量，增量的版本 (见 pending_generation) 也写入详情页的 ETag
+import secrets
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .batchWriter import BatchWriter
+from .cache import invalidate_profile
+
+
+# target_type -> (表, 主键)
+LIKE_TARGETS = {
+    "songlist": ("Songlist", "songlist_id"),
+    "comment": ("Comment", "comment_id"),
+}
+
+
+# ================================
+# 尚未写入数据库的增量
+# ================================
+_pending_lock = threading.Lock()
+_pending = {}     # (target_type, target_id) -> 增量
+_generation = 0   # _pending 每次变化时加一
+# 进程标识: 各 worker 的 _generation 互不相关，带上进程标识后不同 worker 的增量版本不会相同
+_PROCESS_TAG = secrets.token_hex(4)
+
+
+def _add_pending(totals, sign=1):
+    global _generation
+    with _pending_lock:
+        for key, delta in totals.items():
+            value = _pending.get(key, 0) + sign * delta
+            if value:
+                _pending[key] = value
+            else:
+                _pending.pop(key, None)
+        _generation += 1
+
+
+def _pending_tag():
+    # 调用时需持有 _pending_lock
+    if not _pending:
+        return ""
+    return f".p{_PROCESS_TAG}-{_generation}"
+
+
+def pending_generation():
+    """
+    尚未写入的点赞增量的版本，作为 ETag 后缀 (见 profileVersion.not_modified)
+    没有增量时为空字符串，此时详情页只取决于数据库中的数据，各 worker 的 ETag 相同
+    """
+    with _pending_lock:
+        return _pending_tag()
+
+
+def pending_likes(target_type, target_id):
+    "某个对象尚未写入数据库的点赞数"
+    with _pending_lock:
+        return _pending.get((target_type, int(target_id)), 0)
+
+
+def merge_pending_likes(target_type, rows, id_key, count_key="like_count"):
+    "把尚未写入的点赞数加到查询结果 (dict 列表) 上，直接修改 rows"
+    with _pending_lock:
+        if not _pending:
+            return rows
+        for row in rows:
+            delta = _pending.get((target_type, row[id_key]), 0)
+            if delta:
+                row[count_key] = (row[count_key] or 0) + delta
+    return rows
+
+
+def merge_profile_likes(profile, songlist_id=None):
+    """
+    详情页数据加上尚未写入的点赞数 (歌单本身以及其中的评论)
+    profile 可能是缓存中的对象，不能直接修改，有增量时返回新的 dict
+    返回 (profile, 合并的增量的版本)，版本用作 ETag 后缀 (见 profileVersion.add_validators)
+    """
+    with _pending_lock:
+        generation = _pending_tag()
+        if not _pending:
+            return profile, generation
+        profile = dict(profile)
+        if songlist_id is not None:
+            profile["like_count"] = (profile["like_count"] or 0) + _pending.get(("songlist", int(songlist_id)), 0)
+        if profile.get("comments"):
+            profile["comments"] = [
+                dict(c, like_count=(c["like_count"] or 0) + _pending[("comment", c["comment_id"])])
+                if ("comment", c["comment_id"]) in _pending else c
+                for c in profile["comments"]
+            ]
+    return profile, generation
+
+
+def _sum_deltas(items):
+    totals = {}
+    for target_type, target_id, delta in items:
+        key = (target_type, target_id)
+        totals[key] = totals.get(key, 0) + delta
+    return totals
+
+
+# ================================
+# 批量写入
+# ================================
+def write_like_deltas(items):
+    """
+    合并一批点赞增量并写入数据库
+    :param items: [(target_type, target_id, delta), ...]
+    """
+    totals = _sum_deltas(items)
+    comment_ids = []
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for target_type, (table, pk) in LIKE_TARGETS.items():
+                # 按主键顺序更新，多个 worker 并发写入时加锁顺序一致
+                rows = sorted((target_id, delta) for (t, target_id), delta in totals.items()
+                              if t == target_type and delta)
+                if not rows:
+                    continue
+                cases = " ".join(["WHEN %s THEN %s"] * len(rows))
+                placeholders = ", ".join(["%s"] * len(rows))
+                cursor.execute(
+                    f"UPDATE {table} SET like_count = like_count + CASE {pk} {cases} END "
+                    f"WHERE {pk} IN ({placeholders})",
+                    [value for row in rows for value in row] + [row[0] for row in rows]
+                )
+                if target_type == "comment":
+                    comment_ids = [row[0] for row in rows]
+
+    _add_pending(totals, sign=-1)
+
+    # 详情页缓存中的点赞数已过期 (评论点赞数展示在评论目标的详情页中)
+    songlist_ids = [target_id for (t, target_id) in totals if t == "songlist"]
+    if songlist_ids:
+        invalidate_profile("songlist", *songlist_ids)
+    if comment_ids:
+        placeholders = ", ".join(["%s"] * len(comment_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT target_type, target_id FROM Comment WHERE comment_id IN ({placeholders})",
+                comment_ids
+            )
+            for target_type, target_id in cursor.fetchall():
+                invalidate_profile(target_type, target_id)
+
+
+def _drop_like_deltas(items):
+    # 被丢弃的增量不会再写入，从待写入的增量中扣除
+    _add_pending(_sum_deltas(items), sign=-1)
+
+
+def _create_like_writer():
+    config = getattr(settings, "LIKE_COUNTER_BUFFER", {})
+    if not config.get("ENABLED", True):
+        return None
+    return BatchWriter(
+        "like-counter-writer",
+        write_like_deltas,
+        batch_size=config.get("BATCH_SIZE", 1000),
+        interval=config.get("FLUSH_INTERVAL", 1.0),
+        max_pending=config.get("MAX_PENDING", 50000),
+        drop_func=_drop_like_deltas,
+    )
+
+like_writer = _create_like_writer()
+
+
+# ================================
+# 点赞
+# ================================
+def add_like(user_id, target_type, target_id):
+    """
+    记录一次点赞，返回:
+      True  - 点赞成功
+      False - 已经点过赞
+      None  - 缓冲区已满，点赞未记录
+    调用前需确认对象存在
+    """
+    target_id = int(target_id)
+    # 与 ORM 写入 like_time (auto_now_add) 的值相同，不依赖数据库的 NOW() (SQLite 没有该函数)
+    like_time = connection.ops.adapt_datetimefield_value(timezone.now())
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "INSERT INTO LikeRecord (user_id, target_type, target_id, like_time) VALUES (%s, %s, %s, %s)",
+                    [user_id, target_type, target_id, like_time]
+                )
+    except IntegrityError:
+        return False
+
+    item = (target_type, target_id, 1)
+    _add_pending({(target_type, target_id): 1})
+    if like_writer is None:
+        # 未开启缓冲时同步写入
+        write_like_deltas([item])
+        return True
+
+    if not like_writer.put(item):
+        _add_pending({(target_type, target_id): 1}, sign=-1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM LikeRecord WHERE user_id = %s AND target_type = %s AND target_id = %s",
+                [user_id, target_type, target_id]
+            )
+        return None
+    return True
+
+
+def target_exists(target_type, target_id):
+    table, pk = LIKE_TARGETS[target_type]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {table} WHERE {pk} = %s", [target_id])
+        return cursor.fetchone() is not None
+
+
+def delete_like_records(target_type, target_ids):
+    "对象被删除时清理它的点赞记录"
+    target_ids = list(target_ids)
+    if not target_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM LikeRecord WHERE target_type = %s AND target_id IN ({placeholders})",
+            [target_type] + target_ids
+        )
@@ -1,9 +1,22 @@
 # 管理员管理模块
 
-from django.db import connection
+from django.db import connection, transaction
 from django.views.decorators.csrf import csrf_exempt
 import json
+import logging
 from .tools import *
+from . import searchIndex
+from . import playhistory
+from .comment import delete_comment_tree
+from .commentThread import set_comment_status
+from ..mysqlPool.pool import get_pool_stats
+from .cache import invalidate_profile, invalidate_profiles
+from .dailyStats import db_today
+from . import requestProfiler
+from .archive import user_song_plays_sql, user_plays_sql
+
+
+logger = logging.getLogger(__name__)
 
 
 # ================================
@@ -83,6 +96,8 @@ def admin_add_singer(request):
             cursor.execute("SELECT LAST_INSERT_ID()")
             new_singer_id = cursor.fetchone()[0]
 
+        searchIndex.index_entity("singer", new_singer_id, singer_name)
+
         add_system_log(
             action=f"新增歌手: {singer_name}",
             target_table="Singer",
@@ -164,10 +179,30 @@ def admin_delete_singer(request):
         WHERE singer_id = %s   
     """
 
+    # 级联删除的专辑和歌曲，也需要从检索索引中删除
+    sql_cascade_albums = "SELECT album_id FROM Album WHERE singer_id = %s"
+    sql_cascade_songs = """
+        SELECT s.song_id
+        FROM Song s
+        JOIN Album a ON a.album_id = s.album_id
+        WHERE a.singer_id = %s
+    """
+
     try:
         with connection.cursor() as cursor:
+            cursor.execute(sql_cascade_albums, [singer_id])
+            album_ids = [r[0] for r in cursor.fetchall()]
+            cursor.execute(sql_cascade_songs, [singer_id])
+            song_ids = [r[0] for r in cursor.fetchall()]
+
             cursor.execute(delete_sql, [singer_id])
 
+        searchIndex.remove_entities("singer", [singer_id])
+        searchIndex.remove_entities("album", album_ids)
+        searchIndex.remove_entities("song", song_ids)
+        # 级联删除的歌曲可能出现在任意歌单中
+        invalidate_profiles()
+
         add_system_log(
             action=f"删除歌手: {singer_name}",
             target_table="Singer",
@@ -272,6 +307,13 @@ def admin_update_singer(request):
         with connection.cursor() as cursor:
             cursor.execute(sql, params)
 
+        if "singer_name" in data:
+            searchIndex.index_entity("singer", singer_id, data.get("singer_name"))
+            # 歌手名冗余在专辑/歌曲/歌单详情中
+            invalidate_profiles()
+        else:
+            invalidate_profile("singer", singer_id)
+
         add_system_log(
             action=f"成功修改歌手信息: {old_name}",
             target_table="Singer",
@@ -388,6 +430,9 @@ def admin_add_album(request):
             cursor.execute("SELECT LAST_INSERT_ID()")
             new_album_id = cursor.fetchone()[0]
 
+        searchIndex.index_entity("album", new_album_id, album_title)
+        invalidate_profile("singer", singer_id)
+
         add_system_log(
             action=f"新增专辑: {album_title}",
             target_table="Album",
@@ -464,10 +509,20 @@ def admin_delete_album(request):
     # --------------------------
     sql = "DELETE FROM Album WHERE album_id = %s"
 
+    # 级联删除的歌曲，也需要从检索索引中删除
+    sql_cascade_songs = "SELECT song_id FROM Song WHERE album_id = %s"
+
     try:
         with connection.cursor() as cursor:
+            cursor.execute(sql_cascade_songs, [album_id])
+            song_ids = [r[0] for r in cursor.fetchall()]
+
             cursor.execute(sql, [album_id])
 
+        searchIndex.remove_entities("album", [album_id])
+        searchIndex.remove_entities("song", song_ids)
+        invalidate_profiles()
+
         add_system_log(
             action=f"删除专辑: {album_title}",
             target_table="Album",
@@ -590,6 +645,11 @@ def admin_update_album(request):
         with connection.cursor() as cursor:
             cursor.execute(sql, params)
 
+        if "album_title" in data:
+            searchIndex.index_entity("album", album_id, data.get("album_title"))
+        # 专辑名冗余在歌手/歌曲/歌单详情中，修改歌手时也会影响新旧两位歌手的详情
+        invalidate_profiles()
+
         add_system_log(
             action=f"成功修改专辑信息: {old_title}",
             target_table="Album",
@@ -710,6 +770,10 @@ def admin_add_song(request):
 
         singers_str = ", ".join(str(sid) for sid in singers_id)
 
+        searchIndex.index_entity("song", song_id, song_title)
+        invalidate_profile("album", album_id)
+        invalidate_profile("singer", *singers_id)
+
         add_system_log(
             action=f"新增歌曲: {song_title}",
             target_table="Song",
@@ -812,6 +876,9 @@ def admin_delete_song(request):
             cursor.execute(sql_delete_Song_Singer, [song_id])
             cursor.execute(sql_delete_Song, [song_id])
 
+        searchIndex.remove_entities("song", [song_id])
+        invalidate_profiles()
+
         add_system_log(
             action=f"删除歌曲: {song_title}",
             target_table="Song",
@@ -929,6 +996,10 @@ def admin_update_song(request):
         with connection.cursor() as cursor:
             cursor.execute(sql, params)
 
+        if "song_title" in data:
+            searchIndex.index_entity("song", song_id, data.get("song_title"))
+        invalidate_profiles()
+
         add_system_log(
             action=f"修改歌曲信息成功: {old_title}",
             target_table="Song",
@@ -982,68 +1053,57 @@ def get_system_logs(request):
     filter_result = data.get("result")  # e.g., 'fail'
     keyword = data.get("keyword")  # e.g., '删除'
 
-    # 分页参数
-    page = int(data.get("page", 1))
-    page_size = int(data.get("page_size", 20))
-    offset = (page - 1) * page_size
+    # archive=true 时查看已归档的日志 (SystemLogArchive)
+    table = "SystemLogArchive" if data.get("archive") else "SystemLog"
+
+    # 游标分页: 按 (action_time, log_id) 倒序，不再使用 OFFSET 和 COUNT(*)，
+    # 翻到很后面的页也只读取 page_size 条
+    page_size = get_page_size(data)
+    order_key = f"{table}:action_time:DESC"
+    try:
+        cursor_values = decode_cursor(data.get("cursor"), order_key)
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
 
     # --------------------------
-    # 3. 构建复用的 SQL 片段
+    # 3. 拼接筛选条件
     # --------------------------
+    where_clauses = ["1=1"]
+    params = []
 
-    # base_sql: 存储 FROM 和 WHERE 部分，供 Count 和 Select 共用
-    base_sql_parts = ["FROM SystemLog"]
-    where_clauses = ["WHERE 1=1"]  # 使用 1=1 方便后续直接 append 'AND ...'
-    base_params = []  # 存储筛选条件的参数
-
-    # 3.1 拼接筛选条件
     if filter_table:
-        where_clauses.append("AND target_table = %s")
-        base_params.append(filter_table)
+        where_clauses.append("target_table = %s")
+        params.append(filter_table)
 
     if filter_result:
-        where_clauses.append("AND result = %s")
-        base_params.append(filter_result)
+        where_clauses.append("result = %s")
+        params.append(filter_result)
 
     if keyword:
-        where_clauses.append("AND action LIKE %s")
-        base_params.append(f"%{keyword}%")
+        where_clauses.append("action LIKE %s")
+        params.append(f"%{keyword}%")
 
-    # 3.2 组合成完整的公共部分
-    # 结果类似: "FROM SystemLog WHERE 1=1 AND target_table = %s AND action LIKE %s"
-    common_sql_suffix = f"{base_sql_parts[0]} {' '.join(where_clauses)}"
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter("action_time", "log_id", "DESC", cursor_values)
+        where_clauses.append(keyset_sql)
+        params.extend(keyset_params)
 
     # --------------------------
-    # 4. 执行数据库查询
+    # 4. 执行数据库查询 (多取一条判断是否有下一页)
     # --------------------------
+    sql_data = f"""
+        SELECT log_id, action, target_table, target_id, action_time, result
+        FROM {table}
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY action_time DESC, log_id DESC
+        LIMIT %s
+    """
     with connection.cursor() as cursor:
+        cursor.execute(sql_data, params + [page_size + 1])
+        rows = dictfetchall(cursor)
 
-        # ====================
-        # 第一查：统计总数 (Count)
-        # ====================
-        # 拼接: SELECT COUNT(*) + 公共后缀
-        sql_count = f"SELECT COUNT(*) {common_sql_suffix}"
-
-        cursor.execute(sql_count, base_params)  # 直接使用 base_params
-        total_count = cursor.fetchone()[0]
-
-        # ====================
-        # 第二查：获取数据 (Select)
-        # ====================
-        # 拼接: SELECT 字段... + 公共后缀 + ORDER BY + LIMIT
-        sql_data = f"""
-            SELECT log_id, action, target_table, target_id, action_time, result
-            {common_sql_suffix}
-            ORDER BY action_time DESC
-            LIMIT %s OFFSET %s
-        """
-
-        # 构造 Select 专用的参数列表：筛选参数 + 分页参数
-        # 注意：这里必须是 base_params + [...]，顺序不能乱
-        data_params = base_params + [page_size, offset]
-
-        cursor.execute(sql_data, data_params)
-        logs = dictfetchall(cursor)
+    logs, next_cursor = paginate_rows(rows, page_size, order_key,
+                                      lambda row: [row["action_time"], row["log_id"]])
 
     # --------------------------
     # 5. 返回结果
@@ -1051,10 +1111,8 @@ def get_system_logs(request):
     return json_cn({
         "data": logs,
         "pagination": {
-            "current_page": page,
             "page_size": page_size,
-            "total_count": total_count,
-            "total_pages": (total_count + page_size - 1) // page_size
+            "next_cursor": next_cursor
         }
     })
 
@@ -1082,83 +1140,57 @@ def get_user_behavior_stats(request):
 
     # 2. 获取时间范围参数
     # 默认查看最近 7 天
-    today = datetime.date.today()
+    today = db_today()
     seven_days_ago = today - datetime.timedelta(days=7)
 
     start_date = data.get("start_date", str(seven_days_ago))  # 'YYYY-MM-DD'
     end_date = data.get("end_date", str(today))
 
-    # 构造 SQL 用的时间范围 (加上时间后缀以覆盖全天)
-    start_dt = f"{start_date} 00:00:00"
-    end_dt = f"{end_date} 23:59:59"
-
     stats_data = {}
 
     with connection.cursor() as cursor:
 
         # -------------------------------------------------
         # Part A: 数据概览 (Dashboard Summary)
-        # 统计该时间段内的总量
+        # 统计该时间段内的总量 (读取每日汇总表 DailyStats)
         # -------------------------------------------------
         sql_summary = """
-                      SELECT (SELECT COUNT(*) FROM User WHERE register_time BETWEEN %s AND %s)     as new_users, \
-                             (SELECT COUNT(*) FROM PlayHistory WHERE play_time BETWEEN %s AND %s)  as total_plays, \
-                             (SELECT COUNT(*) FROM Comment WHERE comment_time BETWEEN %s AND %s)   as total_comments, \
-                             (SELECT COUNT(*) FROM Favorite WHERE favorite_time BETWEEN %s AND %s) as total_favorites, \
-                             (SELECT COUNT(*) FROM Songlist WHERE create_time BETWEEN %s AND %s)   as new_songlists \
+                      SELECT COALESCE(SUM(new_user_count), 0) as new_users, \
+                             COALESCE(SUM(play_count), 0)     as total_plays, \
+                             COALESCE(SUM(comment_count), 0)  as total_comments, \
+                             COALESCE(SUM(favorite_count), 0) as total_favorites, \
+                             COALESCE(SUM(songlist_count), 0) as new_songlists \
+                      FROM DailyStats
+                      WHERE stat_date BETWEEN %s AND %s \
                       """
-        # 参数需要重复填入，因为有5个子查询，每个都需要 start_dt, end_dt
-        params_summary = [start_dt, end_dt] * 5
-
-        cursor.execute(sql_summary, params_summary)
+        cursor.execute(sql_summary, [start_date, end_date])
         summary_row = dictfetchall(cursor)[0]
-        stats_data['summary'] = summary_row
+        stats_data['summary'] = {key: int(value) for key, value in summary_row.items()}
 
         # -------------------------------------------------
         # Part B: 每日趋势 (Daily Trend)
         # 用于前端画折线图: x轴是日期, y轴是数量
         # -------------------------------------------------
-
-        # 1. 每日播放量
-        sql_trend_play = """
-                         SELECT DATE_FORMAT(play_time, '%%Y-%%m-%%d') as date_str, COUNT(*) as count
-                         FROM PlayHistory
-                         WHERE play_time BETWEEN %s AND %s
-                         GROUP BY date_str \
-                         ORDER BY date_str \
-                         """
-        cursor.execute(sql_trend_play, [start_dt, end_dt])
-        trend_play = dictfetchall(cursor)
-
-        # 2. 每日新增用户
-        sql_trend_user = """
-                         SELECT DATE_FORMAT(register_time, '%%Y-%%m-%%d') as date_str, COUNT(*) as count
-                         FROM User
-                         WHERE register_time BETWEEN %s AND %s
-                         GROUP BY date_str \
-                         ORDER BY date_str \
-                         """
-        cursor.execute(sql_trend_user, [start_dt, end_dt])
-        trend_user = dictfetchall(cursor)
-
-        # 3. 每日互动 (评论+收藏)
-        # 这里演示如何将两个表的统计合并 (Union All 然后 Sum)
-        sql_trend_interaction = """
-                                SELECT date_str, SUM(cnt) as count \
-                                FROM (SELECT DATE_FORMAT(comment_time, '%%Y-%%m-%%d') as date_str, COUNT(*) as cnt \
-                                      FROM Comment \
-                                      WHERE comment_time BETWEEN %s AND %s \
-                                      GROUP BY date_str \
-                                      UNION ALL \
-                                      SELECT DATE_FORMAT(favorite_time, '%%Y-%%m-%%d') as date_str, COUNT(*) as cnt \
-                                      FROM Favorite \
-                                      WHERE favorite_time BETWEEN %s AND %s \
-                                      GROUP BY date_str) as temp_table
-                                GROUP BY date_str \
-                                ORDER BY date_str \
-                                """
-        cursor.execute(sql_trend_interaction, [start_dt, end_dt, start_dt, end_dt])
-        trend_interaction = dictfetchall(cursor)
+        sql_trend = """
+                    SELECT stat_date, play_count, new_user_count, comment_count + favorite_count as interactions
+                    FROM DailyStats
+                    WHERE stat_date BETWEEN %s AND %s
+                    ORDER BY stat_date \
+                    """
+        cursor.execute(sql_trend, [start_date, end_date])
+        trend_rows = cursor.fetchall()
+
+        # 1. 每日播放量 2. 每日新增用户 3. 每日互动 (评论+收藏)
+        # 只返回数量不为 0 的日期
+        trend_play, trend_user, trend_interaction = [], [], []
+        for stat_date, plays, new_users, interactions in trend_rows:
+            date_str = str(stat_date)[:10]
+            if plays:
+                trend_play.append({"date_str": date_str, "count": plays})
+            if new_users:
+                trend_user.append({"date_str": date_str, "count": new_users})
+            if interactions:
+                trend_interaction.append({"date_str": date_str, "count": interactions})
 
         stats_data['trends'] = {
             "plays": trend_play,
@@ -1168,19 +1200,22 @@ def get_user_behavior_stats(request):
 
         # -------------------------------------------------
         # Part C: 活跃用户排行 (Top Active Users)
-        # 找出这段时间内听歌最多的前10名用户
+        # 找出这段时间内听歌最多的前10名用户 (读取每用户每日汇总表 UserDailyStats)
         # -------------------------------------------------
         sql_top_users = """
-                        SELECT u.user_id, u.user_name, u.email, COUNT(ph.play_id) as play_count
-                        FROM PlayHistory ph
-                                 JOIN User u ON ph.user_id = u.user_id
-                        WHERE ph.play_time BETWEEN %s AND %s
+                        SELECT u.user_id, u.user_name, u.email, SUM(uds.play_count) as play_count
+                        FROM UserDailyStats uds
+                                 JOIN User u ON uds.user_id = u.user_id
+                        WHERE uds.stat_date BETWEEN %s AND %s
+                          AND uds.play_count > 0
                         GROUP BY u.user_id, u.user_name, u.email
                         ORDER BY play_count DESC
                         LIMIT 10 \
                         """
-        cursor.execute(sql_top_users, [start_dt, end_dt])
+        cursor.execute(sql_top_users, [start_date, end_date])
         top_users = dictfetchall(cursor)
+        for user in top_users:
+            user['play_count'] = int(user['play_count'])
 
         stats_data['top_active_users'] = top_users
 
@@ -1218,7 +1253,7 @@ def get_specific_user_stats(request):
         return json_cn({"error": "未指定目标用户ID (target_user_id)"}, 400)
 
     # 时间范围 (默认最近 30 天)
-    today = datetime.date.today()
+    today = db_today()
     thirty_days_ago = today - datetime.timedelta(days=30)
 
     start_date = data.get("start_date", str(thirty_days_ago))
@@ -1243,41 +1278,22 @@ def get_specific_user_stats(request):
 
         # -------------------------------------------------
         # Part A: 行为概览 (Summary)
-        # 统计该时间段内的各项核心指标
+        # 统计该时间段内的各项核心指标 (读取每用户每日汇总表 UserDailyStats)
         # -------------------------------------------------
         # 使用 COALESCE 确保 SUM 返回 0 而不是 None
         sql_summary = """
-                      SELECT (SELECT COUNT(*) \
-                              FROM PlayHistory \
-                              WHERE user_id = %s AND play_time BETWEEN %s AND %s)                                   as play_count, \
-                             (SELECT COALESCE(SUM(play_duration), 0) \
-                              FROM PlayHistory \
-                              WHERE user_id = %s \
-                                AND play_time BETWEEN %s AND %s)                                                    as total_duration_sec, \
-                             (SELECT COUNT(*) \
-                              FROM Comment \
-                              WHERE user_id = %s \
-                                AND comment_time BETWEEN %s AND %s)                                                 as comment_count, \
-                             (SELECT COUNT(*) \
-                              FROM Favorite \
-                              WHERE user_id = %s \
-                                AND favorite_time BETWEEN %s AND %s)                                                as favorite_count, \
-                             (SELECT COUNT(*) \
-                              FROM Songlist \
-                              WHERE user_id = %s \
-                                AND create_time BETWEEN %s AND %s)                                                  as songlist_created \
+                      SELECT COALESCE(SUM(play_count), 0)     as play_count, \
+                             COALESCE(SUM(play_duration), 0)  as total_duration_sec, \
+                             COALESCE(SUM(comment_count), 0)  as comment_count, \
+                             COALESCE(SUM(favorite_count), 0) as favorite_count, \
+                             COALESCE(SUM(songlist_count), 0) as songlist_created \
+                      FROM UserDailyStats
+                      WHERE user_id = %s \
+                        AND stat_date BETWEEN %s AND %s \
                       """
-        # 参数顺序对应 SQL 中的 %s
-        params_summary = [
-            target_user_id, start_dt, end_dt,  # Play Count
-            target_user_id, start_dt, end_dt,  # Duration
-            target_user_id, start_dt, end_dt,  # Comment
-            target_user_id, start_dt, end_dt,  # Favorite
-            target_user_id, start_dt, end_dt  # Songlist
-        ]
-
-        cursor.execute(sql_summary, params_summary)
-        stats['behavior_summary'] = dictfetchall(cursor)[0]
+        cursor.execute(sql_summary, [target_user_id, start_date, end_date])
+        summary_row = dictfetchall(cursor)[0]
+        stats['behavior_summary'] = {key: int(value) for key, value in summary_row.items()}
 
         # 转换一下时长显示 (分钟)
         total_sec = stats['behavior_summary']['total_duration_sec']
@@ -1288,34 +1304,32 @@ def get_specific_user_stats(request):
         # -------------------------------------------------
 
         # 1. 最常听的歌手 (Top Artist)
-        # 关联路径: PlayHistory -> Song -> Song_Singer -> Singer
-        sql_top_singer = """
-                         SELECT s.singer_name, s.type, COUNT(*) as listen_count
-                         FROM PlayHistory ph
-                                  JOIN Song_Singer ss ON ph.song_id = ss.song_id
+        # 关联路径: PlayHistory (+ 归档) -> Song_Singer -> Singer
+        plays_sql, plays_params = user_song_plays_sql(target_user_id, start_dt, end_dt)
+        sql_top_singer = f"""
+                         SELECT s.singer_name, s.type, SUM(p.plays) as listen_count
+                         FROM {plays_sql} p
+                                  JOIN Song_Singer ss ON p.song_id = ss.song_id
                                   JOIN Singer s ON ss.singer_id = s.singer_id
-                         WHERE ph.user_id = %s \
-                           AND ph.play_time BETWEEN %s AND %s
                          GROUP BY s.singer_id, s.singer_name, s.type
                          ORDER BY listen_count DESC
                          LIMIT 1 \
                          """
-        cursor.execute(sql_top_singer, [target_user_id, start_dt, end_dt])
+        cursor.execute(sql_top_singer, plays_params)
         top_singer_data = dictfetchall(cursor)
         stats['top_artist'] = top_singer_data[0] if top_singer_data else None
 
         # 2. 听歌时间分布 (比如：深夜党还是白日党)
         # 统计播放发生在哪个小时段 (0-23)
-        sql_active_hour = """
-                          SELECT HOUR(play_time) as hour_of_day, COUNT(*) as count
-                          FROM PlayHistory
-                          WHERE user_id = %s \
-                            AND play_time BETWEEN %s AND %s
+        plays_sql, plays_params = user_plays_sql(target_user_id, start_dt, end_dt)
+        sql_active_hour = f"""
+                          SELECT HOUR(p.play_time) as hour_of_day, COUNT(*) as count
+                          FROM {plays_sql} p
                           GROUP BY hour_of_day
                           ORDER BY count DESC
                           LIMIT 1 \
                           """
-        cursor.execute(sql_active_hour, [target_user_id, start_dt, end_dt])
+        cursor.execute(sql_active_hour, plays_params)
         hour_data = dictfetchall(cursor)
         stats['peak_hour'] = hour_data[0]['hour_of_day'] if hour_data else None
 
@@ -1324,17 +1338,19 @@ def get_specific_user_stats(request):
         # 用于生成该用户的活跃度折线图
         # -------------------------------------------------
         sql_trend = """
-                    SELECT DATE_FORMAT(play_time, '%%Y-%%m-%%d') as date_str,
-                           COUNT(*)                              as plays,
-                           SUM(play_duration)                    as duration
-                    FROM PlayHistory
+                    SELECT stat_date as date_str,
+                           play_count as plays,
+                           play_duration as duration
+                    FROM UserDailyStats
                     WHERE user_id = %s \
-                      AND play_time BETWEEN %s AND %s
-                    GROUP BY date_str
-                    ORDER BY date_str ASC \
+                      AND stat_date BETWEEN %s AND %s \
+                      AND play_count > 0
+                    ORDER BY stat_date ASC \
                     """
-        cursor.execute(sql_trend, [target_user_id, start_dt, end_dt])
+        cursor.execute(sql_trend, [target_user_id, start_date, end_date])
         stats['daily_trend'] = dictfetchall(cursor)
+        for day in stats['daily_trend']:
+            day['date_str'] = str(day['date_str'])[:10]
 
         # -------------------------------------------------
         # Part D: 社交影响力 (Social)
@@ -1423,19 +1439,22 @@ def admin_audit_comment(request):
         with connection.cursor() as cursor:
 
             # 先查一下评论信息 (为了获取 user_id 用于封禁)
-            cursor.execute("SELECT user_id, content FROM Comment WHERE comment_id = %s", [comment_id])
+            cursor.execute(
+                "SELECT user_id, content, target_type, target_id FROM Comment WHERE comment_id = %s",
+                [comment_id]
+            )
             row = cursor.fetchone()
             if not row:
                 return json_cn({"error": "评论不存在"}, 404)
 
-            user_id, content_preview = row
+            user_id, content_preview, target_type, target_id = row
 
             # ==============================
             # 情况 A: 审核通过 (改为正常)
             # ==============================
             if audit_result == 'pass':
-                sql_pass = "UPDATE Comment SET status = '正常' WHERE comment_id = %s"
-                cursor.execute(sql_pass, [comment_id])
+                # 审核通过后计入楼层回复数
+                set_comment_status(comment_id, '正常')
 
                 add_system_log(f"审核通过评论: {content_preview[:10]}...", "Comment", comment_id, "success")
                 return json_cn({"message": "操作成功，评论已恢复正常"})
@@ -1450,26 +1469,88 @@ def admin_audit_comment(request):
                     # 更新用户状态
                     sql_ban = "UPDATE User SET status = '封禁中' WHERE user_id = %s"
                     cursor.execute(sql_ban, [user_id])
+                    # 使缓存的用户状态失效，被封禁用户的下一个请求即被拒绝
+                    invalidate_user(user_id)
 
                     # 这里只处理当前这一条评论。
 
                     add_system_log(f"封禁用户(因违规评论): ID={user_id}", "User", user_id, "success")
 
-                # 2. 删除该条违规评论
+                # 2. 删除该条违规评论及其所有回复 (与用户删除评论一致，不留下无主的回复)
                 # 建议：如果只是"删除"，物理删除即可。
                 # 如果想留存证据，可以把 status 改为 '已删除'
                 # 这里直接删除
-                sql_delete = "DELETE FROM Comment WHERE comment_id = %s"
-                cursor.execute(sql_delete, [comment_id])
+                with transaction.atomic():
+                    deleted = delete_comment_tree(comment_id)
+                invalidate_profile(target_type, target_id)
 
                 action_msg = "审核驳回并删除" + ("(且封号)" if ban_user else "")
-                add_system_log(f"{action_msg}: {content_preview[:10]}...", "Comment", comment_id, "success")
+                add_system_log(f"{action_msg}: {content_preview[:10]}... (共 {deleted} 条)", "Comment", comment_id, "success")
 
-                return json_cn({"message": "违规评论已删除" + ("，用户已封禁" if ban_user else "")})
+                return json_cn({
+                    "message": "违规评论已删除" + ("，用户已封禁" if ban_user else ""),
+                    "deleted_count": deleted
+                })
 
             return None
 
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("审核评论失败: %s", comment_id)
         add_system_log(f"审核操作失败 ID={comment_id}", "Comment", comment_id, "fail")
-        return json_cn({"error": "操作失败"}, 500)
\ No newline at end of file
+        return json_cn({"error": "操作失败"}, 500)
+
+# ================================
+# 15. 查看播放防刷窗口命中率
+# ================================
+# hits: 直接由时间窗口判断; misses: 窗口不可信 (如刚重启) 回退查询数据库
+def get_play_dedup_stats(request):
+    ok, resp = require_admin(request)
+    if not ok:
+        return resp
+
+    if request.method != "GET":
+        return json_cn({"error": "GET required"}, 400)
+
+    return json_cn(playhistory.play_dedup.stats())
+
+# ================================
+# 16. 查看数据库连接池状态
+# ================================
+# pools: 各连接池的大小、占用、新建/回收次数、等待超时次数
+# request_acquire_ms: 最近请求取连接耗时的分位数，p95/p99 明显升高说明 MAX_SIZE 不够
+def get_db_pool_stats(request):
+    ok, resp = require_admin(request)
+    if not ok:
+        return resp
+
+    if request.method != "GET":
+        return json_cn({"error": "GET required"}, 400)
+
+    return json_cn(get_pool_stats())
+
+# ================================
+# 17. 查看接口耗时与 SQL 统计
+# ================================
+# 按路由统计: 耗时直方图和分位数、每个请求的 SQL 条数和数据库耗时、最慢的 SQL、
+# n_plus_one: 同一请求中重复执行达到 N_PLUS_ONE_THRESHOLD 次的 SQL (循环中逐条查询)
+# GET 查看 (可用 route 参数按路由筛选)，POST 清空统计重新开始
+@csrf_exempt
+def get_request_profile(request):
+    ok, resp = require_admin(request)
+    if not ok:
+        return resp
+
+    if request.method not in ("GET", "POST"):
+        return json_cn({"error": "GET or POST required"}, 400)
+
+    config = requestProfiler.get_config()
+    snapshot = requestProfiler.profiler.snapshot(config["SLOW_QUERIES"])
+    if request.method == "POST":
+        requestProfiler.profiler.reset()
+
+    route = request.GET.get("route")
+    if route:
+        snapshot["routes"] = {name: stats for name, stats in snapshot["routes"].items() if route in name}
+    snapshot["enabled"] = config["ENABLED"]
+    snapshot["n_plus_one_threshold"] = config["N_PLUS_ONE_THRESHOLD"]
+    return json_cn(snapshot)
@@ -4,6 +4,12 @@ from django.db import connection
 from django.views.decorators.csrf import csrf_exempt
 import json
 from .tools import *
+from .searchIndex import search_filter
+from .cache import get_profile_cache, load_profile_version, aload_profile_version
+from .profileVersion import not_modified, add_validators
+from .likeCounter import merge_profile_likes, pending_generation
+from .jsonStream import JSONArray, batched, json_stream
+from .asyncQuery import run_queries, arun, arun_queries, async_csrf_exempt
 
 
 
@@ -16,7 +22,7 @@ def search_singer(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
     
     if request.method != "POST":
@@ -44,8 +50,9 @@ def search_singer(request):
         filters.append("country = %s")
         params.append(country)
     if singer_name and singer_name != "":
-        filters.append("singer_name LIKE %s")
-        params.append("%" + singer_name + "%")
+        name_sql, name_params = search_filter("singer", "s.singer_id", "s.singer_name", singer_name)
+        filters.append(name_sql)
+        params.extend(name_params)
 
 
     # --------------------------
@@ -56,7 +63,7 @@ def search_singer(request):
     orderDir = "DESC" if str(orderDir).lower() == "desc" else "ASC"
 
     join_clause = ""
-    order_clause = "s.singer_name " + orderDir
+    sort_expr = "s.singer_name"
 
     if orderType == "songs":
         join_clause = """
@@ -66,7 +73,7 @@ def search_singer(request):
                 GROUP BY singer_id
             ) song_count ON song_count.singer_id = s.singer_id
         """
-        order_clause = "total_songs " + orderDir
+        sort_expr = "COALESCE(song_count.total_songs, 0)"
     elif orderType == "followers":
         join_clause = """
             LEFT JOIN (
@@ -75,68 +82,68 @@ def search_singer(request):
                 GROUP BY singer_id
             ) follow_count ON follow_count.singer_id = s.singer_id
         """
-        order_clause = "followers " + orderDir
-  
+        sort_expr = "COALESCE(follow_count.followers, 0)"
+    else:
+        orderType = "name"
+
+    # --------------------------
+    # 4. 分页参数 (游标分页)
+    # --------------------------
+    page_size = get_page_size(data)
+    order_key = f"{orderType}:{orderDir}"
+    try:
+        cursor_values = decode_cursor(data.get("cursor"), order_key)
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
+
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter(sort_expr, "s.singer_id", orderDir, cursor_values)
+        filters.append(keyset_sql)
+        params.extend(keyset_params)
+
     # --------------------------
-    # 4. 正式查找歌手
+    # 5. 正式查找歌手
     # --------------------------
 
     where_clause = "WHERE " + " AND ".join(filters) if filters else ""
 
     sql = f"""
         SELECT
-            s.singer_id, s.singer_name, s.type, s.country
-            {', COALESCE(song_count.total_songs, 0) AS total_songs' if orderType == 'songs' else ''}
-            {', COALESCE(follow_count.followers, 0) AS followers' if orderType == 'followers' else ''}
+            s.singer_id, s.singer_name, s.type, s.country,
+            {sort_expr} AS sort_key
         FROM Singer s
         {join_clause}
         {where_clause}
-        ORDER BY {order_clause}
+        ORDER BY sort_key {orderDir}, s.singer_id {orderDir}
+        LIMIT %s
     """
 
     with connection.cursor() as cursor:
-        cursor.execute(sql, params)
+        cursor.execute(sql, params + [page_size + 1])
         rows = cursor.fetchall()
 
-    # ------------------------
-    # 5. 查询数量
-    # ------------------------
-    sql_count = f"""
-        SELECT COUNT(*)
-        FROM Singer
-        {where_clause}
-    """
-
-    with connection.cursor() as cursor:
-        cursor.execute(sql_count, params)
-        total = cursor.fetchone()[0]
+    rows, next_cursor = paginate_rows(rows, page_size, order_key, lambda row: [row[4], row[0]])
 
 
     # --------------------------
     # 6. 返回搜索结果
     # --------------------------
     singers = []
-    for row in rows:
-        singer_id, singer_name, singer_type, country = row[:4]
-        songs_count = None
-        followers_count = None
-        if orderType == "songs":
-            songs_count = row[4]
-        elif orderType == "followers":
-            followers_count = row[4]
-
+    for singer_id, singer_name, singer_type, country, sort_key in rows:
         singers.append({
             "singer_id": singer_id,
             "singer_name": singer_name,
             "type": singer_type,
             "country": country,
-            "songs_count": songs_count,
-            "followers_count": followers_count
+            "songs_count": sort_key if orderType == "songs" else None,
+            "followers_count": sort_key if orderType == "followers" else None
         })
 
     return json_cn({
-        "total": total,
-        "singers": singers
+        "total": len(singers),
+        "singers": singers,
+        "page_size": page_size,
+        "next_cursor": next_cursor
     })
 
 
@@ -145,35 +152,14 @@ def search_singer(request):
 # ================================
 # 2. 歌手详情
 # ================================
-@csrf_exempt
-def singer_profile(request, singer_id):
-    # --------------------------
-    # 1. 检查登录状态
-    # --------------------------
-    if "user_id" not in request.session:
-        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
-
-    # --------------------------
-    # 2. 查询歌手信息
-    # --------------------------
-    sql_list = """
+def singer_profile_queries(singer_id):
+    "歌手详情需要的查询，相互独立，异步视图中并发执行"
+    sql_info = """
         SELECT singer_name, type, country, birthday, introduction
         FROM Singer
         WHERE singer_id = %s
     """
-    with connection.cursor() as cursor:
-        cursor.execute(sql_list, [singer_id])
-        row = cursor.fetchone()
-
-    if not row:
-        return json_cn({"error": "歌手不存在"}, 404)
-
-    singer_name, singer_type, country, birthday, introduction = row
 
-
-    # --------------------------
-    # 3. 查询歌手的歌曲列表
-    # --------------------------
     sql_songs = """
         SELECT 
             s.song_id,
@@ -186,12 +172,32 @@ def singer_profile(request, singer_id):
         WHERE ss.singer_id = %s
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_songs, [singer_id])
-        song_rows = cursor.fetchall()
+    sql_albums = """
+        SELECT 
+            a.album_id,
+            a.album_title,
+            a.release_date
+        FROM Album a
+        JOIN Singer s ON s.singer_id = a.singer_id
+        WHERE s.singer_id = %s
+    """
+    return [(sql_info, [singer_id]), (sql_songs, [singer_id]), (sql_albums, [singer_id])]
+
+
+def build_singer_profile(singer_id, results):
+    "由查询结果生成歌手详情数据，歌手不存在时返回 None"
+    info_rows, song_rows, album_rows = results
+
+    # --------------------------
+    # 1. 歌手信息
+    # --------------------------
+    if not info_rows:
+        return None
+
+    singer_name, singer_type, country, birthday, introduction = info_rows[0]
 
     # --------------------------
-    # 4. 生成歌手歌曲列表
+    # 2. 生成歌手歌曲列表
     # --------------------------
     songs = []
     for (song_id, song_title, duration, album_title) in song_rows:
@@ -203,50 +209,76 @@ def singer_profile(request, singer_id):
             "album_title": album_title
         })
 
-
-    # --------------------------
-    # 5. 查询歌手的专辑列表
-    # --------------------------
-    sql_albums = """
-        SELECT 
-            a.album_id,
-            a.album_title,
-            a.release_date
-        FROM Album a
-        JOIN Singer s ON s.singer_id = a.singer_id
-        WHERE s.singer_id = %s
-    """
-
-    with connection.cursor() as cursor:
-        cursor.execute(sql_albums, [singer_id])
-        album_rows = cursor.fetchall()
-
     # --------------------------
-    # 6. 生成歌手专辑列表
+    # 3. 生成歌手专辑列表
     # --------------------------
     albums = []
     for (album_id, album_title, release_date) in album_rows:
         albums.append({
             "album_id": album_id,
             "album_title": album_title,
-            "release_date": str(release_date) if release_date else None
+            "release_date": release_date
         })
 
     # --------------------------
-    # 7. 返回歌手详情
+    # 4. 返回歌手详情
     # --------------------------
-    return json_cn({
+    return {
         "singer_id": singer_id,
         "singer_name": singer_name,
         "type": singer_type,
         "country": country,
-        "birthday": str(birthday) if birthday else None,
+        "birthday": birthday,
         "introduction": introduction,
         "song_count": len(songs),
         "songs": songs,
         "album_count": len(albums),
         "albums": albums
-    })
+    }
+
+
+def load_singer_profile(singer_id):
+    "查询歌手详情数据，不存在时返回 None"
+    return build_singer_profile(singer_id, run_queries(singer_profile_queries(singer_id)))
+
+
+async def aload_singer_profile(singer_id):
+    return build_singer_profile(singer_id, await arun_queries(singer_profile_queries(singer_id)))
+
+
+@csrf_exempt
+def singer_profile(request, singer_id):
+    # --------------------------
+    # 1. 检查登录状态
+    # --------------------------
+    if not request.current_user:
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    # --------------------------
+    # 2. 客户端缓存仍是最新时返回 304 (见 profileVersion.py)
+    # --------------------------
+    version = load_profile_version("singer", singer_id)
+    if version is None:
+        return json_cn({"error": "歌手不存在"}, 404)
+    response = not_modified(request, version)
+    if response:
+        return response
+
+    # --------------------------
+    # 3. 读取详情 (优先读缓存)
+    # --------------------------
+    profile = get_profile_cache().get_or_build(
+        "singer", singer_id, lambda: load_singer_profile(singer_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "歌手不存在"}, 404)
+
+    # 歌曲、专辑列表分批编码输出，不在每个请求中生成完整的 JSON 字符串
+    # (数据来自详情页缓存，多个请求共用，因此不从数据库流式读取)
+    response = json_stream(dict(profile, songs=JSONArray(batched(profile["songs"])),
+                                albums=JSONArray(batched(profile["albums"]))))
+    return add_validators(response, version)
+
 
 
 
@@ -258,7 +290,7 @@ def search_album(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
     
     if request.method != "POST":
@@ -279,11 +311,13 @@ def search_album(request):
     params = []
 
     if album_title:
-        filters.append("a.album_title LIKE %s")
-        params.append(f"%{album_title}%")
+        title_sql, title_params = search_filter("album", "a.album_id", "a.album_title", album_title)
+        filters.append(title_sql)
+        params.extend(title_params)
     if singer_name:
-        filters.append("sg.singer_name LIKE %s")
-        params.append(f"%{singer_name}%")
+        name_sql, name_params = search_filter("singer", "sg.singer_id", "sg.singer_name", singer_name)
+        filters.append(name_sql)
+        params.extend(name_params)
 
     
     # --------------------------
@@ -293,21 +327,44 @@ def search_album(request):
     orderDir = data.get("direction")    # asc / desc
     orderDir = "DESC" if str(orderDir).lower() == "desc" else "ASC"
 
-    order = "a.album_title " + orderDir # 默认按名字排序
+    sort_expr = "a.album_title"         # 默认按名字排序
     join = ""
 
     if orderType == "release_date":
-        order = "a.release_date " + orderDir
+        sort_expr = "a.release_date"
     elif orderType == "songs_count":
-        join = "LEFT JOIN Song s ON s.album_id = a.album_id"
-        order = "COUNT(s.song_id) " + orderDir
+        join = """
+            LEFT JOIN (
+                SELECT album_id, COUNT(*) AS songs_count
+                FROM Song
+                GROUP BY album_id
+            ) sc ON sc.album_id = a.album_id
+        """
+        sort_expr = "COALESCE(sc.songs_count, 0)"
+    else:
+        orderType = "album_title"
+
+    # --------------------------
+    # 4. 分页参数 (游标分页)
+    # --------------------------
+    page_size = get_page_size(data)
+    order_key = f"{orderType}:{orderDir}"
+    try:
+        cursor_values = decode_cursor(data.get("cursor"), order_key)
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
+
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter(sort_expr, "a.album_id", orderDir, cursor_values)
+        filters.append(keyset_sql)
+        params.extend(keyset_params)
 
     # --------------------------
-    # 4. 查询专辑信息
+    # 5. 查询专辑信息
     # --------------------------
     sql_album = f"""
-        SELECT a.album_id, a.album_title, sg.singer_name, a.release_date
-        {', COUNT(s.song_id) AS songs_count' if orderType == 'songs_count' else ''}
+        SELECT a.album_id, a.album_title, sg.singer_name, a.release_date,
+               {sort_expr} AS sort_key
         FROM Album a
         JOIN Singer sg ON a.singer_id = sg.singer_id
         {join}
@@ -315,38 +372,38 @@ def search_album(request):
 
     if filters:
         sql_album += " WHERE " + " AND ".join(filters)
-    if orderType == 'songs_count':
-        sql_album += " GROUP BY a.album_id"
 
-    sql_album += f" ORDER BY {order}"
+    sql_album += f" ORDER BY sort_key {orderDir}, a.album_id {orderDir} LIMIT %s"
 
     with connection.cursor() as cursor:
-        cursor.execute(sql_album, params)
+        cursor.execute(sql_album, params + [page_size + 1])
         rows = cursor.fetchall()
 
 
     if not rows:
-        return json_cn({"message": "未找到符合条件专辑", "albums": []})
+        return json_cn({"message": "未找到符合条件专辑", "albums": [], "next_cursor": None})
+
+    rows, next_cursor = paginate_rows(rows, page_size, order_key, lambda row: [row[4], row[0]])
 
 
     # --------------------------
-    # 5. 返回搜索结果
+    # 6. 返回搜索结果
     # --------------------------
     albums = []
-    for row in rows:
-        album_id, album_title, singer_name, release_date = row[:4]
-        songs_count = row[4] if orderType == "songs_count" else None
+    for album_id, album_title, singer_name, release_date, sort_key in rows:
         albums.append({
             "album_id": album_id,
             "album_title": album_title,
             "singer_name": singer_name,
-            "release_date": str(release_date) if release_date else None,
-            "songs_count": songs_count
+            "release_date": release_date,
+            "songs_count": sort_key if orderType == "songs_count" else None
         })
 
     return json_cn({
         "total": len(albums),
-        "albums": albums
+        "albums": albums,
+        "page_size": page_size,
+        "next_cursor": next_cursor
     })
 
 
@@ -354,37 +411,16 @@ def search_album(request):
 # ================================
 # 4. 专辑详情
 # ================================
-@csrf_exempt
-def album_profile(request, album_id):
-    # --------------------------
-    # 1. 检查登录状态
-    # --------------------------
-    if "user_id" not in request.session:
-        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
-
-    # --------------------------
-    # 2. 查询专辑信息
-    # --------------------------
-    sql_list = """
+def album_profile_queries(album_id):
+    "专辑详情需要的查询，相互独立，异步视图中并发执行"
+    sql_info = """
         SELECT album_title, release_date, cover_url, description, sg.singer_name, sg.singer_id
         FROM Album a
         JOIN Singer sg ON sg.singer_id = a.singer_id
         WHERE a.album_id = %s
     """
-    with connection.cursor() as cursor:
-        cursor.execute(sql_list, [album_id])
-        row = cursor.fetchone()
 
-    if not row:
-        return json_cn({"error": "专辑不存在"}, 404)
-
-    album_title, release_date, cover_url, description, singer_name, singer_id = row
-
-
-    # --------------------------
-    # 3. 查询专辑的歌曲列表
-    # --------------------------
-    sql_albums = """
+    sql_songs = """
         SELECT 
             s.song_id,
             s.song_title,
@@ -402,15 +438,6 @@ def album_profile(request, album_id):
         WHERE a.album_id = %s
     """
 
-    sql_singers = """
-        SELECT
-            sg.singer_id,
-            sg.singer_name
-        FROM Singer sg
-        JOIN Song_Singer ss ON ss.singer_id = sg.singer_id
-        WHERE ss.song_id = %s
-    """
-
     sql_comment = """
         SELECT 
             u.user_id, u.user_name, c.comment_id, c.content, c.like_count, c.comment_time
@@ -420,37 +447,55 @@ def album_profile(request, album_id):
         ORDER BY comment_time DESC
     """
 
+    # 专辑中所有歌曲的歌手 (按专辑查询，不依赖歌曲列表的结果)
+    sql_singers = """
+        SELECT ss.song_id, si.singer_id, si.singer_name
+        FROM Song s
+        JOIN Song_Singer ss ON ss.song_id = s.song_id
+        JOIN Singer si ON si.singer_id = ss.singer_id
+        WHERE s.album_id = %s
+        ORDER BY ss.song_id, si.singer_id
+    """
+    return [
+        (sql_info, [album_id]),
+        (sql_songs, [album_id]),
+        (sql_total_duration, [album_id]),
+        (sql_comment, [album_id]),
+        (sql_singers, [album_id]),
+    ]
+
+
+def build_album_profile(album_id, results):
+    "由查询结果生成专辑详情数据，专辑不存在时返回 None"
+    info_rows, song_rows, total_rows, comment_rows, singer_rows = results
+
     # --------------------------
-    # 4. 查询并生成专辑歌曲列表
+    # 1. 专辑信息
     # --------------------------
-    songs = []
+    if not info_rows:
+        return None
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_albums, [album_id])
-        song_rows = cursor.fetchall()
-
-        cursor.execute(sql_total_duration, [album_id])
-        total_duration = cursor.fetchone()[0]
-        
-        for (song_id, song_title, duration) in song_rows:
-            cursor.execute(sql_singers, [song_id])
-            singer_rows = cursor.fetchall()
-            song_singers = [{"singer_id": row[0], "singer_name": row[1]} for row in singer_rows]
+    album_title, release_date, cover_url, description, singer_name, singer_id = info_rows[0]
+    total_duration = total_rows[0][0]
 
-            songs.append({
-                "song_id": song_id,
-                "song_title": song_title,
-                "duration": duration,
-                "duration_formatted": format_time(duration),
-                "singers": song_singers
-            })
+    # --------------------------
+    # 2. 生成专辑歌曲列表
+    # --------------------------
+    song_singers = group_song_singers(singer_rows)
 
-        cursor.execute(sql_comment, [album_id])
-        comment_rows = cursor.fetchall()
+    songs = []
+    for (song_id, song_title, duration) in song_rows:
+        songs.append({
+            "song_id": song_id,
+            "song_title": song_title,
+            "duration": duration,
+            "duration_formatted": format_time(duration),
+            "singers": song_singers.get(song_id, [])
+        })
 
 
     # --------------------------
-    # 5. 生成专辑评论列表
+    # 3. 生成专辑评论列表
     # --------------------------
     comments = []
     for user_id, user_name, comment_id, content, like_count, comment_time in comment_rows:
@@ -464,14 +509,14 @@ def album_profile(request, album_id):
         })
 
     # --------------------------
-    # 6. 返回专辑详情
+    # 4. 返回专辑详情
     # --------------------------
-    return json_cn({
+    return {
         "album_id": album_id,
         "album_title": album_title,
         "singer_id": singer_id,
         "singer_name": singer_name,
-        "release_date": str(release_date) if release_date else None,
+        "release_date": release_date,
         "cover_url": cover_url,
         "description": description,
         "song_count": len(songs),
@@ -480,7 +525,48 @@ def album_profile(request, album_id):
         "songs": songs,
         "comment_count": len(comments),
         "comments": comments
-    })
+    }
+
+
+def load_album_profile(album_id):
+    "查询专辑详情数据，不存在时返回 None"
+    return build_album_profile(album_id, run_queries(album_profile_queries(album_id)))
+
+
+async def aload_album_profile(album_id):
+    return build_album_profile(album_id, await arun_queries(album_profile_queries(album_id)))
+
+
+@csrf_exempt
+def album_profile(request, album_id):
+    # --------------------------
+    # 1. 检查登录状态
+    # --------------------------
+    if not request.current_user:
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    # --------------------------
+    # 2. 客户端缓存仍是最新时返回 304 (见 profileVersion.py)
+    # --------------------------
+    version = load_profile_version("album", album_id)
+    if version is None:
+        return json_cn({"error": "专辑不存在"}, 404)
+    response = not_modified(request, version, pending_generation())
+    if response:
+        return response
+
+    # --------------------------
+    # 3. 读取详情 (优先读缓存)
+    # --------------------------
+    profile = get_profile_cache().get_or_build(
+        "album", album_id, lambda: load_album_profile(album_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "专辑不存在"}, 404)
+
+    profile, pending = merge_profile_likes(profile)
+    return add_validators(json_cn(profile), version, pending)
+
 
 
 
@@ -492,7 +578,7 @@ def search_song(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    user_id = request.session.get("user_id")
+    user_id = current_user_id(request)
     if not user_id:
         return json_cn({"error": "请先登录"}, 403)
 
@@ -516,14 +602,17 @@ def search_song(request):
     params = []
 
     if song_title:
-        filters.append("s.song_title LIKE %s")
-        params.append(f"%{song_title}%")
+        title_sql, title_params = search_filter("song", "s.song_id", "s.song_title", song_title)
+        filters.append(title_sql)
+        params.extend(title_params)
     if album_title:
-        filters.append("a.album_title LIKE %s")
-        params.append(f"%{album_title}%")
+        album_sql, album_params = search_filter("album", "a.album_id", "a.album_title", album_title)
+        filters.append(album_sql)
+        params.extend(album_params)
     if singer_name:
-        filters.append("si.singer_name LIKE %s")
-        params.append(f"%{singer_name}%")
+        name_sql, name_params = search_filter("singer", "si.singer_id", "si.singer_name", singer_name)
+        filters.append(name_sql)
+        params.extend(name_params)
 
 
     # --------------------------
@@ -536,11 +625,27 @@ def search_song(request):
     allowed_order = ["duration", "play_count", "song_title"]
     if orderType not in allowed_order:  
         orderType = "song_title"    # 默认按名字排序
-    order = f"s.{orderType} {orderDir}"
+    sort_expr = f"s.{orderType}"
 
 
     # --------------------------
-    # 4. 查询歌曲信息
+    # 4. 分页参数 (游标分页)
+    # --------------------------
+    page_size = get_page_size(data)
+    order_key = f"{orderType}:{orderDir}"
+    try:
+        cursor_values = decode_cursor(data.get("cursor"), order_key)
+    except ValueError:
+        return json_cn({"error": "无效的分页游标"}, 400)
+
+    if cursor_values:
+        keyset_sql, keyset_params = keyset_filter(sort_expr, "s.song_id", orderDir, cursor_values)
+        filters.append(keyset_sql)
+        params.extend(keyset_params)
+
+
+    # --------------------------
+    # 5. 查询歌曲信息
     # --------------------------
     # Base SQL query
     sql_song = """
@@ -556,48 +661,45 @@ def search_song(request):
         JOIN Singer si ON ss.singer_id = si.singer_id
         """
     
-    sql_singers = """
-        SELECT si.singer_id, si.singer_name 
-        FROM Singer si
-        JOIN Song_Singer ss ON si.singer_id = ss.singer_id
-        WHERE ss.song_id = %s
-    """
-
     if filters:
         sql_song += " WHERE " + " AND ".join(filters)
 
-    sql_song += f"ORDER BY {order}"
+    sql_song += f" ORDER BY {sort_expr} {orderDir}, s.song_id {orderDir} LIMIT %s"
 
 
     with connection.cursor() as cursor:
-        cursor.execute(sql_song, params)
+        cursor.execute(sql_song, params + [page_size + 1])
         rows = cursor.fetchall()
 
-        if not rows:
-            return json_cn({"message": "未找到符合歌曲", "songs": []})
-            
-        # --------------------------
-        # 5. 生成歌曲列表
-        # --------------------------
-        songs = []
-        for (song_id, song_title, duration, play_count, album_title) in rows:
-            cursor.execute(sql_singers, [song_id])
-            singer_rows = cursor.fetchall()
-            song_singers = [{"singer_id": row[0], "singer_name": row[1]} for row in singer_rows]
-
-            songs.append({
-                "song_id": song_id,
-                "song_title": song_title,
-                "duration": duration,
-                "duration_formatted": format_time(duration),
-                "play_count": play_count,
-                "album_title": album_title,
-                "singers": song_singers
-            })
+    if not rows:
+        return json_cn({"message": "未找到符合歌曲", "songs": [], "next_cursor": None})
+
+    sort_index = {"song_title": 1, "duration": 2, "play_count": 3}[orderType]
+    rows, next_cursor = paginate_rows(rows, page_size, order_key, lambda row: [row[sort_index], row[0]])
+
+    # --------------------------
+    # 6. 生成歌曲列表
+    # --------------------------
+    # 批量查询所有歌曲的歌手
+    song_singers = fetch_song_singers([row[0] for row in rows])
+
+    songs = []
+    for (song_id, song_title, duration, play_count, album_title) in rows:
+        songs.append({
+            "song_id": song_id,
+            "song_title": song_title,
+            "duration": duration,
+            "duration_formatted": format_time(duration),
+            "play_count": play_count,
+            "album_title": album_title,
+            "singers": song_singers.get(song_id, [])
+        })
 
     return json_cn({
         "total": len(songs),
-        "songs": songs
+        "songs": songs,
+        "page_size": page_size,
+        "next_cursor": next_cursor
     })
 
 
@@ -606,17 +708,8 @@ def search_song(request):
 # ================================
 # 6. 歌曲详情
 # ================================
-@csrf_exempt
-def song_profile(request, song_id):
-    # --------------------------
-    # 1. 检查登录状态
-    # --------------------------
-    if "user_id" not in request.session:
-        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
-
-    # --------------------------
-    # 2. 查询歌曲信息
-    # --------------------------
+def song_profile_queries(song_id):
+    "歌曲详情需要的查询，相互独立，异步视图中并发执行"
     sql_song = """
         SELECT s.song_id, s.song_title, s.duration, a.album_id, a.album_title
         FROM Song s
@@ -624,13 +717,6 @@ def song_profile(request, song_id):
         WHERE s.song_id = %s
     """
 
-    sql_singer = """
-        SELECT sg.singer_id, sg.singer_name
-        FROM Singer sg
-        JOIN Song_Singer ss ON ss.singer_id = sg.singer_id
-        WHERE ss.song_id = %s
-    """
-
     sql_comment = """
         SELECT 
             u.user_id, u.user_name, c.comment_id, c.content, c.like_count, c.comment_time
@@ -640,25 +726,32 @@ def song_profile(request, song_id):
         ORDER BY comment_time DESC
     """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_song, [song_id])
-        song_row = cursor.fetchone()
-        
-        if not song_row:
-            return json_cn({"error": "歌曲不存在"}, 404)
-        
-        song_id, song_title, duration, album_id, album_title = song_row
+    sql_singers = """
+        SELECT ss.song_id, si.singer_id, si.singer_name
+        FROM Song_Singer ss
+        JOIN Singer si ON si.singer_id = ss.singer_id
+        WHERE ss.song_id = %s
+        ORDER BY si.singer_id
+    """
+    return [(sql_song, [song_id]), (sql_comment, [song_id]), (sql_singers, [song_id])]
+
 
-        cursor.execute(sql_singer, [song_id])
-        singer_rows = cursor.fetchall()
-        singers = [{"singer_id": row[0], "singer_name": row[1]} for row in singer_rows]
+def build_song_profile(song_id, results):
+    "由查询结果生成歌曲详情数据，歌曲不存在时返回 None"
+    song_rows, comment_rows, singer_rows = results
 
-        cursor.execute(sql_comment, [song_id])
-        comment_rows = cursor.fetchall()
+    # --------------------------
+    # 1. 歌曲信息
+    # --------------------------
+    if not song_rows:
+        return None
+
+    song_id, song_title, duration, album_id, album_title = song_rows[0]
+    singers = group_song_singers(singer_rows).get(song_id, [])
 
 
     # --------------------------
-    # 3. 生成歌曲评论列表
+    # 2. 生成歌曲评论列表
     # --------------------------
     comments = []
     for user_id, user_name, comment_id, content, like_count, comment_time in comment_rows:
@@ -673,9 +766,9 @@ def song_profile(request, song_id):
 
 
     # --------------------------
-    # 4. 返回歌曲详情
+    # 3. 返回歌曲详情
     # --------------------------
-    return json_cn({
+    return {
         "song_id": song_id,
         "song_title": song_title,
         "duration": duration,
@@ -685,4 +778,130 @@ def song_profile(request, song_id):
         "singers": singers,
         "comment_count": len(comments),
         "comments": comments
-    })
\ No newline at end of file
+    }
+
+
+def load_song_profile(song_id):
+    "查询歌曲详情数据，不存在时返回 None"
+    return build_song_profile(song_id, run_queries(song_profile_queries(song_id)))
+
+
+async def aload_song_profile(song_id):
+    return build_song_profile(song_id, await arun_queries(song_profile_queries(song_id)))
+
+
+@csrf_exempt
+def song_profile(request, song_id):
+    # --------------------------
+    # 1. 检查登录状态
+    # --------------------------
+    if not request.current_user:
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    # --------------------------
+    # 2. 客户端缓存仍是最新时返回 304 (见 profileVersion.py)
+    # --------------------------
+    version = load_profile_version("song", song_id)
+    if version is None:
+        return json_cn({"error": "歌曲不存在"}, 404)
+    response = not_modified(request, version, pending_generation())
+    if response:
+        return response
+
+    # --------------------------
+    # 3. 读取详情 (优先读缓存)
+    # --------------------------
+    profile = get_profile_cache().get_or_build(
+        "song", song_id, lambda: load_song_profile(song_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "歌曲不存在"}, 404)
+
+    profile, pending = merge_profile_likes(profile)
+    return add_validators(json_cn(profile), version, pending)
+
+
+
+
+# ================================
+# 7. 异步版本 (ASGI 部署时使用，见 urls.py)
+# ================================
+# 详情页的各条查询并发执行；搜索只有一条主查询，整体放到线程池中执行，不阻塞事件循环
+@async_csrf_exempt
+async def search_singer_async(request):
+    return await arun(search_singer, request)
+
+
+@async_csrf_exempt
+async def search_album_async(request):
+    return await arun(search_album, request)
+
+
+@async_csrf_exempt
+async def search_song_async(request):
+    return await arun(search_song, request)
+
+
+@async_csrf_exempt
+async def singer_profile_async(request, singer_id):
+    if not current_user_id(request):
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    version = await aload_profile_version("singer", singer_id)
+    if version is None:
+        return json_cn({"error": "歌手不存在"}, 404)
+    response = not_modified(request, version)
+    if response:
+        return response
+
+    profile = await get_profile_cache().aget_or_build(
+        "singer", singer_id, lambda: aload_singer_profile(singer_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "歌手不存在"}, 404)
+
+    return add_validators(json_cn(profile), version)
+
+
+@async_csrf_exempt
+async def album_profile_async(request, album_id):
+    if not current_user_id(request):
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    version = await aload_profile_version("album", album_id)
+    if version is None:
+        return json_cn({"error": "专辑不存在"}, 404)
+    response = not_modified(request, version, pending_generation())
+    if response:
+        return response
+
+    profile = await get_profile_cache().aget_or_build(
+        "album", album_id, lambda: aload_album_profile(album_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "专辑不存在"}, 404)
+
+    profile, pending = merge_profile_likes(profile)
+    return add_validators(json_cn(profile), version, pending)
+
+
+@async_csrf_exempt
+async def song_profile_async(request, song_id):
+    if not current_user_id(request):
+        return json_cn({"error": "请先登录后再进行查看操作"}, 403)
+
+    version = await aload_profile_version("song", song_id)
+    if version is None:
+        return json_cn({"error": "歌曲不存在"}, 404)
+    response = not_modified(request, version, pending_generation())
+    if response:
+        return response
+
+    profile = await get_profile_cache().aget_or_build(
+        "song", song_id, lambda: aload_song_profile(song_id), version.token
+    )
+    if profile is None:
+        return json_cn({"error": "歌曲不存在"}, 404)
+
+    profile, pending = merge_profile_likes(profile)
+    return add_validators(json_cn(profile), version, pending)
@@ -1,14 +1,142 @@
 # 播放记录模块
 import json
+import time
 import datetime
-from django.db import connection
+from django.conf import settings
+from django.db import connection, transaction
 from django.views.decorators.csrf import csrf_exempt
 from .tools import *
+from .batchWriter import BatchWriter
+from .dedupWindow import create_dedup_window
+from .dailyStats import add_stats, db_today
+from .archive import user_song_plays_sql
 
 
 # ==========================
 # 1. 记录播放
 # ==========================
+# 播放事件先进入进程内缓冲区，由后台线程批量写入：
+#   - 多行 INSERT 写入 PlayHistory
+#   - 每首歌每批只执行一次 play_count = play_count + n (代替 after_play_insert 触发器的逐行更新)
+#   - 按 (用户, 日期) 汇总后更新每日统计表
+# 播放时间每批向数据库取一次当前时间，与评论、收藏等记录的 NOW() 以及按日期统计的接口使用同一个时钟
+# (缓冲区最多延迟 FLUSH_INTERVAL 秒，数据库不可用后重新写入的记录使用写入时的时间)
+def _db_now(cursor):
+    cursor.execute("SELECT CURRENT_TIMESTAMP")
+    now = cursor.fetchone()[0]
+    # SQLite 返回字符串
+    if isinstance(now, str):
+        now = datetime.datetime.fromisoformat(now)
+    return now
+
+
+def write_play_events(events):
+    """
+    批量写入播放事件
+    :param events: [(user_id, song_id, play_duration), ...]
+    """
+    play_counts = {}
+    user_rows = {}
+    for user_id, song_id, play_duration in events:
+        play_counts[song_id] = play_counts.get(song_id, 0) + 1
+        row = user_rows.setdefault(user_id, {"play_count": 0, "play_duration": 0})
+        row["play_count"] += 1
+        row["play_duration"] += int(play_duration or 0)
+
+    # 按 song_id 顺序更新，多个 worker 同时写入时加锁顺序一致，避免死锁
+    song_ids = sorted(play_counts)
+    case_sql = " ".join(["WHEN %s THEN %s"] * len(song_ids))
+    case_params = []
+    for song_id in song_ids:
+        case_params.extend([song_id, play_counts[song_id]])
+
+    placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(events))
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            play_time = _db_now(cursor)
+            cursor.execute(f"""
+                INSERT INTO PlayHistory (user_id, song_id, play_duration, play_time)
+                VALUES {placeholders}
+            """, [value for event in events for value in (*event, play_time)])
+
+            cursor.execute(f"""
+                UPDATE Song
+                SET play_count = play_count + CASE song_id {case_sql} ELSE 0 END
+                WHERE song_id IN ({", ".join(["%s"] * len(song_ids))})
+            """, case_params + song_ids)
+
+        add_stats({(user_id, play_time.date()): row for user_id, row in user_rows.items()})
+
+
+def _create_play_writer():
+    config = getattr(settings, "PLAY_EVENT_BUFFER", {})
+    if not config.get("ENABLED", True):
+        return None
+    return BatchWriter(
+        "play-event-writer",
+        write_play_events,
+        batch_size=config.get("BATCH_SIZE", 500),
+        interval=config.get("FLUSH_INTERVAL", 1.0),
+        max_pending=config.get("MAX_PENDING", 50000),
+    )
+
+play_writer = _create_play_writer()
+
+def enqueue_play_event(user_id, song_id, play_duration):
+    "写入播放事件，返回是否成功"
+    event = (user_id, song_id, play_duration)
+    if play_writer is None:
+        # 未开启缓冲时同步写入
+        write_play_events([event])
+        return True
+    return play_writer.put(event)
+
+
+# 防刷时间窗口：记录最近 60 秒内的有效播放 (包括缓冲区中尚未写入数据库的)
+# 窗口中保存的是应用服务器的时间戳 (time.time())，只用于计算距离上次播放的秒数
+PLAY_DEDUP_SECONDS = 60
+play_dedup = create_dedup_window(PLAY_DEDUP_SECONDS)
+
+def _query_last_play(user_id, song_id):
+    """
+    查询数据库中该用户最近一次播放这首歌的时间，换算为应用服务器的时间戳
+    播放时间和 CURRENT_TIMESTAMP 都是数据库的时钟，在同一条查询中相减，不受两边时钟/时区差异影响
+    """
+    sql_check_recent = """
+                       SELECT MAX(play_time), CURRENT_TIMESTAMP
+                       FROM PlayHistory
+                       WHERE user_id = %s \
+                         AND song_id = %s \
+                       """
+    with connection.cursor() as cursor:
+        cursor.execute(sql_check_recent, [user_id, song_id])
+        last_time, db_now = cursor.fetchone()
+    if last_time is None:
+        return None
+    # SQLite 返回字符串
+    if isinstance(last_time, str):
+        last_time = datetime.datetime.fromisoformat(last_time)
+        db_now = datetime.datetime.fromisoformat(db_now)
+    return time.time() - (db_now - last_time).total_seconds()
+
+
+# 已确认存在的歌曲ID，热门歌曲的播放不再每次查询 Song 表
+# 只缓存存在的结果: 不存在的ID每次都查询；歌曲删除后 (其他 worker 中) 仍在集合里的ID
+# 由批量写入时的外键约束拒绝，BatchWriter 逐条重试后丢弃
+_known_song_ids = set()
+
+def _song_exists(song_id):
+    if song_id in _known_song_ids:
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM Song WHERE song_id = %s", [song_id])
+        if cursor.fetchone() is None:
+            return False
+    _known_song_ids.add(song_id)
+    return True
+
+
 # 设置防刷规则：同一首歌在 60秒 内重复提交只记录一次，不增加播放计数
 # 自动更新 Song 表的 play_count
 @csrf_exempt
@@ -16,55 +144,46 @@ def record_play(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
 
-    song_id = data.get("song_id")
-    # 实际播放时长（秒），如果前端没传，默认0
-    play_duration = data.get("play_duration", 0)
-
-    if not song_id:
+    if not data.get("song_id"):
         return json_cn({"error": "未检测到歌曲ID"}, 400)
 
-    with connection.cursor() as cursor:
-        # 规则检查：防止重复记录 (Anti-Spam)
-        # 检查该用户最近一次播放这首歌的时间
-        sql_check_recent = """
-                           SELECT play_time
-                           FROM PlayHistory
-                           WHERE user_id = %s \
-                             AND song_id = %s
-                           ORDER BY play_time DESC
-                           LIMIT 1 \
-                           """
-        cursor.execute(sql_check_recent, [current_user_id, song_id])
-        last_record = cursor.fetchone()
-
-        should_record = True
-
-        if last_record:
-            last_time = last_record[0]
-            # 获取当前时间 (注意时区问题，这里假设数据库和应用时区一致)
-            # 如果最近一次播放是在 60秒 内，则认为是重复提交或者是切歌太快，不计入有效播放
-            # 也可以根据 play_duration 判断，例如播放超过30秒才算
-            now = datetime.datetime.now()
-            if (now - last_time).total_seconds() < 60:
-                should_record = False
-
-        if should_record:
-            # 1. 插入播放记录
-            sql_insert = """
-                         INSERT INTO PlayHistory (user_id, song_id, play_duration, play_time)
-                         VALUES (%s, %s, %s, NOW()) \
-                         """
-            cursor.execute(sql_insert, [current_user_id, song_id, play_duration])
-
-            # 2. 更新歌曲总播放次数 (原子更新)
-            # after_play_insert 触发器实现
-
-            return json_cn({"message": "播放记录已更新"})
-        else:
-            return json_cn({"message": "播放记录过频，忽略本次计数"})
+    # 参数在放入缓冲区之前检查，避免一条错误的数据导致整批写入失败
+    try:
+        song_id = int(data.get("song_id"))
+        # 实际播放时长（秒），如果前端没传，默认0
+        play_duration = int(data.get("play_duration") or 0)
+    except (TypeError, ValueError):
+        return json_cn({"error": "歌曲ID和播放时长必须是整数"}, 400)
+    if song_id <= 0 or play_duration < 0:
+        return json_cn({"error": "歌曲ID或播放时长不合法"}, 400)
+
+    if not _song_exists(song_id):
+        return json_cn({"error": "歌曲不存在"}, 404)
+
+    # 规则检查：防止重复记录 (Anti-Spam)
+    # 检查该用户最近一次播放这首歌的时间 (先查时间窗口，窗口不可信时才查数据库)
+    last_time = play_dedup.last_play(
+        current_user_id, song_id,
+        lambda: _query_last_play(current_user_id, song_id)
+    )
+
+    # 如果最近一次播放是在 60秒 内，则认为是重复提交或者是切歌太快，不计入有效播放
+    # 也可以根据 play_duration 判断，例如播放超过30秒才算
+    now = time.time()
+    if last_time is not None and now - last_time < PLAY_DEDUP_SECONDS:
+        return json_cn({"message": "播放记录过频，忽略本次计数"})
+
+    # 放入缓冲区，由后台线程批量写入 PlayHistory 并更新 Song.play_count
+    if not enqueue_play_event(current_user_id, song_id, play_duration):
+        return json_cn({"error": "服务器繁忙，播放记录未保存"}, 503)
+    play_dedup.record(current_user_id, song_id, now)
+
+    return json_cn({"message": "播放记录已更新"})
 
 
 # ==========================
@@ -135,7 +254,9 @@ def get_my_play_history(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
 
     # 筛选参数
@@ -144,6 +265,7 @@ def get_my_play_history(request):
     song_id = data.get("song_id")  # 如果传了这个，就是查看单曲的播放记录
     limit = data.get("limit", 50)  # 默认只看最近50条
 
+    # 先查原表 (最近的播放记录)，不够 limit 条时再从归档表中补 (归档表中的记录都比原表中的早)
     sql = """
           SELECT ph.play_id, \
                  ph.play_time, \
@@ -153,7 +275,7 @@ def get_my_play_history(request):
                  s.file_url,
                  a.album_title, \
                  a.cover_url
-          FROM PlayHistory ph
+          FROM {table} ph
                    JOIN Song s ON ph.song_id = s.song_id
                    LEFT JOIN Album a ON s.album_id = a.album_id
           WHERE ph.user_id = %s \
@@ -174,11 +296,14 @@ def get_my_play_history(request):
         params.append(song_id)
 
     sql += " ORDER BY ph.play_time DESC LIMIT %s"
-    params.append(limit)
 
+    history = []
     with connection.cursor() as cursor:
-        cursor.execute(sql, params)
-        history = dictfetchall(cursor)
+        for table in ("PlayHistory", "PlayHistoryArchive"):
+            cursor.execute(sql.format(table=table), params + [int(limit) - len(history)])
+            history += dictfetchall(cursor)
+            if len(history) >= int(limit):
+                break
 
     return json_cn({"history": history, "count": len(history)})
 
@@ -192,55 +317,65 @@ def get_play_report(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
 
     # time_range: 'week', 'month', 'all'
     time_range = data.get("time_range", "week")
 
-    # 构建时间条件
-    sql_where = "WHERE user_id = %s"
-    params = [current_user_id]
+    # 构建时间条件 (按天统计)
+    # 总次数和总时长读取每日汇总表 UserDailyStats，最常听的歌仍需查询原始记录
+    today = db_today()
+    start_date = end_date = None
 
     if time_range == 'week':
         # 最近7天
-        sql_where += " AND play_time >= DATE_SUB(NOW(), INTERVAL 7 DAY)"
+        start_date = today - datetime.timedelta(days=7)
     elif time_range == 'month':
         # 最近30天
-        sql_where += " AND play_time >= DATE_SUB(NOW(), INTERVAL 30 DAY)"
+        start_date = today - datetime.timedelta(days=30)
     elif time_range == 'self-defined':
         if "start_date" in data:
-            sql_where += " AND play_time >= %s"
-            params.append(data.get("start_date"))
+            start_date = str(data.get("start_date"))[:10]
         if "end_date" in data:
-            sql_where += " AND play_time <= %s"
-            params.append(data.get("end_date"))
+            end_date = str(data.get("end_date"))[:10]
+
+    stats_where = "WHERE user_id = %s"
+    stats_params = [current_user_id]
+    start_dt = end_dt = None
+
+    if start_date:
+        stats_where += " AND stat_date >= %s"
+        stats_params.append(start_date)
+        start_dt = f"{start_date} 00:00:00"
+    if end_date:
+        stats_where += " AND stat_date <= %s"
+        stats_params.append(end_date)
+        end_dt = f"{end_date} 23:59:59"
+
+    # 每首歌的播放次数 (原表 + 已归档)
+    plays_sql, params = user_song_plays_sql(current_user_id, start_dt, end_dt)
 
     with connection.cursor() as cursor:
         # 1. 统计总次数和总时长
         sql_summary = f"""
-            SELECT COUNT(*) as total_count, SUM(play_duration) as total_seconds
-            FROM PlayHistory
-            {sql_where}
+            SELECT COALESCE(SUM(play_count), 0) as total_count, COALESCE(SUM(play_duration), 0) as total_seconds
+            FROM UserDailyStats
+            {stats_where}
         """
-        cursor.execute(sql_summary, params)
-        summary = dictfetchall(cursor)[0]
-
-        # 处理 None 的情况
-        if not summary['total_seconds']: summary['total_seconds'] = 0
+        cursor.execute(sql_summary, stats_params)
+        total_count, total_seconds = cursor.fetchone()
 
         # 2. 统计该时间段内听得最多的歌 (Top 1)
         sql_top_song = f"""
-            SELECT s.song_title, COUNT(ph.song_id) as play_times
-            FROM PlayHistory ph
-            JOIN Song s ON ph.song_id = s.song_id
-            {sql_where.replace('WHERE', 'WHERE ph.')} 
-            GROUP BY ph.song_id, s.song_title
+            SELECT s.song_title, p.plays as play_times
+            FROM {plays_sql} p
+            JOIN Song s ON p.song_id = s.song_id
             ORDER BY play_times DESC
             LIMIT 1
         """
-        # 注意：这里 user_id 参数需要再传一遍，或者稍微调整 SQL 拼接逻辑
-        # 为简单起见，这里复用 params
         cursor.execute(sql_top_song, params)
         top_song_row = dictfetchall(cursor)
         top_song = top_song_row[0] if top_song_row else None
@@ -248,8 +383,8 @@ def get_play_report(request):
     return json_cn({
         "time_range": time_range,
         "report": {
-            "total_plays": summary['total_count'],
-            "total_duration_minutes": round(summary['total_seconds'] / 60, 2),
+            "total_plays": int(total_count),
+            "total_duration_minutes": round(int(total_seconds) / 60, 2),
             "top_song": top_song
         }
     })
@@ -265,53 +400,53 @@ def get_user_top_charts(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
 
     # type: 'song', 'singer', 'album'
     chart_type = data.get("type", "song")
     limit = data.get("limit", 10)
 
+    # 每首歌的播放次数 (原表 + 已归档播放的月度汇总)
+    plays_sql, plays_params = user_song_plays_sql(current_user_id)
+
     with connection.cursor() as cursor:
         if chart_type == 'song':
-            sql = """
-                  SELECT s.song_id, s.song_title, s.file_url, COUNT(*) as my_play_count
-                  FROM PlayHistory ph
-                           JOIN Song s ON ph.song_id = s.song_id
-                  WHERE ph.user_id = %s
-                  GROUP BY s.song_id, s.song_title, s.file_url
+            sql = f"""
+                  SELECT s.song_id, s.song_title, s.file_url, p.plays as my_play_count
+                  FROM {plays_sql} p
+                           JOIN Song s ON p.song_id = s.song_id
                   ORDER BY my_play_count DESC
                   LIMIT %s \
                   """
-            cursor.execute(sql, [current_user_id, limit])
+            cursor.execute(sql, plays_params + [limit])
 
         elif chart_type == 'album':
-            sql = """
-                  SELECT a.album_id, a.album_title, a.cover_url, COUNT(*) as my_play_count
-                  FROM PlayHistory ph
-                           JOIN Song s ON ph.song_id = s.song_id
+            sql = f"""
+                  SELECT a.album_id, a.album_title, a.cover_url, SUM(p.plays) as my_play_count
+                  FROM {plays_sql} p
+                           JOIN Song s ON p.song_id = s.song_id
                            JOIN Album a ON s.album_id = a.album_id
-                  WHERE ph.user_id = %s
                   GROUP BY a.album_id, a.album_title, a.cover_url
                   ORDER BY my_play_count DESC
                   LIMIT %s \
                   """
-            cursor.execute(sql, [current_user_id, limit])
+            cursor.execute(sql, plays_params + [limit])
 
         elif chart_type == 'singer':
             # 这里需要关联 Song -> SongSinger -> Singer
-            sql = """
-                  SELECT singer.singer_id, singer.singer_name, COUNT(*) as my_play_count
-                  FROM PlayHistory ph
-                           JOIN Song s ON ph.song_id = s.song_id
-                           JOIN Song_Singer ss ON s.song_id = ss.song_id
+            sql = f"""
+                  SELECT singer.singer_id, singer.singer_name, SUM(p.plays) as my_play_count
+                  FROM {plays_sql} p
+                           JOIN Song_Singer ss ON p.song_id = ss.song_id
                            JOIN Singer singer ON ss.singer_id = singer.singer_id
-                  WHERE ph.user_id = %s
                   GROUP BY singer.singer_id, singer.singer_name
                   ORDER BY my_play_count DESC
                   LIMIT %s \
                   """
-            cursor.execute(sql, [current_user_id, limit])
+            cursor.execute(sql, plays_params + [limit])
 
         else:
             return json_cn({"error": "无效的榜单类型"}, 400)
@@ -333,39 +468,43 @@ def get_user_activity_trend(request):
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
 
-    current_user_id = get_user_id(request)
+    if not request.current_user:
+        return json_cn({"error": "用户未登录"}, 403)
+    current_user_id = request.current_user.user_id
     data = json.loads(request.body)
 
     # period: 'day' (最近14天, 按天统计), 'month' (最近12个月, 按月统计)
     period = data.get("period", "day")
 
-    with connection.cursor() as cursor:
-        if period == 'day':
-            # 按日期分组统计
-            sql = """
-                  SELECT DATE_FORMAT(play_time, '%%Y-%%m-%%d') as date_str, COUNT(*) as play_count
-                  FROM PlayHistory
-                  WHERE user_id = %s \
-                    AND play_time >= DATE_SUB(NOW(), INTERVAL 14 DAY)
-                  GROUP BY date_str
-                  ORDER BY date_str ASC \
-                  """
-        elif period == 'month':
-            # 按月份分组统计
-            sql = """
-                  SELECT DATE_FORMAT(play_time, '%%Y-%%m') as date_str, COUNT(*) as play_count
-                  FROM PlayHistory
-                  WHERE user_id = %s \
-                    AND play_time >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-                  GROUP BY date_str
-                  ORDER BY date_str ASC \
-                  """
-        else:
-            return json_cn({"error": "Invalid period"}, 400)
+    # 读取每日汇总表 UserDailyStats，按月统计时再按月份相加
+    today = db_today()
+    if period == 'day':
+        start_date = today - datetime.timedelta(days=14)
+    elif period == 'month':
+        start_date = today - datetime.timedelta(days=365)
+    else:
+        return json_cn({"error": "Invalid period"}, 400)
 
-        # 注意：Python 中 % 是占位符，所以在 SQL 里的 %Y 需要写成 %%Y 进行转义
-        cursor.execute(sql, [current_user_id])
-        trend_data = dictfetchall(cursor)
+    sql = """
+          SELECT stat_date, play_count
+          FROM UserDailyStats
+          WHERE user_id = %s \
+            AND stat_date >= %s \
+            AND play_count > 0
+          ORDER BY stat_date ASC \
+          """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [current_user_id, start_date])
+        rows = cursor.fetchall()
+
+    date_format = "%Y-%m-%d" if period == 'day' else "%Y-%m"
+    trend = {}
+    for stat_date, play_count in rows:
+        if isinstance(stat_date, str):
+            stat_date = datetime.date.fromisoformat(stat_date)
+        date_str = stat_date.strftime(date_format)
+        trend[date_str] = trend.get(date_str, 0) + play_count
+    trend_data = [{"date_str": date_str, "play_count": count} for date_str, count in trend.items()]
 
     return json_cn({
         "period": period,
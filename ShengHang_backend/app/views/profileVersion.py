@@ -0,0 +1,151 @@
+# 详情页版本号 (HTTP 条件请求)
+# 歌曲/专辑/歌手/歌单详情页返回 ETag 和 Last-Modified，浏览器再次请求时自动带上 If-None-Match /
+# If-Modified-Since，数据没有变化时返回 304，不再读取和生成详情数据
+# 版本号由 cache.load_profile_version 缓存，缓存命中时 (无论返回 304 还是缓存的详情) 不访问数据库
+# 版本号保存在 EntityVersion 表中，由 cache.invalidate_profile / invalidate_profiles 加一
+# (管理员修改、评论、歌单操作、点赞数写入数据库时都会调用):
+#   - (kind, id) 单个对象的版本
+#   - (kind, 0)  整类详情页的版本 (如用户注销后其评论可能出现在任意详情页中)
+# 详情页缓存的 key 带上版本号，版本号加一即使所有 worker 的旧缓存失效，也不会把旧缓存和新 ETag 一起返回
+# 使用强 ETag: 同一 ETag 的响应内容完全相同。响应中还合并了尚未写入数据库的点赞数
+# (见 likeCounter.merge_profile_likes)，这部分不改变版本号，因此增量的版本 (likeCounter.pending_generation)
+# 作为后缀加在 ETag 中; 没有待写入的增量时没有后缀
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+
+
+# 详情页返回的数据格式变化时加一，使客户端保存的旧 ETag 全部失效
+ETAG_FORMAT = 1
+
+# 详情页类型 -> (表, 主键, 权限判断需要的额外字段)
+VERSION_TARGETS = {
+    "song": ("Song", "song_id", []),
+    "album": ("Album", "album_id", []),
+    "singer": ("Singer", "singer_id", []),
+    "songlist": ("Songlist", "songlist_id", ["user_id", "is_public"]),
+}
+
+# 整类详情页的版本使用的 target_id
+KIND_TARGET_ID = 0
+
+
+class ProfileVersion:
+    "某个详情页的当前版本"
+
+    __slots__ = ("kind", "obj_id", "version", "kind_version", "last_modified", "fields")
+
+    def __init__(self, kind, obj_id, version, kind_version, last_modified, fields):
+        self.kind = kind
+        self.obj_id = obj_id
+        self.version = version
+        self.kind_version = kind_version
+        self.last_modified = last_modified    # Unix 时间戳，从未修改过时为 None
+        self.fields = fields                  # VERSION_TARGETS 中的额外字段 -> 值
+
+    @property
+    def token(self):
+        "对象版本和整类版本，任意一个变化时详情数据都可能变化 (也用作详情页缓存 key 的一部分)"
+        return f"{self.kind_version}.{self.version}"
+
+    def etag(self, variant=""):
+        return f'"{self.kind}-{self.obj_id}-{ETAG_FORMAT}.{self.token}{variant}"'
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # SQLite 可能返回字符串
+        value = parse_datetime(value)
+    if settings.USE_TZ and timezone.is_naive(value):
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+# ================================
+# 读取
+# ================================
+def get_profile_version(kind, obj_id):
+    "读取详情页的版本，对象不存在时返回 None"
+    table, pk, extra = VERSION_TARGETS[kind]
+    columns = "".join(f", e.{column}" for column in extra)
+    sql = f"""
+        SELECT v.version, v.update_time, k.version, k.update_time{columns}
+        FROM {table} e
+        LEFT JOIN EntityVersion v ON v.target_type = %s AND v.target_id = e.{pk}
+        LEFT JOIN EntityVersion k ON k.target_type = %s AND k.target_id = %s
+        WHERE e.{pk} = %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [kind, kind, KIND_TARGET_ID, obj_id])
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    version, update_time, kind_version, kind_update_time = row[:4]
+    times = [t for t in (_timestamp(update_time), _timestamp(kind_update_time)) if t is not None]
+    return ProfileVersion(kind, obj_id, version or 0, kind_version or 0,
+                          max(times) if times else None, dict(zip(extra, row[4:])))
+
+
+def not_modified(request, profile_version, variant=""):
+    """
+    客户端缓存的详情页仍是最新时返回 304 响应，否则返回 None
+    variant: 加在 ETag 中的后缀，同一详情页对不同用户返回不同数据时 (如歌单的 is_owner)
+             以及响应中合并了尚未写入的点赞数时 (likeCounter.pending_generation) 使用
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    response = get_conditional_response(
+        request, etag=profile_version.etag(variant), last_modified=profile_version.last_modified
+    )
+    if response is None:
+        return None
+    return add_validators(response, profile_version, variant)
+
+
+def add_validators(response, profile_version, variant=""):
+    "在详情页响应 (200 或 304) 中加入 ETag / Last-Modified"
+    response.headers["ETag"] = profile_version.etag(variant)
+    if profile_version.last_modified is not None:
+        response.headers["Last-Modified"] = http_date(profile_version.last_modified)
+    # 需要登录才能查看，只允许浏览器缓存，并且每次使用前都要向服务器确认
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+# ================================
+# 写操作后加一
+# ================================
+def _bump(kind, target_ids):
+    rows = [(kind, target_id) for target_id in sorted(set(target_ids))]
+    if not rows:
+        return
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    placeholders = ", ".join(["(%s, %s, 1, %s)"] * len(rows))
+    sql = f"INSERT INTO EntityVersion (target_type, target_id, version, update_time) VALUES {placeholders}"
+    if connection.vendor == "mysql":
+        sql += " ON DUPLICATE KEY UPDATE version = version + 1, update_time = VALUES(update_time)"
+    else:
+        sql += (" ON CONFLICT (target_type, target_id) DO UPDATE SET "
+                "version = version + 1, update_time = excluded.update_time")
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for row in rows for value in row + (now,)])
+
+
+def bump_versions(kind, *obj_ids):
+    "对象的详情数据被修改后调用"
+    _bump(kind, [int(obj_id) for obj_id in obj_ids if obj_id is not None])
+
+
+def bump_kind_versions(*kinds):
+    "整类详情页的数据都可能被修改后调用"
+    for kind in kinds:
+        _bump(kind, [KIND_TARGET_ID])
@@ -0,0 +1,250 @@
+# 接口耗时与 SQL 统计
+# 按路由统计每个接口的:
+#   - 耗时分布 (直方图) 和错误数
+#   - 每个请求执行的 SQL 条数、数据库总耗时
+#   - 最慢的 SQL 指纹 (参数和 IN 列表被折叠后的 SQL)
+#   - N+1 查询: 同一个请求中同一指纹的 SQL 执行次数达到 N_PLUS_ONE_THRESHOLD
+# SQL 通过 connection.execute_wrapper 机制记录 (每个数据库连接建立时挂上 query_wrapper)，
+# 请求由 app.middleware.request_profiler_middleware 记录，
+# 统计结果通过管理员接口 Administrator/get_request_profile/ 查看
+import contextvars
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+DEFAULT_CONFIG = {
+    'ENABLED': True,
+    'SERVER_TIMING': False,
+    'N_PLUS_ONE_THRESHOLD': 5,
+    'SLOW_QUERIES': 5,
+}
+
+# 耗时直方图的桶上限 (毫秒)，最后一个桶为 "大于 5000"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# 每个路由最多保留的 SQL 指纹数，超出时淘汰总耗时最少的
+MAX_FINGERPRINTS_PER_ROUTE = 50
+
+
+def get_config():
+    return dict(DEFAULT_CONFIG, **getattr(settings, "REQUEST_PROFILER", {}))
+
+
+# ================================
+# SQL 指纹
+# ================================
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:%s\s*,\s*)*%s\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_NUMBER = re.compile(r"\b\d+\b")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    "折叠 IN (...) / 多行 VALUES / 数字常量和空白，同一类 SQL 得到相同的指纹"
+    sql = _IN_LIST.sub("IN (...)", sql)
+    sql = _VALUES_LIST.sub(r"VALUES \1, ...", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _SPACES.sub(" ", sql).strip()[:300]
+
+
+# ================================
+# 单个请求的 SQL 记录
+# ================================
+class RequestRecord:
+
+    def __init__(self):
+        self.lock = threading.Lock()    # 异步视图中多条查询会在不同线程中并发执行
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}            # 指纹 -> [次数, 总耗时, 最大耗时]
+
+    def add(self, sql, seconds):
+        fp = fingerprint(sql)
+        with self.lock:
+            self.queries += 1
+            self.db_time += seconds
+            stat = self.statements.get(fp)
+            if stat is None:
+                self.statements[fp] = [1, seconds, seconds]
+            else:
+                stat[0] += 1
+                stat[1] += seconds
+                stat[2] = max(stat[2], seconds)
+
+
+_current = contextvars.ContextVar("request_profile", default=None)
+
+
+def query_wrapper(execute, sql, params, many, context):
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.add(sql, time.perf_counter() - start)
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    # 每个线程有各自的连接对象，异步视图在线程池中建立的连接在这里挂上 (重复建立时不重复挂)
+    if query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_wrapper)
+
+connection_created.connect(_install_wrapper, dispatch_uid="request_profiler_query_wrapper")
+
+
+def start_request():
+    # 当前线程中已经建立的连接 (如 CONN_MAX_AGE 保持的长连接) 不会再触发 connection_created
+    for conn in connections.all():
+        _install_wrapper(None, conn)
+    record = RequestRecord()
+    return record, _current.set(record)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+# ================================
+# 按路由汇总
+# ================================
+class RouteStats:
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.queries = 0
+        self.max_queries = 0
+        self.db_ms = 0.0
+        self.n_plus_one_requests = 0
+        self.statements = {}    # 指纹 -> {"count", "total_ms", "max_ms", "n_plus_one"}
+
+    def add(self, status, elapsed_ms, record, threshold):
+        self.count += 1
+        if status >= 500:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[_bucket_index(elapsed_ms)] += 1
+        self.queries += record.queries
+        self.max_queries = max(self.max_queries, record.queries)
+        self.db_ms += record.db_time * 1000
+
+        n_plus_one = False
+        for fp, (count, total, longest) in record.statements.items():
+            stat = self.statements.get(fp)
+            if stat is None:
+                stat = self.statements[fp] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "n_plus_one": 0}
+            stat["count"] += count
+            stat["total_ms"] += total * 1000
+            stat["max_ms"] = max(stat["max_ms"], longest * 1000)
+            if count >= threshold:
+                stat["n_plus_one"] += 1
+                n_plus_one = True
+        if n_plus_one:
+            self.n_plus_one_requests += 1
+
+        if len(self.statements) > MAX_FINGERPRINTS_PER_ROUTE:
+            keep = sorted(self.statements.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+            self.statements = dict(keep[:MAX_FINGERPRINTS_PER_ROUTE])
+
+    def percentile(self, p):
+        "由直方图估计分位数，返回所在桶的上限 (毫秒)"
+        target = self.count * p / 100
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else round(self.max_ms, 3)
+        return None
+
+    def snapshot(self, slow_queries):
+        def statement(fp, stat):
+            return {
+                "sql": fp,
+                "count": stat["count"],
+                "avg_ms": round(stat["total_ms"] / stat["count"], 3),
+                "max_ms": round(stat["max_ms"], 3),
+                "n_plus_one_requests": stat["n_plus_one"],
+            }
+
+        slowest = sorted(self.statements.items(), key=lambda item: item[1]["max_ms"], reverse=True)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 3),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": {
+                (f"<={bound}ms" if index < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]}ms"): count
+                for index, (bound, count) in enumerate(zip(LATENCY_BUCKETS_MS + (None,), self.buckets))
+            },
+            "avg_queries": round(self.queries / self.count, 2),
+            "max_queries": self.max_queries,
+            "avg_db_ms": round(self.db_ms / self.count, 3),
+            "n_plus_one_requests": self.n_plus_one_requests,
+            "n_plus_one": [statement(fp, stat) for fp, stat in self.statements.items() if stat["n_plus_one"]],
+            "slowest_queries": [statement(fp, stat) for fp, stat in slowest[:slow_queries]],
+        }
+
+
+def _bucket_index(elapsed_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+class RequestProfiler:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.started_at = time.time()
+
+    def record(self, route, status, elapsed_ms, record, threshold):
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = self.routes[route] = RouteStats()
+            stats.add(status, elapsed_ms, record, threshold)
+
+    def snapshot(self, slow_queries=5):
+        with self.lock:
+            routes = {route: stats.snapshot(slow_queries) for route, stats in self.routes.items()}
+            started_at = self.started_at
+        return {
+            "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started_at)),
+            # 按总耗时排序，最值得优化的接口在前
+            "routes": dict(sorted(routes.items(), key=lambda item: item[1]["avg_ms"] * item[1]["count"], reverse=True)),
+        }
+
+    def reset(self):
+        with self.lock:
+            self.routes = {}
+            self.started_at = time.time()
+
+
+profiler = RequestProfiler()
+
+
+def route_name(request):
+    "按 URL 模式统计 (如 /song/profile/<int:song_id>/)，未匹配任何路由的请求归为一类"
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return f"{request.method} <unmatched>"
+    return f"{request.method} /{match.route}"
+
+
+def server_timing(elapsed_ms, record):
+    return f'app;dur={elapsed_ms:.1f}, db;dur={record.db_time * 1000:.1f};desc="{record.queries} queries"'
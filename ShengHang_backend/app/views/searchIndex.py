@@ -0,0 +1,329 @@
+# 曲库全文检索模块
+# 为 歌曲/专辑/歌手/歌单 的标题建立倒排索引，替代 LIKE '%关键词%' 的全表扫描
+#   - MySQL: SearchIndex 表 + ngram 全文索引 (MATCH ... AGAINST)
+#   - 其他数据库 (本地 SQLite 测试部署): 磁盘上的本地倒排索引文件
+# 索引内容为 标题的二元组 (bigram) + 标题的拼音首字母，如 "周杰伦" -> 周杰、杰伦、zjl
+# 拼音首字母依赖 pypinyin (见 requirements.txt)
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection
+from pypinyin import lazy_pinyin, Style
+
+
+logger = logging.getLogger(__name__)
+
+
+# 二元组长度，与 MySQL 的 ngram_token_size 默认值一致
+NGRAM_SIZE = 2
+
+# 每类检索对象对应的 (表名, 主键, 标题字段)
+TARGET_TABLES = {
+    "song": ("Song", "song_id", "song_title"),
+    "album": ("Album", "album_id", "album_title"),
+    "singer": ("Singer", "singer_id", "singer_name"),
+    "songlist": ("Songlist", "songlist_id", "songlist_title"),
+}
+
+
+# ================================
+# 分词
+# ================================
+def normalize(text):
+    "统一转小写并去掉空白"
+    return "".join(str(text or "").lower().split())
+
+def pinyin_initials(text):
+    "标题的拼音首字母，如 周杰伦 -> zjl"
+    return normalize("".join(lazy_pinyin(str(text or ""), style=Style.FIRST_LETTER)))
+
+def bigrams(text):
+    "生成二元组，如 爱在西元前 -> 爱在、在西、西元、元前"
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+def build_keywords(title):
+    "写入索引的关键词：标题 + 拼音首字母"
+    initials = pinyin_initials(title)
+    return f"{normalize(title)} {initials}".strip()
+
+
+# ================================
+# 本地磁盘倒排索引 (SQLite 测试部署)
+# ================================
+# 磁盘上分两个文件:
+#   - 快照 (SEARCH_INDEX_PATH): 完整的倒排索引
+#   - 日志 (快照路径 + ".log"): 快照之后的增删，每次写入只在末尾追加一行，不重写整个索引
+# 日志累计 SEARCH_INDEX_COMPACT_EVERY 条后把索引写回快照并清空日志 (重建索引时直接写快照)
+# 日志中的增删可重复执行，写快照后、清空日志前中断时重放日志得到的结果相同
+class LocalSearchIndex:
+    """
+    快照结构:
+    {
+        "song": {
+            "docs": {"1": "爱在西元前 azxyq"},
+            "postings": {"爱在": [1], "az": [1], ...}
+        },
+        ...
+    }
+    日志每行一条:
+        {"op": "upsert", "type": "song", "docs": [[1, "爱在西元前 azxyq"], ...]}
+        {"op": "remove", "type": "song", "ids": [1, ...]}
+    """
+
+    def __init__(self, path, compact_every=1000):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.data = None
+        self.mtime = None
+        self.log_offset = 0     # 已重放到的日志位置 (字节)
+        self.log_entries = 0    # 快照之后的日志条数
+
+    def _load(self):
+        # 其他 worker 进程写快照 (或清空日志) 后全部重新加载，只追加了日志时重放新增的部分
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        if self.data is None or mtime != self.mtime or log_size < self.log_offset:
+            if mtime is None:
+                self.data = {}
+            else:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            self.mtime = mtime
+            self.log_offset = 0
+            self.log_entries = 0
+        if log_size > self.log_offset:
+            self._replay()
+
+    def _replay(self):
+        with open(self.log_path, "rb") as f:
+            f.seek(self.log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # 其他进程正在写入的行，下次再读
+                    break
+                self.log_offset += len(line)
+                self.log_entries += 1
+                self._apply(json.loads(line))
+
+    def _apply(self, entry):
+        section = self._section(entry["type"])
+        if entry["op"] == "upsert":
+            for target_id, keywords in entry["docs"]:
+                self._remove_doc(section, target_id)
+                section["docs"][str(target_id)] = keywords
+                for token in self._tokens(keywords):
+                    section["postings"].setdefault(token, []).append(target_id)
+        else:
+            for target_id in entry["ids"]:
+                self._remove_doc(section, target_id)
+
+    def _append(self, entry):
+        "应用一条增删并追加到日志，日志过长时写回快照"
+        self._apply(entry)
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self.log_path, "ab") as f:
+            f.write(line)
+        self.log_offset += len(line)
+        self.log_entries += 1
+        if self.log_entries >= self.compact_every:
+            self._save()
+
+    def _save(self):
+        "把完整索引写回快照并清空日志"
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        open(self.log_path, "wb").close()
+        self.mtime = os.path.getmtime(self.path)
+        self.log_offset = 0
+        self.log_entries = 0
+
+    def _section(self, target_type):
+        return self.data.setdefault(target_type, {"docs": {}, "postings": {}})
+
+    def _remove_doc(self, section, target_id):
+        keywords = section["docs"].pop(str(target_id), None)
+        if keywords is None:
+            return
+        for token in self._tokens(keywords):
+            ids = section["postings"].get(token)
+            if ids and target_id in ids:
+                ids.remove(target_id)
+                if not ids:
+                    del section["postings"][token]
+
+    @staticmethod
+    def _tokens(keywords):
+        tokens = set()
+        for part in keywords.split():
+            tokens |= bigrams(part)
+        return tokens
+
+    def upsert_many(self, target_type, items, replace=False):
+        """
+        :param items: [(target_id, title), ...]
+        :param replace: True 时先清空该类型的全部索引 (用于重建)
+        """
+        docs = [[int(target_id), build_keywords(title)] for target_id, title in items]
+        with self.lock:
+            self._load()
+            if replace:
+                self.data[target_type] = {"docs": {}, "postings": {}}
+                self._apply({"op": "upsert", "type": target_type, "docs": docs})
+                self._save()
+            elif docs:
+                self._append({"op": "upsert", "type": target_type, "docs": docs})
+
+    def remove_many(self, target_type, target_ids):
+        ids = [int(target_id) for target_id in target_ids]
+        with self.lock:
+            self._load()
+            if ids:
+                self._append({"op": "remove", "type": target_type, "ids": ids})
+
+    def search(self, target_type, term):
+        "返回标题或拼音首字母包含 term 的对象ID列表"
+        with self.lock:
+            self._load()
+            section = self.data.get(target_type)
+            if not section:
+                return []
+
+            # 1. 取所有二元组倒排表的交集作为候选
+            candidates = None
+            for token in bigrams(term):
+                ids = set(section["postings"].get(token, []))
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+
+            # 2. 二元组都命中不代表连续出现，再校验一次子串
+            return sorted(
+                target_id for target_id in candidates
+                if term in section["docs"].get(str(target_id), "")
+            )
+
+
+_local_index = None
+
+def get_local_index():
+    global _local_index
+    if _local_index is None:
+        path = getattr(settings, "SEARCH_INDEX_PATH", os.path.join(settings.BASE_DIR, "search_index.json"))
+        compact_every = getattr(settings, "SEARCH_INDEX_COMPACT_EVERY", 1000)
+        _local_index = LocalSearchIndex(str(path), compact_every)
+    return _local_index
+
+def use_mysql_fulltext():
+    backend = getattr(settings, "SEARCH_INDEX_BACKEND", "auto")
+    if backend == "auto":
+        return connection.vendor == "mysql"
+    return backend == "mysql"
+
+
+# ================================
+# 索引维护 (由管理员增删改曲库时调用)
+# ================================
+def index_entities(target_type, items, replace=False):
+    """
+    新增或更新索引
+    :param items: [(target_id, title), ...]
+    """
+    items = [(int(target_id), title) for target_id, title in items]
+
+    if not use_mysql_fulltext():
+        get_local_index().upsert_many(target_type, items, replace=replace)
+        return
+
+    with connection.cursor() as cursor:
+        if replace:
+            cursor.execute("DELETE FROM SearchIndex WHERE target_type = %s", [target_type])
+        if not items:
+            return
+        placeholders = ", ".join(["(%s, %s, %s)"] * len(items))
+        params = []
+        for target_id, title in items:
+            params.extend([target_type, target_id, build_keywords(title)])
+        cursor.execute(f"""
+            INSERT INTO SearchIndex (target_type, target_id, keywords)
+            VALUES {placeholders}
+            ON DUPLICATE KEY UPDATE keywords = VALUES(keywords)
+        """, params)
+
+def index_entity(target_type, target_id, title):
+    "新增或更新单个对象的索引"
+    try:
+        index_entities(target_type, [(target_id, title)])
+    except Exception:
+        # 索引更新失败不应影响主业务流程，可用 rebuild_search_index 命令修复
+        logger.exception("检索索引更新失败: %s %s", target_type, target_id)
+
+def remove_entities(target_type, target_ids):
+    "删除索引"
+    target_ids = [int(target_id) for target_id in target_ids]
+    if not target_ids:
+        return
+
+    try:
+        if not use_mysql_fulltext():
+            get_local_index().remove_many(target_type, target_ids)
+            return
+
+        placeholders = ", ".join(["%s"] * len(target_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM SearchIndex WHERE target_type = %s AND target_id IN ({placeholders})",
+                [target_type] + target_ids
+            )
+    except Exception:
+        logger.exception("检索索引删除失败: %s %s", target_type, target_ids)
+
+def rebuild(target_type, batch_size=1000):
+    "从数据表全量重建某类对象的索引，返回索引条数"
+    table, pk, title_field = TARGET_TABLES[target_type]
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {pk}, {title_field} FROM {table}")
+        rows = cursor.fetchall()
+
+    index_entities(target_type, rows[:batch_size], replace=True)
+    for start in range(batch_size, len(rows), batch_size):
+        index_entities(target_type, rows[start:start + batch_size])
+    return len(rows)
+
+
+# ================================
+# 检索 (供 search_* 视图拼接 WHERE 条件)
+# ================================
+def search_filter(target_type, id_column, title_column, term):
+    """
+    生成 "标题包含 term" 的筛选条件
+    :param id_column: 视图 SQL 中对象主键的列名，如 "s.song_id"
+    :param title_column: 视图 SQL 中标题的列名，如 "s.song_title"
+    :return: (sql 片段, 参数列表)
+    """
+    normalized = normalize(term)
+
+    # 关键词短于二元组长度时无法走索引，退回 LIKE
+    if len(normalized) < NGRAM_SIZE:
+        return f"{title_column} LIKE %s", [f"%{term}%"]
+
+    if use_mysql_fulltext():
+        # 短语匹配：要求所有二元组按顺序连续出现
+        phrase = '"' + normalized.replace('"', "") + '"'
+        sql = f"""{id_column} IN (
+            SELECT target_id FROM SearchIndex
+            WHERE target_type = %s AND MATCH(keywords) AGAINST (%s IN BOOLEAN MODE)
+        )"""
+        return sql, [target_type, phrase]
+
+    target_ids = get_local_index().search(target_type, normalized)
+    if not target_ids:
+        return "1 = 0", []
+    placeholders = ", ".join(["%s"] * len(target_ids))
+    return f"{id_column} IN ({placeholders})", target_ids
@@ -0,0 +1,151 @@
+# 系统日志写入模块
+# 管理员的每个操作都会写一条 SystemLog，原来每条日志在请求中单独执行一次 INSERT，
+# 批量导入时数据库往返次数翻倍。现在日志先放入进程内缓冲区，由后台线程批量写入 (多行 INSERT)
+#   - 操作时间在调用 add_system_log 时记录，不受写入延迟影响
+#   - 缓冲区已满时按 ON_FULL 处理: file 写入本地文件 / sync 同步写入数据库 / drop 丢弃
+#   - 数据库不可用时日志留在缓冲区中重试，超出缓冲区或进程退出时仍未写入的日志写入本地文件
+#   - 本地文件中的日志可用 python manage.py replay_system_logs 补写到数据库
+# 管理员查看日志时最多晚 FLUSH_INTERVAL 秒看到最新的操作
+import datetime
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from .batchWriter import BatchWriter
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return getattr(settings, "SYSTEM_LOG_BUFFER", {})
+
+
+# ================================
+# 写入数据库
+# ================================
+def write_system_logs(logs):
+    """
+    批量写入日志
+    :param logs: [(action, target_table, target_id, result, action_time), ...]
+    """
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s)"] * len(logs))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO SystemLog (action, target_table, target_id, result, action_time) VALUES {placeholders}",
+            [value for log in logs for value in log]
+        )
+
+
+# ================================
+# 本地文件 (数据库不可用时)
+# ================================
+_file_lock = threading.Lock()
+
+
+def fallback_path():
+    path = get_config().get("FALLBACK_FILE")
+    return str(path) if path else None
+
+
+def write_fallback(logs):
+    "追加写入本地文件 (每行一条 JSON)，未配置 FALLBACK_FILE 时丢弃"
+    path = fallback_path()
+    if not path:
+        logger.error("日志记录失败，丢弃 %d 条日志", len(logs))
+        return
+    lines = "".join(
+        json.dumps({
+            "action": action,
+            "target_table": target_table,
+            "target_id": target_id,
+            "result": result,
+            "action_time": action_time.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        }, ensure_ascii=False) + "\n"
+        for action, target_table, target_id, result, action_time in logs
+    )
+    try:
+        with _file_lock:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
+    except OSError:
+        logger.exception("日志写入本地文件失败，丢弃 %d 条日志", len(logs))
+
+
+def replay_fallback(batch_size=500):
+    """
+    把本地文件中的日志补写到数据库，返回写入条数
+    文件先改名再读取，读取期间新产生的日志写入新文件，互不影响；写入失败时改名后的文件保留，可再次运行
+    """
+    path = fallback_path()
+    if not path or not os.path.exists(path):
+        return 0
+
+    replaying = f"{path}.{datetime.datetime.now():%Y%m%d%H%M%S}.replaying"
+    with _file_lock:
+        os.replace(path, replaying)
+
+    logs = []
+    with open(replaying, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                log = json.loads(line)
+                logs.append((
+                    log["action"], log["target_table"], log["target_id"], log["result"],
+                    datetime.datetime.strptime(log["action_time"], "%Y-%m-%d %H:%M:%S.%f"),
+                ))
+    for start in range(0, len(logs), batch_size):
+        write_system_logs(logs[start:start + batch_size])
+    os.remove(replaying)
+    return len(logs)
+
+
+# ================================
+# 缓冲区
+# ================================
+def _create_log_writer():
+    config = get_config()
+    if not config.get("ENABLED", True):
+        return None
+    return BatchWriter(
+        "system-log-writer",
+        write_system_logs,
+        batch_size=config.get("BATCH_SIZE", 500),
+        interval=config.get("FLUSH_INTERVAL", 1.0),
+        max_pending=config.get("MAX_PENDING", 10000),
+        put_timeout=config.get("PUT_TIMEOUT", 0.1),
+        drop_func=write_fallback,
+    )
+
+log_writer = _create_log_writer()
+
+
+def _write_now(log):
+    try:
+        write_system_logs([log])
+    except Exception:
+        logger.exception("日志记录失败")
+        write_fallback([log])
+
+
+def add_log(action, target_table=None, target_id=None, result='success'):
+    "记录一条日志，不会抛出异常"
+    log = (action, target_table, target_id, result, datetime.datetime.now())
+    if log_writer is None:
+        # 未开启缓冲时同步写入
+        _write_now(log)
+        return
+    if log_writer.put(log):
+        return
+
+    on_full = get_config().get("ON_FULL", "file")
+    if on_full == "sync":
+        _write_now(log)
+    elif on_full == "file":
+        write_fallback([log])
+    else:
+        logger.warning("日志缓冲区已满，丢弃日志: %s", action)
@@ -1,9 +1,15 @@
 # 存储各种工具方法
+import base64
 import datetime
+import json
 from django.db import connection
-from django.http import JsonResponse
+from django.http import HttpResponse
 import hashlib
 
+from .systemLog import add_log
+from .jsonEncoder import dumps as json_dumps
+from .currentUser import ADMIN_USER_ID, get_current_user, current_user_id, invalidate_user
+
 # ================================
 # 工具函数
 # ================================
@@ -13,25 +19,25 @@ def hash_password(pw: str) -> str:
 
 # 中文输出
 def json_cn(data, status=200):
-    return JsonResponse(data, status=status, json_dumps_params={'ensure_ascii': False})
+    # 编码器由 settings.JSON_ENCODER 选择 (见 jsonEncoder.py)，中文不转义
+    return HttpResponse(json_dumps(data), status=status, content_type="application/json")
 
 # 管理员权限检查
-ADMIN_USER_ID = 1  # 可以改成实际管理员 id
 def require_admin(request):
-    user_id = request.session.get("user_id")
-    if not user_id:
+    user = get_current_user(request)
+    if not user:
         return False, json_cn({"error": "请先登录"}, 403)
 
-    if user_id != ADMIN_USER_ID:
+    if not user.is_admin:
         return False, json_cn({"error": "不是管理员"}, 403)
 
     return True, None
 
 def get_user_id(request):
-    current_user_id = request.session.get("user_id")
-    if not current_user_id:
+    user_id = current_user_id(request)
+    if not user_id:
         return json_cn({"error": "用户未登录"}, 403)
-    return current_user_id
+    return user_id
 
 # ============================================================
 # 辅助工具：将游标结果转换为字典列表
@@ -45,6 +51,136 @@ def dictfetchall(cursor):
     ]
 
 
+# ============================================================
+# 辅助工具：批量查询歌曲的歌手列表
+# ============================================================
+# 单条 IN 查询的最大 ID 数量，防止 SQL 过长
+SONG_SINGER_BATCH_SIZE = 1000
+
+def fetch_song_singers(song_ids):
+    """
+    一次性查询多首歌曲的歌手，避免在循环中逐首查询 (N+1 问题)
+    :param song_ids: 歌曲ID列表，如 [1, 2, 3]
+    :return: {song_id: [{"singer_id": 1, "singer_name": "周杰伦"}, ...]}
+    """
+    # 去重并保持顺序
+    song_ids = list(dict.fromkeys(song_ids))
+    singers = {sid: [] for sid in song_ids}
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(song_ids), SONG_SINGER_BATCH_SIZE):
+            batch = song_ids[start:start + SONG_SINGER_BATCH_SIZE]
+            placeholders = ", ".join(["%s"] * len(batch))
+            sql = f"""
+                SELECT ss.song_id, si.singer_id, si.singer_name
+                FROM Song_Singer ss
+                JOIN Singer si ON si.singer_id = ss.singer_id
+                WHERE ss.song_id IN ({placeholders})
+                ORDER BY ss.song_id, si.singer_id
+            """
+            cursor.execute(sql, batch)
+            group_song_singers(cursor.fetchall(), singers)
+
+    return singers
+
+def group_song_singers(rows, singers=None):
+    """
+    把 (song_id, singer_id, singer_name) 查询结果按歌曲分组
+    :return: {song_id: [{"singer_id": 1, "singer_name": "周杰伦"}, ...]}
+    """
+    singers = {} if singers is None else singers
+    for song_id, singer_id, singer_name in rows:
+        singers.setdefault(song_id, []).append({
+            "singer_id": singer_id,
+            "singer_name": singer_name
+        })
+    return singers
+
+
+# ============================================================
+# 辅助工具：游标分页 (keyset pagination)
+# ============================================================
+# 按 (排序键, 主键) 定位下一页，避免 OFFSET 翻页越深越慢
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def get_page_size(data, default=DEFAULT_PAGE_SIZE):
+    "解析 page_size 参数，限制在 [1, MAX_PAGE_SIZE] 内"
+    try:
+        page_size = int(data.get("page_size", default))
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+def encode_cursor(order_key, values):
+    """
+    生成不透明游标
+    :param order_key: 排序方式标识，如 "song_title:ASC"，防止换了排序后继续使用旧游标
+    :param values: [排序键的值, 主键的值]
+    """
+    raw = json.dumps({"o": order_key, "k": values}, default=str, ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, order_key):
+    """
+    解析游标，返回 [排序键的值, 主键的值]；未传游标返回 None
+    游标非法或与当前排序方式不一致时抛出 ValueError
+    """
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(str(cursor).encode("ascii")))
+        values = payload["k"]
+        if payload["o"] != order_key or len(values) != 2:
+            raise ValueError
+    except Exception:
+        raise ValueError("invalid cursor")
+    return values
+
+def keyset_filter(sort_expr, pk_expr, direction, cursor_values):
+    """
+    生成游标之后的数据的筛选条件
+    :return: (sql 片段, 参数列表)
+    """
+    op = "<" if direction == "DESC" else ">"
+    sort_value, pk_value = cursor_values
+    sql = f"({sort_expr} {op} %s OR ({sort_expr} = %s AND {pk_expr} {op} %s))"
+    return sql, [sort_value, sort_value, pk_value]
+
+def paginate_rows(rows, page_size, order_key, cursor_values):
+    """
+    查询时多取一条 (LIMIT page_size + 1)，用于判断是否还有下一页
+    :param cursor_values: 函数，row -> [排序键的值, 主键的值]
+    :return: (当前页数据, next_cursor)
+    """
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(order_key, cursor_values(rows[-1]))
+
+
+# ============================================================
+# 辅助工具：计数表的 插入或累加
+# ============================================================
+def upsert_counter_sql(table, key_columns, counters, row_count, values=None):
+    """
+    生成 "不存在则插入，存在则累加计数" 的多行 SQL (MySQL / SQLite)
+    参数顺序为每行 key_columns + counters
+    :param values: 每列的 SQL 表达式，默认全部为 %s (如统计日期可以直接写 CURRENT_DATE)
+    """
+    columns = list(key_columns) + list(counters)
+    values = values or ["%s"] * len(columns)
+    placeholders = ", ".join(["(" + ", ".join(values) + ")"] * row_count)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders}"
+
+    if connection.vendor == "mysql":
+        updates = ", ".join(f"{c} = {c} + VALUES({c})" for c in counters)
+        return f"{sql} ON DUPLICATE KEY UPDATE {updates}"
+
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in counters)
+    return f"{sql} ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}"
+
+
 # 把秒转成 mm:ss 格式
 def format_time(sec):
     if sec is None:
@@ -59,18 +195,7 @@ def add_system_log(action, target_table=None, target_id=None, result='success'):
     :param target_table: 操作的表名，如 "Singer"
     :param target_id: 操作的记录ID，如 10
     :param result: 'success' 或 'fail'
+    日志先放入缓冲区，由后台线程批量写入 (见 systemLog.py)，
+    日志记录失败不应该影响主业务流程，所以不会抛出异常
     """
-    try:
-        sql = """
-              INSERT INTO SystemLog (action, target_table, target_id, result, action_time)
-              VALUES (%s, %s, %s, %s, %s) \
-              """
-        now = datetime.datetime.now()
-
-        # 使用一个新的 cursor，防止干扰外部事务
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [action, target_table, target_id, result, now])
-
-    except Exception as e:
-        # 日志记录失败不应该影响主业务流程，所以这里只打印错误，不抛出异常
-        print(f"日志记录失败: {e}")
\ No newline at end of file
+    add_log(action, target_table, target_id, result)
\ No newline at end of file
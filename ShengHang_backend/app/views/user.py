@@ -1,9 +1,15 @@
 # 用户管理模块
 from django.views.decorators.csrf import csrf_exempt
-from django.db import connection
+from django.db import connection, transaction
 import datetime
 import json
 from .tools import *
+from . import searchIndex
+from .cache import invalidate_profiles
+from .dailyStats import add_user_stat, subtract_user
+from .leaderboard import remove_user_favorites
+from .likeCounter import delete_like_records
+from .jsonStream import JSONArray, fetch_batches, json_stream
 
 
 
@@ -110,7 +116,9 @@ def register(request):
         cursor.execute(sql_insert, [
             username, hashed_pw, gender, birthday, region, email, profile
         ])
-        
+
+    add_user_stat(None, "new_user_count")
+
     return json_cn({"message": "注册成功"})
 
 
@@ -183,7 +191,7 @@ def logout(request):
     # ----------------------------
     # 1. 登录检查
     # ----------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "您尚未登录"}, 403)
 
     if request.method != "POST":
@@ -206,7 +214,7 @@ def delete_account(request):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    user_id = request.session.get("user_id")
+    user_id = current_user_id(request)
     if not user_id:
         return json_cn({"error": "请先登录"}, 401)
 
@@ -250,8 +258,23 @@ def delete_account(request):
     # --------------------------
     sql_delete = "DELETE FROM User WHERE user_id = %s"
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_delete, [user_id])
+    with transaction.atomic():
+        # 收藏记录会被级联删除，先扣除收藏排行榜中的计数
+        remove_user_favorites(user_id)
+        # 播放、评论、收藏、歌单和账号本身从全站每日统计中扣除
+        subtract_user(user_id)
+        with connection.cursor() as cursor:
+            # 歌单会被级联删除，先记下歌单ID，用于清理检索索引和点赞记录
+            cursor.execute("SELECT songlist_id FROM Songlist WHERE user_id = %s", [user_id])
+            songlist_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(sql_delete, [user_id])
+        delete_like_records("songlist", songlist_ids)
+
+    searchIndex.remove_entities("songlist", songlist_ids)
+
+    # 用户的评论与歌单被级联删除，可能出现在任意详情页中
+    invalidate_profiles()
+    invalidate_user(user_id)
 
     # --------------------------
     # 5. 注销 session
@@ -272,7 +295,7 @@ def change_password(request):
     # --------------------------
     # 1. 检查登录状态
     # --------------------------
-    uid = request.session.get("user_id")
+    uid = current_user_id(request)
     if not uid:
         return json_cn({"error": "请先登录"}, 403)
 
@@ -327,7 +350,7 @@ def profile(request, owner_id):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    user_id = request.session.get("user_id")
+    user_id = current_user_id(request)
     if not user_id:
         return json_cn({"error": "请先登录"}, 403)
     
@@ -358,7 +381,7 @@ def profile(request, owner_id):
     region = region if region else None
     email = email if email else None
     profile_text = profile_text if profile_text else None
-    birthday = str(birthday) if birthday else None
+    birthday = birthday if birthday else None
 
     # --------------------------
     # 4. 返回用户信息
@@ -384,9 +407,9 @@ def update_profile(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录再修改个人信息"}, 403)
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -446,10 +469,10 @@ def follow_user(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
 
-    follower = request.session["user_id"]
+    follower = request.current_user.user_id
 
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -516,10 +539,10 @@ def unfollow_user(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
 
-    follower = request.session["user_id"]
+    follower = request.current_user.user_id
 
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -587,10 +610,10 @@ def follow_singer(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
 
-    follower = request.session["user_id"]
+    follower = request.current_user.user_id
     
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -651,10 +674,10 @@ def unfollow_singer(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
 
-    follower = request.session["user_id"]
+    follower = request.current_user.user_id
     
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -717,10 +740,10 @@ def get_followings(request, uid):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
 
-    login_user_id = request.session["user_id"]
+    login_user_id = request.current_user.user_id
     
 
     if login_user_id != uid:
@@ -771,17 +794,17 @@ def get_followers(request, uid):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
     
-    login_user_id = request.session.get("user_id")
+    login_user_id = current_user_id(request)
     
 
     if login_user_id != uid:
         return json_cn({"error": "无权限查看他人粉丝列表"}, 403)
 
     # --------------------------
-    # 2. 查询粉丝列表和总数
+    # 2. 查询粉丝列表 (流式输出，总数在列表之后输出)
     # --------------------------
     sql = """
         SELECT u.user_name, u.user_id
@@ -789,30 +812,18 @@ def get_followers(request, uid):
         JOIN User u ON uf.follower_id = u.user_id
         WHERE uf.followed_id = %s
     """
-    sql_count = """
-        SELECT COUNT(*)
-        FROM UserFollow
-        WHERE followed_id = %s
-    """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [uid])
-        rows = cursor.fetchall()
+    def build_followers(rows):
+        return [{"user_name": row[0], "user_id": row[1]} for row in rows]
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql_count, [uid])
-        total_count = cursor.fetchone()[0]
-    if not total_count:
-        total_count = 0
+    followers = JSONArray(map(build_followers, fetch_batches(sql, [uid])))
 
     # --------------------------
     # 3. 返回粉丝列表和总数
     # --------------------------
-    followers = [{"user_name": row[0], "user_id": row[1]} for row in rows]
-
-    return json_cn({
-        "total_count": total_count,
-        "followers": followers
+    return json_stream({
+        "followers": followers,
+        "total_count": lambda: followers.count
     })
 
 
@@ -824,10 +835,10 @@ def get_followsingers(request, uid):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
     
-    login_user_id = request.session.get("user_id")
+    login_user_id = current_user_id(request)
     
 
     if login_user_id != uid:
@@ -878,7 +889,7 @@ def get_user_info(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录"}, 403)
     
     if request.method != "POST":
@@ -928,9 +939,9 @@ def update_visibility(request):
     # --------------------------
     # 1. 登录校验
     # --------------------------
-    if "user_id" not in request.session:
+    if not request.current_user:
         return json_cn({"error": "请先登录再修改可见性"}, 403)
-    uid = request.session["user_id"]
+    uid = request.current_user.user_id
 
     if request.method != "POST":
         return json_cn({"error": "POST required"}, 400)
@@ -953,5 +964,6 @@ def update_visibility(request):
     sql_update = "UPDATE User SET visibility=%s WHERE user_id=%s"
     with connection.cursor() as cursor:
         cursor.execute(sql_update, [visibility, uid])
+    invalidate_user(uid)
 
     return json_cn({"message": "个人信息可见性修改成功", "visibility": visibility})
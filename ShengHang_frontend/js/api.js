@@ -262,9 +262,9 @@ const SonglistAPI = {
     }),
 
     // 搜索歌单
-    searchSonglist: (title) => apiRequest('/songlist/search_songlist/', {
+    searchSonglist: (title, cursor = null) => apiRequest('/songlist/search_songlist/', {
         method: 'POST',
-        body: { songlist_title: title }
+        body: { songlist_title: title, cursor }
     }),
 
     // 点赞歌单
@@ -273,7 +273,7 @@ const SonglistAPI = {
     }),
 
     // 歌单排序
-    sortSonglist: (songlistId, sortBy) => apiRequest(`/songlist/sort_songlist/${songlistId}/?sort=${sortBy}`, {
+    sortSonglist: (songlistId, sortBy, cursor = null) => apiRequest(`/songlist/sort_songlist/${songlistId}/?sort=${sortBy}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`, {
         method: 'GET'
     })
 };